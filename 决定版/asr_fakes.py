@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ASR测试辅助模块
+ASR相关测试共用的百度语音识别接口替身：按上传方式返回预设响应并记录请求，
+以及跳过令牌获取的ASR模块和替换 requests.post 的识别调用
+
+版本: 2.0.0
+"""
+
+import time
+
+import asr_module
+from asr_module import ASRModule
+
+
+class FakeResponse:
+    """requests.Response 的替身"""
+
+    def __init__(self, status_code: int, body: dict):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class FakeBaidu:
+    """记录请求并按上传方式（raw / json / form）返回预设响应，替换 requests.post"""
+
+    def __init__(self, responses: dict):
+        """
+        Args:
+            responses (dict): 上传方式 → 响应；值为异常时抛出该异常
+        """
+        self.responses = responses
+        self.calls = []
+
+    def __call__(self, url, params=None, data=None, json=None, headers=None, timeout=None):
+        content_type = headers['Content-Type']
+        mode = 'raw' if content_type.startswith('audio/') else 'json' if json is not None else 'form'
+        self.calls.append((mode, content_type, data if mode == 'raw' else (json or data)))
+        response = self.responses[mode]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def make_asr(**attributes) -> ASRModule:
+    """创建已持有有效令牌、不压缩上传的ASR模块，attributes 覆盖其他属性"""
+    asr = ASRModule()
+    asr.access_token = 'test_token'
+    asr.token_expire_time = time.time() + 3600
+    asr.compression = None
+    for name, value in attributes.items():
+        setattr(asr, name, value)
+    return asr
+
+
+def recognize(asr: ASRModule, fake: FakeBaidu, audio: bytes):
+    """用 fake 替换 requests.post 后识别一段音频"""
+    original = asr_module.requests.post
+    asr_module.requests.post = fake
+    try:
+        return asr.recognize_speech(audio)
+    finally:
+        asr_module.requests.post = original
@@ -11,7 +11,17 @@ import logging
 import requests
 import base64
 import time
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from audio_codec import encode_m4a
+from circuit_breaker import CircuitBreaker
+from config import (ASR_UPLOAD_CONFIG, ASR_CACHE_CONFIG, API_TIMEOUTS, AUDIO_SAMPLE_RATE, HEDGING_CONFIG,
+                    ERROR_THRESHOLDS, RETRY_CONFIG, TEST_CONFIG)
+from deadline import Deadline, request_timeout
+from hedging import Hedger
+from utils import calculate_audio_hash
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -19,6 +29,12 @@ logger = logging.getLogger(__name__)
 class ASRModule:
     """ASR语音识别模块类"""
     
+    # 百度ASR API端点
+    ASR_URL = "https://vop.baidu.com/server_api"
+    
+    # 表示请求格式不被接受的错误码（参数错误、采样率非法、格式非法），出现时换用其他上传方式
+    FORMAT_ERROR_CODES = {3300, 3311, 3312}
+    
     def __init__(self):
         """初始化ASR模块"""
         # 百度ASR配置信息
@@ -30,6 +46,33 @@ class ASRModule:
         self.access_token = None
         self.token_expire_time = 0
         
+        # 上传方式：首次请求按顺序探测，确定后记住
+        self.upload_modes = list(ASR_UPLOAD_CONFIG['MODES'])
+        self.upload_mode: Optional[str] = None
+        self.compression = ASR_UPLOAD_CONFIG['COMPRESSION']
+        self.upload_stats = {
+            'requests': 0,
+            'rejected_requests': 0,
+            'compressed_requests': 0,
+            'uploaded_bytes': 0
+        }
+        
+        # 对冲请求：主请求出现长尾延迟时重复发送同一份音频
+        self.hedger = Hedger.from_config('asr', HEDGING_CONFIG['ASR'], HEDGING_CONFIG)
+        
+        # 熔断器：百度ASR故障期间直接走降级方案
+        self.breaker = CircuitBreaker.from_config('ASR', ERROR_THRESHOLDS, RETRY_CONFIG)
+        
+        # 识别结果缓存：音频指纹 -> (过期时间, 识别文本)，命中时不再请求后端
+        self.cache_enabled = ASR_CACHE_CONFIG['ENABLED']
+        self.result_cache: OrderedDict = OrderedDict()
+        self.cache_stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0
+        }
+        self._cache_lock = threading.Lock()
+        
     def get_access_token(self) -> Optional[str]:
         """获取百度ASR访问令牌"""
         try:
@@ -83,34 +126,74 @@ class ASRModule:
             logger.error(f"❌ 获取ASR访问令牌时发生未知错误: {e}")
             return None
     
-    def recognize_speech(self, audio_data: bytes) -> Optional[str]:
-        """执行语音识别"""
+    def recognize_speech(self, audio_data: bytes, deadline: Optional[Deadline] = None) -> Optional[str]:
+        """执行语音识别（deadline 为本轮对话的截止时间，请求超时不超过剩余预算）"""
         try:
             logger.info("🔍 开始语音识别处理")
             
+            # 验证音频数据
+            if not self._validate_audio_data(audio_data):
+                return None
+            
+            # 相同音频（客户端重发、固定提示语）直接返回缓存的识别结果，熔断期间同样可用
+            cache_key = calculate_audio_hash(audio_data) if self.cache_enabled else None
+            if cache_key:
+                cached = self._get_cached_result(cache_key)
+                if cached is not None:
+                    return cached
+            
+            # 熔断打开时直接返回，不再等待请求超时
+            if not self.breaker.allow_request():
+                logger.warning("⚡ ASR服务熔断中，跳过请求")
+                return self._fallback_asr()
+            
             # 获取访问令牌
             access_token = self.get_access_token()
             if not access_token:
                 logger.error("❌ 无法获取ASR访问令牌")
+                self.breaker.record_failure()
                 return self._fallback_asr()
             
-            # 验证音频数据
-            if not self._validate_audio_data(audio_data):
-                return None
-            
-            # 将音频数据转换为base64编码
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
-            # 构建ASR请求参数
-            asr_data = self._build_asr_request(access_token, audio_base64, len(audio_data))
+            # 按配置压缩音频（上行带宽受限时使用）
+            audio_format, payload = self._prepare_audio(audio_data)
             
             # 执行ASR识别
-            return self._execute_asr_request(asr_data)
+            return self._execute_asr_request(access_token, audio_format, payload, deadline, cache_key)
             
         except Exception as e:
             logger.error(f"❌ 语音识别过程中发生未知错误: {e}")
+            self.breaker.record_failure()
             return self._fallback_asr()
     
+    def _get_cached_result(self, cache_key: str) -> Optional[str]:
+        """查询缓存的识别结果（过期的条目删除）"""
+        with self._cache_lock:
+            entry = self.result_cache.get(cache_key)
+            if entry is None:
+                self.cache_stats['misses'] += 1
+                return None
+            
+            expires_at, text = entry
+            if time.monotonic() >= expires_at:
+                del self.result_cache[cache_key]
+                self.cache_stats['expired'] += 1
+                self.cache_stats['misses'] += 1
+                return None
+            
+            self.result_cache.move_to_end(cache_key)
+            self.cache_stats['hits'] += 1
+        
+        logger.info("💾 ASR缓存命中，跳过识别请求")
+        return text
+    
+    def _cache_result(self, cache_key: str, text: str):
+        """缓存识别结果，超过容量时淘汰最久未用的"""
+        with self._cache_lock:
+            self.result_cache[cache_key] = (time.monotonic() + ASR_CACHE_CONFIG['TTL'], text)
+            self.result_cache.move_to_end(cache_key)
+            while len(self.result_cache) > ASR_CACHE_CONFIG['MAX_ENTRIES']:
+                self.result_cache.popitem(last=False)
+    
     def _validate_audio_data(self, audio_data: bytes) -> bool:
         """验证音频数据有效性"""
         if not audio_data:
@@ -125,10 +208,26 @@ class ASRModule:
         logger.debug(f"✅ 音频数据验证通过: {len(audio_data)} 字节")
         return True
     
-    def _build_asr_request(self, access_token: str, audio_base64: str, audio_length: int) -> dict:
-        """构建ASR请求参数"""
+    def _prepare_audio(self, audio_data: bytes) -> Tuple[str, bytes]:
+        """按配置压缩PCM音频，返回 (音频格式, 上传数据)；压缩不可用或失败时使用原始PCM"""
+        if self.compression == 'm4a' and len(audio_data) >= ASR_UPLOAD_CONFIG['COMPRESSION_MIN_BYTES']:
+            try:
+                compressed = encode_m4a(audio_data, AUDIO_SAMPLE_RATE, ASR_UPLOAD_CONFIG['COMPRESSION_BITRATE'])
+                self.upload_stats['compressed_requests'] += 1
+                logger.debug(f"🗜️ ASR音频已压缩: {len(audio_data)} -> {len(compressed)} 字节")
+                return 'm4a', compressed
+            except ImportError:
+                logger.warning("⚠️ 未安装av，无法压缩ASR音频，改为上传原始PCM")
+                self.compression = None
+            except Exception as e:
+                logger.warning(f"⚠️ ASR音频压缩失败，上传原始PCM: {e}")
+        return 'pcm', audio_data
+    
+    def _build_asr_request(self, access_token: str, audio_base64: str, audio_length: int,
+                           audio_format: str = 'pcm') -> dict:
+        """构建ASR请求参数（JSON/表单方式）"""
         return {
-            'format': 'pcm',              # 音频格式：PCM
+            'format': audio_format,       # 音频格式：pcm / m4a
             'rate': 16000,                # 采样率：16kHz
             'channel': 1,                 # 声道数：单声道
             'token': access_token,        # 访问令牌
@@ -137,114 +236,155 @@ class ASRModule:
             'len': audio_length           # 音频数据长度
         }
     
-    def _execute_asr_request(self, asr_data: dict) -> Optional[str]:
-        """执行ASR识别请求"""
+    def _execute_asr_request(self, access_token: str, audio_format: str, payload: bytes,
+                             deadline: Optional[Deadline] = None, cache_key: Optional[str] = None) -> Optional[str]:
+        """执行ASR识别请求（主请求出现长尾延迟时发出对冲请求，取先被服务端接受的结果；只缓存后端的有效结果）"""
         try:
-            logger.info(f"📤 发送ASR识别请求: {asr_data['len']} 字节")
+            logger.info(f"📤 发送ASR识别请求: {len(payload)} 字节 ({audio_format})")
             
-            # 百度ASR API端点
-            asr_url = "https://vop.baidu.com/server_api"
-            
-            # 尝试不同的请求格式
-            asr_result = self._try_json_request(asr_url, asr_data)
-            if asr_result is not None:
-                return asr_result
-            
-            # 如果JSON格式失败，尝试表单格式
-            asr_result = self._try_form_request(asr_url, asr_data)
-            if asr_result is not None:
+            accepted, asr_result = self.hedger.call(
+                lambda: self._send_asr_request(access_token, audio_format, payload, deadline),
+                accept=lambda outcome: outcome[0]
+            )
+            if accepted:
+                self.breaker.record_success()
+                if cache_key and asr_result:
+                    self._cache_result(cache_key, asr_result)
                 return asr_result
             
-            # 所有请求格式都失败
             logger.error("❌ 所有ASR请求格式都失败")
+            self.breaker.record_failure()
             return self._fallback_asr()
             
+        except requests.exceptions.RequestException as e:
+            # 网络错误与上传方式无关，不换方式重发同一份数据
+            logger.error(f"❌ ASR请求网络异常: {e}")
+            self.breaker.record_failure()
+            return self._fallback_asr()
         except Exception as e:
             logger.error(f"❌ 执行ASR请求时发生错误: {e}")
+            self.breaker.record_failure()
             return self._fallback_asr()
     
-    def _try_json_request(self, url: str, data: dict) -> Optional[str]:
-        """尝试使用JSON格式发送ASR请求"""
-        try:
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(url, json=data, headers=headers, timeout=8)
+    def _send_asr_request(self, access_token: str, audio_format: str, payload: bytes,
+                          deadline: Optional[Deadline] = None) -> Tuple[bool, Optional[str]]:
+        """
+        发送一次ASR识别请求，返回 (服务端是否接受, 识别文本)
+        
+        首次请求按配置顺序尝试上传方式，找到服务端接受的方式后记住，之后的请求只使用该方式；
+        该方式被服务端拒绝时清除记录，下一次请求重新探测
+        """
+        modes = [self.upload_mode] if self.upload_mode else self.upload_modes
+        for mode in modes:
+            timeout = request_timeout(deadline, API_TIMEOUTS['ASR_REQUEST'])
+            accepted, asr_result = self.UPLOAD_SENDERS[mode](self, access_token, audio_format, payload, timeout)
+            self.upload_stats['requests'] += 1
+            self.upload_stats['uploaded_bytes'] += len(payload)
             
-            logger.info(f"📤 JSON格式ASR请求完成，状态码: {response.status_code}")
+            if accepted:
+                if self.upload_mode != mode:
+                    self.upload_mode = mode
+                    logger.info(f"✅ ASR上传方式已确定: {mode}")
+                return True, asr_result
             
-            if response.status_code == 200:
-                return self._parse_asr_response(response)
-            else:
-                logger.warning(f"⚠️ JSON格式ASR请求失败: HTTP {response.status_code}")
-                return None
-                
-        except Exception as e:
-            logger.warning(f"⚠️ JSON格式ASR请求异常: {e}")
-            return None
+            self.upload_stats['rejected_requests'] += 1
+        
+        # 所有上传方式都被拒绝（或记住的方式失效）
+        if self.upload_mode:
+            logger.warning(f"⚠️ ASR上传方式 {self.upload_mode} 失效，下次请求重新探测")
+            self.upload_mode = None
+        return False, None
     
-    def _try_form_request(self, url: str, data: dict) -> Optional[str]:
-        """尝试使用表单格式发送ASR请求"""
-        try:
-            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-            response = requests.post(url, data=data, headers=headers, timeout=8)
-            
-            logger.info(f"📤 表单格式ASR请求完成，状态码: {response.status_code}")
-            
-            if response.status_code == 200:
-                return self._parse_asr_response(response)
-            else:
-                logger.warning(f"⚠️ 表单格式ASR请求失败: HTTP {response.status_code}")
-                return None
-                
-        except Exception as e:
-            logger.warning(f"⚠️ 表单格式ASR请求异常: {e}")
-            return None
+    def _try_raw_request(self, access_token: str, audio_format: str, payload: bytes,
+                         timeout: float) -> Tuple[bool, Optional[str]]:
+        """以原始音频作为请求体发送ASR请求（无base64开销）"""
+        headers = {'Content-Type': f'audio/{audio_format};rate={AUDIO_SAMPLE_RATE}'}
+        params = {'cuid': 'webrtc_client', 'token': access_token}
+        response = requests.post(self.ASR_URL, params=params, data=payload, headers=headers, timeout=timeout)
+        
+        logger.info(f"📤 原始音频ASR请求完成，状态码: {response.status_code}")
+        return self._parse_asr_response(response)
+    
+    def _try_json_request(self, access_token: str, audio_format: str, payload: bytes,
+                           timeout: float) -> Tuple[bool, Optional[str]]:
+        """使用JSON格式（base64编码音频）发送ASR请求"""
+        data = self._build_asr_request(access_token, base64.b64encode(payload).decode('utf-8'), len(payload), audio_format)
+        headers = {'Content-Type': 'application/json'}
+        response = requests.post(self.ASR_URL, json=data, headers=headers, timeout=timeout)
+        
+        logger.info(f"📤 JSON格式ASR请求完成，状态码: {response.status_code}")
+        return self._parse_asr_response(response)
+    
+    def _try_form_request(self, access_token: str, audio_format: str, payload: bytes,
+                           timeout: float) -> Tuple[bool, Optional[str]]:
+        """使用表单格式（base64编码音频）发送ASR请求"""
+        data = self._build_asr_request(access_token, base64.b64encode(payload).decode('utf-8'), len(payload), audio_format)
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        response = requests.post(self.ASR_URL, data=data, headers=headers, timeout=timeout)
+        
+        logger.info(f"📤 表单格式ASR请求完成，状态码: {response.status_code}")
+        return self._parse_asr_response(response)
+    
+    UPLOAD_SENDERS = {
+        'raw': _try_raw_request,
+        'json': _try_json_request,
+        'form': _try_form_request
+    }
     
-    def _parse_asr_response(self, response: requests.Response) -> Optional[str]:
-        """解析ASR API响应"""
+    def _parse_asr_response(self, response: requests.Response) -> Tuple[bool, Optional[str]]:
+        """
+        解析ASR API响应
+        
+        Returns:
+            (服务端是否接受了该上传方式, 识别文本)；识别失败但请求格式正确时仍视为接受
+        """
+        if response.status_code != 200:
+            logger.warning(f"⚠️ ASR请求失败: HTTP {response.status_code}")
+            return False, None
+        
         try:
             asr_result = response.json()
-            logger.info(f"📋 ASR响应解析完成: {asr_result.get('err_msg', 'unknown')}")
+        except ValueError as e:
+            logger.error(f"❌ 解析ASR响应失败: {e}")
+            return False, None
+        
+        logger.info(f"📋 ASR响应解析完成: {asr_result.get('err_msg', 'unknown')}")
+        
+        # 检查API返回状态
+        error_code = asr_result.get('err_no')
+        if error_code == 0:
+            # 成功识别
+            result_text = asr_result.get('result', [''])[0] if asr_result.get('result') else ''
             
-            # 检查API返回状态
-            if asr_result.get('err_no') == 0:
-                # 成功识别
-                result_text = asr_result.get('result', [''])[0] if asr_result.get('result') else ''
-                
-                if result_text and result_text.strip():
-                    logger.info(f"✅ ASR识别成功: {result_text}")
-                    return result_text
-                else:
-                    logger.warning("⚠️ ASR识别结果为空")
-                    return None
+            if result_text and result_text.strip():
+                logger.info(f"✅ ASR识别成功: {result_text}")
+                return True, result_text
             else:
-                # API返回错误
-                error_code = asr_result.get('err_no')
-                error_msg = asr_result.get('err_msg', 'unknown')
-                logger.error(f"❌ ASR API返回错误: 错误码={error_code}, 错误信息={error_msg}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"❌ 解析ASR响应失败: {e}")
-            return None
+                logger.warning("⚠️ ASR识别结果为空")
+                return True, None
+        
+        # API返回错误
+        error_msg = asr_result.get('err_msg', 'unknown')
+        logger.error(f"❌ ASR API返回错误: 错误码={error_code}, 错误信息={error_msg}")
+        return error_code not in self.FORMAT_ERROR_CODES, None
     
     def _fallback_asr(self) -> Optional[str]:
-        """ASR失败时的备用方案"""
-        logger.warning("⚠️ 使用备用ASR方案")
+        """
+        ASR失败时的备用方案：返回None，由服务器直接通知客户端识别失败，不再调用LLM和TTS
         
-        try:
-            # 这里可以集成其他ASR服务，如：
-            # - Google Speech Recognition
-            # - Microsoft Azure Speech
-            # - 本地语音识别模型
-            
-            # 目前返回模拟结果
-            mock_result = "我听到了您的声音，这是一个测试回复"
-            logger.info(f"✅ 备用ASR完成: {mock_result}")
+        只有启用模拟服务（TEST_CONFIG['ENABLE_MOCK_SERVICES']，开发测试用）时返回模拟的识别结果
+        """
+        # 这里可以集成其他ASR服务，如：
+        # - Google Speech Recognition
+        # - Microsoft Azure Speech
+        # - 本地语音识别模型
+        if TEST_CONFIG['ENABLE_MOCK_SERVICES']:
+            mock_result = TEST_CONFIG['MOCK_ASR_RESPONSE']
+            logger.info(f"✅ 模拟ASR结果: {mock_result}")
             return mock_result
-            
-        except Exception as e:
-            logger.error(f"❌ 备用ASR也失败了: {e}")
-            return None
+        
+        logger.warning("⚠️ ASR不可用，本轮识别失败")
+        return None
     
     def get_module_status(self) -> dict:
         """获取模块状态信息"""
@@ -253,9 +393,26 @@ class ASRModule:
             'status': 'active',
             'has_token': self.access_token is not None,
             'token_expires_in': max(0, self.token_expire_time - time.time()) if self.token_expire_time else 0,
-            'api_key_configured': bool(self.API_KEY and self.SECRET_KEY)
+            'api_key_configured': bool(self.API_KEY and self.SECRET_KEY),
+            'upload_mode': self.upload_mode,
+            'compression': self.compression,
+            'upload': dict(self.upload_stats),
+            'hedging': self.hedger.get_stats(),
+            'breaker': self.breaker.get_status(),
+            'cache': self.get_cache_stats()
         }
     
+    def get_cache_stats(self) -> dict:
+        """获取识别结果缓存的命中统计"""
+        with self._cache_lock:
+            lookups = self.cache_stats['hits'] + self.cache_stats['misses']
+            return {
+                'enabled': self.cache_enabled,
+                'size': len(self.result_cache),
+                **self.cache_stats,
+                'hit_rate': self.cache_stats['hits'] / lookups if lookups else 0.0
+            }
+    
     def reset_token(self):
         """重置访问令牌"""
         self.access_token = None
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上行音频时钟模块
+客户端在每个上行音频帧前附带帧头：序号和采集时间戳（客户端音频时钟，毫秒），
+服务器按采集时间而不是到达时间判断静音：
+
+- 网络抖动、TCP队头阻塞造成的到达间隔不再被当成句中停顿（假静音）
+- 积压后集中到达的一批帧不再被当成持续说话（假语音）
+- 序号跳变计为丢帧（缺口），迟到或重复的帧丢弃，按会话统计到达抖动
+
+帧头格式（网络字节序，8字节）：uint32 序号 + uint32 采集时间戳（毫秒），之后是按协商编码的音频数据
+
+版本: 2.0.0
+"""
+
+import struct
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('!II')
+SEQ_MODULO = 1 << 32
+
+
+def pack_audio_frame(seq: int, capture_ms: int, payload: bytes) -> bytes:
+    """构造带帧头的上行音频帧"""
+    return FRAME_HEADER.pack(seq % SEQ_MODULO, int(capture_ms) % SEQ_MODULO) + payload
+
+
+def unpack_audio_frame(frame: bytes) -> Tuple[int, int, bytes]:
+    """解析上行音频帧，返回 (序号, 采集时间戳毫秒, 音频数据)"""
+    if len(frame) <= FRAME_HEADER.size:
+        raise ValueError("音频帧长度不足")
+    seq, capture_ms = FRAME_HEADER.unpack_from(frame)
+    return seq, capture_ms, frame[FRAME_HEADER.size:]
+
+
+class AudioClock:
+    """单个会话的上行音频时钟：把客户端采集时间映射到服务器时间，统计缺口、迟到帧和到达抖动"""
+
+    __slots__ = ('max_reorder', 'jitter_margin', 'max_margin_ms', 'next_seq', 'offset_ms', 'end_ms',
+                 'last_capture_ms', 'last_arrival_ms', 'jitter_ms', 'frames', 'lost_frames',
+                 'late_frames', 'restarts')
+
+    def __init__(self, max_reorder: int = 50, jitter_margin: float = 2.0, max_margin_ms: float = 300.0):
+        """
+        Args:
+            max_reorder (int): 序号落后超过该帧数时视为客户端重新开始计数
+            jitter_margin (float): 判断静音时按抖动的多少倍预留等待余量
+            max_margin_ms (float): 等待余量上限（毫秒）
+        """
+        self.max_reorder = max_reorder
+        self.jitter_margin = jitter_margin
+        self.max_margin_ms = max_margin_ms
+        self.next_seq: Optional[int] = None
+        self.offset_ms = 0.0             # 服务器时间 - 采集时间 的最小值（传输最快的帧）
+        self.end_ms = 0.0                # 已收到音频在采集时钟上的结束时间
+        self.last_capture_ms = 0.0
+        self.last_arrival_ms = 0.0
+        self.jitter_ms = 0.0             # 到达抖动估计（RFC 3550 算法）
+        self.frames = 0
+        self.lost_frames = 0             # 序号缺口（传输中丢失的帧）
+        self.late_frames = 0             # 迟到或重复而丢弃的帧
+        self.restarts = 0
+
+    def _restart(self, seq: int, capture_ms: float, arrival_ms: float):
+        if self.next_seq is not None:
+            self.restarts += 1
+        self.next_seq = seq
+        self.offset_ms = arrival_ms - capture_ms
+        self.end_ms = capture_ms
+        self.last_capture_ms = capture_ms
+        self.last_arrival_ms = arrival_ms
+
+    def observe(self, seq: int, capture_ms: float, duration_ms: float, arrival: float) -> bool:
+        """
+        记录一个到达的音频帧
+
+        Args:
+            seq (int): 帧序号
+            capture_ms (float): 采集时间戳（客户端音频时钟，毫秒）
+            duration_ms (float): 帧时长（毫秒）
+            arrival (float): 到达时间（服务器时间，秒）
+
+        Returns:
+            帧是否按顺序到达、应当加入缓冲区（迟到或重复的帧返回False）
+        """
+        arrival_ms = arrival * 1000.0
+        behind = (self.next_seq - seq) % SEQ_MODULO if self.next_seq is not None else 0
+        # 序号从0重新开始或落后太多：客户端重新开始计数
+        if self.next_seq is None or (seq == 0 and behind) or self.max_reorder < behind < SEQ_MODULO // 2:
+            self._restart(seq, capture_ms, arrival_ms)
+        elif 0 < behind <= self.max_reorder:
+            self.late_frames += 1
+            return False
+        else:
+            ahead = (seq - self.next_seq) % SEQ_MODULO
+            if ahead:
+                self.lost_frames += ahead
+                logger.debug(f"📉 音频帧缺口: 期望序号 {self.next_seq}，收到 {seq}")
+
+            # 到达间隔与采集间隔之差的平滑估计
+            transit_change = (arrival_ms - self.last_arrival_ms) - (capture_ms - self.last_capture_ms)
+            self.jitter_ms += (abs(transit_change) - self.jitter_ms) / 16.0
+            self.offset_ms = min(self.offset_ms, arrival_ms - capture_ms)
+            self.last_capture_ms = capture_ms
+            self.last_arrival_ms = arrival_ms
+
+        self.next_seq = (seq + 1) % SEQ_MODULO
+        self.end_ms = max(self.end_ms, capture_ms + duration_ms)
+        self.frames += 1
+        return True
+
+    def silence_seconds(self, now: float) -> float:
+        """
+        按采集时钟计算音频结束后已经过去多久（秒）
+
+        当前时刻换算到采集时钟时按传输最快的帧估计，再扣除抖动余量：
+        只是在网络中延迟的帧不会被当成停顿
+        """
+        margin = min(self.jitter_ms * self.jitter_margin, self.max_margin_ms)
+        audio_now = now * 1000.0 - self.offset_ms - margin
+        return max(0.0, (audio_now - self.end_ms) / 1000.0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """转换为字典（用于状态上报）"""
+        return {
+            'frames': self.frames,
+            'lost_frames': self.lost_frames,
+            'late_frames': self.late_frames,
+            'restarts': self.restarts,
+            'jitter_ms': round(self.jitter_ms, 1)
+        }
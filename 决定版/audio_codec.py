@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上行音频编解码模块
+浏览器端可将16位PCM压缩后再上传，服务端在进入音频处理流程前解码还原：
+
+- pcm16:     原始16位小端PCM（不压缩）
+- pcmu:      G.711 μ-law，每样本8位（1/2）
+- pcma:      G.711 A-law，每样本8位（1/2）
+- ima_adpcm: IMA-ADPCM，每样本4位（约1/4）
+
+IMA-ADPCM 每帧自带4字节头：预测值（int16小端）+ 步长索引（uint8）+ 保留字节，
+随后每字节两个样本（高4位在前，与audioop一致），因此每帧可独立解码。
+
+G.711 使用查表向量化解码；IMA-ADPCM 的预测递推无法向量化，
+优先使用标准库 audioop 的C实现，不可用时（Python 3.13+）使用查表的纯Python实现。
+
+另提供 encode_m4a（AAC），上行带宽受限时用于压缩发往ASR服务的音频（需要av）。
+
+版本: 2.0.0
+"""
+
+import struct
+import logging
+import warnings
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import audioop
+except ImportError:
+    audioop = None
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+PCM16 = 'pcm16'
+PCMU = 'pcmu'
+PCMA = 'pcma'
+IMA_ADPCM = 'ima_adpcm'
+
+# IMA-ADPCM 帧头：预测值、步长索引、保留字节
+ADPCM_HEADER = struct.Struct('<hBB')
+
+_ADPCM_STEP_TABLE = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767
+]
+_ADPCM_INDEX_TABLE = [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8]
+
+
+# =============================================================================
+# 查表构建
+# =============================================================================
+
+def _ulaw_to_linear(value: int) -> int:
+    value = ~value & 0xFF
+    exponent = (value >> 4) & 0x07
+    sample = ((((value & 0x0F) << 3) + 0x84) << exponent) - 0x84
+    return -sample if value & 0x80 else sample
+
+
+def _alaw_to_linear(value: int) -> int:
+    value ^= 0x55
+    segment = (value & 0x70) >> 4
+    sample = (value & 0x0F) << 4
+    if segment == 0:
+        sample += 8
+    else:
+        sample = (sample + 0x108) << (segment - 1)
+    return sample if value & 0x80 else -sample
+
+
+def _build_adpcm_tables() -> Tuple[List[int], List[int]]:
+    """预计算 (步长索引, 4位码) -> (带符号差值, 下一步长索引)"""
+    diffs, next_indexes = [], []
+    for index, step in enumerate(_ADPCM_STEP_TABLE):
+        for code in range(16):
+            diff = step >> 3
+            if code & 4:
+                diff += step
+            if code & 2:
+                diff += step >> 1
+            if code & 1:
+                diff += step >> 2
+            diffs.append(-diff if code & 8 else diff)
+            next_indexes.append(min(88, max(0, index + _ADPCM_INDEX_TABLE[code])))
+    return diffs, next_indexes
+
+
+_ULAW_DECODE_TABLE = np.array([_ulaw_to_linear(i) for i in range(256)], dtype='<i2')
+_ALAW_DECODE_TABLE = np.array([_alaw_to_linear(i) for i in range(256)], dtype='<i2')
+_ADPCM_DIFF_TABLE, _ADPCM_NEXT_INDEX_TABLE = _build_adpcm_tables()
+
+# G.711 编码的分段上界
+_ULAW_SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+_ALAW_SEGMENT_ENDS = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+
+# =============================================================================
+# 解码
+# =============================================================================
+
+def decode_pcmu(data: bytes) -> bytes:
+    """G.711 μ-law -> 16位PCM"""
+    return _ULAW_DECODE_TABLE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+def decode_pcma(data: bytes) -> bytes:
+    """G.711 A-law -> 16位PCM"""
+    return _ALAW_DECODE_TABLE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+def decode_ima_adpcm(data: bytes) -> bytes:
+    """IMA-ADPCM（带帧头）-> 16位PCM"""
+    if len(data) <= ADPCM_HEADER.size:
+        raise ValueError(f"IMA-ADPCM帧过短: {len(data)} 字节")
+
+    predictor, index, _ = ADPCM_HEADER.unpack_from(data)
+    if index > 88:
+        raise ValueError(f"IMA-ADPCM步长索引无效: {index}")
+
+    payload = data[ADPCM_HEADER.size:]
+    if audioop is not None:
+        return audioop.adpcm2lin(payload, 2, (predictor, index))[0]
+
+    # 拆分4位码（高4位在前）
+    packed = np.frombuffer(payload, dtype=np.uint8)
+    codes = np.empty(packed.size * 2, dtype=np.uint8)
+    codes[0::2] = packed >> 4
+    codes[1::2] = packed & 0x0F
+
+    diffs = _ADPCM_DIFF_TABLE
+    next_indexes = _ADPCM_NEXT_INDEX_TABLE
+    samples = array('h', bytes(codes.size * 2))
+    for i, code in enumerate(codes.tolist()):
+        key = (index << 4) | code
+        predictor += diffs[key]
+        if predictor > 32767:
+            predictor = 32767
+        elif predictor < -32768:
+            predictor = -32768
+        samples[i] = predictor
+        index = next_indexes[key]
+
+    return samples.tobytes()
+
+
+# =============================================================================
+# 编码（浏览器端编码器的参考实现，用于测试和基准）
+# =============================================================================
+
+def encode_pcmu(pcm: bytes) -> bytes:
+    """16位PCM -> G.711 μ-law"""
+    samples = np.frombuffer(pcm, dtype='<i2').astype(np.int32) >> 2
+    mask = np.where(samples < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(samples), 8159) + 0x21
+    segment = np.searchsorted(_ULAW_SEGMENT_ENDS, magnitude)
+    value = (np.minimum(segment, 7) << 4) | ((magnitude >> np.minimum(segment + 1, 8)) & 0x0F)
+    value = np.where(segment >= 8, 0x7F, value)
+    return ((value ^ mask) & 0xFF).astype(np.uint8).tobytes()
+
+
+def encode_pcma(pcm: bytes) -> bytes:
+    """16位PCM -> G.711 A-law"""
+    samples = np.frombuffer(pcm, dtype='<i2').astype(np.int32) >> 3
+    mask = np.where(samples >= 0, 0xD5, 0x55)
+    magnitude = np.where(samples >= 0, samples, -samples - 1)
+    segment = np.searchsorted(_ALAW_SEGMENT_ENDS, magnitude)
+    shift = np.where(segment < 2, 1, segment)
+    value = (np.minimum(segment, 7) << 4) | ((magnitude >> np.minimum(shift, 7)) & 0x0F)
+    value = np.where(segment >= 8, 0x7F, value)
+    return ((value ^ mask) & 0xFF).astype(np.uint8).tobytes()
+
+
+def encode_ima_adpcm(pcm: bytes, state: Optional[Tuple[int, int]] = None) -> Tuple[bytes, Tuple[int, int]]:
+    """16位PCM -> IMA-ADPCM（带帧头），返回 (编码数据, 编码器状态)，状态可传给下一帧"""
+    predictor, index = state or (0, 0)
+    header = ADPCM_HEADER.pack(predictor, index, 0)
+
+    samples = array('h')
+    samples.frombytes(pcm)
+    out = bytearray((len(samples) + 1) // 2)
+
+    for i, sample in enumerate(samples):
+        step = _ADPCM_STEP_TABLE[index]
+        diff = sample - predictor
+        code = 0
+        if diff < 0:
+            code = 8
+            diff = -diff
+        if diff >= step:
+            code |= 4
+            diff -= step
+        if diff >= step >> 1:
+            code |= 2
+            diff -= step >> 1
+        if diff >= step >> 2:
+            code |= 1
+
+        key = (index << 4) | code
+        predictor = max(-32768, min(32767, predictor + _ADPCM_DIFF_TABLE[key]))
+        index = _ADPCM_NEXT_INDEX_TABLE[key]
+        out[i >> 1] |= code << 4 if i % 2 == 0 else code
+
+    return header + bytes(out), (predictor, index)
+
+
+def encode_m4a(pcm: bytes, sample_rate: int = 16000, bit_rate: int = 32000) -> bytes:
+    """16位单声道PCM -> m4a（AAC），用于压缩ASR上传；依赖av，未安装时抛出ImportError"""
+    import av
+    import io
+
+    samples = np.frombuffer(pcm, dtype='<i2', count=len(pcm) // 2)
+    frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format='s16', layout='mono')
+    frame.sample_rate = sample_rate
+
+    output = io.BytesIO()
+    with av.open(output, 'w', format='ipod') as container:
+        stream = container.add_stream('aac', rate=sample_rate, layout='mono')
+        stream.bit_rate = bit_rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return output.getvalue()
+
+
+# =============================================================================
+# 协商与分发
+# =============================================================================
+
+DECODERS: Dict[str, Callable[[bytes], bytes]] = {
+    PCMU: decode_pcmu,
+    PCMA: decode_pcma,
+    IMA_ADPCM: decode_ima_adpcm
+}
+
+
+def negotiate_codec(requested: Optional[str], supported: List[str], default: str = PCM16) -> str:
+    """选择上行编码：客户端请求的编码受支持时使用该编码，否则回退到默认编码"""
+    if requested in supported and (requested == PCM16 or requested in DECODERS):
+        return requested
+    if requested:
+        logger.warning(f"⚠️ 不支持的上行音频编码: {requested}，使用 {default}")
+    return default
+
+
+def decode_audio(codec: str, data: bytes) -> bytes:
+    """按协商的编码解码一帧上行音频，返回16位PCM"""
+    if codec == PCM16:
+        return data
+    return DECODERS[codec](data)
@@ -7,10 +7,11 @@
 版本: 2.0.0
 """
 
+import math
 import logging
 import time
-from collections import deque
 from typing import List, Optional, Dict, Any
+from client_session import ClientSession
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -18,46 +19,89 @@ logger = logging.getLogger(__name__)
 class AudioProcessor:
     """音频处理模块类"""
     
-    def __init__(self, buffer_size: int = 50):
-        """初始化音频处理模块"""
+    def __init__(self, buffer_size: int = 50, sessions: Optional[Dict[str, ClientSession]] = None):
+        """
+        初始化音频处理模块
+        
+        Args:
+            buffer_size (int): 每个客户端音频缓冲区的最大块数
+            sessions (dict): 客户端会话表（客户端ID -> ClientSession），
+                由服务器传入时与其连接表共用，独立使用时自动创建
+        """
         self.buffer_size = buffer_size
         
-        # 客户端音频数据管理
-        self.audio_buffers: Dict[str, deque] = {}
-        self.last_audio_time: Dict[str, float] = {}
-        self.asr_tasks: Dict[str, Any] = {}
+        # 客户端音频数据管理：缓冲区、时间戳、ASR任务和统计信息都保存在客户端会话对象中
+        self.sessions: Dict[str, ClientSession] = sessions if sessions is not None else {}
+        
+        # ASR前静音裁剪统计（累计值，不随客户端回收清零）
+        self.trim_stats = {
+            'trimmed_requests': 0,
+            'input_bytes': 0,
+            'output_bytes': 0
+        }
+        
+        # 长语音分段次数
+        self.segment_count = 0
+    
+    # 兼容旧接口的只读视图（按需生成，仅用于调试和状态查看）
+    @property
+    def audio_buffers(self) -> Dict[str, Any]:
+        return {cid: s.audio_buffer for cid, s in self.sessions.items() if s.audio_buffer is not None}
+    
+    @property
+    def last_audio_time(self) -> Dict[str, float]:
+        return {cid: s.last_audio_time for cid, s in self.sessions.items() if s.audio_buffer is not None}
+    
+    @property
+    def asr_tasks(self) -> Dict[str, Any]:
+        return {cid: s.asr_task for cid, s in self.sessions.items() if s.asr_task is not None}
+    
+    @property
+    def processing_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {cid: s.stats.as_dict() for cid, s in self.sessions.items() if s.stats is not None}
+    
+    def get_session(self, client_id: str) -> Optional[ClientSession]:
+        """获取客户端会话"""
+        return self.sessions.get(client_id)
         
-        # 音频处理统计
-        self.processing_stats: Dict[str, Dict[str, Any]] = {}
+    def add_audio_data(self, client_id: str, audio_data: bytes, wire_bytes: Optional[int] = None) -> bool:
+        """
+        添加音频数据到缓冲区
         
-    def add_audio_data(self, client_id: str, audio_data: bytes) -> bool:
-        """添加音频数据到缓冲区"""
+        Args:
+            client_id (str): 客户端ID
+            audio_data (bytes): 16位PCM音频数据（已解码）
+            wire_bytes (int): 解码前的字节数，用于统计上行带宽，默认等于PCM字节数
+        """
         try:
             # 验证输入参数
             if not client_id or not audio_data:
                 logger.warning("⚠️ 无效的输入参数")
                 return False
             
-            # 初始化客户端缓冲区（如果不存在）
-            if client_id not in self.audio_buffers:
-                self.audio_buffers[client_id] = deque(maxlen=self.buffer_size)
-                self.last_audio_time[client_id] = time.time()
-                self.processing_stats[client_id] = {
-                    'total_audio_chunks': 0,
-                    'total_audio_bytes': 0,
-                    'first_audio_time': time.time(),
-                    'last_audio_time': time.time()
-                }
-                logger.debug(f"🔧 为客户端 {client_id} 初始化音频缓冲区")
+            session = self.sessions.get(client_id)
+            if session is None:
+                session = self.sessions[client_id] = ClientSession(client_id)
+            
+            now = time.time()
+            
+            # 初始化客户端缓冲区（如果不存在，或已被空闲回收）
+            buffer = session.audio_buffer
+            if buffer is None:
+                buffer = session.ensure_audio_buffer(self.buffer_length(len(audio_data)))
             
             # 添加音频数据到缓冲区
-            self.audio_buffers[client_id].append(audio_data)
-            self.last_audio_time[client_id] = time.time()
+            buffer.append(audio_data)
+            session.last_audio_time = now
             
             # 更新统计信息
-            self.processing_stats[client_id]['total_audio_chunks'] += 1
-            self.processing_stats[client_id]['total_audio_bytes'] += len(audio_data)
-            self.processing_stats[client_id]['last_audio_time'] = time.time()
+            stats = session.stats
+            if stats is None:
+                stats = session.ensure_stats(now)
+            stats.total_audio_chunks += 1
+            stats.total_audio_bytes += len(audio_data)
+            stats.total_wire_bytes += len(audio_data) if wire_bytes is None else wire_bytes
+            stats.last_audio_time = now
             
             logger.debug(f"🎵 客户端 {client_id} 音频数据已添加: {len(audio_data)} 字节")
             return True
@@ -66,18 +110,67 @@ class AudioProcessor:
             logger.error(f"❌ 添加音频数据失败: {e}")
             return False
     
+    def buffer_length(self, frame_bytes: int) -> int:
+        """
+        音频缓冲区的块数：至少 buffer_size，且按帧长能容纳两段最长语音（MAX_WAIT_TIME），
+        长语音在分段前不会被deque丢弃（重采样后的帧可能远小于1024个采样）
+        """
+        from config import ASR_PROCESSING_CONFIG, AUDIO_SAMPLE_RATE, AUDIO_SAMPLE_WIDTH
+        
+        segment_bytes = ASR_PROCESSING_CONFIG['MAX_WAIT_TIME'] * AUDIO_SAMPLE_RATE * AUDIO_SAMPLE_WIDTH
+        return max(self.buffer_size, 2 * math.ceil(segment_bytes / frame_bytes))
+    
+    def observe_frame(self, session: ClientSession, audio_data: bytes, seq: int, capture_ms: int, now: float) -> bool:
+        """
+        把一个带时间戳的音频帧记入会话的音频时钟（不存在时分配）
+        
+        Returns:
+            帧是否按顺序到达（迟到或重复的帧返回False，不应加入缓冲区）
+        """
+        from config import AUDIO_CLOCK_CONFIG, AUDIO_SAMPLE_RATE, AUDIO_SAMPLE_WIDTH
+        from audio_clock import AudioClock
+        
+        clock = session.audio_clock
+        if clock is None:
+            clock = session.audio_clock = AudioClock(
+                max_reorder=AUDIO_CLOCK_CONFIG['MAX_REORDER_FRAMES'],
+                jitter_margin=AUDIO_CLOCK_CONFIG['JITTER_MARGIN'],
+                max_margin_ms=AUDIO_CLOCK_CONFIG['MAX_MARGIN_MS']
+            )
+        duration_ms = len(audio_data) * 1000.0 / (AUDIO_SAMPLE_RATE * AUDIO_SAMPLE_WIDTH)
+        return clock.observe(seq, capture_ms, duration_ms, now)
+    
+    def silence_duration(self, session: ClientSession, now: float) -> float:
+        """最后一段音频结束后的静音时长（秒）：帧带时间戳时按音频时钟，否则按到达时间"""
+        if session.audio_clock is not None:
+            return session.audio_clock.silence_seconds(now)
+        return now - session.last_audio_time
+    
+    def time_until_silent(self, client_id: str, silence_threshold: float) -> Optional[float]:
+        """
+        按音频时钟计算还要等待多久才满足静音时长
+        
+        Returns:
+            剩余等待时间（秒）；会话的音频帧不带时间戳或缓冲区为空时返回None，由调用方按固定时间等待
+        """
+        session = self.sessions.get(client_id)
+        if session is None or session.audio_clock is None or not session.audio_buffer:
+            return None
+        return max(0.0, silence_threshold - session.audio_clock.silence_seconds(time.time()))
+    
     def get_audio_data(self, client_id: str) -> Optional[bytes]:
         """获取并清空音频缓冲区数据"""
         try:
-            if client_id not in self.audio_buffers:
+            session = self.sessions.get(client_id)
+            if session is None or session.audio_buffer is None:
                 logger.warning(f"⚠️ 客户端 {client_id} 的音频缓冲区不存在")
                 return None
             
             # 获取所有音频数据
-            audio_chunks = list(self.audio_buffers[client_id])
+            audio_chunks = list(session.audio_buffer)
             
             # 清空缓冲区
-            self.audio_buffers[client_id].clear()
+            session.audio_buffer.clear()
             
             if not audio_chunks:
                 logger.debug(f"📝 客户端 {client_id} 的音频缓冲区为空")
@@ -87,9 +180,9 @@ class AudioProcessor:
             combined_audio = b''.join(audio_chunks)
             
             # 更新统计信息
-            if client_id in self.processing_stats:
-                self.processing_stats[client_id]['processed_chunks'] = len(audio_chunks)
-                self.processing_stats[client_id]['processed_bytes'] = len(combined_audio)
+            if session.stats is not None:
+                session.stats.processed_chunks = len(audio_chunks)
+                session.stats.processed_bytes = len(combined_audio)
             
             logger.info(f"📊 处理音频数据: 客户端 {client_id}, {len(audio_chunks)} 块, {len(combined_audio)} 字节")
             return combined_audio
@@ -98,14 +191,104 @@ class AudioProcessor:
             logger.error(f"❌ 获取音频数据失败: {e}")
             return None
     
+    def pop_segment(self, client_id: str, max_seconds: float, search_seconds: float) -> Optional[bytes]:
+        """
+        长语音分段：缓冲的音频超过 max_seconds 时，
+        在最后 search_seconds 内能量最低处（句中停顿）切分，取出前一段，其余留在缓冲区；
+        只按时长判断，与帧长无关（缓冲区容量见 buffer_length）
+        
+        Args:
+            client_id (str): 客户端ID
+            max_seconds (float): 单段最长时长（秒）
+            search_seconds (float): 在段尾多长范围内寻找停顿（秒）
+        
+        Returns:
+            切出的音频段，未达到分段条件时返回None
+        """
+        try:
+            session = self.sessions.get(client_id)
+            if session is None or not session.audio_buffer:
+                return None
+            
+            from config import AUDIO_SAMPLE_RATE, AUDIO_SAMPLE_WIDTH
+            from silence_trim import find_pause
+            
+            buffer = session.audio_buffer
+            bytes_per_second = AUDIO_SAMPLE_RATE * AUDIO_SAMPLE_WIDTH
+            total_bytes = sum(len(chunk) for chunk in buffer)
+            if total_bytes < max_seconds * bytes_per_second:
+                return None
+            
+            audio = b''.join(buffer)
+            search_from = max(0, len(audio) - int(search_seconds * bytes_per_second))
+            cut = find_pause(audio, AUDIO_SAMPLE_RATE, search_from=search_from)
+            
+            buffer.clear()
+            if cut < len(audio):
+                buffer.append(audio[cut:])
+            self.segment_count += 1
+            
+            logger.info(f"✂️ 客户端 {client_id} 长语音分段: {cut / bytes_per_second:.2f} 秒，"
+                        f"剩余 {(len(audio) - cut) / bytes_per_second:.2f} 秒")
+            return audio[:cut]
+        
+        except Exception as e:
+            logger.error(f"❌ 长语音分段失败: {e}")
+            return None
+    
+    def trim_silence(self, client_id: str, audio_data: bytes, config: Optional[Dict[str, Any]] = None) -> bytes:
+        """
+        裁剪送往ASR的音频：去掉首尾静音（保留余量）并压缩过长的句中停顿
+        
+        Args:
+            client_id (str): 客户端ID
+            audio_data (bytes): 合并后的16位PCM音频
+            config (dict): 裁剪配置，默认使用 config.SILENCE_TRIM_CONFIG
+        """
+        try:
+            from config import SILENCE_TRIM_CONFIG, AUDIO_SAMPLE_RATE
+            from silence_trim import trim_silence
+            
+            config = config or SILENCE_TRIM_CONFIG
+            if not config['ENABLED'] or not audio_data:
+                return audio_data
+            
+            trimmed, saved = trim_silence(
+                audio_data,
+                sample_rate=AUDIO_SAMPLE_RATE,
+                frame_ms=config['FRAME_MS'],
+                threshold=config['THRESHOLD'],
+                edge_margin_ms=config['EDGE_MARGIN_MS'],
+                max_pause_ms=config['MAX_PAUSE_MS']
+            )
+            
+            self.trim_stats['trimmed_requests'] += 1
+            self.trim_stats['input_bytes'] += len(audio_data)
+            self.trim_stats['output_bytes'] += len(trimmed)
+            
+            session = self.sessions.get(client_id)
+            if session is not None and session.stats is not None:
+                session.stats.trimmed_bytes += saved
+            
+            if saved:
+                logger.info(f"✂️ 客户端 {client_id} 静音裁剪: {len(audio_data)} -> {len(trimmed)} 字节 "
+                            f"(节省 {saved * 100 / len(audio_data):.0f}%)")
+            return trimmed
+            
+        except Exception as e:
+            logger.error(f"❌ 静音裁剪失败: {e}")
+            return audio_data
+    
     def has_sufficient_audio(self, client_id: str, threshold: int = 1) -> bool:
         """检查是否有足够的音频数据进行处理"""
         try:
-            if client_id in self.audio_buffers:
-                buffer_size = len(self.audio_buffers[client_id])
+            session = self.sessions.get(client_id)
+            if session is not None and session.audio_buffer is not None:
+                buffer = session.audio_buffer
+                buffer_size = len(buffer)
                 
                 # 计算总音频数据大小（字节）
-                total_bytes = sum(len(chunk) for chunk in self.audio_buffers[client_id])
+                total_bytes = sum(len(chunk) for chunk in buffer)
                 
                 # 使用配置文件中的参数
                 from config import ASR_PROCESSING_CONFIG
@@ -131,8 +314,9 @@ class AudioProcessor:
     def get_audio_buffer_size(self, client_id: str) -> int:
         """获取音频缓冲区大小"""
         try:
-            if client_id in self.audio_buffers:
-                return len(self.audio_buffers[client_id])
+            session = self.sessions.get(client_id)
+            if session is not None and session.audio_buffer is not None:
+                return len(session.audio_buffer)
             else:
                 return 0
                 
@@ -143,8 +327,9 @@ class AudioProcessor:
     def is_silent(self, client_id: str, silence_threshold: float = 1.0) -> bool:
         """检查是否已经静音足够长时间"""
         try:
-            if client_id in self.last_audio_time:
-                time_since_last_audio = time.time() - self.last_audio_time[client_id]
+            session = self.sessions.get(client_id)
+            if session is not None and session.audio_buffer is not None:
+                time_since_last_audio = self.silence_duration(session, time.time())
                 is_silent = time_since_last_audio >= silence_threshold
                 
                 if is_silent:
@@ -164,13 +349,13 @@ class AudioProcessor:
     def clear_buffer(self, client_id: str):
         """清空指定客户端的音频缓冲区"""
         try:
-            if client_id in self.audio_buffers:
-                buffer_size = len(self.audio_buffers[client_id])
-                self.audio_buffers[client_id].clear()
+            session = self.sessions.get(client_id)
+            if session is not None and session.audio_buffer is not None:
+                buffer_size = len(session.audio_buffer)
+                session.audio_buffer.clear()
                 
                 # 重置最后音频时间
-                if client_id in self.last_audio_time:
-                    self.last_audio_time[client_id] = 0
+                session.last_audio_time = 0
                 
                 logger.info(f"🗑️ 已清空客户端 {client_id} 的音频缓冲区 ({buffer_size} 块)")
             else:
@@ -180,43 +365,73 @@ class AudioProcessor:
             logger.error(f"❌ 清空音频缓冲区失败: {e}")
     
     def cleanup_client(self, client_id: str):
-        """清理指定客户端的资源"""
+        """清理指定客户端的资源（移除客户端会话并释放其音频状态）"""
         try:
-            # 清理音频缓冲区
-            if client_id in self.audio_buffers:
-                buffer_size = len(self.audio_buffers[client_id])
-                del self.audio_buffers[client_id]
+            session = self.sessions.pop(client_id, None)
+            if session is not None:
+                buffer_size = len(session.audio_buffer) if session.audio_buffer is not None else 0
+                session.release_audio()
                 logger.debug(f"🗑️ 已清理客户端 {client_id} 的音频缓冲区 ({buffer_size} 块)")
             
-            # 清理时间记录
-            if client_id in self.last_audio_time:
-                del self.last_audio_time[client_id]
-            
-            # 清理ASR任务
-            if client_id in self.asr_tasks:
-                del self.asr_tasks[client_id]
-            
-            # 清理统计信息
-            if client_id in self.processing_stats:
-                del self.processing_stats[client_id]
-            
             logger.info(f"🧹 已清理客户端 {client_id} 的所有音频处理资源")
             
         except Exception as e:
             logger.error(f"❌ 清理客户端资源失败: {e}")
     
+    def reap_idle(self, active_clients, buffer_ttl: float, stats_ttl: float) -> int:
+        """
+        回收空闲客户端的音频资源，返回估算回收的字节数
+        
+        Args:
+            active_clients: 当前仍在连接的客户端ID集合，不在其中的客户端资源全部回收
+            buffer_ttl (float): 超过该时间未收到音频时释放缓冲区（下次收到音频时重新分配）
+            stats_ttl (float): 超过该时间未收到音频时释放统计信息
+        """
+        from utils import estimate_object_size
+        
+        now = time.time()
+        reclaimed = 0
+        
+        for client_id, session in list(self.sessions.items()):
+            try:
+                if client_id not in active_clients:
+                    # 断开路径未正常清理的遗留资源
+                    reclaimed += estimate_object_size([session.audio_buffer]) + _stats_size(session.stats)
+                    self.cleanup_client(client_id)
+                    continue
+                
+                idle = now - session.last_audio_time
+                
+                # 已完成的ASR任务句柄
+                if session.asr_task is not None and session.asr_task.done():
+                    session.asr_task = None
+                
+                if idle > buffer_ttl and session.audio_buffer is not None and session.asr_task is None:
+                    reclaimed += estimate_object_size(session.audio_buffer)
+                    session.audio_buffer = None
+                
+                if idle > stats_ttl and session.stats is not None:
+                    reclaimed += _stats_size(session.stats)
+                    session.stats = None
+                    
+            except Exception as e:
+                logger.error(f"❌ 回收客户端 {client_id} 音频资源失败: {e}")
+        
+        return reclaimed
+    
     def get_client_stats(self, client_id: str) -> Dict[str, Any]:
         """获取客户端音频处理统计信息"""
         try:
+            session = self.sessions.get(client_id)
             stats = {
                 'buffer_size': self.get_audio_buffer_size(client_id),
                 'is_silent': self.is_silent(client_id),
-                'last_audio_time': self.last_audio_time.get(client_id, 0)
+                'last_audio_time': session.last_audio_time if session is not None else 0
             }
             
             # 添加详细统计信息
-            if client_id in self.processing_stats:
-                stats.update(self.processing_stats[client_id])
+            if session is not None and session.stats is not None:
+                stats.update(session.stats.as_dict())
                 
                 # 计算处理速率
                 if stats['first_audio_time'] > 0:
@@ -234,15 +449,16 @@ class AudioProcessor:
     def get_all_clients_summary(self) -> Dict[str, Any]:
         """获取所有客户端的音频处理摘要"""
         try:
+            audio_clients = [cid for cid, s in self.sessions.items() if s.audio_buffer is not None]
             summary = {
-                'total_clients': len(self.audio_buffers),
+                'total_clients': len(audio_clients),
                 'active_clients': 0,
                 'total_audio_chunks': 0,
                 'total_audio_bytes': 0,
                 'clients_info': {}
             }
             
-            for client_id in self.audio_buffers:
+            for client_id in audio_clients:
                 client_stats = self.get_client_stats(client_id)
                 summary['clients_info'][client_id] = client_stats
                 
@@ -263,29 +479,50 @@ class AudioProcessor:
     def get_module_status(self) -> Dict[str, Any]:
         """获取模块状态信息"""
         try:
+            buffers = [s.audio_buffer for s in self.sessions.values() if s.audio_buffer is not None]
+            stats = [s.stats for s in self.sessions.values() if s.stats is not None]
             return {
                 'module': 'AudioProcessor',
                 'status': 'active',
                 'buffer_size': self.buffer_size,
-                'total_clients': len(self.audio_buffers),
-                'active_clients': len([c for c in self.audio_buffers if not self.is_silent(c)]),
-                'total_audio_chunks': sum(len(buf) for buf in self.audio_buffers.values())
+                'total_clients': len(buffers),
+                'active_clients': len([c for c, s in self.sessions.items()
+                                       if s.audio_buffer is not None and not self.is_silent(c)]),
+                'total_audio_chunks': sum(len(buf) for buf in buffers),
+                'buffered_bytes': sum(len(chunk) for buf in buffers for chunk in buf),
+                # 上行带宽：解码后PCM字节数与实际接收字节数
+                'total_pcm_bytes': sum(st.total_audio_bytes for st in stats),
+                'total_wire_bytes': sum(st.total_wire_bytes for st in stats),
+                # 上行帧时钟：缺口、迟到帧和各客户端的到达抖动
+                'clock': self.get_clock_status(),
+                # ASR前静音裁剪
+                'asr_segments': self.segment_count,
+                'trim': dict(self.trim_stats,
+                             saved_bytes=self.trim_stats['input_bytes'] - self.trim_stats['output_bytes'])
             }
             
         except Exception as e:
             logger.error(f"❌ 获取模块状态失败: {e}")
             return {'error': str(e)}
     
+    def get_clock_status(self) -> Dict[str, Any]:
+        """汇总各客户端上行音频时钟的统计"""
+        clocks = {cid: s.audio_clock for cid, s in self.sessions.items() if s.audio_clock is not None}
+        return {
+            'timed_clients': len(clocks),
+            'frames': sum(clock.frames for clock in clocks.values()),
+            'lost_frames': sum(clock.lost_frames for clock in clocks.values()),
+            'late_frames': sum(clock.late_frames for clock in clocks.values()),
+            'jitter_ms': {cid: round(clock.jitter_ms, 1) for cid, clock in clocks.items()}
+        }
+    
     def reset_client_stats(self, client_id: str):
         """重置指定客户端的统计信息"""
         try:
-            if client_id in self.processing_stats:
-                self.processing_stats[client_id] = {
-                    'total_audio_chunks': 0,
-                    'total_audio_bytes': 0,
-                    'first_audio_time': time.time(),
-                    'last_audio_time': time.time()
-                }
+            session = self.sessions.get(client_id)
+            if session is not None and session.stats is not None:
+                session.stats = None
+                session.ensure_stats(time.time())
                 logger.info(f"🔄 已重置客户端 {client_id} 的统计信息")
             else:
                 logger.debug(f"📝 客户端 {client_id} 没有统计信息需要重置")
@@ -296,15 +533,16 @@ class AudioProcessor:
     def get_audio_quality_metrics(self, client_id: str) -> Dict[str, Any]:
         """获取音频质量指标"""
         try:
-            if client_id not in self.processing_stats:
+            session = self.sessions.get(client_id)
+            if session is None or session.stats is None:
                 return {'error': '客户端不存在'}
             
-            stats = self.processing_stats[client_id]
+            stats = session.stats
             
             # 计算音频质量指标
             metrics = {
-                'total_chunks': stats.get('total_audio_chunks', 0),
-                'total_bytes': stats.get('total_audio_bytes', 0),
+                'total_chunks': stats.total_audio_chunks,
+                'total_bytes': stats.total_audio_bytes,
                 'average_chunk_size': 0,
                 'processing_efficiency': 0
             }
@@ -314,13 +552,23 @@ class AudioProcessor:
                 metrics['average_chunk_size'] = metrics['total_bytes'] / metrics['total_chunks']
             
             # 计算处理效率（基于时间）
-            if stats.get('first_audio_time', 0) > 0:
-                duration = time.time() - stats['first_audio_time']
+            if stats.first_audio_time > 0:
+                duration = time.time() - stats.first_audio_time
                 if duration > 0:
                     metrics['processing_efficiency'] = metrics['total_bytes'] / duration
             
+            # 上行帧时钟：丢帧、迟到帧和到达抖动
+            if session.audio_clock is not None:
+                metrics['clock'] = session.audio_clock.as_dict()
+            
             return metrics
             
         except Exception as e:
             logger.error(f"❌ 获取音频质量指标失败: {e}")
             return {'error': str(e)}
+
+
+def _stats_size(stats) -> int:
+    """估算统计对象占用的内存（字节）"""
+    import sys
+    return sys.getsizeof(stats) if stats is not None else 0
@@ -0,0 +1,604 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准测试脚本
+覆盖每帧/每轮的热路径，按提交保存结果并与基线对比，超过回归阈值时返回非零退出码
+
+用法:
+    python benchmark.py                     # 运行基准测试并与基线对比
+    python benchmark.py --save-baseline     # 运行并将结果保存为新的基线
+    python benchmark.py --threshold 0.3     # 自定义回归阈值（30%）
+    python benchmark.py --only audio        # 只运行名称包含 audio 的用例
+    python benchmark.py --only memory       # 只运行内存用例（每个空闲连接的内存占用）
+
+版本: 2.0.0
+"""
+
+import gc
+import sys
+import json
+import time
+import uuid
+import timeit
+import base64
+import asyncio
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+# 先配置日志，避免导入server时写入server.log，同时屏蔽热路径上的调试日志
+logging.basicConfig(level=logging.WARNING, format='[%(asctime)s] [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+from config import BENCHMARK_CONFIG, AUDIO_SAMPLE_RATE, AUDIO_SAMPLE_WIDTH
+
+# 客户端每帧发送 1024 个 16 位采样（ScriptProcessor 缓冲区大小）
+FRAME_BYTES = 1024 * AUDIO_SAMPLE_WIDTH
+
+# 基准用例注册表：名称 -> 构造函数，构造函数返回 (被测函数, 每次调用包含的操作数)，
+# 需要释放资源（事件循环、写任务）的用例再返回一个清理函数：(被测函数, 操作数, 清理函数)
+BENCHMARKS: Dict[str, Callable[[], Tuple]] = {}
+
+# 内存用例注册表：名称 -> 构造函数，构造函数接收数量并返回创建的对象（测量期间保持引用）
+MEMORY_BENCHMARKS: Dict[str, Callable[[int], Any]] = {}
+
+
+def benchmark(name: str):
+    """注册基准用例的装饰器"""
+    def decorator(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return decorator
+
+
+def memory_benchmark(name: str):
+    """注册内存用例的装饰器"""
+    def decorator(factory):
+        MEMORY_BENCHMARKS[name] = factory
+        return factory
+    return decorator
+
+
+def _make_frame(seed: int = 0) -> bytes:
+    """生成一帧确定性的PCM测试数据"""
+    return bytes((i * 31 + seed) & 0xFF for i in range(FRAME_BYTES))
+
+
+def _make_tts_payload() -> bytes:
+    """生成与一条典型TTS回复相当的音频数据（约2秒16kHz WAV）"""
+    return b'RIFF' + _make_frame(7) * (AUDIO_SAMPLE_RATE * 2 * AUDIO_SAMPLE_WIDTH // FRAME_BYTES)
+
+
+class _NullWebSocket:
+    """丢弃所有数据的WebSocket替身，只保留消息编码开销"""
+
+    async def send(self, message):
+        return None
+
+
+def _server_teardown(server, loop: asyncio.AbstractEventLoop) -> Callable[[], None]:
+    """服务器用例的清理函数：关闭全部发送队列，等写任务退出后关闭事件循环，避免遗留的任务影响后续用例"""
+    def teardown():
+        queues = list(server.send_queues.values())
+        for queue in queues:
+            queue.close()
+
+        async def drain():
+            await asyncio.gather(*(queue.writer for queue in queues), return_exceptions=True)
+
+        loop.run_until_complete(drain())
+        loop.close()
+
+    return teardown
+
+
+# =============================================================================
+# 音频处理热路径
+# =============================================================================
+
+@benchmark('audio.add_audio_data')
+def _bench_add_audio_data():
+    from audio_processor import AudioProcessor
+
+    processor = AudioProcessor(buffer_size=50)
+    frame = _make_frame()
+    processor.add_audio_data('bench_client', frame)
+
+    return (lambda: processor.add_audio_data('bench_client', frame)), 1
+
+
+@benchmark('audio.get_audio_data')
+def _bench_get_audio_data():
+    from audio_processor import AudioProcessor
+
+    processor = AudioProcessor(buffer_size=50)
+    frames = [_make_frame(i) for i in range(50)]
+    processor.add_audio_data('bench_client', frames[0])
+    buffer = processor.sessions['bench_client'].audio_buffer
+
+    def run():
+        # 直接填充deque，只计入合并与清空的开销
+        buffer.extend(frames)
+        processor.get_audio_data('bench_client')
+
+    return run, 1
+
+
+@benchmark('audio.has_sufficient_audio')
+def _bench_has_sufficient_audio():
+    from audio_processor import AudioProcessor
+
+    processor = AudioProcessor(buffer_size=50)
+    for i in range(50):
+        processor.add_audio_data('bench_client', _make_frame(i))
+
+    return (lambda: processor.has_sufficient_audio('bench_client', threshold=1)), 1
+
+
+@benchmark('audio.trim_silence')
+def _bench_trim_silence():
+    from silence_trim import trim_silence
+
+    # 一次完整的ASR输入：50帧（约3.2秒），首尾和中间各有一段静音
+    frames = [bytes(FRAME_BYTES)] * 10 + [_make_frame(i) for i in range(15)] + [bytes(FRAME_BYTES)] * 10 \
+        + [_make_frame(i) for i in range(15)]
+    audio = b''.join(frames)
+
+    return (lambda: trim_silence(audio, AUDIO_SAMPLE_RATE)), 1
+
+
+# =============================================================================
+# 序列化热路径
+# =============================================================================
+
+@benchmark('server.send_message')
+def _bench_send_message():
+    from server import WebRTCServer
+
+    server = WebRTCServer()
+    websocket = _NullWebSocket()
+    message = {
+        'type': 'llm_response',
+        'text': '今天北京晴，气温二十度左右，适合户外活动。',
+        'timestamp': time.time()
+    }
+    batch = 100
+    loop = asyncio.new_event_loop()
+
+    async def send_batch():
+        for _ in range(batch):
+            await server.send_message(websocket, message)
+
+    return (lambda: loop.run_until_complete(send_batch())), batch, _server_teardown(server, loop)
+
+
+@benchmark('server.send_message_tts')
+def _bench_send_message_tts():
+    from server import WebRTCServer
+
+    server = WebRTCServer()
+    websocket = _NullWebSocket()
+    message = {
+        'type': 'tts_audio',
+        'audio': base64.b64encode(_make_tts_payload()).decode('utf-8'),
+        'text': '今天北京晴，气温二十度左右，适合户外活动。',
+        'timestamp': time.time()
+    }
+    loop = asyncio.new_event_loop()
+
+    return (lambda: loop.run_until_complete(server.send_message(websocket, message))), 1, _server_teardown(server, loop)
+
+
+def _broadcast_case(clients: int):
+    """广播给 clients 个客户端并等待全部写出，按客户端数计为操作数（每客户端耗时应不随客户端数增长）"""
+    from server import WebRTCServer
+    from client_session import ClientSession
+
+    server = WebRTCServer()
+    for index in range(clients):
+        server.clients[f'client-{index}'] = ClientSession(f'client-{index}', _NullWebSocket())
+    message = {
+        'type': 'notice',
+        'text': '今天北京晴，气温二十度左右，适合户外活动。',
+        'timestamp': time.time()
+    }
+    loop = asyncio.new_event_loop()
+
+    async def broadcast():
+        await server.broadcast_message(message)
+        while any(queue.messages for queue in server.send_queues.values()):
+            await asyncio.sleep(0)
+
+    return (lambda: loop.run_until_complete(broadcast())), clients, _server_teardown(server, loop)
+
+
+@benchmark('server.broadcast_100')
+def _bench_broadcast_100():
+    return _broadcast_case(100)
+
+
+@benchmark('server.broadcast_1000')
+def _bench_broadcast_1000():
+    return _broadcast_case(1000)
+
+
+@benchmark('tts.base64_encode')
+def _bench_base64_encode():
+    payload = _make_tts_payload()
+
+    return (lambda: base64.b64encode(payload).decode('utf-8')), 1
+
+
+@benchmark('tts.base64_decode')
+def _bench_base64_decode():
+    encoded = base64.b64encode(_make_tts_payload()).decode('utf-8')
+
+    return (lambda: base64.b64decode(encoded)), 1
+
+
+@benchmark('utils.create_message')
+def _bench_create_message():
+    from utils import create_message
+
+    data = {'text': '今天北京晴，气温二十度左右，适合户外活动。'}
+
+    return (lambda: create_message('llm_response', data)), 1
+
+
+# =============================================================================
+# 上行音频解码
+# =============================================================================
+
+@benchmark('codec.decode_pcmu')
+def _bench_decode_pcmu():
+    from audio_codec import encode_pcmu, decode_pcmu
+
+    encoded = encode_pcmu(_make_frame())
+
+    return (lambda: decode_pcmu(encoded)), 1
+
+
+@benchmark('codec.decode_ima_adpcm')
+def _bench_decode_ima_adpcm():
+    from audio_codec import encode_ima_adpcm, decode_ima_adpcm
+
+    encoded, _ = encode_ima_adpcm(_make_frame())
+
+    return (lambda: decode_ima_adpcm(encoded)), 1
+
+
+# =============================================================================
+# 重采样和声道下混（每帧 1024 个采样，按浏览器常见的采集格式）
+# 实时倍数 = 帧时长 / 每帧耗时，48kHz 下一帧约 21.3ms
+# =============================================================================
+
+@benchmark('resample.uplink_48k_stereo')
+def _bench_resample_48k_stereo():
+    from resampler import Resampler
+
+    resampler = Resampler(48000, AUDIO_SAMPLE_RATE, channels=2)
+    frame = _make_frame() * 2
+
+    return (lambda: resampler.process(frame)), 1
+
+
+@benchmark('resample.uplink_44k')
+def _bench_resample_44k():
+    from resampler import Resampler
+
+    resampler = Resampler(44100, AUDIO_SAMPLE_RATE)
+    frame = _make_frame()
+
+    return (lambda: resampler.process(frame)), 1
+
+
+@benchmark('resample.tts_to_48k')
+def _bench_resample_tts():
+    from resampler import resample_pcm
+
+    pcm = _make_frame(7) * (AUDIO_SAMPLE_RATE * 2 * AUDIO_SAMPLE_WIDTH // FRAME_BYTES)
+
+    return (lambda: resample_pcm(pcm, AUDIO_SAMPLE_RATE, 48000)), 1
+
+
+# =============================================================================
+# 会话热路径
+# =============================================================================
+
+@benchmark('llm.build_conversation_messages')
+def _bench_build_conversation_messages():
+    from llm_module import LLMModule
+
+    llm = LLMModule()
+    # 直接填充历史与摘要，避免触发后台摘要请求
+    llm.conversation_history['bench_client'] = [
+        message
+        for i in range(10)
+        for message in ({"role": "user", "content": f'第{i}个问题是什么？'},
+                        {"role": "assistant", "content": f'这是第{i}个回答。' * 5})
+    ]
+    llm.conversation_summaries['bench_client'] = '用户问过：今天天气怎么样；用户问过：明天会下雨吗'
+
+    return (lambda: llm._build_conversation_messages('现在几点了？', 'bench_client')), 1
+
+
+# =============================================================================
+# 每连接内存占用
+# =============================================================================
+
+@memory_benchmark('memory.idle_connection')
+def _mem_idle_connection(count: int):
+    """刚连接、尚未发送音频的客户端：会话对象 + 客户端ID + 连接表条目"""
+    from client_session import ClientSession
+
+    websocket = _NullWebSocket()
+    clients = {}
+    for _ in range(count):
+        client_id = str(uuid.uuid4())
+        clients[client_id] = ClientSession(client_id, websocket)
+    return clients
+
+
+@memory_benchmark('memory.idle_connection_after_audio')
+def _mem_idle_connection_after_audio(count: int):
+    """说过话后进入空闲的客户端：音频缓冲区已被空闲回收，统计信息仍保留"""
+    from audio_processor import AudioProcessor
+
+    processor = AudioProcessor(buffer_size=50)
+    frame = _make_frame()
+    for _ in range(count):
+        client_id = str(uuid.uuid4())
+        processor.add_audio_data(client_id, frame)
+        processor.sessions[client_id].audio_buffer = None
+    return processor
+
+
+# =============================================================================
+# 运行、保存与对比
+# =============================================================================
+
+def measure(func: Callable[[], Any], ops_per_call: int, repeat: int, min_time: float) -> Dict[str, float]:
+    """测量单个用例，返回每次操作的耗时（纳秒）"""
+    timer = timeit.Timer(func)
+
+    # 自动确定每轮调用次数，使单轮耗时不少于 min_time
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, int(min_time / elapsed) + 1)
+
+    samples = [t / (number * ops_per_call) * 1e9 for t in timer.repeat(repeat, number)]
+    return {
+        'best_ns': min(samples),
+        'median_ns': statistics.median(samples),
+        'loops': number * ops_per_call
+    }
+
+
+def measure_memory(build: Callable[[int], Any], count: int) -> Dict[str, float]:
+    """测量内存用例，返回每个对象的平均内存占用（字节）"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = build(count)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    del objects
+    return {
+        'bytes_per_item': (after - before) / count,
+        'count': count
+    }
+
+
+def run_benchmarks(only: Optional[str] = None, repeat: int = None, min_time: float = None) -> Dict[str, Dict[str, float]]:
+    """运行所有（或筛选后的）基准用例"""
+    repeat = repeat or BENCHMARK_CONFIG['REPEAT']
+    min_time = min_time or BENCHMARK_CONFIG['MIN_TIME']
+
+    results = {}
+    for name, factory in BENCHMARKS.items():
+        if only and only not in name:
+            continue
+
+        func, ops_per_call, *teardown = factory()
+        try:
+            results[name] = measure(func, ops_per_call, repeat, min_time)
+        finally:
+            for release in teardown:
+                release()
+        print(f"  {name:<36} {_format_ns(results[name]['best_ns']):>12}/op")
+
+    for name, build in MEMORY_BENCHMARKS.items():
+        if only and only not in name:
+            continue
+
+        results[name] = measure_memory(build, BENCHMARK_CONFIG['MEMORY_COUNT'])
+        print(f"  {name:<36} {_format_bytes(results[name]['bytes_per_item']):>12}/个")
+
+    return results
+
+
+def get_commit_id() -> str:
+    """获取当前git提交ID，工作区有改动时追加 -dirty"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=project_root, capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+        if not commit:
+            return 'unknown'
+
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=project_root, capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+
+    except Exception as e:
+        logger.warning(f"⚠️ 获取git提交ID失败: {e}")
+        return 'unknown'
+
+
+def save_results(results: Dict[str, Dict[str, float]], results_dir: Path, commit: str) -> Path:
+    """保存本次运行结果，文件名为提交ID（同一提交的部分运行会合并到已有结果中）"""
+    results_dir.mkdir(parents=True, exist_ok=True)
+    path = results_dir / f"{commit}.json"
+
+    existing = load_results(path)
+    if existing:
+        results = {**existing.get('results', {}), **results}
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': commit,
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results
+        }, f, ensure_ascii=False, indent=2)
+
+    return path
+
+
+def load_results(path: Path) -> Optional[Dict[str, Any]]:
+    """读取保存的结果文件"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"❌ 读取基准结果失败: {path}: {e}")
+        return None
+
+
+def compare_results(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                    threshold: float) -> List[str]:
+    """与基线对比，返回超过阈值的回归用例名称"""
+    regressions = []
+
+    print(f"\n📊 与基线对比（回归阈值 {threshold:.0%}）:")
+    for name, result in current.items():
+        if name not in baseline:
+            print(f"  {name:<36} {'(新用例)':>12}")
+            continue
+
+        # 耗时用例比较 best_ns，内存用例比较 bytes_per_item
+        key, formatter = ('bytes_per_item', _format_bytes) if 'bytes_per_item' in result else ('best_ns', _format_ns)
+        if key not in baseline[name]:
+            print(f"  {name:<36} {'(指标变化)':>12}")
+            continue
+
+        base_value = baseline[name][key]
+        change = (result[key] - base_value) / base_value if base_value > 0 else 0.0
+        status = "✅"
+        if change > threshold:
+            status = "❌"
+            regressions.append(name)
+
+        print(f"  {status} {name:<34} {formatter(base_value):>12} → {formatter(result[key]):>12} ({change:+.1%})")
+
+    return regressions
+
+
+def _format_ns(value: float) -> str:
+    """格式化纳秒耗时"""
+    if value >= 1e6:
+        return f"{value / 1e6:.2f}ms"
+    if value >= 1e3:
+        return f"{value / 1e3:.2f}µs"
+    return f"{value:.0f}ns"
+
+
+def _format_bytes(value: float) -> str:
+    """格式化字节数"""
+    if value >= 1024:
+        return f"{value / 1024:.2f}KB"
+    return f"{value:.0f}B"
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='WebRTC语音助手热路径性能基准测试')
+
+    parser.add_argument(
+        '--save-baseline',
+        action='store_true',
+        help='将本次结果保存为基线'
+    )
+
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=BENCHMARK_CONFIG['REGRESSION_THRESHOLD'],
+        help=f"回归阈值，相对基线的变慢比例 (默认: {BENCHMARK_CONFIG['REGRESSION_THRESHOLD']})"
+    )
+
+    parser.add_argument(
+        '--results-dir',
+        default=str(project_root / BENCHMARK_CONFIG['RESULTS_DIR']),
+        help='结果保存目录'
+    )
+
+    parser.add_argument(
+        '--only',
+        help='只运行名称包含该字符串的用例'
+    )
+
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        help=f"每个用例的重复轮数 (默认: {BENCHMARK_CONFIG['REPEAT']})"
+    )
+
+    return parser.parse_args()
+
+
+def main() -> int:
+    """主函数"""
+    args = parse_arguments()
+    results_dir = Path(args.results_dir)
+    commit = get_commit_id()
+
+    print(f"🧪 运行热路径基准测试 (提交: {commit})")
+    results = run_benchmarks(only=args.only, repeat=args.repeat)
+
+    path = save_results(results, results_dir, commit)
+    print(f"\n💾 结果已保存: {path}")
+
+    baseline_path = results_dir / 'baseline.json'
+    if args.save_baseline:
+        save_results(results, results_dir, 'baseline')
+        print(f"📌 已更新基线: {baseline_path}")
+        return 0
+
+    baseline = load_results(baseline_path)
+    if not baseline:
+        print("💡 未找到基线，使用 --save-baseline 创建")
+        return 0
+
+    regressions = compare_results(results, baseline['results'], args.threshold)
+    if regressions:
+        print(f"\n❌ 检测到 {len(regressions)} 个性能回归: {', '.join(regressions)}")
+        return 1
+
+    print("\n✅ 未检测到性能回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+熔断器模块
+外部服务（百度ASR/TTS、SiliconFlow LLM）故障期间，每轮对话仍要等满超时时间，
+线程池线程也被占满。每个后端一个熔断器：
+
+- closed:    正常请求；统计窗口内连续失败达到阈值时打开
+- open:      直接走降级方案，不发请求；恢复等待时间过后进入半开
+- half_open: 放行一个探测请求，成功则关闭，失败则重新打开，恢复等待时间按退避乘数增长
+
+版本: 2.0.0
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """单个后端的熔断器（线程安全）"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, failure_window: float = 300,
+                 recovery_timeout: float = 10, max_recovery_timeout: float = 120,
+                 backoff_multiplier: float = 2):
+        """
+        初始化熔断器
+
+        Args:
+            name (str): 后端名称，用于日志
+            failure_threshold (int): 打开熔断所需的连续失败次数
+            failure_window (float): 连续失败的统计窗口（秒），首次失败早于窗口时重新计数
+            recovery_timeout (float): 打开后首次放行探测请求前的等待时间（秒）
+            max_recovery_timeout (float): 恢复等待时间上限（秒）
+            backoff_multiplier (float): 探测失败后恢复等待时间的增长倍数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.backoff_multiplier = backoff_multiplier
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.first_failure_time = 0.0
+        self.opened_at = 0.0
+        self.current_recovery_timeout = recovery_timeout
+        self.probe_started = 0.0
+        self.stats = {
+            'opened': 0,
+            'short_circuited': 0,
+            'probes': 0
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, name: str, thresholds: Dict[str, Any], retry_config: Dict[str, Any]) -> 'CircuitBreaker':
+        """按 ERROR_THRESHOLDS 和 RETRY_CONFIG 创建"""
+        return cls(
+            name,
+            failure_threshold=thresholds['MAX_CONSECUTIVE_FAILURES'],
+            failure_window=thresholds['FAILURE_WINDOW'],
+            recovery_timeout=thresholds['RECOVERY_TIMEOUT'],
+            max_recovery_timeout=thresholds['MAX_RECOVERY_TIMEOUT'],
+            backoff_multiplier=retry_config['BACKOFF_MULTIPLIER']
+        )
+
+    def allow_request(self) -> bool:
+        """
+        判断是否发出请求；返回False时调用方应直接走降级方案
+
+        半开状态只放行一个探测请求；探测请求超过恢复等待时间仍未报告结果时，视为丢失，放行下一个
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.current_recovery_timeout:
+                self.state = HALF_OPEN
+                logger.info(f"🔌 {self.name} 熔断半开，放行探测请求")
+            elif self.state == HALF_OPEN and now - self.probe_started >= self.current_recovery_timeout:
+                pass
+            else:
+                self.stats['short_circuited'] += 1
+                return False
+
+            self.probe_started = now
+            self.stats['probes'] += 1
+            return True
+
+    def record_success(self):
+        """报告请求成功"""
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"✅ {self.name} 探测请求成功，熔断关闭")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.current_recovery_timeout = self.recovery_timeout
+
+    def record_failure(self):
+        """报告请求失败"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                # 探测失败：重新打开，延长恢复等待时间
+                self.consecutive_failures += 1
+                self.current_recovery_timeout = min(self.max_recovery_timeout,
+                                                    self.current_recovery_timeout * self.backoff_multiplier)
+                self._open(now)
+                return
+            if self.state == OPEN:
+                return
+
+            if self.consecutive_failures == 0 or now - self.first_failure_time > self.failure_window:
+                self.consecutive_failures = 0
+                self.first_failure_time = now
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self._open(now)
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self.stats['opened'] += 1
+        logger.warning(f"⚡ {self.name} 连续失败 {self.consecutive_failures} 次，熔断打开，"
+                       f"{self.current_recovery_timeout:.0f} 秒后探测恢复")
+
+    def retry_in(self) -> Optional[float]:
+        """距离下一次放行探测请求的秒数（未打开时为None）"""
+        with self._lock:
+            if self.state != OPEN:
+                return None
+            return max(0.0, self.current_recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取熔断器状态"""
+        retry_in = self.retry_in()
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'recovery_timeout': self.current_recovery_timeout,
+                'retry_in': retry_in,
+                **self.stats
+            }
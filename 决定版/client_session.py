@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+客户端会话模块
+每个连接的全部运行时状态集中在一个紧凑的 __slots__ 对象中：
+连接信息、音频缓冲区、时间戳、ASR任务句柄和统计信息。
+很少用到的部分（音频缓冲区、统计信息）在首次使用时才分配，
+大量空闲连接时单连接内存占用保持在最低
+
+版本: 2.0.0
+"""
+
+import sys
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class AudioStats:
+    """单个客户端的音频处理统计"""
+
+    __slots__ = ('total_audio_chunks', 'total_audio_bytes', 'total_wire_bytes', 'first_audio_time',
+                 'last_audio_time', 'processed_chunks', 'processed_bytes', 'trimmed_bytes')
+
+    def __init__(self, now: float):
+        self.total_audio_chunks = 0
+        self.total_audio_bytes = 0
+        self.total_wire_bytes = 0        # 解码前（网络上实际传输）的字节数
+        self.first_audio_time = now
+        self.last_audio_time = now
+        self.processed_chunks = 0
+        self.processed_bytes = 0
+        self.trimmed_bytes = 0           # ASR前静音裁剪节省的字节数
+
+    def as_dict(self) -> Dict[str, Any]:
+        """转换为字典（用于状态上报）"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class DetachedConnection:
+    """
+    断线宽限期内代替WebSocket连接：发给客户端的消息进入有界的待发送队列，
+    客户端重连后按顺序补发；超过条数或字节数上限时丢弃最早的消息
+    """
+
+    __slots__ = ('outbox', 'max_messages', 'max_bytes', 'bytes', 'dropped', 'origin')
+
+    def __init__(self, max_messages: int, max_bytes: int, origin=None):
+        self.outbox: deque = deque()
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.bytes = 0                   # 队列中消息占用的内存（字节）
+        self.dropped = 0
+        self.origin = origin             # 断开的原连接（其发送队列中未写出的消息随后转入本队列）
+
+    async def send(self, message):
+        self.outbox.append(message)
+        self.bytes += sys.getsizeof(message)
+        while self.outbox and (len(self.outbox) > self.max_messages or self.bytes > self.max_bytes):
+            self.drop_oldest()
+
+    def drop_oldest(self) -> int:
+        """丢弃最早的一条消息，返回释放的字节数"""
+        size = sys.getsizeof(self.outbox.popleft())
+        self.bytes -= size
+        self.dropped += 1
+        return size
+
+    def pop_sent(self):
+        """最早的一条消息已补发，移出队列"""
+        self.bytes -= sys.getsizeof(self.outbox.popleft())
+
+
+class ClientSession:
+    """单个客户端连接的运行时状态"""
+
+    __slots__ = ('client_id', 'websocket', 'connected_at', 'last_activity', 'status', 'session_token',
+                 'codec', 'transport', 'audio_buffer', 'last_audio_time', 'asr_task', 'asr_segments', 'stats',
+                 'last_reply', 'resume_token', 'detached_at', 'frame_header', 'audio_clock',
+                 'tts_reference', 'resampler', 'playback_rate', 'dsp_local')
+
+    def __init__(self, client_id: str, websocket=None, now: Optional[float] = None):
+        """
+        Args:
+            client_id (str): 客户端ID
+            websocket: WebSocket连接（独立使用音频处理模块时为None）
+            now (float): 创建时间，默认当前时间
+        """
+        now = now or time.time()
+        self.client_id = client_id
+        self.websocket = websocket
+        self.connected_at = now
+        self.last_activity = now
+        self.status = 'connected'
+        self.session_token: Optional[str] = None
+        self.codec = 'pcm16'             # 上行音频编码（连接建立后协商）
+        self.transport = 'websocket'     # 音频传输方式：websocket / rtc（WebRTC媒体连接）
+        self.frame_header = False        # 上行音频帧是否带序号和采集时间戳帧头（编码协商时确定）
+        self.resampler = None            # 上行重采样器（客户端采集格式不是16kHz单声道时）
+        self.playback_rate: Optional[int] = None  # 客户端声明的TTS播放采样率（None表示原样下发）
+        self.dsp_local = False           # DSP进程池处理失败后，该会话的上行音频改在本进程处理
+
+        # 以下部分按需分配
+        self.audio_buffer: Optional[deque] = None
+        self.last_audio_time = 0.0
+        self.asr_task = None
+        self.asr_segments: Optional[List[asyncio.Future]] = None   # 说话过程中已提前送识别的语音段（按顺序）
+        self.stats: Optional[AudioStats] = None
+        self.audio_clock = None          # 上行音频时钟（帧带时间戳时分配）
+        self.tts_reference = None        # 正在播放的TTS参考信号（回声检测）
+        self.last_reply: Optional[str] = None   # 上一句回复文本（"再说一遍"时复述）
+        self.resume_token: Optional[str] = None  # 断线恢复令牌（每次连接轮换）
+        self.detached_at: Optional[float] = None  # 连接意外断开的时间，宽限期内等待重连
+
+    @property
+    def detached(self) -> bool:
+        """连接已断开、会话处于宽限期"""
+        return isinstance(self.websocket, DetachedConnection)
+
+    def ensure_audio_buffer(self, maxlen: int) -> deque:
+        """获取音频缓冲区，不存在时分配"""
+        if self.audio_buffer is None:
+            self.audio_buffer = deque(maxlen=maxlen)
+            logger.debug(f"🔧 为客户端 {self.client_id} 初始化音频缓冲区")
+        return self.audio_buffer
+
+    def ensure_stats(self, now: float) -> AudioStats:
+        """获取音频统计，不存在时分配"""
+        if self.stats is None:
+            self.stats = AudioStats(now)
+        return self.stats
+
+    def cancel_asr_task(self):
+        """取消进行中的ASR任务"""
+        task = self.asr_task
+        if task is not None and not task.done():
+            try:
+                task.cancel()
+            except Exception as e:
+                logger.warning(f"⚠️ 取消ASR任务失败: {e}")
+
+    def add_asr_segment(self, task: asyncio.Future):
+        """记录一个已送识别的语音段"""
+        if self.asr_segments is None:
+            self.asr_segments = []
+        self.asr_segments.append(task)
+
+    def take_asr_segments(self) -> List[asyncio.Future]:
+        """取出全部已送识别的语音段（按顺序）"""
+        segments = self.asr_segments or []
+        self.asr_segments = None
+        return segments
+
+    def cancel_asr_segments(self):
+        """取消尚未完成的语音段识别"""
+        for task in self.take_asr_segments():
+            if not task.done():
+                task.cancel()
+
+    def release_audio(self):
+        """释放音频相关的全部状态"""
+        self.cancel_asr_task()
+        self.cancel_asr_segments()
+        self.asr_task = None
+        self.audio_buffer = None
+        self.stats = None
+        self.audio_clock = None
+        self.tts_reference = None
+        self.last_audio_time = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（用于状态上报）"""
+        return {
+            'id': self.client_id,
+            'connected_at': self.connected_at,
+            'last_activity': self.last_activity,
+            'status': self.status,
+            'has_session': self.session_token is not None,
+            'detached': self.detached,
+            'codec': self.codec,
+            'transport': self.transport,
+            'jitter_ms': round(self.audio_clock.jitter_ms, 1) if self.audio_clock is not None else None,
+            'buffered_chunks': len(self.audio_buffer) if self.audio_buffer is not None else 0
+        }
@@ -25,6 +25,32 @@ AVAILABLE_MODELS = [
     "THUDM/glm-4-9b-chat-2m"  # 智谱GLM-4-9B-2M模型
 ]
 
+# LLM模型路由配置（按各模型近期的首token时间和吞吐量，把请求发往预期延迟最低的模型）
+MODEL_ROUTER_CONFIG = {
+    'ENABLED': True,               # 是否启用；关闭时固定使用 DEFAULT_MODEL
+    'CONTEXT_TOKENS': {            # 各模型上下文窗口（tokens），提示词加生成长度超过时不路由到该模型
+        "THUDM/glm-4-9b-chat": 128000,
+        "THUDM/glm-4-9b-chat-1m": 1000000,
+        "THUDM/glm-4-9b-chat-2m": 2000000
+    },
+    'WINDOW': 50,                  # 每个模型保留的最近样本数
+    'MIN_SAMPLES': 5,              # 参与按延迟路由所需的最少样本数（不足时首选 DEFAULT_MODEL）
+    'EXPLORE_RATE': 0.05,          # 把请求分给样本不足的模型的概率，保持各模型统计更新
+    'FAILURE_THRESHOLD': 3,        # 模型连续失败多少次后暂停路由到该模型
+    'RECOVERY_TIMEOUT': 30         # 暂停路由的模型多久后放行探测请求（秒）
+}
+
+# 对话上下文配置（按token预算构建提示词，旧对话在后台折叠为滚动摘要）
+CONTEXT_CONFIG = {
+    'MAX_PROMPT_TOKENS': 1200,       # 每轮提示词总预算（系统提示+摘要+历史+问题，离线估算）
+    'MAX_HISTORY_MESSAGES': 20,      # 每个客户端保留的最大历史消息条数
+    'SUMMARY_TRIGGER_TOKENS': 800,   # 历史超过该token数时触发后台摘要
+    'SUMMARY_TRIGGER_MESSAGES': 16,  # 历史达到该条数时同样触发后台摘要
+    'SUMMARY_KEEP_MESSAGES': 4,      # 折叠时保留的最近消息条数（2轮对话）
+    'SUMMARY_MAX_TOKENS': 120,       # 摘要的最大token数
+    'SUMMARY_WORKERS': 1             # 后台摘要线程数
+}
+
 # =============================================================================
 # 音频处理配置
 # =============================================================================
@@ -35,6 +61,37 @@ AUDIO_CHANNELS = 1             # 声道数：单声道
 AUDIO_SAMPLE_WIDTH = 2         # 采样位宽：16位
 AUDIO_BUFFER_SIZE = 1024       # 音频缓冲区大小
 
+# 上行音频编码配置（连接建立时协商，服务端解码为16位PCM后进入处理流程）
+AUDIO_CODEC_CONFIG = {
+    'SUPPORTED_CODECS': ['ima_adpcm', 'pcmu', 'pcma', 'pcm16'],  # 服务端支持的编码，按优先级排列
+    'DEFAULT_CODEC': 'pcm16'       # 客户端未协商时的默认编码（原始16位PCM）
+}
+
+# 重采样和声道下混（处理流程统一使用16kHz单声道，客户端在编码协商时声明采集和播放格式）
+RESAMPLE_CONFIG = {
+    'SUPPORTED_RATES': [8000, 11025, 16000, 22050, 24000, 32000, 44100, 48000],  # 接受的采集/播放采样率
+    'MAX_CHANNELS': 2,             # 上行音频最多声道数（下混为单声道）
+    'TAPS_PER_PHASE': 16,          # 多相滤波器每相抽头数（降采样时按比例增加）
+    'KAISER_BETA': 8.0             # Kaiser窗参数（阻带衰减约80dB）
+}
+
+# 上行音频帧时钟（帧头携带序号和采集时间戳，按音频时间而不是到达时间判断静音）
+AUDIO_CLOCK_CONFIG = {
+    'ENABLED': True,               # 是否接受带帧头的上行音频（客户端在编码协商时声明）
+    'MAX_REORDER_FRAMES': 50,      # 序号落后不超过该帧数的帧视为迟到并丢弃，落后更多视为客户端重新计数
+    'JITTER_MARGIN': 2.0,          # 判断静音时按到达抖动的多少倍预留等待余量
+    'MAX_MARGIN_MS': 300           # 抖动余量上限（毫秒）
+}
+
+# 回声感知的打断检测（TTS播放期间按下发的TTS音频区分扬声器回声和用户说话）
+ECHO_CONFIG = {
+    'ENABLED': True,               # 是否启用；关闭时客户端按音量声明的打断立即生效
+    'WINDOW_MS': 200,              # 攒够多长的上行音频再判断（毫秒）
+    'MAX_DELAY_MS': 800,           # 回声相对TTS下发时刻的最大延迟（下行、播放缓冲、声学路径和上行，毫秒）
+    'ECHO_THRESHOLD': 0.5,         # 与TTS参考信号的归一化互相关不低于该值时判为回声
+    'TAIL_MS': 500                 # TTS播放结束后继续检测的时长（毫秒）
+}
+
 # 语音检测参数
 SILENCE_THRESHOLD = 1.0        # 静音检测阈值（秒）
 VOICE_DETECTION_THRESHOLD = 0.012  # 语音检测音量阈值
@@ -50,7 +107,32 @@ ASR_PROCESSING_CONFIG = {
     'MIN_AUDIO_BYTES': 100,          # 最小音频数据大小（字节）
     'SILENCE_WAIT_TIME': 0.5,        # 静音等待时间（秒）
     'DELAYED_PROCESSING_WAIT': 0.5,  # 延迟处理等待时间（秒）
-    'MAX_WAIT_TIME': 3.0             # 最大等待时间（秒）
+    'MAX_WAIT_TIME': 3.0,            # 单段语音最长时长（秒），超过后在句中停顿处切分，说话过程中提前送ASR
+    'SEGMENT_SEARCH_WINDOW': 1.0     # 在段尾多长范围内寻找停顿作为切分点（秒）
+}
+
+# ASR上传配置（原始音频请求体避免base64的33%膨胀；确定可用的上传方式后记住，不再逐个尝试）
+ASR_UPLOAD_CONFIG = {
+    'MODES': ['raw', 'json', 'form'],  # 上传方式探测顺序：raw（原始音频请求体）/ json / form（base64编码）
+    'COMPRESSION': None,           # 上传前压缩：None（原始PCM）/ 'm4a'（AAC，约1/7大小，需要av，适合上行带宽受限的部署）
+    'COMPRESSION_BITRATE': 32000,  # m4a压缩码率（bps）
+    'COMPRESSION_MIN_BYTES': 32000  # 小于该字节数（约1秒）的音频不压缩
+}
+
+# ASR识别结果缓存（按裁剪后PCM的指纹，客户端重发、回放测试音频、固定提示语等相同音频不再请求后端）
+ASR_CACHE_CONFIG = {
+    'ENABLED': True,               # 是否启用
+    'MAX_ENTRIES': 256,            # 最多缓存的识别结果条数（超过时淘汰最久未用的）
+    'TTL': 600                     # 缓存有效期（秒）
+}
+
+# ASR前静音裁剪配置（裁掉首尾低能量部分、压缩过长停顿，减少上传数据量）
+SILENCE_TRIM_CONFIG = {
+    'ENABLED': True,               # 是否启用
+    'FRAME_MS': 20,                # 能量分析帧长（毫秒）
+    'THRESHOLD': VOICE_DETECTION_THRESHOLD,  # 有声帧的RMS能量门限（与浏览器端语音检测一致）
+    'EDGE_MARGIN_MS': 200,         # 首尾保留的静音余量（毫秒）
+    'MAX_PAUSE_MS': 400            # 句中停顿超过该长度时压缩到该长度（毫秒）
 }
 
 # =============================================================================
@@ -66,6 +148,25 @@ WEBSOCKET_MAX_MESSAGE_SIZE = 1024 * 1024  # 最大消息大小：1MB
 WEBSOCKET_PING_INTERVAL = 30              # Ping间隔（秒）
 WEBSOCKET_PING_TIMEOUT = 10               # Ping超时（秒）
 
+# 发送队列配置（每个连接一个写任务按顺序写出，广播只序列化一次，写得慢的连接按慢消费者断开）
+SEND_QUEUE_CONFIG = {
+    'ENABLED': True,               # 是否启用；关闭时由调用方直接写出
+    'MAX_QUEUED_BYTES': 8 << 20,   # 单个连接的积压字节数上限，超过时断开（会话转入断线宽限期）；
+                                   # 积压计入会话内存核算，低于 MEMORY_CONFIG 的单会话硬上限，先于硬上限断开连接
+    'HIGH_WATER_BYTES': 1 << 20,   # 积压超过该字节数时标记为拥塞
+    'SEND_TIMEOUT': 10             # 单条消息的最长写出时间（秒），超时断开
+}
+
+# WebRTC媒体传输配置（可选，需要aiortc；信令复用WebSocket连接，音频走Opus/RTP/SRTP）
+RTC_CONFIG = {
+    'ENABLED': True,               # 是否启用（未安装aiortc时自动关闭，只使用WebSocket传输）
+    'ICE_SERVERS': [],             # STUN/TURN服务器，如 ['stun:stun.l.google.com:19302']；局域网和本机可留空
+    'CHUNK_SAMPLES': 1024,         # 上行音频切块长度（样本数，与浏览器端ScriptProcessor帧长一致）
+    'VOICE_THRESHOLD': VOICE_DETECTION_THRESHOLD,  # 上行音频能量门限，低于该值的块不送入ASR流程
+    'TTS_SAMPLE_RATE': 48000,      # 下行TTS轨道采样率（Opus原生采样率）
+    'TTS_FRAME_MS': 20             # 下行TTS轨道帧长（毫秒）
+}
+
 # =============================================================================
 # 系统性能配置
 # =============================================================================
@@ -74,6 +175,22 @@ WEBSOCKET_PING_TIMEOUT = 10               # Ping超时（秒）
 THREAD_POOL_MAX_WORKERS = 20   # 最大工作线程数
 THREAD_POOL_QUEUE_SIZE = 100   # 线程池队列大小
 
+# 多进程工作模式配置（start_server.py --workers N）
+WORKER_CONFIG = {
+    'DEFAULT_WORKERS': 1,          # 默认工作进程数：1表示单进程模式
+    'RESTART_DELAY': 1.0,          # 工作进程退出后的重启等待时间（秒），按重启次数指数退避
+    'MAX_RESTARTS': 5,             # 统计窗口内单个工作进程的最大重启次数
+    'RESTART_WINDOW': 60,          # 重启次数统计窗口（秒）
+    'METRICS_INTERVAL': 30         # 工作进程指标上报与汇总间隔（秒）
+}
+
+# DSP进程池（上行音频的解码和重采样交给独立进程，音频经共享内存环形缓冲区传递）
+DSP_POOL_CONFIG = {
+    'ENABLED': False,              # 是否启用（默认关闭）；关闭时在事件循环中处理
+    'WORKERS': 0,                  # 工作进程数：0表示按CPU核数选择（核数的一半，1-4个）；多进程模式下每个服务器进程各有一组
+    'RING_BYTES': 1 << 20          # 每个工作进程每个方向的环形缓冲区字节数
+}
+
 # 超时配置
 API_TIMEOUTS = {
     'ASR_TOKEN': 5,            # ASR令牌获取超时（秒）
@@ -84,6 +201,24 @@ API_TIMEOUTS = {
     'WEBSOCKET': 30            # WebSocket操作超时（秒）
 }
 
+# 单轮对话延迟预算（语音结束时创建，各阶段请求超时取自身超时与剩余预算中较小者）
+TURN_DEADLINE_CONFIG = {
+    'ENABLED': True,               # 是否启用；关闭时各阶段使用 API_TIMEOUTS 中的固定超时
+    'BUDGET': 10.0,                # 从语音结束到TTS音频发出的延迟预算（秒）
+    'MIN_REQUEST_TIMEOUT': 0.5,    # 请求超时下限（秒）
+    'LLM_SHORT_BELOW': 5.0,        # 进入LLM阶段时剩余预算低于该值，限制回复长度（秒）
+    'LLM_SHORT_MAX_TOKENS': 40,    # 限制回复长度时的 max_tokens
+    'LLM_CACHED_BELOW': 1.5,       # 剩余预算低于该值时不再请求LLM，使用缓存的回复（秒）
+    'ANSWER_CACHE_SIZE': 256,      # LLM回复缓存条数（按问题文本）
+    'TTS_TEXT_ONLY_BELOW': 1.0     # 进入TTS阶段时剩余预算低于该值，不再合成语音、只返回文本（秒）
+}
+
+# 本地快速意图（问时间、日期、打招呼、再说一遍、调音量、停止播放等在本地直接回复，不经过LLM）
+INTENT_CONFIG = {
+    'ENABLED': True,               # 是否启用；关闭时所有识别结果都交给LLM
+    'PRERENDER': True              # 服务启动时在后台预合成固定回复的语音
+}
+
 # 缓存配置
 CACHE_TTL = {
     'ASR_TOKEN': 2592000,      # ASR令牌缓存时间：30天
@@ -91,6 +226,52 @@ CACHE_TTL = {
     'CONVERSATION_HISTORY': 3600  # 对话历史缓存时间：1小时
 }
 
+# 断线恢复配置（连接意外断开后会话保留一段宽限期，客户端凭恢复令牌重连后接回原会话）
+RESUME_CONFIG = {
+    'ENABLED': True,               # 是否启用；关闭时断线立即清理会话
+    'GRACE_PERIOD': 30,            # 断线后会话保留时间（秒），期间音频缓冲、对话历史和进行中的回复都保留
+    'MAX_QUEUED_MESSAGES': 50,     # 断线期间最多暂存的待发送消息条数（超过时丢弃最早的）
+    'MAX_QUEUED_BYTES': 4 * 1024 * 1024  # 断线期间暂存消息的字节数上限（主要是base64编码的TTS音频）
+}
+
+# 单会话内存上限（音频缓冲、统计信息、对话历史、待发送/待处理消息按字节计）
+MEMORY_CONFIG = {
+    'ENABLED': True,               # 是否启用内存核算和上限
+    'SESSION_SOFT_LIMIT': 4 * 1024 * 1024,   # 超过时丢弃最早的对话历史，再丢弃最早的待发送消息（字节）
+    'SESSION_HARD_LIMIT': 16 * 1024 * 1024,  # 丢弃后仍超过时清空音频缓冲区并通知客户端重说（字节）
+    'GLOBAL_LIMIT': 512 * 1024 * 1024,       # 全部会话的内存预算（字节）
+    'ADMIT_RATIO': 0.9             # 全部会话占用超过预算的该比例时拒绝新会话
+}
+
+# 会话多路复用配置（网关通过一条WebSocket连接承载多个终端用户的逻辑会话）
+MUX_CONFIG = {
+    'ENABLED': True,               # 是否接受多路复用连接
+    'PATH': '/mux',                # 多路复用连接的URL路径，其他路径按普通单会话连接处理
+    'MAX_SESSIONS': 1000,          # 每条多路复用连接最多承载的逻辑会话数
+    'MAX_PENDING_FRAMES': 100      # 每个逻辑会话输入队列的容量（帧），满时暂停该会话并丢弃新帧
+}
+
+# 会话存储配置（按客户端会话令牌保存对话历史，断线重连和多进程间可恢复）
+SESSION_STORE_CONFIG = {
+    'BACKEND': 'memory',           # 存储后端：memory（进程内）/ sqlite（本地持久化，多进程共享）/ None（不启用）
+    'SQLITE_PATH': 'sessions.db',  # SQLite数据库文件路径
+    'SESSION_TTL': 86400,          # 会话过期时间（秒）：24小时
+    'CACHE_SIZE': 1000,            # 读穿透缓存的最大会话数
+    'FLUSH_INTERVAL': 1.0,         # 后台批量写入间隔（秒）
+    'FLUSH_BATCH_SIZE': 100        # 待写入会话达到该数量时立即写入
+}
+
+# 空闲会话回收配置（后台定期释放空闲客户端的缓冲区、统计和对话历史）
+REAPER_CONFIG = {
+    'ENABLED': True,               # 是否启用后台回收
+    'INTERVAL': 30,                # 回收检查间隔（秒）
+    'AUDIO_BUFFER_TTL': 60,        # 超过该时间未收到音频时释放音频缓冲区（秒）
+    'STATS_TTL': 600,              # 超过该时间未收到音频时释放音频统计信息（秒）
+    'CONVERSATION_HISTORY_TTL': CACHE_TTL['CONVERSATION_HISTORY'],  # 对话历史空闲时间，超过后写入会话存储并移出内存
+    'CONNECTION_IDLE_TIMEOUT': 120,  # 连接超过该时间无任何消息时主动探测（秒）
+    'PROBE_TIMEOUT': WEBSOCKET_PING_TIMEOUT  # 探测Ping的等待时间，超时视为半开连接并关闭（秒）
+}
+
 # =============================================================================
 # 日志配置
 # =============================================================================
@@ -120,11 +301,44 @@ RETRY_CONFIG = {
     'BACKOFF_MULTIPLIER': 2    # 退避乘数
 }
 
-# 错误阈值配置
+# 对冲请求配置（主请求超过近期延迟分位数仍未返回时，再发一个请求，取先返回的有效结果）
+HEDGING_CONFIG = {
+    'ENABLED': True,               # 总开关
+    'MIN_SAMPLES': 20,             # 按分位数计算对冲延迟所需的最少样本数，不足时使用初始延迟
+    'WINDOW': 200,                 # 保留的最近主请求耗时样本数
+    'MAX_WORKERS': 8,              # 每个阶段的对冲线程池大小，在途请求达到该值时不再发对冲请求
+    'ASR': {
+        'ENABLED': True,
+        'PERCENTILE': 95,          # 对冲延迟取最近主请求耗时的该分位数
+        'INITIAL_DELAY': 1.5,      # 样本不足时的对冲延迟（秒）
+        'MIN_DELAY': 0.3,          # 对冲延迟下限（秒）
+        'MAX_DELAY': 3.0           # 对冲延迟上限（秒）
+    },
+    'LLM': {
+        'ENABLED': True,
+        'PERCENTILE': 95,
+        'INITIAL_DELAY': 2.0,
+        'MIN_DELAY': 0.5,
+        'MAX_DELAY': 5.0,
+        'HEDGE_MODEL': None        # 对冲请求使用的模型：None 重复请求主模型，或 AVAILABLE_MODELS 中的备用模型
+    },
+    'TTS': {
+        'ENABLED': True,
+        'PERCENTILE': 95,
+        'INITIAL_DELAY': 1.5,
+        'MIN_DELAY': 0.3,
+        'MAX_DELAY': 3.0
+    }
+}
+
+# 错误阈值配置（每个外部后端一个熔断器：窗口内连续失败达到上限时打开，直接走降级方案；
+# 恢复等待时间过后放行一个探测请求，探测失败时等待时间按 RETRY_CONFIG['BACKOFF_MULTIPLIER'] 增长）
 ERROR_THRESHOLDS = {
-    'MAX_CONSECUTIVE_FAILURES': 5,  # 最大连续失败次数
+    'MAX_CONSECUTIVE_FAILURES': 5,  # 最大连续失败次数（达到后熔断打开）
     'FAILURE_WINDOW': 300,          # 失败统计窗口（秒）
-    'DEGRADATION_THRESHOLD': 0.8    # 服务降级阈值
+    'DEGRADATION_THRESHOLD': 0.8,   # 服务降级阈值
+    'RECOVERY_TIMEOUT': 10,         # 熔断打开后首次探测恢复前的等待时间（秒）
+    'MAX_RECOVERY_TIMEOUT': 120     # 探测恢复等待时间上限（秒）
 }
 
 # =============================================================================
@@ -170,6 +384,15 @@ STATISTICS_CONFIG = {
     'ENABLE_DETAILED_LOGGING': False        # 启用详细日志记录
 }
 
+# 基准测试配置（benchmark.py）
+BENCHMARK_CONFIG = {
+    'RESULTS_DIR': 'benchmark_results',     # 结果保存目录（按提交ID命名）
+    'REGRESSION_THRESHOLD': 0.20,           # 回归阈值：相对基线变慢超过20%即失败
+    'REPEAT': 5,                            # 每个用例的重复轮数
+    'MIN_TIME': 0.2,                        # 每轮最少运行时间（秒）
+    'MEMORY_COUNT': 10000                   # 内存用例创建的对象数（如空闲连接数）
+}
+
 # =============================================================================
 # 开发调试配置
 # =============================================================================
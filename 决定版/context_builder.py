@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话上下文构建模块
+按token预算（离线近似估算）组装发送给LLM的消息列表，并决定哪些旧对话需要折叠进滚动摘要
+
+版本: 2.0.0
+"""
+
+import re
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 每条消息的固定开销（角色标记、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+# 中日韩字符（含全角标点），这类字符大致一个字符对应一个token
+_CJK_PATTERN = re.compile(
+    '[\u4e00-\u9fff'      # CJK统一汉字
+    '\u3400-\u4dbf'       # CJK扩展A
+    '\u3000-\u303f'       # CJK符号和标点
+    '\uff00-\uffef'       # 全角字符
+    '\u3040-\u30ff'       # 日文假名
+    '\uac00-\ud7af]'      # 韩文音节
+)
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text: str) -> int:
+    """
+    离线估算文本的token数
+
+    中文按每字1个token计，其余字符按每4个字符1个token计，
+    对GLM等中文模型略偏保守，用于预算控制足够；
+    每轮都会重新估算全部历史，因此按文本缓存结果
+    """
+    if not text:
+        return 0
+
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def estimate_message_tokens(message: Dict[str, str]) -> int:
+    """估算单条消息的token数（含固定开销）"""
+    return estimate_tokens(message.get('content', '')) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextBuilder:
+    """按token预算构建对话上下文"""
+
+    def __init__(self, max_prompt_tokens: int = 1200, summary_trigger_tokens: int = 800,
+                 summary_keep_messages: int = 4, summary_trigger_messages: int = 16):
+        """
+        Args:
+            max_prompt_tokens (int): 每轮发送的提示词总预算（系统提示 + 摘要 + 历史 + 问题）
+            summary_trigger_tokens (int): 历史消息超过该token数时，建议将旧对话折叠进摘要
+            summary_keep_messages (int): 折叠时保留的最近消息条数（不参与折叠）
+            summary_trigger_messages (int): 历史消息达到该条数时同样触发折叠
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+        self.summary_trigger_tokens = summary_trigger_tokens
+        self.summary_keep_messages = summary_keep_messages
+        self.summary_trigger_messages = summary_trigger_messages
+
+    def build(self, system_prompt: str, question: str, history: Optional[List[Dict[str, str]]] = None,
+              summary: Optional[str] = None) -> Tuple[List[Dict[str, str]], int]:
+        """
+        构建消息列表，返回 (消息列表, 估算token数)
+
+        系统提示、摘要和当前问题总是保留；历史按从新到旧、以轮（问+答）为单位填入剩余预算
+        """
+        head = [{"role": "system", "content": system_prompt}]
+        if summary:
+            head.append({"role": "system", "content": f"此前对话摘要：{summary}"})
+        tail = [{"role": "user", "content": question}]
+
+        used = sum(estimate_message_tokens(m) for m in head + tail)
+        remaining = self.max_prompt_tokens - used
+
+        selected: List[Dict[str, str]] = []
+        if history and remaining > 0:
+            # 从最新的消息开始，两条一组（问+答）地填入预算
+            index = len(history)
+            while index > 0:
+                start = max(0, index - 2)
+                turn = history[start:index]
+                cost = sum(estimate_message_tokens(m) for m in turn)
+                if cost > remaining:
+                    break
+                selected[:0] = turn
+                used += cost
+                remaining -= cost
+                index = start
+
+        return head + selected + tail, used
+
+    def history_tokens(self, history: List[Dict[str, str]]) -> int:
+        """估算历史消息的总token数"""
+        return sum(estimate_message_tokens(m) for m in history)
+
+    def select_messages_to_fold(self, history: List[Dict[str, str]]) -> int:
+        """
+        判断是否需要折叠旧对话，返回需要折叠进摘要的最旧消息条数（0表示无需折叠）
+
+        折叠数量保持为偶数，保证剩余历史仍以用户提问开头
+        """
+        if (len(history) < self.summary_trigger_messages and
+                self.history_tokens(history) <= self.summary_trigger_tokens):
+            return 0
+
+        fold_count = len(history) - self.summary_keep_messages
+        fold_count -= fold_count % 2
+        return max(0, fold_count)
+
+    @staticmethod
+    def format_for_summary(previous_summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+        """将已有摘要和待折叠的对话整理为摘要请求的输入文本"""
+        lines = []
+        if previous_summary:
+            lines.append(f"已有摘要：{previous_summary}")
+        for message in messages:
+            speaker = "用户" if message.get('role') == 'user' else "助手"
+            lines.append(f"{speaker}：{message.get('content', '')}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def extractive_summary(previous_summary: Optional[str], messages: List[Dict[str, str]],
+                           max_tokens: int = 150) -> str:
+        """无需调用LLM的抽取式摘要：保留用户提问要点，超出预算时丢弃最旧的部分"""
+        points = [m.get('content', '').strip()[:30] for m in messages if m.get('role') == 'user']
+        parts = ([previous_summary] if previous_summary else []) + [f"用户问过：{p}" for p in points if p]
+
+        while len(parts) > 1 and estimate_tokens("；".join(parts)) > max_tokens:
+            parts.pop(0)
+        return "；".join(parts)
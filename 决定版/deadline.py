@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单轮对话延迟预算
+语音结束（或收到文本输入）时创建，依次传给 ASR → LLM → TTS 各阶段：
+每个阶段的请求超时取该阶段配置的超时与剩余预算中较小者，
+预算将尽时各阶段改走更快的降级路径（更短的回复、缓存的回复、只返回文本），
+整轮对话的延迟因此有确定的上限，而不是各阶段超时之和。
+
+版本: 2.0.0
+"""
+
+import time
+from typing import Optional
+
+
+class Deadline:
+    """单轮对话的截止时间"""
+
+    def __init__(self, budget: float, min_timeout: float = 0.5):
+        """
+        创建截止时间
+
+        Args:
+            budget (float): 本轮对话的延迟预算（秒）
+            min_timeout (float): 请求超时的下限（秒），预算已耗尽的阶段仍按该值发出请求
+        """
+        self.budget = budget
+        self.min_timeout = min_timeout
+        self.started = time.monotonic()
+        self.expires_at = self.started + budget
+
+    def remaining(self) -> float:
+        """剩余预算（秒）"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        """已用时间（秒）"""
+        return time.monotonic() - self.started
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, stage_timeout: float) -> float:
+        """本阶段请求的超时：阶段自身超时与剩余预算中较小者（不低于下限）"""
+        return max(self.min_timeout, min(stage_timeout, self.remaining()))
+
+
+def request_timeout(deadline: Optional[Deadline], stage_timeout: float) -> float:
+    """没有截止时间时使用阶段自身的超时"""
+    return deadline.timeout(stage_timeout) if deadline else stage_timeout
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DSP进程池模块
+上行音频的编码解码和重采样下混都是CPU密集型的numpy计算：放在事件循环里会阻塞所有会话的消息处理，
+放进共享线程池又要和ASR/LLM/TTS的线程争抢GIL。DSP进程池把这些计算交给独立的工作进程，随CPU核数扩展：
+
+- 每个工作进程有一对共享内存环形缓冲区（上行音频、处理结果），音频字节不经过pickle，
+  管道里只传递缓冲区位置和长度
+- 同一会话固定分配给一个工作进程，重采样器等跨帧状态留在该进程内，帧按到达顺序处理
+- 环形缓冲区写满时该帧经管道传递（计入统计），不丢帧也不打乱顺序；
+  工作进程退出时调用方收到 DSPPoolError 并在本进程内处理，会话改由其他工作进程接管
+
+版本: 2.0.0
+"""
+
+import signal
+import struct
+import asyncio
+import logging
+import threading
+import multiprocessing
+from itertools import count
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+from audio_codec import decode_audio
+from resampler import Resampler
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class DSPPoolError(RuntimeError):
+    """DSP工作进程不可用或处理失败，调用方应在本进程内处理"""
+
+
+class SharedRing:
+    """
+    单生产者单消费者的共享内存环形缓冲区
+
+    头部保存写位置和读位置（单调递增的字节计数，各自只由一方写入），
+    生产者按 写位置 - 读位置 判断剩余空间，消费者读完一段后把读位置推进到该段末尾
+    """
+
+    HEADER = struct.Struct('<QQ')
+
+    def __init__(self, capacity: int, name: Optional[str] = None):
+        """
+        Args:
+            capacity (int): 数据区字节数（两端必须一致）
+            name (Optional[str]): 已有共享内存的名称；为None时新建
+        """
+        self.capacity = capacity
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.HEADER.size + capacity)
+            self.HEADER.pack_into(self.shm.buf, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.data = self.shm.buf[self.HEADER.size:self.HEADER.size + capacity]
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def used(self) -> int:
+        head, tail = self.HEADER.unpack_from(self.shm.buf, 0)
+        return head - tail
+
+    def write(self, payload: bytes) -> Optional[int]:
+        """写入一段数据，返回其起始位置；剩余空间不足时返回None"""
+        head, tail = self.HEADER.unpack_from(self.shm.buf, 0)
+        length = len(payload)
+        if length > self.capacity - (head - tail):
+            return None
+
+        offset = head % self.capacity
+        first = min(length, self.capacity - offset)
+        view = memoryview(payload)
+        self.data[offset:offset + first] = view[:first]
+        self.data[:length - first] = view[first:]
+        struct.pack_into('<Q', self.shm.buf, 0, head + length)
+        return head
+
+    def read(self, position: int, length: int) -> bytes:
+        """复制出一段数据（跨越缓冲区末尾时分两段拷贝）"""
+        offset = position % self.capacity
+        first = min(length, self.capacity - offset)
+        return bytes(self.data[offset:offset + first]) + bytes(self.data[:length - first])
+
+    def release(self, end: int):
+        """读完到 end 为止的数据，空间交还生产者"""
+        struct.pack_into('<Q', self.shm.buf, 8, end)
+
+    def close(self):
+        """断开共享内存；创建方同时删除它"""
+        self.data.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def process_uplink(data: bytes, codec: str, resampler: Optional[Resampler]) -> bytes:
+    """
+    一帧上行音频的处理流程：解码、下混重采样为16kHz单声道的16位PCM
+
+    工作进程和回退时的本进程处理共用该函数，结果相同
+    """
+    pcm = decode_audio(codec, data)
+    if resampler is not None:
+        pcm = resampler.process(pcm)
+    return pcm
+
+
+def _dsp_worker_main(requests, results, inbound_name: str, outbound_name: str, capacity: int,
+                     resample_options: Tuple[int, int, float]):
+    """DSP工作进程入口：按顺序处理请求，会话的重采样器跨帧保留"""
+    # Ctrl+C 由主进程统一处理，主进程退出时守护进程随之结束
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    inbound = SharedRing(capacity, inbound_name)
+    outbound = SharedRing(capacity, outbound_name)
+    out_rate, taps_per_phase, beta = resample_options
+    resamplers: Dict[str, Optional[Resampler]] = {}
+
+    try:
+        while True:
+            try:
+                message = requests.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+
+            task_id, client_id, codec, in_rate, channels, position, length, inline = message
+            if task_id is None:
+                # 会话结束，释放其跨帧状态
+                resamplers.pop(client_id, None)
+                continue
+
+            if position is None:
+                data = inline
+            else:
+                data = inbound.read(position, length)
+                inbound.release(position + length)
+
+            try:
+                resampler = resamplers.get(client_id)
+                if resampler is None or (resampler.in_rate, resampler.channels) != (in_rate, channels):
+                    if in_rate == out_rate and channels == 1:
+                        resampler = None
+                    else:
+                        resampler = Resampler(in_rate, out_rate, channels, taps_per_phase, beta)
+                    resamplers[client_id] = resampler
+                pcm = process_uplink(data, codec, resampler)
+            except Exception as e:
+                results.send((task_id, None, 0, None, str(e)))
+                continue
+
+            out_position = outbound.write(pcm)
+            results.send((task_id, out_position, len(pcm), pcm if out_position is None else None, None))
+    finally:
+        inbound.close()
+        outbound.close()
+
+
+class _DSPWorker:
+    """主进程一侧的工作进程句柄"""
+
+    __slots__ = ('index', 'process', 'requests', 'results', 'inbound', 'outbound', 'pending', 'sessions',
+                 'alive', 'reader')
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.requests = None             # 主进程 → 工作进程的请求管道
+        self.results = None              # 工作进程 → 主进程的结果管道
+        self.inbound: Optional[SharedRing] = None
+        self.outbound: Optional[SharedRing] = None
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.sessions = 0
+        self.alive = False
+        self.reader: Optional[threading.Thread] = None
+
+
+class DSPPool:
+    """DSP工作进程池：会话固定分配到一个工作进程，音频经共享内存环形缓冲区传递"""
+
+    def __init__(self, workers: int = 2, ring_bytes: int = 1 << 20, sample_rate: int = 16000,
+                 taps_per_phase: int = 16, beta: float = 8.0):
+        """
+        Args:
+            workers (int): 工作进程数
+            ring_bytes (int): 每个工作进程每个方向的环形缓冲区字节数
+            sample_rate (int): 处理后的采样率（重采样目标）
+            taps_per_phase (int): 重采样滤波器每相抽头数
+            beta (float): 重采样滤波器的Kaiser窗参数
+        """
+        self.ring_bytes = ring_bytes
+        self.sample_rate = sample_rate
+        self.resample_options = (sample_rate, taps_per_phase, beta)
+
+        self.workers = [_DSPWorker(index) for index in range(workers)]
+        self.assignments: Dict[str, _DSPWorker] = {}
+        self.task_ids = count()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.running = False
+
+        self.stats = {
+            'tasks': 0,              # 已提交的处理请求
+            'failed': 0,             # 工作进程退出或处理出错的请求
+            'ring_full': 0           # 环形缓冲区写满、改经管道传递的帧
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], sample_rate: int, resample_config: Dict[str, Any]) -> 'DSPPool':
+        """按 DSP_POOL_CONFIG 和 RESAMPLE_CONFIG 创建"""
+        workers = config['WORKERS'] or max(1, min(4, (multiprocessing.cpu_count() or 2) // 2))
+        return cls(
+            workers=workers,
+            ring_bytes=config['RING_BYTES'],
+            sample_rate=sample_rate,
+            taps_per_phase=resample_config['TAPS_PER_PHASE'],
+            beta=resample_config['KAISER_BETA']
+        )
+
+    def start(self):
+        """创建共享内存和工作进程（需在事件循环中调用，结果在该循环上返回）"""
+        if self.running:
+            return
+        self.loop = asyncio.get_running_loop()
+        # 服务器进程里已有线程池和事件循环，用spawn启动干净的子进程
+        context = multiprocessing.get_context('spawn')
+        for worker in self.workers:
+            self._start_worker(context, worker)
+        self.running = True
+        logger.info(f"🧮 DSP进程池已启动: {len(self.workers)} 个工作进程，"
+                    f"环形缓冲区 {self.ring_bytes // 1024}KB×2/进程")
+
+    def _start_worker(self, context, worker: _DSPWorker):
+        worker.inbound = SharedRing(self.ring_bytes)
+        worker.outbound = SharedRing(self.ring_bytes)
+        request_reader, worker.requests = context.Pipe(duplex=False)
+        worker.results, result_writer = context.Pipe(duplex=False)
+        worker.process = context.Process(
+            target=_dsp_worker_main,
+            args=(request_reader, result_writer, worker.inbound.name, worker.outbound.name, self.ring_bytes,
+                  self.resample_options),
+            name=f'dsp-worker-{worker.index}',
+            daemon=True
+        )
+        worker.process.start()
+        # 子进程持有的一端在父进程中关闭，子进程退出时结果管道才会读到EOF
+        request_reader.close()
+        result_writer.close()
+        worker.alive = True
+        worker.reader = threading.Thread(target=self._read_results, args=(worker,),
+                                         name=f'dsp-reader-{worker.index}', daemon=True)
+        worker.reader.start()
+
+    def _read_results(self, worker: _DSPWorker):
+        """结果读取线程：从结果环形缓冲区复制出PCM后在事件循环上完成对应的Future"""
+        while True:
+            try:
+                task_id, position, length, inline, error = worker.results.recv()
+            except (EOFError, OSError):
+                break
+            if position is None:
+                pcm = inline
+            else:
+                pcm = worker.outbound.read(position, length)
+                worker.outbound.release(position + length)
+
+            future = worker.pending.pop(task_id, None)
+            if future is not None:
+                result = DSPPoolError(error) if error else pcm
+                self._resolve(future, result)
+
+        worker.alive = False
+        if self.running:
+            logger.error(f"❌ DSP工作进程 #{worker.index} 已退出，其会话改由其他工作进程处理")
+        pending, worker.pending = worker.pending, {}
+        for future in pending.values():
+            self._resolve(future, DSPPoolError(f"DSP工作进程 #{worker.index} 已退出"))
+
+    def _resolve(self, future: asyncio.Future, result):
+        """在事件循环线程上完成Future（结果是异常时设为异常）"""
+        def settle():
+            if future.done():
+                return
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        try:
+            self.loop.call_soon_threadsafe(settle)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def worker_for(self, client_id: str) -> Optional[_DSPWorker]:
+        """会话所在的工作进程；首次处理或原工作进程退出时分配给会话最少的存活进程"""
+        worker = self.assignments.get(client_id)
+        if worker is not None and worker.alive:
+            return worker
+        if worker is not None:
+            worker.sessions -= 1
+
+        alive = [candidate for candidate in self.workers if candidate.alive]
+        if not alive:
+            self.assignments.pop(client_id, None)
+            return None
+        worker = min(alive, key=lambda candidate: candidate.sessions)
+        worker.sessions += 1
+        self.assignments[client_id] = worker
+        return worker
+
+    async def process_uplink(self, client_id: str, data: bytes, codec: str, in_rate: int,
+                             channels: int = 1) -> bytes:
+        """
+        在会话所在的工作进程中处理一帧上行音频
+
+        Args:
+            client_id (str): 会话ID（决定工作进程和重采样器状态）
+            data (bytes): 按 codec 编码的上行帧
+            codec (str): 协商的编码
+            in_rate (int): 采集采样率
+            channels (int): 采集声道数
+
+        Returns:
+            bytes: 16kHz单声道16位PCM
+
+        Raises:
+            DSPPoolError: 进程池未启动、没有存活的工作进程或处理失败
+        """
+        worker = self.worker_for(client_id) if self.running else None
+        if worker is None:
+            raise DSPPoolError("没有可用的DSP工作进程")
+
+        task_id = next(self.task_ids)
+        position = worker.inbound.write(data)
+        inline = None
+        if position is None:
+            self.stats['ring_full'] += 1
+            inline = data
+
+        future = self.loop.create_future()
+        worker.pending[task_id] = future
+        self.stats['tasks'] += 1
+        try:
+            worker.requests.send((task_id, client_id, codec, in_rate, channels, position, len(data), inline))
+            pcm = await future
+        except (OSError, DSPPoolError) as e:
+            worker.pending.pop(task_id, None)
+            self.stats['failed'] += 1
+            raise DSPPoolError(str(e)) from e
+        return pcm
+
+    def release_session(self, client_id: str):
+        """会话结束：工作进程释放其重采样器状态"""
+        worker = self.assignments.pop(client_id, None)
+        if worker is None:
+            return
+        worker.sessions -= 1
+        if worker.alive:
+            try:
+                worker.requests.send((None, client_id, None, None, None, None, 0, None))
+            except OSError:
+                pass
+
+    def close(self):
+        """停止工作进程并删除共享内存"""
+        if not self.running:
+            return
+        self.running = False
+        for worker in self.workers:
+            try:
+                worker.requests.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=2)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(timeout=1)
+            worker.requests.close()
+            worker.reader.join(timeout=1)
+            worker.results.close()
+            worker.inbound.close()
+            worker.outbound.close()
+            worker.alive = False
+        self.assignments.clear()
+        logger.info("🧮 DSP进程池已停止")
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取进程池状态和统计"""
+        workers: List[Dict[str, Any]] = [{
+            'index': worker.index,
+            'pid': worker.process.pid if worker.process else None,
+            'alive': worker.alive,
+            'sessions': worker.sessions,
+            'pending': len(worker.pending),
+            'ring_used': worker.inbound.used if worker.inbound and worker.alive else 0
+        } for worker in self.workers]
+        return {
+            'running': self.running,
+            'ring_bytes': self.ring_bytes,
+            'workers': workers,
+            **self.stats
+        }
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回声感知的打断检测模块
+TTS播放期间扬声器的声音会被麦克风录到，客户端只按音量判断打断时回声也会触发，
+导致本轮回复被打断、回声被送去识别并开始新一轮ASR+LLM+TTS。
+
+服务器保留本轮下发的TTS音频（16位PCM）作为参考信号，播放期间收到的上行音频先暂存，
+攒够一个窗口后在预计的播放位置附近计算与参考信号的归一化互相关（FFT向量化）：
+
+- 相关度高于门限：是回声，丢弃这段音频，客户端声明的打断被否决
+- 相关度低：是用户真的在说话，确认打断，暂存的音频进入正常的识别流程
+
+版本: 2.0.0
+"""
+
+import wave
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from resampler import read_wav, resample_pcm
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def decode_reference(audio_data: bytes, sample_rate: int) -> Optional[np.ndarray]:
+    """把TTS音频文件解码为单声道16位PCM（int16数组），无法解码时返回None"""
+    try:
+        pcm, rate, channels = read_wav(audio_data)
+        if rate != sample_rate or channels != 1:
+            pcm = resample_pcm(pcm, rate, sample_rate, channels)
+        return np.frombuffer(pcm, dtype='<i2')
+    except (wave.Error, EOFError):
+        pass
+
+    # 其他格式（mp3等）需要av解码
+    from rtc_transport import RTC_AVAILABLE, decode_audio_file
+    if not RTC_AVAILABLE:
+        logger.debug("📝 TTS音频不是wav且未安装av，本轮不做回声检测")
+        return None
+    return np.frombuffer(decode_audio_file(audio_data, sample_rate), dtype='<i2')
+
+
+def echo_correlation(mic: np.ndarray, reference: np.ndarray) -> float:
+    """
+    麦克风音频在参考信号各个对齐位置上的归一化互相关的最大值（0-1）
+
+    Args:
+        mic: 麦克风音频（float32，-1~1）
+        reference: 参考信号（float32，-1~1），短于麦克风音频时补零
+    """
+    n = mic.size
+    mic_energy = float(np.dot(mic, mic))
+    if n == 0 or mic_energy <= 0:
+        return 0.0
+    if reference.size < n:
+        reference = np.pad(reference, (0, n - reference.size))
+
+    # 全部对齐位置的互相关一次FFT算完，参考信号各窗口的能量用累加和求差
+    size = 1 << (reference.size + n - 1).bit_length()
+    spectrum = np.fft.rfft(reference, size) * np.conj(np.fft.rfft(mic, size))
+    corr = np.fft.irfft(spectrum, size)[:reference.size - n + 1]
+    energy = np.concatenate(([0.0], np.cumsum(reference.astype(np.float64) ** 2)))
+    window_energy = energy[n:] - energy[:-n]
+    ncc = np.abs(corr) / np.sqrt(np.maximum(window_energy, 1e-9) * mic_energy)
+    return float(min(1.0, ncc.max()))
+
+
+class EchoReference:
+    """单个会话正在播放的TTS参考信号和播放期间暂存的上行音频"""
+
+    __slots__ = ('pcm', 'started_at', 'held', 'held_samples', 'hinted')
+
+    def __init__(self, pcm: np.ndarray, started_at: float):
+        self.pcm = pcm.astype(np.float32) / 32768
+        self.started_at = started_at
+        self.held: List[Tuple[bytes, Optional[int]]] = []   # (PCM, 解码前字节数)
+        self.held_samples = 0
+        self.hinted = False              # 客户端已按音量声明打断，等待服务器确认或否决
+
+    @property
+    def nbytes(self) -> int:
+        return self.pcm.nbytes + sum(len(pcm) for pcm, _ in self.held)
+
+
+class BargeInDetector:
+    """按TTS参考信号区分回声和用户说话，只有用户说话才确认打断"""
+
+    def __init__(self, sample_rate: int = 16000, window_ms: int = 200, max_delay_ms: int = 800,
+                 echo_threshold: float = 0.5, tail_ms: int = 500, enabled: bool = True):
+        """
+        Args:
+            sample_rate (int): 上行PCM和参考信号的采样率
+            window_ms (int): 攒够多长的上行音频再判断（毫秒）
+            max_delay_ms (int): 回声相对下发时刻的最大延迟（下行、播放缓冲、声学路径和上行，毫秒）
+            echo_threshold (float): 归一化互相关不低于该值时判为回声
+            tail_ms (int): 参考信号播放结束后继续检测的时长（混响和播放缓冲，毫秒）
+            enabled (bool): 是否启用；关闭时客户端的打断请求立即生效
+        """
+        self.sample_rate = sample_rate
+        self.window_samples = sample_rate * window_ms // 1000
+        self.max_delay_samples = sample_rate * max_delay_ms // 1000
+        self.echo_threshold = echo_threshold
+        self.tail = tail_ms / 1000
+        self.enabled = enabled
+
+        self.stats = {
+            'barge_ins': 0,          # 客户端声明的打断次数
+            'confirmed': 0,          # 确认是用户说话的打断
+            'false_barge_ins': 0,    # 被判为回声而否决的打断
+            'echo_windows': 0,       # 判为回声而丢弃的音频窗口数
+            'echo_bytes': 0
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], sample_rate: int) -> 'BargeInDetector':
+        """按 ECHO_CONFIG 创建"""
+        return cls(
+            sample_rate=sample_rate,
+            window_ms=config['WINDOW_MS'],
+            max_delay_ms=config['MAX_DELAY_MS'],
+            echo_threshold=config['ECHO_THRESHOLD'],
+            tail_ms=config['TAIL_MS'],
+            enabled=config['ENABLED']
+        )
+
+    def start_playback(self, session, audio_data: bytes, now: float):
+        """记录本轮下发的TTS音频作为参考信号（替换上一轮）"""
+        if not self.enabled:
+            return
+        pcm = decode_reference(audio_data, self.sample_rate)
+        session.tts_reference = EchoReference(pcm, now) if pcm is not None and pcm.size else None
+
+    def stop_playback(self, session):
+        """播放已停止（确认打断、停止播放指令），释放参考信号"""
+        session.tts_reference = None
+
+    def active_reference(self, session, now: float) -> Optional[EchoReference]:
+        """正在播放（含结束后的余量）的参考信号，已播完时释放"""
+        reference = session.tts_reference
+        if reference is None:
+            return None
+        if now - reference.started_at > reference.pcm.size / self.sample_rate + self.tail:
+            session.tts_reference = None
+            return None
+        return reference
+
+    def hint(self, session, now: float) -> bool:
+        """
+        客户端按音量声明打断
+
+        Returns:
+            True 表示正在播放参考信号，打断等上行音频判断后再确认；False 表示应立即打断
+        """
+        reference = self.active_reference(session, now) if self.enabled else None
+        if reference is None:
+            return False
+        if not reference.hinted:
+            reference.hinted = True
+            self.stats['barge_ins'] += 1
+        return True
+
+    def check(self, session, pcm: bytes, now: float, wire_bytes: Optional[int] = None) -> Optional[str]:
+        """
+        判断播放期间收到的一块上行音频
+
+        Returns:
+            None（未在播放，直接处理）、'pending'（已暂存，窗口未满）、
+            'echo'（回声，已丢弃）、'speech'（用户说话，用 take_held 取出暂存的音频）
+        """
+        reference = self.active_reference(session, now)
+        if reference is None:
+            return None
+
+        reference.held.append((pcm, wire_bytes))
+        reference.held_samples += len(pcm) // 2
+        if reference.held_samples < self.window_samples:
+            return 'pending'
+
+        mic = np.frombuffer(b''.join(chunk for chunk, _ in reference.held), dtype='<i2').astype(np.float32) / 32768
+        end = int((now - reference.started_at) * self.sample_rate)
+        start = max(0, end - self.max_delay_samples - mic.size)
+        score = echo_correlation(mic, reference.pcm[start:end])
+
+        if score < self.echo_threshold:
+            self.stats['confirmed'] += 1
+            logger.info(f"🗣️ 客户端 {session.client_id} 打断确认：与TTS参考信号相关度 {score:.2f}")
+            return 'speech'
+
+        self.stats['echo_windows'] += 1
+        self.stats['echo_bytes'] += mic.size * 2
+        reference.held = []
+        reference.held_samples = 0
+        logger.info(f"🔁 客户端 {session.client_id} 上行音频是TTS回声（相关度 {score:.2f}），已丢弃")
+        return 'echo'
+
+    def reject_hint(self, session) -> bool:
+        """判为回声后否决客户端声明的打断，返回是否有待否决的打断"""
+        reference = session.tts_reference
+        if reference is None or not reference.hinted:
+            return False
+        reference.hinted = False
+        self.stats['false_barge_ins'] += 1
+        return True
+
+    def take_held(self, session) -> List[Tuple[bytes, Optional[int]]]:
+        """取出暂存的上行音频（按顺序）"""
+        reference = session.tts_reference
+        return reference.held if reference is not None else []
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取打断检测统计和误打断率"""
+        barge_ins = self.stats['barge_ins']
+        return {
+            'enabled': self.enabled,
+            'echo_threshold': self.echo_threshold,
+            'false_barge_in_rate': self.stats['false_barge_ins'] / barge_ins if barge_ins else 0.0,
+            **self.stats
+        }
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对冲请求模块
+外部API（ASR、LLM、TTS）偶发的长尾延迟决定了整轮对话的最慢情况。
+主请求耗时超过近期延迟的某个分位数后，再发出一个对冲请求（重复请求，
+或发往备用模型），取先得到有效结果的一个，另一个取消。
+
+- 对冲延迟取最近主请求耗时的分位数，样本不足时使用初始延迟，并限制在上下限之间
+- 主请求在对冲延迟内完成（无论成败）时不发对冲请求，对冲不是失败重试
+- 对冲线程池已满时直接执行主请求、不发对冲请求，避免在过载时放大负载
+- 已在执行的HTTP请求无法中断，输掉的请求结果被丢弃，线程在请求超时内释放
+- 统计对冲率（发出对冲的请求占比）和对冲胜率（对冲请求先返回的占比），额外开销可见
+
+版本: 2.0.0
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Optional
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def _is_not_none(result: Any) -> bool:
+    return result is not None
+
+
+class Hedger:
+    """单个外部调用阶段的对冲请求执行器"""
+
+    def __init__(self, name: str, enabled: bool = True, percentile: float = 95,
+                 initial_delay: float = 1.0, min_delay: float = 0.2, max_delay: float = 3.0,
+                 min_samples: int = 20, window: int = 200, max_workers: int = 8):
+        """
+        初始化对冲执行器
+
+        Args:
+            name (str): 阶段名称（asr/llm/tts），用于日志和线程名
+            enabled (bool): 是否启用对冲；关闭时直接在调用线程执行主请求
+            percentile (float): 对冲延迟取最近主请求耗时的该分位数
+            initial_delay (float): 样本不足时的对冲延迟（秒）
+            min_delay (float): 对冲延迟下限（秒）
+            max_delay (float): 对冲延迟上限（秒）
+            min_samples (int): 按分位数计算对冲延迟所需的最少样本数
+            window (int): 保留的最近主请求耗时样本数
+            max_workers (int): 对冲线程池大小，同时在途的请求数达到该值时不再发对冲请求
+        """
+        self.name = name
+        self.enabled = enabled
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+
+        self.latencies = deque(maxlen=window)
+        self.stats = {
+            'requests': 0,
+            'hedged': 0,
+            'hedge_wins': 0,
+            'cancelled': 0,
+            'saturated': 0
+        }
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'hedge-{name}')
+
+    @classmethod
+    def from_config(cls, name: str, stage_config: Dict[str, Any], config: Dict[str, Any]) -> 'Hedger':
+        """按 HEDGING_CONFIG 中的公共配置和阶段配置创建"""
+        return cls(
+            name,
+            enabled=config['ENABLED'] and stage_config['ENABLED'],
+            percentile=stage_config['PERCENTILE'],
+            initial_delay=stage_config['INITIAL_DELAY'],
+            min_delay=stage_config['MIN_DELAY'],
+            max_delay=stage_config['MAX_DELAY'],
+            min_samples=config['MIN_SAMPLES'],
+            window=config['WINDOW'],
+            max_workers=config['MAX_WORKERS']
+        )
+
+    def hedge_delay(self) -> float:
+        """当前的对冲延迟（秒）"""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < self.min_samples:
+            delay = self.initial_delay
+        else:
+            delay = samples[round(self.percentile / 100 * (len(samples) - 1))]
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def call(self, primary: Callable[[], Any], hedge: Optional[Callable[[], Any]] = None,
+             accept: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        执行一次带对冲的请求（阻塞调用线程，在线程池中调用）
+
+        Args:
+            primary: 主请求
+            hedge: 对冲请求（如发往备用模型）；为None时重复主请求
+            accept: 判断结果是否有效；无效结果或抛出异常的请求不算赢，继续等待另一个请求。
+                默认非None即有效
+
+        Returns:
+            先返回有效结果的请求的结果；两个请求都无效时返回主请求的结果（或抛出其异常）
+        """
+        accept = accept or _is_not_none
+        with self._lock:
+            self.stats['requests'] += 1
+
+        if not self.enabled or self._is_saturated():
+            started = time.monotonic()
+            result = primary()
+            if accept(result):
+                self._record_latency(time.monotonic() - started)
+            return result
+
+        delay = self.hedge_delay()
+        first = self._submit(primary, accept, record=True)
+        if wait([first], timeout=delay).done:
+            return first.result()
+
+        if self._is_saturated():
+            return first.result()
+
+        # 主请求超过对冲延迟仍未返回，发出对冲请求
+        with self._lock:
+            self.stats['hedged'] += 1
+        logger.debug(f"🔀 {self.name} 主请求超过 {delay:.2f} 秒未返回，发出对冲请求")
+        second = self._submit(hedge or primary, accept, record=False)
+
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # 同时完成时优先采用主请求
+            for future in sorted(done, key=lambda f: f is not first):
+                if future.exception() is None and accept(future.result()):
+                    self._cancel(pending)
+                    if future is second:
+                        with self._lock:
+                            self.stats['hedge_wins'] += 1
+                        logger.info(f"🔀 {self.name} 对冲请求先返回")
+                    return future.result()
+
+        return first.result()
+
+    def _submit(self, fn: Callable[[], Any], accept: Callable[[Any], bool], record: bool) -> Future:
+        """在对冲线程池中执行请求；主请求的有效结果耗时计入延迟样本（包括输掉的主请求，避免样本偏向短耗时）"""
+        started = time.monotonic()
+        with self._lock:
+            self._inflight += 1
+
+        def on_done(future: Future):
+            with self._lock:
+                self._inflight -= 1
+            if record and not future.cancelled() and future.exception() is None and accept(future.result()):
+                self._record_latency(time.monotonic() - started)
+
+        future = self._executor.submit(fn)
+        future.add_done_callback(on_done)
+        return future
+
+    def _is_saturated(self) -> bool:
+        """在途请求已占满对冲线程池（过载时不发对冲请求）"""
+        with self._lock:
+            if self._inflight < self.max_workers:
+                return False
+            self.stats['saturated'] += 1
+            return True
+
+    def _cancel(self, pending):
+        """取消输掉的请求：尚未开始的直接取消，已在执行的结果被丢弃"""
+        for future in pending:
+            future.cancel()
+        with self._lock:
+            self.stats['cancelled'] += len(pending)
+
+    def _record_latency(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取对冲统计信息"""
+        with self._lock:
+            stats = dict(self.stats)
+            samples = len(self.latencies)
+        stats['enabled'] = self.enabled
+        stats['hedge_rate'] = stats['hedged'] / stats['requests'] if stats['requests'] else 0.0
+        stats['win_rate'] = stats['hedge_wins'] / stats['hedged'] if stats['hedged'] else 0.0
+        stats['delay'] = self.hedge_delay()
+        stats['samples'] = samples
+        return stats
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+空闲会话回收模块
+后台定期按TTL回收各模块中空闲客户端的状态，探测并关闭半开连接，
+使长时间运行的进程内存占用保持平稳；失效连接上可恢复的会话转入断线宽限期，等待客户端重连
+
+版本: 2.0.0
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Dict
+
+from websockets.protocol import State
+
+from config import REAPER_CONFIG
+from multiplex import MuxChannel
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class IdleReaper:
+    """空闲会话回收器，由WebRTCServer在事件循环中启动"""
+
+    def __init__(self, server, config: Dict[str, Any] = None):
+        """
+        Args:
+            server: WebRTCServer实例（需要 clients、audio_processor、llm_module、session_store、executor）
+            config (dict): 回收配置，默认使用 config.REAPER_CONFIG
+        """
+        self.server = server
+        self.config = config or REAPER_CONFIG
+
+        # 统计信息
+        self.stats = {
+            'runs': 0,
+            'reclaimed_bytes': 0,
+            'last_reclaimed_bytes': 0,
+            'closed_connections': 0,
+            'purged_sessions': 0,
+            'last_run_time': 0
+        }
+
+    async def run(self):
+        """回收循环"""
+        logger.info(f"🧹 空闲会话回收已启动，间隔 {self.config['INTERVAL']} 秒")
+        while True:
+            await asyncio.sleep(self.config['INTERVAL'])
+            try:
+                await self.reap_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ 空闲会话回收失败: {e}")
+
+    async def reap_once(self) -> Dict[str, int]:
+        """执行一次回收，返回本次回收结果"""
+        start_time = time.time()
+        loop = asyncio.get_event_loop()
+
+        # 先处理连接，断开的客户端随后在各模块中一并回收
+        closed = await self._reap_connections()
+        active_clients = set(self.server.clients)
+
+        audio_bytes = self.server.audio_processor.reap_idle(
+            active_clients,
+            self.config['AUDIO_BUFFER_TTL'],
+            self.config['STATS_TTL']
+        )
+
+        # 对话历史回收可能写入会话存储，放到线程池中执行
+        history_bytes = await loop.run_in_executor(
+            self.server.executor,
+            self.server.llm_module.reap_idle_history,
+            active_clients,
+            self.config['CONVERSATION_HISTORY_TTL']
+        )
+
+        purged = 0
+        if self.server.session_store:
+            purged = await loop.run_in_executor(self.server.executor, self.server.session_store.purge_expired)
+
+        result = {
+            'audio_bytes': audio_bytes,
+            'history_bytes': history_bytes,
+            'closed_connections': closed,
+            'purged_sessions': purged
+        }
+
+        reclaimed = audio_bytes + history_bytes
+        self.stats['runs'] += 1
+        self.stats['reclaimed_bytes'] += reclaimed
+        self.stats['last_reclaimed_bytes'] = reclaimed
+        self.stats['closed_connections'] += closed
+        self.stats['purged_sessions'] += purged
+        self.stats['last_run_time'] = start_time
+
+        if reclaimed or closed or purged:
+            logger.info(
+                f"🧹 空闲回收完成: 音频 {audio_bytes} 字节, 对话历史 {history_bytes} 字节, "
+                f"关闭连接 {closed} 个, 过期会话 {purged} 个, 耗时 {(time.time() - start_time) * 1000:.1f}ms"
+            )
+        return result
+
+    async def _reap_connections(self) -> int:
+        """
+        处理已关闭但未清理的连接，探测长时间无消息的连接，返回关闭的连接数
+
+        失效的连接按意外断开处理：可恢复的会话转入宽限期（保留恢复令牌、音频和对话历史），否则清理
+        """
+        now = time.time()
+        stale = []
+        probes = []
+
+        for client_id, session in list(self.server.clients.items()):
+            if session.websocket is None or session.detached or isinstance(session.websocket, MuxChannel):
+                # 宽限期内的断线会话由服务器在到期后清理；多路复用会话的连接由网关连接的心跳探测
+                continue
+            if session.websocket.state is State.CLOSED:
+                stale.append(client_id)
+            elif now - session.last_activity > self.config['CONNECTION_IDLE_TIMEOUT']:
+                probes.append(client_id)
+
+        if probes:
+            results = await asyncio.gather(*(self._probe(client_id) for client_id in probes))
+            stale.extend(client_id for client_id, alive in zip(probes, results) if not alive)
+
+        for client_id in stale:
+            session = self.server.clients.get(client_id)
+            if session is None or session.detached:
+                continue
+            logger.warning(f"⚠️ 客户端 {client_id} 连接已失效")
+            await self.server.release_connection(session, session.websocket)
+
+        return len(stale)
+
+    async def _probe(self, client_id: str) -> bool:
+        """发送Ping探测连接，超时未收到Pong时关闭连接并返回False"""
+        session = self.server.clients.get(client_id)
+        if session is None:
+            return True
+
+        websocket = session.websocket
+        try:
+            pong_waiter = await websocket.ping()
+            await asyncio.wait_for(pong_waiter, timeout=self.config['PROBE_TIMEOUT'])
+            session.last_activity = time.time()
+            return True
+
+        except Exception as e:
+            logger.debug(f"📝 客户端 {client_id} 探测失败: {type(e).__name__}")
+            try:
+                # 半开连接无法完成关闭握手，限制等待时间
+                await asyncio.wait_for(websocket.close(), timeout=self.config['PROBE_TIMEOUT'])
+            except Exception:
+                pass
+            return False
+
+    def get_reaper_status(self) -> Dict[str, Any]:
+        """获取回收器状态信息"""
+        status = dict(self.stats)
+        status['interval'] = self.config['INTERVAL']
+        return status
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地快速意图模块
+位于ASR与LLM对话之间：问时间、日期、打招呼、"再说一遍"、调音量、停止播放这类简单指令
+在本地用预编译的正则（含简单的槽位提取）匹配并直接回复，不经过LLM；
+未命中时交给LLM处理。
+
+- 匹配前去掉标点和空白，整句匹配，避免"你好，帮我查下天气"这类真实问题被截走
+- 固定回复（问候、"好的"）可在服务启动时预合成语音，命中后无需等待TTS
+- 处理函数返回None表示放弃（如"再说一遍"时还没有上一句回复），继续交给LLM
+- 可通过 register() 注册自定义意图
+
+版本: 2.0.0
+"""
+
+import re
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 匹配前去掉的标点和空白
+_PUNCTUATION = re.compile(r'[\s，。！？、,.!?~…；;：:"“”\'‘’]+')
+
+_CHINESE_DIGITS = {'零': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5,
+                   '六': 6, '七': 7, '八': 8, '九': 9, '十': 10}
+
+_WEEKDAYS = '一二三四五六日'
+
+
+class IntentResult:
+    """快速意图的处理结果"""
+
+    __slots__ = ('intent', 'reply', 'command')
+
+    def __init__(self, reply: Optional[str] = None, command: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            reply (str): 回复文本（为None时不回复，如停止播放）
+            command (dict): 发给客户端执行的指令，如 {'action': 'volume', 'delta': 1}
+        """
+        self.intent: Optional[str] = None
+        self.reply = reply
+        self.command = command
+
+
+IntentHandler = Callable[[re.Match, Dict[str, Any]], Optional[IntentResult]]
+
+
+def normalize_text(text: str) -> str:
+    """去掉标点和空白并转为小写"""
+    return _PUNCTUATION.sub('', text).lower()
+
+
+def parse_level(value: str) -> Optional[int]:
+    """解析音量档位（阿拉伯数字或单个中文数字）"""
+    if value.isdigit():
+        return int(value)
+    return _CHINESE_DIGITS.get(value)
+
+
+class IntentFastPath:
+    """本地快速意图匹配"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.intents: List[Tuple[str, Pattern, IntentHandler]] = []
+        self.static_replies: List[str] = []
+
+        # 预合成的固定回复语音：回复文本 -> 音频数据
+        self.prerendered: Dict[str, bytes] = {}
+
+        self.stats = {
+            'turns': 0,
+            'hits': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0
+        }
+        self.hits_by_intent: Dict[str, int] = {}
+
+        register_builtin_intents(self)
+
+    def register(self, name: str, patterns: List[str], handler: IntentHandler,
+                 static_replies: Tuple[str, ...] = ()):
+        """
+        注册意图
+
+        Args:
+            name (str): 意图名称
+            patterns: 正则表达式列表，对去掉标点后的整句匹配，可用命名分组提取槽位
+            handler: 处理函数 (匹配结果, 上下文) -> IntentResult，返回None时交给LLM处理
+            static_replies: 该意图的固定回复文本，服务启动时可预合成语音
+        """
+        pattern = re.compile('(?:' + '|'.join(patterns) + ')')
+        self.intents.append((name, pattern, handler))
+        self.static_replies.extend(reply for reply in static_replies if reply not in self.static_replies)
+        self.hits_by_intent.setdefault(name, 0)
+
+    def match(self, text: str, context: Optional[Dict[str, Any]] = None) -> Optional[IntentResult]:
+        """匹配识别文本，未命中时返回None（计入未命中统计）"""
+        self.stats['turns'] += 1
+        if not self.enabled:
+            return None
+
+        normalized = normalize_text(text)
+        for name, pattern, handler in self.intents:
+            match = pattern.fullmatch(normalized)
+            if match is None:
+                continue
+            result = handler(match, context or {})
+            if result is not None:
+                result.intent = name
+                logger.info(f"⚡ 命中本地快速意图: {name}")
+                return result
+        return None
+
+    def record_hit(self, intent: str, latency: float):
+        """记录一次命中的处理耗时（从识别结果到回复发出）"""
+        self.stats['hits'] += 1
+        self.stats['latency_total'] += latency
+        self.stats['latency_max'] = max(self.stats['latency_max'], latency)
+        self.hits_by_intent[intent] = self.hits_by_intent.get(intent, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中率和命中时的处理耗时（与经过LLM的对话分开统计）"""
+        turns, hits = self.stats['turns'], self.stats['hits']
+        return {
+            'enabled': self.enabled,
+            'turns': turns,
+            'hits': hits,
+            'hit_rate': hits / turns if turns else 0.0,
+            'avg_latency_ms': self.stats['latency_total'] / hits * 1000 if hits else 0.0,
+            'max_latency_ms': self.stats['latency_max'] * 1000,
+            'by_intent': dict(self.hits_by_intent),
+            'prerendered': len(self.prerendered)
+        }
+
+
+# =============================================================================
+# 内置意图
+# =============================================================================
+
+GREETING_REPLY = "你好，有什么可以帮您？"
+ACK_REPLY = "好的"
+
+
+def _greeting(match: re.Match, context: Dict[str, Any]) -> IntentResult:
+    return IntentResult(GREETING_REPLY)
+
+
+def _time(match: re.Match, context: Dict[str, Any]) -> IntentResult:
+    now = datetime.now()
+    return IntentResult(f"现在是{now.hour}点{now.minute}分")
+
+
+def _date(match: re.Match, context: Dict[str, Any]) -> IntentResult:
+    now = datetime.now()
+    return IntentResult(f"今天是{now.month}月{now.day}日，星期{_WEEKDAYS[now.weekday()]}")
+
+
+def _repeat(match: re.Match, context: Dict[str, Any]) -> Optional[IntentResult]:
+    last_reply = context.get('last_reply')
+    return IntentResult(last_reply) if last_reply else None
+
+
+def _volume(match: re.Match, context: Dict[str, Any]) -> Optional[IntentResult]:
+    level = match.group('level')
+    if level is not None:
+        value = parse_level(level)
+        if value is None or value > 10:
+            return None
+        return IntentResult(ACK_REPLY, {'action': 'volume', 'level': value})
+    delta = 1 if (match.group('up') or match.group('up2')) else -1
+    return IntentResult(ACK_REPLY, {'action': 'volume', 'delta': delta})
+
+
+def _stop(match: re.Match, context: Dict[str, Any]) -> IntentResult:
+    return IntentResult(command={'action': 'stop'})
+
+
+def register_builtin_intents(fast_path: IntentFastPath):
+    """注册内置意图"""
+    fast_path.register('greeting', [
+        r'(你好|您好|嗨|哈喽|hello|hi|hey)(呀|啊)?',
+        r'(早上|上午|中午|下午|晚上)好'
+    ], _greeting, static_replies=(GREETING_REPLY,))
+
+    fast_path.register('time', [
+        r'(请问)?(现在)?(几点|几点钟|什么时间|什么时候)(了)?(呀|啊)?',
+        r'(请问)?现在(的)?时间(是)?(多少)?'
+    ], _time)
+
+    fast_path.register('date', [
+        r'(请问)?今天(是)?(几号|几月几号|几月几日|星期几|周几|礼拜几|什么日子)(了)?(呀|啊)?',
+        r'(请问)?今天(的)?日期(是)?(多少)?'
+    ], _date)
+
+    fast_path.register('repeat', [
+        r'(请)?(你)?(再说一遍|再说一次|再讲一遍|重复一遍|重复一下)(吧)?',
+        r'(我)?没听清(楚)?'
+    ], _repeat)
+
+    fast_path.register('volume', [
+        r'(把)?(音量|声音)(调|开)?(到|成)(?P<level>\d{1,2}|[零一二两三四五六七八九十])(级|档)?',
+        r'(把)?(音量|声音)(调|开)?((?P<up>大|高)|小|低)(一)?(点|些)?',
+        r'((?P<up2>大)|小)(一)?点(声)?'
+    ], _volume, static_replies=(ACK_REPLY,))
+
+    fast_path.register('stop', [
+        r'(停|停止|停下|暂停|别说了|不要说了|闭嘴|安静)(吧|了|一下)?'
+    ], _stop)
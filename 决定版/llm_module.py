@@ -7,10 +7,21 @@ LLM对话模块
 版本: 2.0.0
 """
 
+import sys
 import logging
+import time
+import threading
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict, Any
-from config import BASE_URL, DEFAULT_MODEL
+from circuit_breaker import CircuitBreaker
+from config import (BASE_URL, DEFAULT_MODEL, AVAILABLE_MODELS, API_TIMEOUTS, CONTEXT_CONFIG, HEDGING_CONFIG,
+                    ERROR_THRESHOLDS, RETRY_CONFIG, TURN_DEADLINE_CONFIG, MODEL_ROUTER_CONFIG)
+from context_builder import ContextBuilder, estimate_message_tokens, estimate_tokens
+from deadline import Deadline, request_timeout
+from hedging import Hedger
+from model_router import ModelRouter
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -18,15 +29,66 @@ logger = logging.getLogger(__name__)
 class LLMModule:
     """LLM对话模块类"""
     
-    def __init__(self):
-        """初始化LLM模块"""
+    def __init__(self, session_store=None):
+        """
+        初始化LLM模块
+        
+        Args:
+            session_store: 可选的会话存储（见 session_store.py），用于按会话令牌持久化对话历史
+        """
         # API配置
         self.API_KEY = "YOUR API KEY"
         self.base_url = BASE_URL
         self.model = DEFAULT_MODEL
         
+        # 模型路由：按各模型的首token时间和吞吐量选择预期延迟最低的模型，self.model 为首选模型
+        self.router = (ModelRouter.from_config(AVAILABLE_MODELS, self.model, MODEL_ROUTER_CONFIG)
+                       if MODEL_ROUTER_CONFIG['ENABLED'] else None)
+        
+        # 对冲请求：主请求出现长尾延迟时，向对冲模型（未配置时与本次路由的模型相同）再发一个请求
+        hedge_model = HEDGING_CONFIG['LLM']['HEDGE_MODEL']
+        if hedge_model and hedge_model not in AVAILABLE_MODELS:
+            logger.warning(f"⚠️ 对冲模型 {hedge_model} 不在可用模型列表中，改为重复请求主模型")
+            hedge_model = None
+        self.hedge_model = hedge_model
+        self.hedger = Hedger.from_config('llm', HEDGING_CONFIG['LLM'], HEDGING_CONFIG)
+        
+        # 熔断器：LLM服务故障期间直接返回降级回复
+        self.breaker = CircuitBreaker.from_config('LLM', ERROR_THRESHOLDS, RETRY_CONFIG)
+        
+        # 本轮预算将尽时的降级：缓存的回复（按客户端和问题文本）及各降级路径的次数
+        self.answer_cache: OrderedDict = OrderedDict()
+        self.deadline_stats = {
+            'short_answers': 0,
+            'cached_answers': 0,
+            'budget_exhausted': 0
+        }
+        
         # 对话历史管理
         self.conversation_history: Dict[str, List[Dict[str, str]]] = {}
+        self.last_activity: Dict[str, float] = {}
+        
+        # 因空闲被移出内存、已写入会话存储的客户端（下次提问时按需恢复）
+        self.spilled_clients: set = set()
+        
+        # 会话存储：客户端ID -> 会话令牌
+        self.session_store = session_store
+        self.session_tokens: Dict[str, str] = {}
+        
+        # 上下文构建：按token预算组装提示词，旧对话在后台折叠为滚动摘要
+        self.context_builder = ContextBuilder(
+            max_prompt_tokens=CONTEXT_CONFIG['MAX_PROMPT_TOKENS'],
+            summary_trigger_tokens=CONTEXT_CONFIG['SUMMARY_TRIGGER_TOKENS'],
+            summary_keep_messages=CONTEXT_CONFIG['SUMMARY_KEEP_MESSAGES'],
+            summary_trigger_messages=CONTEXT_CONFIG['SUMMARY_TRIGGER_MESSAGES']
+        )
+        self.conversation_summaries: Dict[str, str] = {}
+        self._summarizing: set = set()
+        self._history_lock = threading.Lock()
+        self._summary_executor = ThreadPoolExecutor(
+            max_workers=CONTEXT_CONFIG['SUMMARY_WORKERS'],
+            thread_name_prefix='llm-summary'
+        )
         
         # 系统提示词配置
         self.system_prompt = (
@@ -34,46 +96,56 @@ class LLMModule:
             "控制在50字以内，直接给出核心答案，不要解释过程。"
         )
         
-    def ask_question(self, question: str, client_id: str = None) -> str:
-        """向LLM提问并获取回复"""
+    def ask_question(self, question: str, client_id: str = None, deadline: Optional[Deadline] = None) -> str:
+        """向LLM提问并获取回复（deadline 为本轮对话的截止时间，预算将尽时限制回复长度或使用缓存的回复）"""
         try:
             logger.info(f"🤖 处理用户问题: {question[:50]}...")
             
-            # 构建API请求URL
-            url = f"{self.base_url}/v1/chat/completions"
+            # 熔断打开时直接返回降级回复，不再等待请求超时
+            if not self.breaker.allow_request():
+                logger.warning("⚡ LLM服务熔断中，跳过请求")
+                return "抱歉，服务暂时不可用，请稍后重试。"
             
-            # 设置请求头
-            headers = {
-                "Authorization": f"Bearer {self.API_KEY}",
-                "Content-Type": "application/json"
-            }
+            # 预算将尽：不再请求LLM，使用该客户端缓存的回复
+            remaining = deadline.remaining() if deadline else None
+            if remaining is not None and remaining < TURN_DEADLINE_CONFIG['LLM_CACHED_BELOW']:
+                return self._answer_within_budget(question, client_id)
+            
+            # 预算紧张：限制回复长度，缩短生成时间
+            max_tokens = 100
+            if remaining is not None and remaining < TURN_DEADLINE_CONFIG['LLM_SHORT_BELOW']:
+                max_tokens = TURN_DEADLINE_CONFIG['LLM_SHORT_MAX_TOKENS']
+                self.deadline_stats['short_answers'] += 1
+                logger.info(f"⏱️ 剩余预算 {remaining:.1f} 秒，限制回复长度: {max_tokens} tokens")
+            
+            # 空闲期间被移出内存的历史，按需从会话存储恢复
+            if client_id in self.spilled_clients:
+                self._restore_spilled_history(client_id)
             
             # 构建对话消息
             messages = self._build_conversation_messages(question, client_id)
             
-            # 构建请求数据
-            request_data = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": 0.5,      # 降低随机性，提高响应一致性
-                "max_tokens": 100,       # 减少最大token数，更快响应
-                "stream": False          # 非流式响应，简化处理
-            }
-            
-            logger.debug(f"📤 发送LLM请求: {len(messages)} 条消息")
+            # 选择本次请求的模型（上下文窗口需容纳提示词和生成长度）
+            model = self.model
+            if self.router:
+                prompt_tokens = sum(estimate_message_tokens(message) for message in messages)
+                model = self.router.choose(prompt_tokens, max_tokens)
+            hedge_model = self.hedge_model or model
             
-            # 发送请求到LLM API
-            response = requests.post(url, headers=headers, json=request_data, timeout=15)
-            response.raise_for_status()
+            logger.debug(f"📤 发送LLM请求: {len(messages)} 条消息, 模型 {model}")
             
-            # 解析响应
-            result = response.json()
-            ai_reply = self._extract_ai_reply(result)
+            # 主请求超过近期延迟分位数仍未返回时，向对冲模型再发一个请求，取先返回的回复
+            ai_reply = self.hedger.call(
+                lambda: self._request_completion(messages, model, max_tokens, deadline),
+                hedge=lambda: self._request_completion(messages, hedge_model, max_tokens, deadline)
+            )
+            self.breaker.record_success()
             
             if ai_reply:
                 # 保存对话历史
                 if client_id:
                     self._save_conversation_history(client_id, question, ai_reply)
+                    self._cache_answer(client_id, question, ai_reply)
                 
                 logger.info(f"✅ 回复生成成功: {ai_reply[:50]}...")
                 return ai_reply
@@ -83,29 +155,92 @@ class LLMModule:
                 
         except requests.exceptions.Timeout:
             logger.error("❌ LLM API请求超时")
+            self.breaker.record_failure()
             return "抱歉，服务响应超时，请稍后重试。"
         except requests.exceptions.RequestException as e:
             logger.error(f"❌ LLM API请求失败: {e}")
+            self.breaker.record_failure()
             return "抱歉，服务暂时不可用，请检查网络连接。"
         except Exception as e:
             logger.error(f"❌ LLM处理过程中发生未知错误: {e}")
+            self.breaker.record_failure()
             return "抱歉，服务出现异常，请稍后重试。"
     
+    def _request_completion(self, messages: List[Dict[str, str]], model: str, max_tokens: int = 100,
+                            deadline: Optional[Deadline] = None) -> Optional[str]:
+        """向指定模型发送一次对话请求，返回回复文本（请求超时不超过本轮剩余预算；耗时和生成token数计入模型路由统计）"""
+        # 构建API请求URL
+        url = f"{self.base_url}/v1/chat/completions"
+        
+        # 设置请求头
+        headers = {
+            "Authorization": f"Bearer {self.API_KEY}",
+            "Content-Type": "application/json"
+        }
+        
+        # 构建请求数据
+        request_data = {
+            "model": model,
+            "messages": messages,
+            "temperature": 0.5,      # 降低随机性，提高响应一致性
+            "max_tokens": max_tokens,  # 减少最大token数，更快响应
+            "stream": False          # 非流式响应，简化处理
+        }
+        
+        # 发送请求到LLM API
+        timeout = request_timeout(deadline, API_TIMEOUTS['LLM_REQUEST'])
+        started = time.monotonic()
+        try:
+            response = requests.post(url, headers=headers, json=request_data, timeout=timeout)
+            response.raise_for_status()
+            result = response.json()
+        except Exception:
+            if self.router:
+                self.router.record_failure(model)
+            raise
+        
+        # 解析响应
+        ai_reply = self._extract_ai_reply(result)
+        if self.router:
+            usage = result.get('usage') or {}
+            completion_tokens = usage.get('completion_tokens') or estimate_tokens(ai_reply or '')
+            self.router.record_success(model, completion_tokens, time.monotonic() - started)
+        return ai_reply
+    
+    def _answer_within_budget(self, question: str, client_id: str = None) -> str:
+        """本轮预算已将尽时的回复：该客户端问过相同问题时复用上次的回复，否则直接返回超时提示"""
+        with self._history_lock:
+            answer = self.answer_cache.get((client_id, question.strip()))
+        
+        if answer:
+            self.deadline_stats['cached_answers'] += 1
+            logger.info("⏱️ 本轮预算将尽，使用缓存的回复")
+            if client_id:
+                self._save_conversation_history(client_id, question, answer)
+            return answer
+        
+        self.deadline_stats['budget_exhausted'] += 1
+        logger.warning("⏱️ 本轮预算已耗尽，跳过LLM请求")
+        return "抱歉，服务响应超时，请稍后重试。"
+    
+    def _cache_answer(self, client_id: str, question: str, answer: str):
+        """缓存回复（按客户端和问题文本，避免不同客户端之间共享回复），超过容量时淘汰最久未用的"""
+        key = (client_id, question.strip())
+        with self._history_lock:
+            self.answer_cache[key] = answer
+            self.answer_cache.move_to_end(key)
+            while len(self.answer_cache) > TURN_DEADLINE_CONFIG['ANSWER_CACHE_SIZE']:
+                self.answer_cache.popitem(last=False)
+    
     def _build_conversation_messages(self, question: str, client_id: str = None) -> List[Dict[str, str]]:
-        """构建对话消息列表"""
-        # 基础消息结构
-        messages = [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "user", "content": question}
-        ]
+        """构建对话消息列表（系统提示 + 滚动摘要 + 预算内的最近对话 + 当前问题）"""
+        history = self.conversation_history.get(client_id) if client_id else None
+        summary = self.conversation_summaries.get(client_id) if client_id else None
         
-        # 如果有对话历史，添加最近的对话
-        if client_id and client_id in self.conversation_history:
-            # 只保留最近的3轮对话，避免上下文过长
-            recent_history = self.conversation_history[client_id][-6:]  # 3轮对话 = 6条消息
-            messages = [messages[0]] + recent_history + [messages[1]]
-            
-            logger.debug(f"📚 添加对话历史: {len(recent_history)} 条消息")
+        messages, prompt_tokens = self.context_builder.build(self.system_prompt, question, history, summary)
+        
+        if history or summary:
+            logger.debug(f"📚 添加对话上下文: {len(messages) - 2} 条消息, 约 {prompt_tokens} tokens")
         
         return messages
     
@@ -127,30 +262,243 @@ class LLMModule:
     def _save_conversation_history(self, client_id: str, question: str, answer: str):
         """保存对话历史"""
         try:
-            # 确保客户端有对话历史记录
+            with self._history_lock:
+                # 确保客户端有对话历史记录
+                if client_id not in self.conversation_history:
+                    self.conversation_history[client_id] = []
+                
+                # 添加用户问题和回答
+                self.conversation_history[client_id].extend([
+                    {"role": "user", "content": question},
+                    {"role": "assistant", "content": answer}
+                ])
+                
+                # 限制对话历史长度，避免内存占用过大（正常情况下后台摘要会先行折叠）
+                max_history = CONTEXT_CONFIG['MAX_HISTORY_MESSAGES']
+                if len(self.conversation_history[client_id]) > max_history:
+                    self.conversation_history[client_id] = self.conversation_history[client_id][-max_history:]
+                    logger.debug(f"📚 对话历史已截断至 {max_history} 条")
+                
+                self._persist_session(client_id)
+                self.last_activity[client_id] = time.time()
+            
+            logger.debug(f"💾 已保存对话历史: 客户端 {client_id}, 总条数: {len(self.conversation_history[client_id])}")
+            
+            # 历史过长时在后台折叠旧对话，不阻塞本轮回复
+            self._schedule_summary(client_id)
+            
+        except Exception as e:
+            logger.error(f"❌ 保存对话历史失败: {e}")
+    
+    def _persist_session(self, client_id: str):
+        """写入会话存储（仅更新缓存，由后台线程批量落盘）"""
+        if self.session_store and client_id in self.session_tokens:
+            self.session_store.save(self.session_tokens[client_id], {
+                'history': list(self.conversation_history.get(client_id, [])),
+                'summary': self.conversation_summaries.get(client_id),
+                'updated_at': time.time()
+            })
+    
+    def get_history_bytes(self, client_id: str) -> int:
+        """估算客户端对话历史和摘要占用的内存（字节，按文本计）"""
+        history = self.conversation_history.get(client_id)
+        summary = self.conversation_summaries.get(client_id)
+        total = sum(sys.getsizeof(message['content']) for message in history) if history else 0
+        return total + (sys.getsizeof(summary) if summary else 0)
+    
+    def shed_history(self, client_id: str, excess: int) -> int:
+        """从最早的对话开始丢弃，直到释放 excess 字节（至少保留最近一轮问答），返回释放的字节数"""
+        with self._history_lock:
+            history = self.conversation_history.get(client_id)
+            if not history:
+                return 0
+            
+            freed = 0
+            drop = 0
+            while drop < len(history) - 2 and freed < excess:
+                freed += sys.getsizeof(history[drop]['content'])
+                drop += 1
+            if drop:
+                del history[:drop]
+                self._persist_session(client_id)
+                logger.warning(f"⚠️ 客户端 {client_id} 内存超限，丢弃最早的 {drop} 条对话历史")
+        return freed
+    
+    def _schedule_summary(self, client_id: str) -> bool:
+        """需要时提交后台摘要任务，返回是否已提交"""
+        with self._history_lock:
+            if client_id in self._summarizing:
+                return False
+            
+            history = self.conversation_history.get(client_id, [])
+            fold_count = self.context_builder.select_messages_to_fold(history)
+            if fold_count <= 0:
+                return False
+            
+            folded = list(history[:fold_count])
+            previous_summary = self.conversation_summaries.get(client_id)
+            self._summarizing.add(client_id)
+        
+        try:
+            self._summary_executor.submit(self._fold_history, client_id, folded, previous_summary)
+            return True
+        except Exception as e:
+            logger.error(f"❌ 提交对话摘要任务失败: {e}")
+            with self._history_lock:
+                self._summarizing.discard(client_id)
+            return False
+    
+    def _fold_history(self, client_id: str, folded: List[Dict[str, str]], previous_summary: Optional[str]):
+        """将最旧的若干条对话折叠进滚动摘要（在后台线程中执行）"""
+        try:
+            summary = self._request_summary(previous_summary, folded)
+            if not summary:
+                summary = self.context_builder.extractive_summary(
+                    previous_summary, folded, CONTEXT_CONFIG['SUMMARY_MAX_TOKENS']
+                )
+            
+            with self._history_lock:
+                history = self.conversation_history.get(client_id)
+                # 期间历史被清除、截断或重新绑定时放弃本次结果
+                if history is None or history[:len(folded)] != folded:
+                    logger.debug(f"📝 客户端 {client_id} 的对话历史已变化，放弃本次摘要")
+                    return
+                
+                del history[:len(folded)]
+                self.conversation_summaries[client_id] = summary
+                self._persist_session(client_id)
+            
+            logger.info(f"🧾 客户端 {client_id} 已折叠 {len(folded)} 条旧对话为摘要 ({len(summary)} 字)")
+            
+        except Exception as e:
+            logger.error(f"❌ 折叠对话历史失败: {e}")
+        finally:
+            with self._history_lock:
+                self._summarizing.discard(client_id)
+    
+    def _request_summary(self, previous_summary: Optional[str], folded: List[Dict[str, str]]) -> Optional[str]:
+        """请求LLM生成对话摘要，失败时返回None"""
+        try:
+            url = f"{self.base_url}/v1/chat/completions"
+            headers = {
+                "Authorization": f"Bearer {self.API_KEY}",
+                "Content-Type": "application/json"
+            }
+            request_data = {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": "请把以下对话压缩成一段简短摘要，保留用户的关键信息、偏好和未完成的问题，不超过80字。"},
+                    {"role": "user", "content": self.context_builder.format_for_summary(previous_summary, folded)}
+                ],
+                "temperature": 0.2,
+                "max_tokens": CONTEXT_CONFIG['SUMMARY_MAX_TOKENS'],
+                "stream": False
+            }
+            
+            response = requests.post(url, headers=headers, json=request_data, timeout=API_TIMEOUTS['LLM_REQUEST'])
+            response.raise_for_status()
+            return self._extract_ai_reply(response.json())
+            
+        except Exception as e:
+            logger.warning(f"⚠️ LLM摘要请求失败，使用抽取式摘要: {e}")
+            return None
+    
+    def reap_idle_history(self, active_clients, ttl: float) -> int:
+        """
+        回收空闲客户端的对话历史，返回估算回收的字节数
+        
+        已断开客户端的历史直接释放；仍在连接但超过ttl未对话的客户端，
+        已绑定会话时先写入会话存储，下次提问时再恢复
+        """
+        from utils import estimate_object_size
+        
+        now = time.time()
+        reclaimed = 0
+        
+        with self._history_lock:
+            client_ids = set(self.conversation_history) | set(self.conversation_summaries)
+            for client_id in client_ids:
+                if client_id in self._summarizing:
+                    continue
+                
+                connected = client_id in active_clients
+                if connected and now - self.last_activity.get(client_id, now) <= ttl:
+                    continue
+                
+                if connected and self.session_store and client_id in self.session_tokens:
+                    self._persist_session(client_id)
+                    self.spilled_clients.add(client_id)
+                
+                reclaimed += estimate_object_size([
+                    self.conversation_history.pop(client_id, None),
+                    self.conversation_summaries.pop(client_id, None)
+                ])
+                self.last_activity.pop(client_id, None)
+            
+            # 已断开客户端的会话绑定
+            for client_id in set(self.session_tokens) - set(active_clients):
+                self.session_tokens.pop(client_id, None)
+                self.spilled_clients.discard(client_id)
+        
+        if reclaimed:
+            logger.debug(f"🧹 已回收空闲对话历史: {reclaimed} 字节")
+        return reclaimed
+    
+    def _restore_spilled_history(self, client_id: str):
+        """从会话存储恢复因空闲被移出内存的对话历史"""
+        self.spilled_clients.discard(client_id)
+        session_token = self.session_tokens.get(client_id)
+        if not self.session_store or not session_token:
+            return
+        
+        state = self.session_store.load(session_token)
+        if not state:
+            return
+        
+        with self._history_lock:
             if client_id not in self.conversation_history:
-                self.conversation_history[client_id] = []
+                self.conversation_history[client_id] = list(state.get('history') or [])
+            if state.get('summary') and client_id not in self.conversation_summaries:
+                self.conversation_summaries[client_id] = state['summary']
+        logger.debug(f"📚 已从会话存储恢复客户端 {client_id} 的对话历史")
+    
+    def bind_session(self, client_id: str, session_token: str) -> int:
+        """将客户端绑定到会话令牌，并从会话存储恢复对话历史，返回恢复的消息条数"""
+        try:
+            self.session_tokens[client_id] = session_token
             
-            # 添加用户问题和回答
-            self.conversation_history[client_id].extend([
-                {"role": "user", "content": question},
-                {"role": "assistant", "content": answer}
-            ])
+            if not self.session_store:
+                return 0
             
-            # 限制对话历史长度，避免内存占用过大
-            max_history = 20  # 保留最近10轮对话
-            if len(self.conversation_history[client_id]) > max_history:
-                self.conversation_history[client_id] = self.conversation_history[client_id][-max_history:]
-                logger.debug(f"📚 对话历史已截断至 {max_history} 条")
+            # 会话可能在其他工作进程中更新过，跳过本地缓存读取最新状态
+            state = self.session_store.load(session_token, refresh=True)
+            if not state or not state.get('history'):
+                logger.debug(f"📝 会话 {session_token[:8]}... 没有可恢复的对话历史")
+                return 0
             
-            logger.debug(f"💾 已保存对话历史: 客户端 {client_id}, 总条数: {len(self.conversation_history[client_id])}")
+            self.conversation_history[client_id] = list(state['history'])
+            self.last_activity[client_id] = time.time()
+            if state.get('summary'):
+                self.conversation_summaries[client_id] = state['summary']
+            restored = len(self.conversation_history[client_id])
+            logger.info(f"📚 客户端 {client_id} 已恢复会话对话历史 ({restored} 条)")
+            return restored
             
         except Exception as e:
-            logger.error(f"❌ 保存对话历史失败: {e}")
+            logger.error(f"❌ 恢复会话对话历史失败: {e}")
+            return 0
     
     def clear_conversation_history(self, client_id: str):
-        """清除指定客户端的对话历史"""
+        """清除指定客户端的对话历史（已绑定会话的历史仍保留在会话存储中）"""
         try:
+            self.session_tokens.pop(client_id, None)
+            self.conversation_summaries.pop(client_id, None)
+            self.last_activity.pop(client_id, None)
+            self.spilled_clients.discard(client_id)
+            with self._history_lock:
+                for key in [key for key in self.answer_cache if key[0] == client_id]:
+                    del self.answer_cache[key]
+            
             if client_id in self.conversation_history:
                 history_count = len(self.conversation_history[client_id])
                 del self.conversation_history[client_id]
@@ -232,7 +580,19 @@ class LLMModule:
                 'api_configured': bool(self.API_KEY),
                 'base_url': self.base_url,
                 'model': self.model,
+                'hedge_model': self.hedge_model,
+                'router': self.router.get_status() if self.router else None,
+                'hedging': self.hedger.get_stats(),
+                'breaker': self.breaker.get_status(),
+                'deadline': dict(self.deadline_stats),
                 'total_clients': len(self.conversation_history),
+                'history_bytes': sum(self.get_history_bytes(client_id) for client_id in list(self.conversation_history)),
+                'session_store': self.session_store.get_store_status() if self.session_store else None,
+                'context': {
+                    'max_prompt_tokens': self.context_builder.max_prompt_tokens,
+                    'summarized_clients': len(self.conversation_summaries),
+                    'pending_summaries': len(self._summarizing)
+                },
                 'system_prompt': self.system_prompt[:100] + "..." if len(self.system_prompt) > 100 else self.system_prompt
             }
             
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话内存核算模块
+按字节核算每个会话持有的内存：音频缓冲（含回声检测的TTS参考信号）、音频统计、对话历史、
+待发送消息（断线期间暂存的消息和连接发送队列中的积压）和待处理消息（多路复用会话的输入队列），并按上限释放：
+
+- 超过软上限：先丢弃最早的对话历史（保留最近一轮问答），仍超过时丢弃最早的待发送消息
+- 仍超过硬上限：清空音频缓冲区和待处理消息，由服务器通知客户端重说
+- 全部会话的占用接近全局预算时拒绝新会话，单个客户端无法耗尽工作进程的内存
+
+版本: 2.0.0
+"""
+
+import sys
+import logging
+from typing import Any, Dict, Iterable, Optional, Set
+
+from client_session import ClientSession, DetachedConnection
+from multiplex import MuxChannel
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class MemoryBudget:
+    """单会话内存上限和全局内存预算"""
+
+    def __init__(self, llm_module, soft_limit: int, hard_limit: int, global_limit: int,
+                 admit_ratio: float = 0.9, enabled: bool = True, send_queues: Optional[Dict[Any, Any]] = None):
+        """
+        Args:
+            llm_module: LLM模块（对话历史的核算和丢弃）
+            soft_limit (int): 单会话软上限（字节）
+            hard_limit (int): 单会话硬上限（字节）
+            global_limit (int): 全部会话的内存预算（字节）
+            admit_ratio (float): 占用超过全局预算的该比例时拒绝新会话
+            enabled (bool): 是否启用
+            send_queues (Optional[Dict]): 服务器的连接发送队列（连接 → SendQueue），积压字节计入待发送消息
+        """
+        self.llm_module = llm_module
+        self.soft_limit = soft_limit
+        self.hard_limit = hard_limit
+        self.global_limit = global_limit
+        self.admit_ratio = admit_ratio
+        self.enabled = enabled
+        self.send_queues = send_queues if send_queues is not None else {}
+
+        self.stats = {
+            'soft_sheds': 0,
+            'hard_sheds': 0,
+            'shed_bytes': 0,
+            'rejected_sessions': 0
+        }
+
+    @classmethod
+    def from_config(cls, llm_module, config: Dict[str, Any],
+                    send_queues: Optional[Dict[Any, Any]] = None) -> 'MemoryBudget':
+        """按 MEMORY_CONFIG 创建"""
+        return cls(
+            llm_module,
+            soft_limit=config['SESSION_SOFT_LIMIT'],
+            hard_limit=config['SESSION_HARD_LIMIT'],
+            global_limit=config['GLOBAL_LIMIT'],
+            admit_ratio=config['ADMIT_RATIO'],
+            enabled=config['ENABLED'],
+            send_queues=send_queues
+        )
+
+    def account(self, session: ClientSession, counted_queues: Optional[Set[int]] = None) -> Dict[str, int]:
+        """
+        核算会话各部分占用的内存（字节）
+
+        Args:
+            session (ClientSession): 会话
+            counted_queues (Optional[Set[int]]): 合计多个会话时传入，多路复用会话共用网关连接的发送队列，
+                同一队列的积压只计入一次
+        """
+        connection = session.websocket
+        outbound = connection.bytes if isinstance(connection, DetachedConnection) else 0
+        pending = connection.pending_bytes() if isinstance(connection, MuxChannel) else 0
+
+        queue = self.send_queues.get(connection.connection if isinstance(connection, MuxChannel) else connection)
+        if queue is not None and (counted_queues is None or id(queue) not in counted_queues):
+            outbound += queue.bytes
+            if counted_queues is not None:
+                counted_queues.add(id(queue))
+
+        usage = {
+            'audio': (sum(len(chunk) for chunk in session.audio_buffer) if session.audio_buffer else 0) +
+                     (session.tts_reference.nbytes if session.tts_reference is not None else 0),
+            'stats': sys.getsizeof(session.stats) if session.stats is not None else 0,
+            'history': self.llm_module.get_history_bytes(session.client_id),
+            'outbound': outbound,
+            'pending': pending
+        }
+        usage['total'] = sum(usage.values())
+        return usage
+
+    def enforce(self, session: ClientSession) -> Optional[str]:
+        """
+        检查会话是否超过上限并释放内存
+
+        Returns:
+            None（未超过）、'soft'（已丢弃历史或待发送消息）、'hard'（已清空音频缓冲区和待处理消息）
+        """
+        if not self.enabled:
+            return None
+
+        usage = self.account(session)
+        total = usage['total']
+        if total <= self.soft_limit:
+            return None
+
+        # 软上限：最早的对话历史 → 最早的待发送消息
+        self.stats['soft_sheds'] += 1
+        freed = self.llm_module.shed_history(session.client_id, total - self.soft_limit)
+        connection = session.websocket
+        if isinstance(connection, DetachedConnection):
+            while connection.outbox and total - freed > self.soft_limit:
+                freed += connection.drop_oldest()
+        total -= freed
+        level = 'soft'
+
+        # 硬上限：清空音频缓冲区和尚未处理的输入
+        if total > self.hard_limit:
+            self.stats['hard_sheds'] += 1
+            # 只清空音频缓冲区；TTS参考信号在播放期间仍用于回声检测，不计入释放的字节数
+            freed += usage['pending']
+            if session.audio_buffer is not None:
+                freed += sum(len(chunk) for chunk in session.audio_buffer)
+                session.audio_buffer.clear()
+            if isinstance(connection, MuxChannel):
+                connection.clear_pending()
+            level = 'hard'
+
+        self.stats['shed_bytes'] += freed
+        logger.warning(f"⚠️ 客户端 {session.client_id} 内存 {usage['total']} 字节超过{'硬' if level == 'hard' else '软'}上限，"
+                       f"已释放 {freed} 字节")
+        return level
+
+    def total_bytes(self, sessions: Iterable[ClientSession]) -> int:
+        """全部会话占用的内存（字节）"""
+        counted_queues: Set[int] = set()
+        return sum(self.account(session, counted_queues)['total'] for session in sessions)
+
+    def admit(self, sessions: Iterable[ClientSession]) -> bool:
+        """全部会话的占用未接近全局预算时接受新会话"""
+        if not self.enabled:
+            return True
+        if self.total_bytes(sessions) < self.global_limit * self.admit_ratio:
+            return True
+        self.stats['rejected_sessions'] += 1
+        logger.warning("⚠️ 会话内存接近全局预算，拒绝新会话")
+        return False
+
+    def get_status(self, sessions: Iterable[ClientSession]) -> Dict[str, Any]:
+        """获取各部分内存合计、占用最多的会话和释放统计"""
+        totals = {'audio': 0, 'stats': 0, 'history': 0, 'outbound': 0, 'pending': 0, 'total': 0}
+        largest_id, largest = None, 0
+        counted_queues: Set[int] = set()
+        for session in list(sessions):
+            usage = self.account(session, counted_queues)
+            for key in totals:
+                totals[key] += usage[key]
+            if usage['total'] > largest:
+                largest_id, largest = session.client_id, usage['total']
+
+        return {
+            'enabled': self.enabled,
+            'bytes': totals,
+            'largest_session': {'client_id': largest_id, 'bytes': largest},
+            'soft_limit': self.soft_limit,
+            'hard_limit': self.hard_limit,
+            'global_limit': self.global_limit,
+            'global_usage': totals['total'] / self.global_limit if self.global_limit else 0.0,
+            **self.stats
+        }
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM模型路由模块
+在 AVAILABLE_MODELS 之间按预期延迟选择模型：
+
+- 每个模型保留最近的 (生成token数, 响应耗时) 样本，按最小二乘拟合
+  耗时 = 首token时间 + token数 / 吞吐量（请求为非流式，首token时间取拟合的截距）
+- 预期延迟 = 首token时间 + min(本次max_tokens, 近期平均生成token数) / 吞吐量，
+  因此预算紧张、回复较短时更偏向首token快的模型
+- 质量约束：模型上下文窗口必须容纳本次提示词和生成长度（长对话历史只能发往长上下文模型）
+- 每个模型一个熔断器，连续失败的模型在恢复前不参与路由；样本不足的模型按探索比例偶尔分到请求，
+  被绕开的模型也能持续更新统计
+- 路由决策次数按模型和原因计数，随模块状态导出
+
+版本: 2.0.0
+"""
+
+import random
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from circuit_breaker import CircuitBreaker
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class ModelStats:
+    """单个模型的滚动延迟统计"""
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.failures = 0
+
+    def add(self, completion_tokens: int, latency: float):
+        self.samples.append((completion_tokens, latency))
+
+    def estimate(self) -> Tuple[float, float, float]:
+        """返回 (首token时间秒, 每token耗时秒, 平均生成token数)"""
+        n = len(self.samples)
+        mean_tokens = sum(tokens for tokens, _ in self.samples) / n
+        mean_latency = sum(latency for _, latency in self.samples) / n
+        var = sum((tokens - mean_tokens) ** 2 for tokens, _ in self.samples)
+        cov = sum((tokens - mean_tokens) * (latency - mean_latency) for tokens, latency in self.samples)
+
+        if var > 0 and cov > 0:
+            per_token = cov / var
+            ttft = max(0.0, mean_latency - per_token * mean_tokens)
+        else:
+            # 生成长度几乎不变时无法区分两部分，全部计入首token时间
+            per_token = 0.0
+            ttft = mean_latency
+        return ttft, per_token, mean_tokens
+
+
+class ModelRouter:
+    """按预期延迟和上下文约束选择LLM模型"""
+
+    def __init__(self, models: List[str], preferred: str, context_tokens: Dict[str, int],
+                 window: int = 50, min_samples: int = 5, explore_rate: float = 0.05,
+                 failure_threshold: int = 3, recovery_timeout: float = 30):
+        """
+        初始化模型路由
+
+        Args:
+            models: 可路由的模型（AVAILABLE_MODELS）
+            preferred (str): 首选模型，样本不足或没有其他可用模型时使用
+            context_tokens: 模型 -> 上下文窗口（tokens），未列出的模型不做上下文约束
+            window (int): 每个模型保留的最近样本数
+            min_samples (int): 参与按延迟路由所需的最少样本数
+            explore_rate (float): 把请求分给样本不足的模型的概率
+            failure_threshold (int): 模型连续失败多少次后暂停路由
+            recovery_timeout (float): 暂停路由的模型多久后放行探测请求（秒）
+        """
+        self.models = list(dict.fromkeys([preferred] + list(models)))
+        self.preferred = preferred
+        self.context_tokens = context_tokens
+        self.min_samples = min_samples
+        self.explore_rate = explore_rate
+
+        self.stats = {model: ModelStats(window) for model in self.models}
+        self.breakers = {
+            model: CircuitBreaker(f'LLM模型 {model}', failure_threshold=failure_threshold,
+                                  recovery_timeout=recovery_timeout)
+            for model in self.models
+        }
+        self.decisions = {
+            'routed': {model: 0 for model in self.models},
+            'explored': 0,
+            'skipped_context': 0,
+            'skipped_degraded': 0
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, models: List[str], preferred: str, config: Dict[str, Any]) -> 'ModelRouter':
+        """按 MODEL_ROUTER_CONFIG 创建"""
+        return cls(
+            models,
+            preferred,
+            config['CONTEXT_TOKENS'],
+            window=config['WINDOW'],
+            min_samples=config['MIN_SAMPLES'],
+            explore_rate=config['EXPLORE_RATE'],
+            failure_threshold=config['FAILURE_THRESHOLD'],
+            recovery_timeout=config['RECOVERY_TIMEOUT']
+        )
+
+    def expected_latency(self, model: str, max_tokens: int) -> Optional[float]:
+        """预期响应耗时（秒），样本不足时为None"""
+        with self._lock:
+            stats = self.stats[model]
+            if len(stats.samples) < self.min_samples:
+                return None
+            ttft, per_token, mean_tokens = stats.estimate()
+        return ttft + min(max_tokens, mean_tokens) * per_token
+
+    def choose(self, prompt_tokens: int, max_tokens: int) -> str:
+        """为本次请求选择模型"""
+        required = prompt_tokens + max_tokens
+        candidates = []
+        for model in self.models:
+            if required > self.context_tokens.get(model, required):
+                self._count('skipped_context')
+                continue
+            if self.breakers[model].state != 'closed':
+                if self.breakers[model].allow_request():
+                    # 暂停路由的模型到了探测时间，本次请求作为探测
+                    with self._lock:
+                        self.decisions['routed'][model] += 1
+                    return model
+                self._count('skipped_degraded')
+                continue
+            candidates.append(model)
+
+        if not candidates:
+            model = self.preferred
+        else:
+            scored = [(self.expected_latency(model, max_tokens), model) for model in candidates]
+            unexplored = [model for latency, model in scored if latency is None]
+            known = sorted((latency, model) for latency, model in scored if latency is not None)
+
+            if unexplored and (not known or random.random() < self.explore_rate):
+                # 首选模型还没有样本时先用首选模型，否则偶尔探索样本不足的模型
+                model = self.preferred if self.preferred in unexplored else random.choice(unexplored)
+                if known:
+                    self._count('explored')
+            else:
+                model = known[0][1]
+
+        with self._lock:
+            self.decisions['routed'][model] += 1
+        if model != self.preferred:
+            logger.debug(f"🧭 LLM请求路由到模型: {model}")
+        return model
+
+    def _count(self, reason: str):
+        with self._lock:
+            self.decisions[reason] += 1
+
+    def record_success(self, model: str, completion_tokens: int, latency: float):
+        """记录一次成功请求的生成token数和耗时（不在路由范围内的模型忽略）"""
+        if model not in self.stats:
+            return
+        with self._lock:
+            self.stats[model].add(completion_tokens, latency)
+        self.breakers[model].record_success()
+
+    def record_failure(self, model: str):
+        """记录一次失败请求"""
+        if model not in self.stats:
+            return
+        with self._lock:
+            self.stats[model].failures += 1
+        self.breakers[model].record_failure()
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取路由统计（各模型的首token时间、吞吐量和路由决策次数）"""
+        models = {}
+        for model in self.models:
+            with self._lock:
+                stats = self.stats[model]
+                samples = len(stats.samples)
+                estimate = stats.estimate() if samples else None
+                failures = stats.failures
+            ttft, per_token, mean_tokens = estimate or (None, None, None)
+            models[model] = {
+                'samples': samples,
+                'ttft': ttft,
+                'tokens_per_second': 1 / per_token if per_token else None,
+                'mean_completion_tokens': mean_tokens,
+                'failures': failures,
+                'state': self.breakers[model].state
+            }
+
+        with self._lock:
+            decisions = {**self.decisions, 'routed': dict(self.decisions['routed'])}
+        return {'models': models, 'decisions': decisions}
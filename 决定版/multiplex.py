@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket会话多路复用模块
+网关部署时一条WebSocket连接（路径 MUX_CONFIG['PATH']）承载多个逻辑会话，
+服务器不再为每个终端用户维护一条连接。
+
+帧格式：
+- JSON帧：带 "session" 字段（网关为终端用户分配的会话ID），其余字段与普通连接相同；
+  控制消息 session_open（可带 resume_token 接回断线的会话）/ session_close
+- 二进制帧：1字节会话ID长度 + 会话ID（UTF-8）+ 音频数据
+- 服务器发出的JSON消息同样带 "session" 字段，由网关转发给对应用户
+
+每个逻辑会话有独立的有界输入队列和处理任务：一个会话处理缓慢不会阻塞同一连接上的其他会话；
+队列满时丢弃该会话的新帧并发送 flow_control 暂停消息，队列排空到一半后发送恢复消息。
+
+版本: 2.0.0
+"""
+
+import sys
+import json
+import asyncio
+import logging
+from typing import Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+MAX_SESSION_ID_BYTES = 255
+
+
+def pack_binary_frame(session_id: str, payload: bytes) -> bytes:
+    """二进制帧：1字节会话ID长度 + 会话ID + 数据"""
+    encoded = session_id.encode('utf-8')
+    if not encoded or len(encoded) > MAX_SESSION_ID_BYTES:
+        raise ValueError(f"会话ID长度必须为1-{MAX_SESSION_ID_BYTES}字节")
+    return bytes([len(encoded)]) + encoded + payload
+
+
+def unpack_binary_frame(frame: bytes) -> Tuple[str, bytes]:
+    """解析二进制帧，返回 (会话ID, 数据)；格式错误时抛出 ValueError"""
+    if not frame:
+        raise ValueError("空帧")
+    length = frame[0]
+    if length == 0 or len(frame) < 1 + length:
+        raise ValueError("会话ID长度无效")
+    return frame[1:1 + length].decode('utf-8'), frame[1 + length:]
+
+
+def is_valid_session_id(session_id) -> bool:
+    """检查网关提供的会话ID"""
+    return (isinstance(session_id, str) and session_id != ''
+            and len(session_id.encode('utf-8')) <= MAX_SESSION_ID_BYTES)
+
+
+class MuxChannel:
+    """多路复用连接上的一个逻辑会话，作为该会话的连接对象使用（发出的消息自动带上会话ID）"""
+
+    __slots__ = ('connection', 'session_id', 'client_id', 'prefix', 'inbox', 'worker', 'paused',
+                 'dropped_frames')
+
+    def __init__(self, connection, session_id: str, max_pending: int):
+        """
+        Args:
+            connection: 网关的WebSocket连接
+            session_id (str): 网关分配的会话ID
+            max_pending (int): 输入队列容量（帧）
+        """
+        self.connection = connection
+        self.session_id = session_id
+        self.client_id: Optional[str] = None   # 服务器内部的客户端ID（会话建立后设置）
+        self.prefix = '{"session": ' + json.dumps(session_id, ensure_ascii=False)
+        self.inbox: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.worker: Optional[asyncio.Task] = None
+        self.paused = False
+        self.dropped_frames = 0
+
+    @property
+    def close_code(self):
+        return self.connection.close_code
+
+    @property
+    def state(self):
+        return self.connection.state
+
+    def encode(self, message):
+        """编码为网关连接上的帧：JSON消息插入会话ID字段（避免重新序列化），二进制数据加帧头"""
+        if isinstance(message, str):
+            return self.prefix + (', ' + message[1:] if message != '{}' else '}')
+        return pack_binary_frame(self.session_id, message)
+
+    async def send(self, message):
+        """发送消息"""
+        await self.connection.send(self.encode(message))
+
+    def offer(self, message) -> bool:
+        """放入输入队列，队列已满时丢弃并返回False"""
+        try:
+            self.inbox.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped_frames += 1
+            return False
+
+    def pending_bytes(self) -> int:
+        """输入队列中尚未处理的帧占用的内存（字节）"""
+        return sum(sys.getsizeof(message) for message in self.inbox._queue if message is not None)
+
+    def clear_pending(self) -> int:
+        """丢弃尚未处理的帧，返回丢弃的帧数"""
+        dropped = 0
+        while True:
+            try:
+                message = self.inbox.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if message is None:
+                # 保留关闭信号
+                self.inbox.put_nowait(None)
+                break
+            dropped += 1
+        self.dropped_frames += dropped
+        return dropped
+
+    def should_resume(self) -> bool:
+        """暂停状态下队列排空到一半以下时可以恢复"""
+        return self.paused and self.inbox.qsize() <= self.inbox.maxsize // 2
+
+    def close(self):
+        """停止处理任务：已排队的帧处理完后退出，队列已满时直接取消"""
+        try:
+            self.inbox.put_nowait(None)
+        except asyncio.QueueFull:
+            if self.worker is not None:
+                self.worker.cancel()
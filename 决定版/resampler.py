@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重采样和声道下混模块
+音频处理流程统一使用16kHz单声道16位PCM，而浏览器可能忽略 AudioContext 的采样率设置按44.1/48kHz采集，
+原生客户端可能发送立体声，TTS音色也可能输出其他采样率：
+
+- 上行：按客户端声明的采集采样率和声道数，每帧下混为单声道并重采样到16kHz
+- 下行：客户端声明播放采样率时，TTS音频按其转换，客户端不再自行重采样
+
+重采样使用有理数比例 L/M 的多相FIR滤波器（Kaiser窗sinc低通），一帧的全部输出样本一次向量化计算；
+滤波器历史样本和相位跨帧保留，逐帧处理与整段处理结果相同（仅有舍入误差），帧边界没有不连续
+
+版本: 2.0.0
+"""
+
+import io
+import wave
+import logging
+from math import gcd
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def downmix(pcm: bytes, channels: int) -> np.ndarray:
+    """交错的多声道16位PCM下混为单声道（float32，-1~1），不足一个采样帧的尾部丢弃"""
+    samples = np.frombuffer(pcm, dtype='<i2', count=len(pcm) // 2).astype(np.float32) / 32768
+    if channels <= 1:
+        return samples
+    frames = samples.size // channels
+    return samples[:frames * channels].reshape(frames, channels).mean(axis=1)
+
+
+@lru_cache(maxsize=32)
+def design_polyphase_filter(up: int, down: int, taps_per_phase: int, beta: float) -> np.ndarray:
+    """
+    设计多相低通滤波器（同一转换比例的会话共用一份系数，只读）
+
+    Returns:
+        形状为 (up, taps_per_phase) 的系数矩阵，第 p 行是相位 p 的子滤波器
+    """
+    length = up * taps_per_phase
+    cutoff = 0.5 / max(up, down) * 0.92          # 归一化截止频率（上采样后的采样率），留出过渡带
+    n = np.arange(length) - (length - 1) / 2
+    prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta) * up
+    return prototype.reshape(taps_per_phase, up).T.astype(np.float32)
+
+
+class Resampler:
+    """逐帧重采样器：保留滤波器历史样本和输出相位，输入输出均为16位PCM字节串"""
+
+    __slots__ = ('in_rate', 'out_rate', 'channels', 'up', 'down', 'filters', 'taps', 'history', 'position')
+
+    def __init__(self, in_rate: int, out_rate: int, channels: int = 1, taps_per_phase: int = 16,
+                 beta: float = 8.0):
+        """
+        Args:
+            in_rate (int): 输入采样率
+            out_rate (int): 输出采样率
+            channels (int): 输入声道数（交错），输出为单声道
+            taps_per_phase (int): 每个相位子滤波器的抽头数（降采样时按比例增加），越多过渡带越窄、计算量越大
+            beta (float): Kaiser窗参数，越大阻带衰减越大
+        """
+        divisor = gcd(in_rate, out_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.channels = channels
+        self.up = out_rate // divisor
+        self.down = in_rate // divisor
+        # 降采样时截止频率按输出采样率计算，抽头数随降采样比例增加以保持同样的过渡带宽度
+        self.taps = -(-taps_per_phase * self.down // self.up) if self.down > self.up else taps_per_phase
+        self.filters = design_polyphase_filter(self.up, self.down, self.taps, beta) if self.up != self.down else None
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        # 下一个输出样本在 [历史样本 + 新输入] 中的位置（以 1/up 个输入样本为单位）
+        self.position = (self.taps - 1) * self.up
+
+    @property
+    def passthrough(self) -> bool:
+        """采样率和声道数都无需转换"""
+        return self.filters is None and self.channels <= 1
+
+    def process(self, pcm: bytes) -> bytes:
+        """处理一帧输入，返回本帧可以输出的16位PCM（长度随相位在帧间略有变化）"""
+        if self.passthrough:
+            return pcm
+        samples = downmix(pcm, self.channels)
+        if self.filters is None:
+            return self._to_pcm(samples)
+
+        x = np.concatenate((self.history, samples))
+        available = (x.size - 1) * self.up - self.position
+        count = available // self.down + 1 if available >= 0 else 0
+
+        # 每个输出样本对应的最新输入样本和相位，按 (输出样本, 抽头) 取出输入窗口后逐行点积
+        positions = self.position + np.arange(count, dtype=np.int64) * self.down
+        newest = positions // self.up
+        windows = x[newest[:, None] - np.arange(self.taps)[None, :]]
+        output = np.einsum('nk,nk->n', windows, self.filters[positions % self.up])
+
+        # 只保留下一帧需要的历史样本
+        consumed = x.size - (self.taps - 1)
+        self.position += count * self.down - consumed * self.up
+        self.history = x[consumed:]
+        return self._to_pcm(output)
+
+    @staticmethod
+    def _to_pcm(samples: np.ndarray) -> bytes:
+        return np.rint(np.clip(samples, -1.0, 32767 / 32768) * 32768).astype('<i2').tobytes()
+
+
+def negotiate_rate(requested: Optional[int], supported: List[int], default: int) -> int:
+    """选择采样率：客户端声明的采样率受支持时使用，否则回退到默认值"""
+    if requested in supported:
+        return requested
+    if requested is not None:
+        logger.warning(f"⚠️ 不支持的采样率: {requested}，使用 {default}")
+    return default
+
+
+def create_uplink_resampler(sample_rate: int, channels: int, config: dict, target_rate: int) -> Optional[Resampler]:
+    """按客户端声明的采集格式创建上行重采样器，已经是目标格式时返回None"""
+    if sample_rate == target_rate and channels == 1:
+        return None
+    return Resampler(sample_rate, target_rate, channels, config['TAPS_PER_PHASE'], config['KAISER_BETA'])
+
+
+def resample_pcm(pcm: bytes, in_rate: int, out_rate: int, channels: int = 1) -> bytes:
+    """一次性转换一整段16位PCM为 out_rate 单声道"""
+    return Resampler(in_rate, out_rate, channels).process(pcm)
+
+
+def read_wav(data: bytes) -> Tuple[bytes, int, int]:
+    """读取16位wav，返回 (PCM, 采样率, 声道数)"""
+    with wave.open(io.BytesIO(data), 'rb') as wav_file:
+        if wav_file.getsampwidth() != 2:
+            raise wave.Error("只支持16位wav")
+        return wav_file.readframes(wav_file.getnframes()), wav_file.getframerate(), wav_file.getnchannels()
+
+
+def convert_wav(data: bytes, sample_rate: int) -> bytes:
+    """把16位wav转换为 sample_rate 单声道wav，已经符合时原样返回"""
+    pcm, rate, channels = read_wav(data)
+    if rate == sample_rate and channels == 1:
+        return data
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(resample_pcm(pcm, rate, sample_rate, channels))
+    return buffer.getvalue()
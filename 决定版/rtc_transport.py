@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebRTC媒体传输模块（可选）
+在现有WebSocket连接上完成信令（rtc_offer / rtc_answer），建立真正的WebRTC对等连接：
+
+- 上行：浏览器麦克风以Opus经RTP/SRTP传输，由aiortc完成抖动缓冲、丢包隐藏和解码，
+  重采样为16kHz单声道16位PCM后按能量门限切块，送入与WebSocket音频相同的处理流程
+- 下行：TTS音频解码为PCM后写入服务端音频轨道，由aiortc按20ms帧编码为Opus实时发送
+
+依赖 aiortc（及其依赖的 av），未安装时 RTC_AVAILABLE 为 False，服务端只使用WebSocket传输。
+
+版本: 2.0.0
+"""
+
+import io
+import time
+import asyncio
+import logging
+import fractions
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from config import RTC_CONFIG
+
+try:
+    import av
+    from aiortc import RTCConfiguration, RTCIceServer, RTCPeerConnection, RTCSessionDescription
+    from aiortc.mediastreams import MediaStreamError, MediaStreamTrack
+    RTC_AVAILABLE = True
+except ImportError:
+    av = None
+    MediaStreamTrack = object
+    RTC_AVAILABLE = False
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 送入音频处理流程的PCM格式（与WebSocket上行一致）
+PIPELINE_SAMPLE_RATE = 16000
+
+
+def decode_audio_file(data: bytes, sample_rate: int) -> bytes:
+    """将TTS返回的音频文件（wav/mp3等）解码并重采样为单声道16位PCM"""
+    pcm = bytearray()
+    resampler = av.AudioResampler(format='s16', layout='mono', rate=sample_rate)
+    with av.open(io.BytesIO(data)) as container:
+        for frame in container.decode(audio=0):
+            for out in resampler.resample(frame):
+                pcm += out.to_ndarray().tobytes()
+    for out in resampler.resample(None):
+        pcm += out.to_ndarray().tobytes()
+    return bytes(pcm)
+
+
+class TTSAudioTrack(MediaStreamTrack):
+    """服务端下行音频轨道：按实时节奏输出20ms帧，有TTS数据时播放，否则输出静音"""
+
+    kind = 'audio'
+
+    def __init__(self, sample_rate: int = 48000, frame_ms: int = 20):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.samples_per_frame = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.samples_per_frame * 2
+        self.time_base = fractions.Fraction(1, sample_rate)
+
+        self._pending = b''
+        self._offset = 0
+        self._start_time: Optional[float] = None
+        self._timestamp = 0
+
+    @property
+    def queued_seconds(self) -> float:
+        """尚未播放的音频时长（秒）"""
+        return (len(self._pending) - self._offset) / 2 / self.sample_rate
+
+    def push_pcm(self, pcm: bytes):
+        """追加待播放的PCM（单声道16位，采样率与轨道一致）"""
+        self._pending = self._pending[self._offset:] + pcm
+        self._offset = 0
+
+    def clear(self) -> int:
+        """丢弃尚未播放的音频（用于打断），返回丢弃的字节数"""
+        dropped = len(self._pending) - self._offset
+        self._pending = b''
+        self._offset = 0
+        return dropped
+
+    async def recv(self):
+        if self.readyState != 'live':
+            raise MediaStreamError
+
+        # 按帧时间戳控制发送节奏
+        if self._start_time is None:
+            self._start_time = time.time()
+        else:
+            self._timestamp += self.samples_per_frame
+            wait = self._start_time + self._timestamp / self.sample_rate - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        chunk = self._pending[self._offset:self._offset + self.frame_bytes]
+        self._offset += len(chunk)
+        if len(chunk) < self.frame_bytes:
+            chunk += bytes(self.frame_bytes - len(chunk))
+
+        frame = av.AudioFrame(format='s16', layout='mono', samples=self.samples_per_frame)
+        frame.planes[0].update(chunk)
+        frame.sample_rate = self.sample_rate
+        frame.pts = self._timestamp
+        frame.time_base = self.time_base
+        return frame
+
+
+class RTCPeer:
+    """单个客户端的WebRTC对等连接"""
+
+    def __init__(self, client_id: str, pc, tts_track: TTSAudioTrack):
+        self.client_id = client_id
+        self.pc = pc
+        self.tts_track = tts_track
+        self.receiver_task: Optional[asyncio.Task] = None
+        self.created_at = time.time()
+
+        # 统计信息
+        self.received_frames = 0
+        self.received_bytes = 0
+        self.voiced_chunks = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.pc.connectionState == 'connected'
+
+
+class RTCTransport:
+    """WebRTC传输管理器，由WebRTCServer创建，信令复用客户端的WebSocket连接"""
+
+    def __init__(self, on_audio: Callable[[str, bytes], None], config: Dict[str, Any] = None):
+        """
+        Args:
+            on_audio (callable): 收到一块有声音频时的回调 (client_id, 16kHz 16位PCM)，在事件循环中调用
+            config (dict): WebRTC配置，默认使用 config.RTC_CONFIG
+        """
+        if not RTC_AVAILABLE:
+            raise RuntimeError("未安装aiortc，无法启用WebRTC媒体传输")
+
+        self.on_audio = on_audio
+        self.config = config or RTC_CONFIG
+        self.peers: Dict[str, RTCPeer] = {}
+
+        self.stats = {
+            'total_peers': 0,
+            'failed_offers': 0,
+            'tts_seconds': 0.0
+        }
+
+    def _create_peer_connection(self):
+        ice_servers = [RTCIceServer(urls=url) for url in self.config['ICE_SERVERS']]
+        return RTCPeerConnection(RTCConfiguration(iceServers=ice_servers))
+
+    async def handle_offer(self, client_id: str, sdp: str, sdp_type: str = 'offer') -> Dict[str, str]:
+        """处理客户端的SDP offer，返回SDP answer（ICE候选已包含在SDP中）"""
+        # 同一客户端重新协商时替换旧连接
+        await self.close_peer(client_id)
+
+        pc = self._create_peer_connection()
+        tts_track = TTSAudioTrack(self.config['TTS_SAMPLE_RATE'], self.config['TTS_FRAME_MS'])
+        peer = RTCPeer(client_id, pc, tts_track)
+        self.peers[client_id] = peer
+
+        @pc.on('track')
+        def on_track(track):
+            if track.kind == 'audio' and peer.receiver_task is None:
+                logger.info(f"🎧 客户端 {client_id} WebRTC音频轨道已接入")
+                peer.receiver_task = asyncio.ensure_future(self._receive_audio(peer, track))
+
+        @pc.on('connectionstatechange')
+        async def on_connection_state_change():
+            logger.info(f"📡 客户端 {client_id} WebRTC连接状态: {pc.connectionState}")
+            if pc.connectionState == 'failed' and self.peers.get(client_id) is peer:
+                await self.close_peer(client_id)
+
+        try:
+            await pc.setRemoteDescription(RTCSessionDescription(sdp=sdp, type=sdp_type))
+            pc.addTrack(tts_track)
+            await pc.setLocalDescription(await pc.createAnswer())
+        except Exception:
+            self.stats['failed_offers'] += 1
+            await self.close_peer(client_id)
+            raise
+
+        self.stats['total_peers'] += 1
+        return {'sdp': pc.localDescription.sdp, 'type': pc.localDescription.type}
+
+    async def _receive_audio(self, peer: RTCPeer, track):
+        """接收上行音频：重采样为16kHz PCM，按固定块长切分，有声块交给处理流程"""
+        resampler = av.AudioResampler(format='s16', layout='mono', rate=PIPELINE_SAMPLE_RATE)
+        chunk_bytes = self.config['CHUNK_SAMPLES'] * 2
+        threshold = self.config['VOICE_THRESHOLD'] * 32768
+        pending = bytearray()
+
+        try:
+            while True:
+                try:
+                    frame = await track.recv()
+                except MediaStreamError:
+                    break
+
+                peer.received_frames += 1
+                for out in resampler.resample(frame):
+                    pending += out.to_ndarray().tobytes()
+
+                while len(pending) >= chunk_bytes:
+                    chunk = bytes(pending[:chunk_bytes])
+                    del pending[:chunk_bytes]
+                    peer.received_bytes += chunk_bytes
+
+                    # 与浏览器端WebSocket上行相同的能量门限，只把有声部分送入ASR流程
+                    samples = np.frombuffer(chunk, dtype='<i2').astype(np.float32)
+                    if np.sqrt(np.mean(samples * samples)) > threshold:
+                        peer.voiced_chunks += 1
+                        self.on_audio(peer.client_id, chunk)
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"❌ 接收客户端 {peer.client_id} WebRTC音频失败: {e}")
+
+    def is_connected(self, client_id: str) -> bool:
+        """客户端的WebRTC媒体连接是否可用"""
+        peer = self.peers.get(client_id)
+        return peer is not None and peer.connected
+
+    async def play_audio(self, client_id: str, audio_data: bytes) -> float:
+        """通过WebRTC下行轨道播放TTS音频，返回音频时长（秒）"""
+        peer = self.peers[client_id]
+        loop = asyncio.get_event_loop()
+        pcm = await loop.run_in_executor(None, decode_audio_file, audio_data, peer.tts_track.sample_rate)
+
+        # 新的回复替换尚未播放完的旧回复
+        peer.tts_track.clear()
+        peer.tts_track.push_pcm(pcm)
+
+        duration = len(pcm) / 2 / peer.tts_track.sample_rate
+        self.stats['tts_seconds'] += duration
+        return duration
+
+    def interrupt(self, client_id: str) -> int:
+        """打断下行TTS播放，返回丢弃的字节数"""
+        peer = self.peers.get(client_id)
+        return peer.tts_track.clear() if peer else 0
+
+    async def close_peer(self, client_id: str):
+        """关闭客户端的WebRTC连接"""
+        peer = self.peers.pop(client_id, None)
+        if peer is None:
+            return
+        try:
+            if peer.receiver_task:
+                peer.receiver_task.cancel()
+            await peer.pc.close()
+            logger.info(f"🔌 客户端 {client_id} WebRTC连接已关闭")
+        except Exception as e:
+            logger.error(f"❌ 关闭客户端 {client_id} WebRTC连接失败: {e}")
+
+    async def close_all(self):
+        """关闭全部WebRTC连接"""
+        for client_id in list(self.peers):
+            await self.close_peer(client_id)
+
+    def get_transport_status(self) -> Dict[str, Any]:
+        """获取WebRTC传输状态信息"""
+        status = dict(self.stats)
+        status['active_peers'] = len(self.peers)
+        status['connected_peers'] = sum(1 for peer in self.peers.values() if peer.connected)
+        status['received_bytes'] = sum(peer.received_bytes for peer in self.peers.values())
+        status['voiced_chunks'] = sum(peer.voiced_chunks for peer in self.peers.values())
+        return status
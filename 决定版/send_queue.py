@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+连接发送队列模块
+服务器发给客户端的消息经每个连接自己的发送队列，由该连接的写任务按顺序写出：
+
+- 调用方可以入队后等待写出（send，队列空闲时直接写出），也可以入队后立即返回（put，广播使用）；
+  同一连接同一时刻只有一条消息在写出，顺序不变；广播时消息只序列化一次，放入各连接的队列，
+  一个连接写得慢不会拖住其他客户端
+- 背压检测：记录积压字节数和每条消息的写出耗时（排空时间），积压超过高水位时标记为拥塞
+- 慢消费者驱逐：积压超过上限，或单条消息超过发送超时仍未写出时，队列中的消息以 SlowConsumerError 失败，
+  由服务器断开该连接（带恢复令牌的会话转入断线宽限期，重连后补发）
+
+版本: 2.0.0
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class SlowConsumerError(ConnectionError):
+    """连接消费太慢，发送队列已被驱逐"""
+
+
+class SendQueue:
+    """单个连接的发送队列和写任务（需在事件循环中创建）"""
+
+    __slots__ = ('connection', 'max_bytes', 'high_water', 'send_timeout', 'on_error', 'messages', 'bytes',
+                 'wakeup', 'writer', 'writing', 'write_started', 'watchdog', 'error', 'closing', 'congested', 'sent',
+                 'drain_time', 'max_drain_time')
+
+    def __init__(self, connection, max_bytes: int = 8 << 20, high_water: int = 1 << 20, send_timeout: float = 10.0,
+                 on_error: Optional[Callable[['SendQueue', Exception], None]] = None):
+        """
+        Args:
+            connection: 提供 send() 协程的连接
+            max_bytes (int): 积压字节数上限，超过时按慢消费者驱逐
+            high_water (int): 积压超过该字节数时标记为拥塞，回落到一半以下时解除
+            send_timeout (float): 单条消息的最长写出时间（秒），超时按慢消费者驱逐
+            on_error: 连接写出失败或被驱逐时的回调，参数为 (队列, 异常)
+        """
+        self.connection = connection
+        self.max_bytes = max_bytes
+        self.high_water = high_water
+        self.send_timeout = send_timeout
+        self.on_error = on_error
+
+        self.messages: deque = deque()   # (消息, 字节数, 等待写出的Future或None)
+        self.bytes = 0
+        self.wakeup = asyncio.Event()
+        self.writing = False             # 同一时刻只有一条消息在写出（写任务或空闲时的调用方）
+        self.write_started = 0.0
+        self.watchdog: Optional[asyncio.TimerHandle] = None
+        self.error: Optional[Exception] = None
+        self.closing = False
+        self.congested = False
+        self.sent = 0
+        self.drain_time = 0.0            # 单条消息写出耗时的滑动平均（秒）
+        self.max_drain_time = 0.0
+        self.writer = asyncio.get_running_loop().create_task(self._run())
+
+    def put(self, message, waiter: Optional[asyncio.Future] = None) -> bool:
+        """
+        放入队列后立即返回
+
+        Returns:
+            False 表示连接已失效、已关闭或因本次入队积压超限被驱逐（waiter 随之以异常完成）
+        """
+        if self.error is not None or self.closing:
+            if waiter is not None:
+                waiter.set_exception(self.error or ConnectionError("发送队列已关闭"))
+            return False
+
+        size = len(message)
+        self.messages.append((message, size, waiter))
+        self.bytes += size
+        if self.bytes > self.max_bytes:
+            self.evict(f"发送积压 {self.bytes} 字节超过上限")
+            return False
+        if not self.congested and self.bytes > self.high_water:
+            self.congested = True
+            logger.warning(f"⚠️ 连接发送积压 {self.bytes} 字节，客户端接收变慢")
+        self.wakeup.set()
+        return True
+
+    async def send(self, message):
+        """
+        放入队列并等待写出；队列空闲时直接在调用方写出，省去一次任务切换
+
+        Raises:
+            SlowConsumerError: 连接被按慢消费者驱逐
+            其他异常: 连接写出失败（如 ConnectionClosed）
+        """
+        if self.writing or self.messages or self.error is not None or self.closing:
+            waiter = asyncio.get_running_loop().create_future()
+            self.put(message, waiter)
+            await waiter
+            return
+
+        self.messages.append((message, len(message), None))
+        self.bytes += len(message)
+        await self._write_head()
+        if self.messages:
+            self.wakeup.set()
+
+    async def _run(self):
+        """写任务：队列中有消息且没有正在写出的消息时按顺序写出"""
+        while True:
+            if not self.messages or self.writing:
+                if self.closing and not self.messages:
+                    return
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            try:
+                await self._write_head()
+            except Exception:
+                return
+
+    async def _write_head(self):
+        """写出队首消息并记录排空时间；超过发送超时未写出时驱逐，写出失败时整个队列失效并抛出异常"""
+        message, size, waiter = self.messages[0]
+        loop = asyncio.get_running_loop()
+        self.writing = True
+        started = self.write_started = loop.time()
+        if self.watchdog is None:
+            self.watchdog = loop.call_at(started + self.send_timeout, self._check_stalled)
+        try:
+            await self.connection.send(message)
+        except asyncio.CancelledError:
+            if self.error is None:
+                raise
+            raise self.error
+        except Exception as e:
+            self.fail(e)
+            raise self.error from e
+        finally:
+            self.writing = False
+        if self.error is not None:
+            # 写出期间队列已被驱逐（调用方直接写出时），本条消息已写出
+            return
+
+        elapsed = loop.time() - started
+        self.drain_time = elapsed if not self.sent else self.drain_time * 0.8 + elapsed * 0.2
+        self.max_drain_time = max(self.max_drain_time, elapsed)
+        self.sent += 1
+        self.messages.popleft()
+        self.bytes -= size
+        if self.congested and self.bytes <= self.high_water // 2:
+            self.congested = False
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _check_stalled(self):
+        """发送超时检查（每个队列一个定时器，写出期间按当前消息的开始时间重新定时，避免每条消息创建定时器）"""
+        self.watchdog = None
+        if not self.writing or self.error is not None:
+            return
+        deadline = self.write_started + self.send_timeout
+        loop = asyncio.get_running_loop()
+        if loop.time() >= deadline:
+            self.evict(f"消息 {self.send_timeout} 秒内未写出")
+        else:
+            self.watchdog = loop.call_at(deadline, self._check_stalled)
+
+    def fail(self, error: Exception):
+        """连接失效：队列中的消息以该异常失败，之后的入队直接失败"""
+        if self.error is not None:
+            return
+        self.error = error
+        if self.watchdog is not None:
+            self.watchdog.cancel()
+            self.watchdog = None
+        messages, self.messages = self.messages, deque()
+        self.bytes = 0
+        for _, _, waiter in messages:
+            if waiter is not None and not waiter.done():
+                waiter.set_exception(error)
+        if self.on_error is not None:
+            self.on_error(self, error)
+
+    def evict(self, reason: str):
+        """
+        按慢消费者驱逐：停止写任务，队列中的消息以 SlowConsumerError 失败；
+        调用方正在直接写出的消息在连接被断开后同样以 SlowConsumerError 失败
+        """
+        if self.error is not None:
+            return
+        if self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        self.fail(SlowConsumerError(reason))
+
+    def close(self):
+        """连接已关闭：已入队的消息写完（或写出失败）后写任务退出，不再接受新消息"""
+        self.closing = True
+        self.wakeup.set()
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取队列状态"""
+        return {
+            'queued': len(self.messages),
+            'queued_bytes': self.bytes,
+            'congested': self.congested,
+            'sent': self.sent,
+            'drain_ms': self.drain_time * 1000,
+            'max_drain_ms': self.max_drain_time * 1000
+        }
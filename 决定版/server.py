@@ -11,12 +11,17 @@ WebRTC语音助手服务端 - 模块化架构
 版本: 2.0.0
 """
 
+import os
 import asyncio
 import websockets
 import logging
 import time
 import uuid
 import json
+import wave
+import secrets
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, ParseResult
 from concurrent.futures import ThreadPoolExecutor
 
 # 导入自定义模块
@@ -24,7 +29,24 @@ from asr_module import ASRModule
 from llm_module import LLMModule
 from tts_module import TTSModule
 from audio_processor import AudioProcessor
-from config import ASR_PROCESSING_CONFIG
+from client_session import ClientSession, DetachedConnection
+from multiplex import MuxChannel, unpack_binary_frame, is_valid_session_id
+from memory_budget import MemoryBudget
+from echo_guard import BargeInDetector
+from audio_codec import negotiate_codec, decode_audio
+from audio_clock import unpack_audio_frame
+from resampler import negotiate_rate, create_uplink_resampler, convert_wav
+from dsp_pool import DSPPool, DSPPoolError
+from send_queue import SendQueue, SlowConsumerError
+from session_store import create_session_store
+from idle_reaper import IdleReaper
+from rtc_transport import RTCTransport, RTC_AVAILABLE
+from deadline import Deadline
+from intent_fast_path import IntentFastPath
+from config import (ASR_PROCESSING_CONFIG, SESSION_STORE_CONFIG, REAPER_CONFIG, AUDIO_CODEC_CONFIG, RTC_CONFIG,
+                    TURN_DEADLINE_CONFIG, INTENT_CONFIG, RESUME_CONFIG, MUX_CONFIG, MEMORY_CONFIG, AUDIO_CLOCK_CONFIG,
+                    ECHO_CONFIG, RESAMPLE_CONFIG, DSP_POOL_CONFIG, AUDIO_SAMPLE_RATE,
+                    SEND_QUEUE_CONFIG, WEBSOCKET_PING_INTERVAL, WEBSOCKET_PING_TIMEOUT)
 
 # 配置日志系统
 logging.basicConfig(
@@ -48,27 +70,87 @@ class WebRTCServer:
     - 提供实时语音交互服务
     """
     
-    def __init__(self, host='localhost', port=8765):
+    def __init__(self, host='localhost', port=8765, reuse_port=False):
         """
         初始化WebRTC服务器
         
         Args:
             host (str): 服务器监听地址，默认localhost
             port (int): 服务器监听端口，默认8765
+            reuse_port (bool): 是否启用SO_REUSEPORT，多进程模式下多个工作进程共享同一端口
         """
         self.host = host
         self.port = port
+        self.reuse_port = reuse_port
+        self.start_time = None
+        
+        # 会话存储（按客户端会话令牌保存对话历史）
+        self.session_store = create_session_store(SESSION_STORE_CONFIG)
         
         # 初始化核心功能模块
         self.asr_module = ASRModule()
-        self.llm_module = LLMModule()
+        self.llm_module = LLMModule(session_store=self.session_store)
         self.tts_module = TTSModule()
-        self.audio_processor = AudioProcessor(buffer_size=50)
         
-        # 客户端管理
-        self.clients = {}
+        # 本地快速意图（简单指令在ASR之后直接回复，不经过LLM；可通过 register() 注册自定义意图）
+        self.intent_fast_path = IntentFastPath(enabled=INTENT_CONFIG['ENABLED'])
+        
+        # 客户端管理：客户端ID -> ClientSession，与音频处理模块共用同一张表
+        self.clients: Dict[str, ClientSession] = {}
+        self.audio_processor = AudioProcessor(buffer_size=50, sessions=self.clients)
         self.executor = ThreadPoolExecutor(max_workers=20)
         
+        # 断线恢复：恢复令牌 -> 客户端ID（连接意外断开后，宽限期内凭令牌重连接回原会话）
+        self.resume_tokens: Dict[str, str] = {}
+        self.resume_stats = {
+            'detached': 0,
+            'resumed': 0,
+            'expired': 0,
+            'replayed_messages': 0,
+            'dropped_messages': 0
+        }
+        
+        # 每个连接的发送队列（网关多路复用连接上的会话共用该连接的队列）
+        self.send_queues: Dict[Any, SendQueue] = {}
+        self.send_stats = {
+            'broadcasts': 0,
+            'evicted': 0,            # 按慢消费者断开的连接数
+            'failed': 0              # 写出失败（连接已断开）的连接数
+        }
+        
+        # 会话内存核算：单会话软/硬上限，全部会话接近全局预算时拒绝新会话
+        self.memory_budget = MemoryBudget.from_config(self.llm_module, MEMORY_CONFIG, self.send_queues)
+        
+        # 回声感知的打断检测：保留本轮TTS音频作为参考信号，只有用户真的说话才打断
+        self.barge_in = BargeInDetector.from_config(ECHO_CONFIG, AUDIO_SAMPLE_RATE)
+        
+        # DSP进程池：上行音频的解码和重采样交给独立进程，不占用事件循环和线程池的GIL（启动服务器时创建进程）
+        self.dsp_pool = None
+        if DSP_POOL_CONFIG['ENABLED']:
+            self.dsp_pool = DSPPool.from_config(DSP_POOL_CONFIG, AUDIO_SAMPLE_RATE, RESAMPLE_CONFIG)
+        
+        # 网关多路复用连接统计
+        self.mux_stats = {
+            'connections': 0,
+            'sessions': 0,
+            'opened': 0,
+            'rejected': 0,
+            'dropped_frames': 0,
+            'paused': 0
+        }
+        
+        # 空闲会话回收（按TTL释放空闲客户端状态，清理半开连接）
+        self.reaper = IdleReaper(self) if REAPER_CONFIG['ENABLED'] else None
+        self.reaper_task = None
+        
+        # WebRTC媒体传输（可选，未安装aiortc时只使用WebSocket传输音频）
+        self.rtc_transport = None
+        if RTC_CONFIG['ENABLED']:
+            if RTC_AVAILABLE:
+                self.rtc_transport = RTCTransport(self.handle_rtc_audio)
+            else:
+                logger.warning("⚠️ 未安装aiortc，WebRTC媒体传输已禁用，音频通过WebSocket传输")
+        
         # WebSocket服务器实例
         self.websocket_server = None
         
@@ -77,8 +159,28 @@ class WebRTCServer:
         logger.info(f"🚀 正在启动WebRTC服务器 {self.host}:{self.port}")
         
         try:
+            # 多进程模式下由内核在共享同一端口的工作进程间分发连接
+            # 协议层心跳：对端无响应时由websockets关闭连接，及时发现半开连接
+            serve_kwargs = {
+                'ping_interval': WEBSOCKET_PING_INTERVAL,
+                'ping_timeout': WEBSOCKET_PING_TIMEOUT
+            }
+            if self.reuse_port:
+                serve_kwargs['reuse_port'] = True
+            
             # 创建WebSocket服务器并开始监听
-            self.websocket_server = await websockets.serve(self.handle_client, self.host, self.port)
+            self.websocket_server = await websockets.serve(self.handle_client, self.host, self.port, **serve_kwargs)
+            self.start_time = time.time()
+            
+            if self.reaper:
+                self.reaper_task = asyncio.create_task(self.reaper.run())
+            
+            if self.dsp_pool:
+                self.dsp_pool.start()
+            
+            if INTENT_CONFIG['ENABLED'] and INTENT_CONFIG['PRERENDER']:
+                asyncio.create_task(self.prerender_intent_replies())
+            
             logger.info(f"✅ WebRTC服务器启动成功！")
             logger.info(f"📍 监听地址: {self.host}:{self.port}")
             logger.info(f"💡 客户端可通过 webrtc_client.html 连接")
@@ -90,29 +192,28 @@ class WebRTCServer:
         except Exception as e:
             logger.error(f"❌ 服务器启动失败: {e}")
             raise
+        finally:
+            if self.dsp_pool:
+                self.dsp_pool.close()
     
     async def handle_client(self, websocket):
-        """处理新客户端连接"""
-        # 为每个客户端生成唯一ID
-        client_id = str(uuid.uuid4())
-        
-        # 记录客户端信息
-        self.clients[client_id] = {
-            'websocket': websocket, 
-            'id': client_id, 
-            'connected_at': time.time(),
-            'status': 'connected'
-        }
+        """处理新客户端连接（网关的多路复用连接按会话分发；携带有效恢复令牌时接回宽限期内断开的会话）"""
+        url = self.parse_request_url(websocket)
+        if MUX_CONFIG['ENABLED'] and url.path == MUX_CONFIG['PATH']:
+            await self.handle_mux_connection(websocket)
+            return
         
-        logger.info(f"🔌 新客户端连接: {client_id}")
+        resume_token = (parse_qs(url.query).get('resume') or [None])[0]
+        if resume_token not in self.resume_tokens and not self.memory_budget.admit(self.clients.values()):
+            # 1013: 服务器暂时过载，客户端稍后重试
+            await websocket.close(1013, 'memory budget exhausted')
+            return
+        
+        session, resumed = self.open_session(websocket, resume_token)
+        client_id = session.client_id
         
         try:
-            # 发送连接确认消息
-            await self.send_message(websocket, {
-                'type': 'connection_established', 
-                'client_id': client_id, 
-                'message': '连接成功，语音助手已就绪'
-            })
+            await self.establish_session(session, websocket, resumed)
             
             # 处理客户端消息流
             async for message in websocket:
@@ -123,12 +224,289 @@ class WebRTCServer:
         except Exception as e:
             logger.error(f"❌ 处理客户端 {client_id} 消息时出错: {e}")
         finally:
-            # 清理客户端资源
-            await self.cleanup_client(client_id)
+            # 意外断开时保留会话等待重连，否则清理客户端资源
+            await self.release_connection(session, websocket)
+            self.close_send_queue(websocket)
+    
+    @staticmethod
+    def parse_request_url(websocket) -> ParseResult:
+        """解析连接请求的URL（路径和查询参数）"""
+        try:
+            return urlparse(websocket.request.path)
+        except Exception:
+            return urlparse('/')
+    
+    def open_session(self, websocket, resume_token: Optional[str] = None) -> Tuple[ClientSession, bool]:
+        """为新连接创建客户端会话，恢复令牌有效时接回宽限期内断开的会话，返回 (会话, 是否恢复)"""
+        session = self.find_resumable_session(resume_token)
+        resumed = session is not None
+        
+        if session is None:
+            # 为每个客户端生成唯一ID
+            client_id = str(uuid.uuid4())
+            
+            # 记录客户端信息
+            session = ClientSession(client_id, websocket)
+            session.codec = AUDIO_CODEC_CONFIG['DEFAULT_CODEC']
+            self.clients[client_id] = session
+            
+            logger.info(f"🔌 新客户端连接: {client_id}")
+        else:
+            client_id = session.client_id
+            logger.info(f"🔁 客户端 {client_id} 在宽限期内重连，恢复原会话")
+        
+        # 每次连接轮换恢复令牌，旧令牌随即失效
+        if RESUME_CONFIG['ENABLED']:
+            session.resume_token = secrets.token_urlsafe(16)
+            self.resume_tokens[session.resume_token] = client_id
+        
+        return session, resumed
+    
+    async def establish_session(self, session: ClientSession, websocket, resumed: bool):
+        """发送连接确认消息，恢复的会话随后补发断线期间未送达的消息"""
+        client_id = session.client_id
+        await self.send_message(websocket, {
+            'type': 'connection_established', 
+            'client_id': client_id, 
+            'message': '连接成功，语音助手已就绪',
+            'codecs': AUDIO_CODEC_CONFIG['SUPPORTED_CODECS'],
+            'frame_header': AUDIO_CLOCK_CONFIG['ENABLED'],
+            'echo_guard': self.barge_in.enabled,
+            'rtc': self.rtc_transport is not None,
+            'resume_token': session.resume_token,
+            'resumed': resumed
+        })
+        
+        # 补发断线期间未送达的消息，之后的消息直接发往新连接
+        if resumed:
+            await self.reattach_client(session, websocket)
+    
+    def find_resumable_session(self, token: Optional[str]) -> Optional[ClientSession]:
+        """按恢复令牌找回宽限期内断开的会话"""
+        if not RESUME_CONFIG['ENABLED']:
+            return None
+        
+        client_id = self.resume_tokens.get(token) if isinstance(token, str) else None
+        session = self.clients.get(client_id) if client_id else None
+        if session is None or not session.detached:
+            return None
+        
+        del self.resume_tokens[token]
+        return session
+    
+    async def reattach_client(self, session: ClientSession, websocket):
+        """按顺序补发断线期间暂存的消息，再把会话切换到新连接"""
+        detached = session.websocket
+        replayed = 0
+        
+        # 补发完成前新产生的消息仍进入队列，保证顺序；发送成功后才出队，补发中再次断开不丢消息
+        while detached.outbox:
+            await self.deliver(websocket, detached.outbox[0])
+            detached.pop_sent()
+            replayed += 1
+        
+        session.websocket = websocket
+        session.detached_at = None
+        session.last_activity = time.time()
+        
+        self.resume_stats['resumed'] += 1
+        self.resume_stats['replayed_messages'] += replayed
+        self.resume_stats['dropped_messages'] += detached.dropped
+        if detached.dropped:
+            logger.warning(f"⚠️ 客户端 {session.client_id} 断线期间待发送队列已满，丢弃 {detached.dropped} 条最早的消息")
+        logger.info(f"✅ 客户端 {session.client_id} 会话已恢复，补发 {replayed} 条消息")
+    
+    def can_detach(self, session: ClientSession, websocket) -> bool:
+        """连接意外断开（不是客户端正常关闭）且会话仍属于该连接时，可以转入宽限期"""
+        return (RESUME_CONFIG['ENABLED'] 
+                and session.websocket is websocket 
+                and getattr(websocket, 'close_code', None) != 1000 
+                and self.clients.get(session.client_id) is session)
+    
+    async def release_connection(self, session: ClientSession, websocket):
+        """连接关闭：意外断开时会话转入宽限期，客户端正常关闭（1000）时清理全部资源"""
+        if session.detached and getattr(websocket, 'close_code', None) != 1000:
+            # 已经转入宽限期（发送失败时转入，或补发过程中再次断开），按原宽限期等待重连
+            return
+        
+        if self.can_detach(session, websocket):
+            await self.detach_client(session)
+        else:
+            await self.cleanup_client(session.client_id)
+    
+    async def detach_client(self, session: ClientSession):
+        """会话转入宽限期：音频缓冲、对话历史和进行中的ASR/LLM/TTS都保留，发给客户端的消息进入待发送队列"""
+        connection = DetachedConnection(RESUME_CONFIG['MAX_QUEUED_MESSAGES'], RESUME_CONFIG['MAX_QUEUED_BYTES'],
+                                        origin=session.websocket)
+        session.websocket = connection
+        session.detached_at = time.time()
+        self.resume_stats['detached'] += 1
+        logger.info(f"⏸️ 客户端 {session.client_id} 连接意外断开，会话保留 {RESUME_CONFIG['GRACE_PERIOD']} 秒等待重连")
+        
+        # WebRTC媒体连接随信令连接失效，重连后由客户端重新协商
+        if self.rtc_transport and session.transport == 'rtc':
+            session.transport = 'websocket'
+            await self.rtc_transport.close_peer(session.client_id)
+        
+        asyncio.create_task(self.expire_detached_session(session, connection))
+    
+    async def expire_detached_session(self, session: ClientSession, connection: DetachedConnection):
+        """宽限期结束仍未重连时清理会话"""
+        await asyncio.sleep(RESUME_CONFIG['GRACE_PERIOD'])
+        if session.websocket is not connection or self.clients.get(session.client_id) is not session:
+            return
+        
+        self.resume_stats['expired'] += 1
+        self.resume_stats['dropped_messages'] += len(connection.outbox) + connection.dropped
+        logger.info(f"⌛ 客户端 {session.client_id} 宽限期内未重连，清理会话")
+        await self.cleanup_client(session.client_id)
+    
+    async def handle_mux_connection(self, websocket):
+        """网关的多路复用连接：按帧中的会话ID把消息分发给各逻辑会话"""
+        channels: Dict[str, MuxChannel] = {}
+        self.mux_stats['connections'] += 1
+        logger.info("🔀 网关多路复用连接已建立")
+        
+        try:
+            async for frame in websocket:
+                await self.route_mux_frame(websocket, channels, frame)
+                
+        except websockets.exceptions.ConnectionClosed:
+            logger.info("🔀 网关多路复用连接已断开")
+        except Exception as e:
+            logger.error(f"❌ 处理多路复用连接时出错: {e}")
+        finally:
+            # 连接上的全部逻辑会话随之关闭（意外断开时各自转入宽限期，网关可凭恢复令牌重新打开）
+            self.mux_stats['connections'] -= 1
+            for channel in list(channels.values()):
+                await self.close_mux_session(channels, channel)
+            self.close_send_queue(websocket)
+    
+    async def route_mux_frame(self, websocket, channels: Dict[str, MuxChannel], frame):
+        """解析多路复用帧的会话ID，控制消息直接处理，其余放入该会话的输入队列"""
+        if isinstance(frame, bytes):
+            try:
+                session_id, message = unpack_binary_frame(frame)
+            except ValueError as e:
+                logger.warning(f"⚠️ 多路复用二进制帧格式错误: {e}")
+                return
+        else:
+            try:
+                data = json.loads(frame)
+            except json.JSONDecodeError:
+                logger.warning(f"⚠️ 收到无效的多路复用JSON帧: {frame[:100]}...")
+                return
+            session_id = data.get('session')
+            message_type = data.get('type')
+            
+            if message_type == 'session_open':
+                await self.open_mux_session(websocket, channels, session_id, data.get('resume_token'))
+                return
+            if message_type == 'session_close':
+                channel = channels.get(session_id)
+                if channel is not None:
+                    await self.close_mux_session(channels, channel, final=True)
+                return
+            message = frame
+        
+        channel = channels.get(session_id)
+        if channel is None:
+            logger.warning(f"⚠️ 多路复用帧的会话未打开: {session_id}")
+            return
+        
+        if channel.offer(message):
+            self.check_session_memory(channel.client_id)
+        else:
+            # 该会话处理跟不上：丢弃新帧并通知网关暂停转发，其他会话不受影响
+            self.mux_stats['dropped_frames'] += 1
+            if not channel.paused:
+                channel.paused = True
+                self.mux_stats['paused'] += 1
+                await self.send_message(channel, {'type': 'flow_control', 'paused': True, 'timestamp': time.time()})
+    
+    async def open_mux_session(self, websocket, channels: Dict[str, MuxChannel], session_id,
+                               resume_token: Optional[str] = None):
+        """在多路复用连接上打开逻辑会话（恢复令牌有效时接回宽限期内断开的会话）"""
+        if not is_valid_session_id(session_id) or session_id in channels:
+            logger.warning(f"⚠️ 多路复用会话ID无效或已打开: {session_id}")
+            return
+        
+        channel = MuxChannel(websocket, session_id, MUX_CONFIG['MAX_PENDING_FRAMES'])
+        if len(channels) >= MUX_CONFIG['MAX_SESSIONS']:
+            reason = '多路复用连接的会话数已达上限'
+        elif resume_token not in self.resume_tokens and not self.memory_budget.admit(self.clients.values()):
+            reason = '服务器内存繁忙，请稍后重试'
+        else:
+            reason = None
+        if reason:
+            self.mux_stats['rejected'] += 1
+            await self.send_message(channel, {
+                'type': 'error', 
+                'message': reason, 
+                'timestamp': time.time()
+            })
+            return
+        
+        session, resumed = self.open_session(channel, resume_token)
+        channel.client_id = session.client_id
+        channels[session_id] = channel
+        channel.worker = asyncio.create_task(self.run_mux_session(channel))
+        
+        self.mux_stats['sessions'] += 1
+        self.mux_stats['opened'] += 1
+        await self.establish_session(session, channel, resumed)
+    
+    async def run_mux_session(self, channel: MuxChannel):
+        """按顺序处理逻辑会话的输入帧（每个会话一个任务，互不阻塞）"""
+        while True:
+            message = await channel.inbox.get()
+            if message is None:
+                break
+            await self.process_message(channel.client_id, message)
+            
+            if channel.should_resume():
+                channel.paused = False
+                await self.send_message(channel, {'type': 'flow_control', 'paused': False, 'timestamp': time.time()})
+    
+    async def close_mux_session(self, channels: Dict[str, MuxChannel], channel: MuxChannel, final: bool = False):
+        """关闭逻辑会话：网关发送 session_close 时清理全部资源，连接意外断开时转入宽限期"""
+        if channels.pop(channel.session_id, None) is None:
+            return
+        
+        channel.close()
+        self.mux_stats['sessions'] -= 1
+        
+        session = self.clients.get(channel.client_id)
+        if session is None:
+            return
+        if final:
+            await self.cleanup_client(channel.client_id)
+        else:
+            await self.release_connection(session, channel)
+    
+    def check_session_memory(self, client_id: str):
+        """核算会话内存并按上限释放；超过硬上限（音频缓冲区已清空）时通知客户端"""
+        session = self.clients.get(client_id)
+        if session is None:
+            return
+        if self.memory_budget.enforce(session) == 'hard':
+            asyncio.create_task(self.send_error_message(client_id, "会话内存超过上限，已丢弃缓冲的语音，请重新说话"))
+    
+    def find_session_by_connection(self, websocket) -> Optional[ClientSession]:
+        """查找使用该连接的会话"""
+        for session in self.clients.values():
+            if session.websocket is websocket:
+                return session
+        return None
     
     async def process_message(self, client_id: str, message):
         """处理客户端发送的消息"""
         try:
+            # 记录最近活动时间，供空闲回收判断
+            session = self.clients.get(client_id)
+            if session is not None:
+                session.last_activity = time.time()
+            
             # 根据消息类型进行不同处理
             if isinstance(message, bytes):
                 # 二进制音频数据，直接处理
@@ -148,23 +526,122 @@ class WebRTCServer:
         try:
             logger.debug(f"🎵 收到二进制音频数据: {len(audio_data)} 字节")
             
+            # 协商了帧头时先取出序号和采集时间戳，再按协商的编码解码为16位PCM
+            wire_bytes = len(audio_data)
+            session = self.clients.get(client_id)
+            seq = capture_ms = None
+            if session is not None and session.frame_header:
+                seq, capture_ms, audio_data = unpack_audio_frame(audio_data)
+            if session is not None:
+                audio_data = await self.decode_uplink(session, audio_data)
+            
             # 将音频数据添加到处理缓冲区
-            if self.audio_processor.add_audio_data(client_id, audio_data):
-                # 取消之前的ASR任务（如果存在）
-                if client_id in self.audio_processor.asr_tasks and self.audio_processor.asr_tasks[client_id] is not None:
-                    try:
-                        self.audio_processor.asr_tasks[client_id].cancel()
-                    except Exception as e:
-                        logger.warning(f"⚠️ 取消ASR任务失败: {e}")
-                
-                # 创建新的延迟ASR处理任务
-                self.audio_processor.asr_tasks[client_id] = asyncio.create_task(
-                    self.delayed_asr_processing(client_id)
-                )
+            self.ingest_audio(client_id, audio_data, wire_bytes, seq, capture_ms)
                 
         except Exception as e:
             logger.error(f"❌ 处理二进制音频数据失败: {e}")
     
+    async def decode_uplink(self, session: ClientSession, audio_data: bytes) -> bytes:
+        """
+        按协商的编码解码上行帧、按声明的采集格式转换为16kHz单声道；
+        DSP进程池可用时交给会话所在的工作进程，否则在事件循环中处理
+        """
+        if session.codec == 'pcm16' and session.resampler is None:
+            return audio_data
+        
+        if self.dsp_pool is not None and self.dsp_pool.running and not session.dsp_local:
+            resampler = session.resampler
+            try:
+                audio_data = await self.dsp_pool.process_uplink(
+                    session.client_id, audio_data, session.codec,
+                    resampler.in_rate if resampler else AUDIO_SAMPLE_RATE,
+                    resampler.channels if resampler else 1
+                )
+                return audio_data
+            except DSPPoolError as e:
+                # 本进程的重采样器没有处理过之前的帧，换成新实例；此后该会话不再交给进程池，避免跨帧状态来回切换
+                logger.warning(f"⚠️ DSP进程池处理失败，客户端 {session.client_id} 改在本进程处理: {e}")
+                self.dsp_pool.release_session(session.client_id)
+                session.dsp_local = True
+                if resampler is not None:
+                    session.resampler = create_uplink_resampler(resampler.in_rate, resampler.channels,
+                                                                RESAMPLE_CONFIG, AUDIO_SAMPLE_RATE)
+        
+        if session.codec != 'pcm16':
+            audio_data = decode_audio(session.codec, audio_data)
+        if session.resampler is not None:
+            audio_data = session.resampler.process(audio_data)
+        return audio_data
+    
+    def handle_rtc_audio(self, client_id: str, audio_data: bytes):
+        """处理WebRTC上行音频（已解码为16kHz PCM的有声块），与WebSocket音频进入同一处理流程"""
+        session = self.clients.get(client_id)
+        if session is None:
+            return
+        session.last_activity = time.time()
+        
+        self.ingest_audio(client_id, audio_data)
+    
+    def ingest_audio(self, client_id: str, audio_data: bytes, wire_bytes: Optional[int] = None,
+                     seq: Optional[int] = None, capture_ms: Optional[int] = None):
+        """
+        已解码的上行音频进入处理流程：记入音频时钟，TTS播放期间先经过回声检测，
+        然后加入缓冲区并重新开始延迟等待
+        """
+        session = self.clients.get(client_id)
+        if session is None or not audio_data:
+            return
+        now = time.time()
+        
+        # 帧带时间戳时记入音频时钟，迟到或重复的帧不再加入缓冲区
+        if seq is not None and capture_ms is not None:
+            if not self.audio_processor.observe_frame(session, audio_data, seq, capture_ms, now):
+                logger.debug(f"⏮️ 客户端 {client_id} 丢弃迟到的音频帧: 序号 {seq}")
+                return
+        
+        # TTS播放期间：回声丢弃并否决客户端声明的打断，用户说话时确认打断
+        chunks = [(audio_data, wire_bytes)]
+        verdict = self.barge_in.check(session, audio_data, now, wire_bytes)
+        if verdict == 'pending':
+            return
+        if verdict == 'echo':
+            if self.barge_in.reject_hint(session):
+                asyncio.create_task(self.send_message(session.websocket, {
+                    'type': 'interruption_rejected', 
+                    'message': '检测到的是TTS回声，继续播放', 
+                    'timestamp': now
+                }))
+            return
+        if verdict == 'speech':
+            chunks = self.barge_in.take_held(session)
+            self.interrupt_playback(client_id)
+            asyncio.create_task(self.confirm_interruption(client_id))
+        
+        added = False
+        for chunk, chunk_wire_bytes in chunks:
+            added = self.audio_processor.add_audio_data(client_id, chunk, chunk_wire_bytes) or added
+        if added:
+            self.check_session_memory(client_id)
+            # 取消之前的ASR任务并重新开始延迟等待
+            self.schedule_delayed_asr(client_id)
+    
+    def schedule_delayed_asr(self, client_id: str):
+        """取消客户端之前的ASR任务（如果存在），创建新的延迟ASR处理任务；长语音先切出已完成的段提前识别"""
+        session = self.clients.get(client_id)
+        if session is None:
+            return
+        
+        segment = self.audio_processor.pop_segment(
+            client_id, 
+            ASR_PROCESSING_CONFIG['MAX_WAIT_TIME'], 
+            ASR_PROCESSING_CONFIG['SEGMENT_SEARCH_WINDOW']
+        )
+        if segment:
+            session.add_asr_segment(self.start_asr_segment(client_id, segment))
+        
+        session.cancel_asr_task()
+        session.asr_task = asyncio.create_task(self.delayed_asr_processing(client_id))
+    
     async def handle_text_message(self, client_id: str, message_text: str):
         """处理文本消息"""
         try:
@@ -177,16 +654,31 @@ class WebRTCServer:
             # 根据消息类型分发处理
             if message_type == 'audio_data':
                 # 处理base64编码的音频数据
-                await self.handle_base64_audio_data(client_id, parsed_message.get('audio', ''))
+                await self.handle_base64_audio_data(client_id, parsed_message.get('audio', ''),
+                                                    parsed_message.get('seq'), parsed_message.get('capture_ms'))
             elif message_type == 'text':
                 # 处理纯文本输入
                 await self.handle_text_input(client_id, parsed_message)
             elif message_type == 'interrupt_tts':
                 # 处理TTS打断请求
                 await self.handle_tts_interruption(client_id, parsed_message)
+            elif message_type == 'codec_select':
+                # 协商上行音频编码
+                await self.handle_codec_select(client_id, parsed_message)
+            elif message_type == 'rtc_offer':
+                # WebRTC信令：建立媒体连接
+                await self.handle_rtc_offer(client_id, parsed_message)
+            elif message_type == 'rtc_close':
+                # 客户端停止录音，关闭媒体连接
+                if self.rtc_transport:
+                    await self.rtc_transport.close_peer(client_id)
+                    self.clients[client_id].transport = 'websocket'
+            elif message_type == 'session_init':
+                # 绑定会话令牌，恢复对话历史
+                await self.handle_session_init(client_id, parsed_message)
             elif message_type == 'ping':
                 # 处理心跳检测
-                await self.send_message(self.clients[client_id]['websocket'], {
+                await self.send_message(self.clients[client_id].websocket, {
                     'type': 'pong', 
                     'timestamp': time.time()
                 })
@@ -198,44 +690,152 @@ class WebRTCServer:
         except Exception as e:
             logger.error(f"❌ 处理文本消息失败: {e}")
     
-    async def handle_base64_audio_data(self, client_id: str, audio_data: str):
-        """处理base64编码的音频数据"""
+    async def handle_base64_audio_data(self, client_id: str, audio_data: str,
+                                       seq: Optional[int] = None, capture_ms: Optional[int] = None):
+        """处理base64编码的音频数据（可选带序号和采集时间戳字段）"""
         try:
             import base64
             audio_bytes = base64.b64decode(audio_data)
             logger.debug(f"🎵 收到base64编码音频数据: {len(audio_bytes)} 字节")
             
+            wire_bytes = len(audio_bytes)
+            session = self.clients.get(client_id)
+            if session is not None:
+                audio_bytes = await self.decode_uplink(session, audio_bytes)
+            
             # 将解码后的音频数据添加到处理缓冲区
-            if self.audio_processor.add_audio_data(client_id, audio_bytes):
-                # 取消之前的ASR任务
-                if client_id in self.audio_processor.asr_tasks and self.audio_processor.asr_tasks[client_id] is not None:
-                    try:
-                        self.audio_processor.asr_tasks[client_id].cancel()
-                    except Exception as e:
-                        logger.warning(f"⚠️ 取消ASR任务失败: {e}")
-                
-                # 创建新的延迟ASR处理任务
-                self.audio_processor.asr_tasks[client_id] = asyncio.create_task(
-                    self.delayed_asr_processing(client_id)
-                )
+            self.ingest_audio(client_id, audio_bytes, wire_bytes, seq, capture_ms)
                 
         except Exception as e:
             logger.error(f"❌ 处理base64音频数据失败: {e}")
     
+    async def handle_codec_select(self, client_id: str, message_data: dict):
+        """处理上行音频编码和格式协商，之后收到的音频帧按选定的编码解码、按声明的采集格式重采样"""
+        try:
+            codec = negotiate_codec(
+                message_data.get('codec'),
+                AUDIO_CODEC_CONFIG['SUPPORTED_CODECS'],
+                AUDIO_CODEC_CONFIG['DEFAULT_CODEC']
+            )
+            session = self.clients[client_id]
+            session.codec = codec
+            # 客户端声明之后的二进制音频帧带序号和采集时间戳帧头
+            session.frame_header = AUDIO_CLOCK_CONFIG['ENABLED'] and bool(message_data.get('frame_header'))
+            
+            # 采集格式不是16kHz单声道时逐帧下混、重采样；客户端声明播放采样率时TTS音频按其转换
+            sample_rate = negotiate_rate(message_data.get('sample_rate'), RESAMPLE_CONFIG['SUPPORTED_RATES'], AUDIO_SAMPLE_RATE)
+            channels = message_data.get('channels', 1)
+            if channels not in range(1, RESAMPLE_CONFIG['MAX_CHANNELS'] + 1):
+                logger.warning(f"⚠️ 不支持的声道数: {channels}，按单声道处理")
+                channels = 1
+            session.resampler = create_uplink_resampler(sample_rate, channels, RESAMPLE_CONFIG, AUDIO_SAMPLE_RATE)
+            playback_rate = message_data.get('playback_rate')
+            session.playback_rate = playback_rate if playback_rate in RESAMPLE_CONFIG['SUPPORTED_RATES'] else None
+            
+            await self.send_message(session.websocket, {
+                'type': 'codec_selected',
+                'codec': codec,
+                'frame_header': session.frame_header,
+                'sample_rate': sample_rate,
+                'channels': channels,
+                'playback_rate': session.playback_rate,
+                'timestamp': time.time()
+            })
+            logger.info(f"🎚️ 客户端 {client_id} 上行音频编码: {codec}, {sample_rate}Hz/{channels}声道"
+                        f"{'（带帧时间戳）' if session.frame_header else ''}")
+            
+        except Exception as e:
+            logger.error(f"❌ 音频编码协商失败: {e}")
+    
+    async def handle_rtc_offer(self, client_id: str, message_data: dict):
+        """处理WebRTC信令：根据客户端的SDP offer建立对等连接并回复answer"""
+        try:
+            if self.rtc_transport is None:
+                await self.send_error_message(client_id, "服务端未启用WebRTC媒体传输，请使用WebSocket传输音频")
+                return
+            
+            answer = await self.rtc_transport.handle_offer(
+                client_id, 
+                message_data['sdp'], 
+                message_data.get('sdp_type', 'offer')
+            )
+            self.clients[client_id].transport = 'rtc'
+            
+            await self.send_message(self.clients[client_id].websocket, {
+                'type': 'rtc_answer', 
+                'sdp': answer['sdp'], 
+                'sdp_type': answer['type'], 
+                'timestamp': time.time()
+            })
+            logger.info(f"📡 客户端 {client_id} WebRTC协商完成")
+            
+        except Exception as e:
+            logger.error(f"❌ WebRTC协商失败: {e}")
+            await self.send_error_message(client_id, f"WebRTC协商失败: {str(e)}")
+    
+    async def handle_session_init(self, client_id: str, message_data: dict):
+        """处理会话初始化：绑定客户端提供的会话令牌，未提供或无效时分配新令牌"""
+        try:
+            session_token = message_data.get('session_token')
+            if not self._is_valid_session_token(session_token):
+                if session_token:
+                    logger.warning(f"⚠️ 客户端 {client_id} 提供的会话令牌无效，已分配新令牌")
+                session_token = uuid.uuid4().hex
+            
+            # 断线恢复的会话已绑定同一令牌，对话历史仍在内存中，不再从会话存储重新读取
+            if self.clients[client_id].session_token == session_token:
+                await self.send_message(self.clients[client_id].websocket, {
+                    'type': 'session_ready', 
+                    'session_token': session_token, 
+                    'restored_messages': 0, 
+                    'timestamp': time.time()
+                })
+                return
+            
+            # 读取会话存储可能涉及磁盘IO，放到线程池中执行
+            loop = asyncio.get_event_loop()
+            restored = await loop.run_in_executor(
+                self.executor, 
+                self.llm_module.bind_session, 
+                client_id, 
+                session_token
+            )
+            
+            self.clients[client_id].session_token = session_token
+            await self.send_message(self.clients[client_id].websocket, {
+                'type': 'session_ready', 
+                'session_token': session_token, 
+                'restored_messages': restored, 
+                'timestamp': time.time()
+            })
+            
+        except Exception as e:
+            logger.error(f"❌ 处理会话初始化失败: {e}")
+    
+    @staticmethod
+    def _is_valid_session_token(session_token) -> bool:
+        """检查会话令牌格式：8-128位字母、数字、连字符或下划线"""
+        if not isinstance(session_token, str) or not (8 <= len(session_token) <= 128):
+            return False
+        return all(c.isascii() and (c.isalnum() or c in '-_') for c in session_token)
+    
     async def handle_text_input(self, client_id: str, message_data: dict):
         """处理纯文本输入"""
         text = message_data.get('text', '')
         if text:
             logger.info(f"📝 收到文本输入: {text}")
-            await self.process_llm_conversation(client_id, text)
+            if not await self.try_intent_fast_path(client_id, text):
+                await self.process_llm_conversation(client_id, text)
     
     async def delayed_asr_processing(self, client_id: str):
         """延迟ASR处理，等待语音真正结束"""
         try:
-            # 等待1秒，让语音输入完成
-            await asyncio.sleep(ASR_PROCESSING_CONFIG['DELAYED_PROCESSING_WAIT'])
+            # 等待语音输入完成：帧带时间戳时按音频时钟只等剩余的静音时长，否则按固定时间等待
+            wait = self.audio_processor.time_until_silent(client_id, ASR_PROCESSING_CONFIG['SILENCE_WAIT_TIME'])
+            await asyncio.sleep(ASR_PROCESSING_CONFIG['DELAYED_PROCESSING_WAIT'] if wait is None else wait)
             
-            if client_id in self.audio_processor.last_audio_time:
+            session = self.clients.get(client_id)
+            if session is not None and session.audio_buffer is not None:
                 # 检查是否已经静音足够长时间
                 if self.audio_processor.is_silent(client_id, silence_threshold=ASR_PROCESSING_CONFIG['SILENCE_WAIT_TIME']):
                     # 检查是否有足够的音频数据进行处理
@@ -248,12 +848,16 @@ class WebRTCServer:
                         if buffer_size > 0:
                             logger.info(f"🎤 音频数据较少({buffer_size}块)，但仍尝试ASR处理")
                             await self.process_audio_for_asr(client_id)
+                        elif session.asr_segments:
+                            # 切分点恰好在语音末尾，只需汇总已送识别的段
+                            await self.process_audio_for_asr(client_id)
                         else:
                             logger.info(f"⏳ 音频数据不足，继续等待...")
                             # 继续等待，创建新的延迟任务
-                            self.audio_processor.asr_tasks[client_id] = asyncio.create_task(
-                                self.delayed_asr_processing(client_id)
-                            )
+                            session.asr_task = asyncio.create_task(self.delayed_asr_processing(client_id))
+                else:
+                    # 按音频时钟尚未静音（延迟的帧可能仍在网络中），继续等待
+                    session.asr_task = asyncio.create_task(self.delayed_asr_processing(client_id))
                         
         except asyncio.CancelledError:
             # 任务被取消，这是正常情况
@@ -266,91 +870,241 @@ class WebRTCServer:
         try:
             logger.info(f"🎯 开始ASR语音识别")
             
-            # 获取音频缓冲区中的数据
+            # 语音结束，本轮对话的延迟预算从此刻开始计算
+            deadline = self.new_turn_deadline()
+            
+            # 说话过程中已提前送识别的段，加上缓冲区中剩余的最后一段
+            session = self.clients.get(client_id)
+            segments = session.take_asr_segments() if session is not None else []
             audio_data = self.audio_processor.get_audio_data(client_id)
-            if not audio_data:
+            if audio_data:
+                segments.append(self.start_asr_segment(client_id, audio_data, deadline))
+            
+            if not segments:
                 logger.warning("⚠️ 音频缓冲区为空，无法进行ASR处理")
                 return
             
-            # 在线程池中执行ASR识别（避免阻塞主线程）
-            loop = asyncio.get_event_loop()
-            asr_result = await loop.run_in_executor(
-                self.executor, 
-                self.asr_module.recognize_speech, 
-                audio_data
-            )
+            # 各段并发识别，按顺序拼接结果；此时前面的段通常已经完成
+            try:
+                results = await self.await_within_deadline(asyncio.gather(*segments), deadline)
+            except asyncio.TimeoutError:
+                logger.warning("⏱️ ASR超出本轮预算")
+                results = []
+            asr_result = ''.join(text for text in results if text)
+            if len(segments) > 1:
+                logger.info(f"🧩 长语音分 {len(segments)} 段识别，结果已拼接")
             
             if asr_result:
                 # ASR识别成功，发送结果给客户端
-                await self.send_message(self.clients[client_id]['websocket'], {
+                await self.send_message(self.clients[client_id].websocket, {
                     'type': 'asr_result', 
                     'text': asr_result, 
                     'timestamp': time.time()
                 })
                 
-                # 继续处理LLM对话
-                await self.process_llm_conversation(client_id, asr_result)
+                # 简单指令在本地直接回复，其余继续处理LLM对话
+                if not await self.try_intent_fast_path(client_id, asr_result):
+                    await self.process_llm_conversation(client_id, asr_result, deadline)
             else:
-                # ASR识别失败，发送错误消息
-                await self.send_message(self.clients[client_id]['websocket'], {
+                # ASR识别失败（或熔断中）立即发送错误消息，不调用LLM
+                retry_in = self.asr_module.breaker.retry_in()
+                await self.send_message(self.clients[client_id].websocket, {
                     'type': 'asr_error', 
-                    'message': '语音识别失败，请重试', 
+                    'message': '语音识别服务暂时不可用，请稍后再试' if retry_in is not None else '语音识别失败，请重试', 
+                    'retry_in': retry_in,
                     'timestamp': time.time()
                 })
                 
         except Exception as e:
             logger.error(f"❌ ASR处理失败: {e}")
     
-    async def process_llm_conversation(self, client_id: str, recognized_text: str):
-        """处理LLM对话"""
+    def start_asr_segment(self, client_id: str, audio_data: bytes, deadline: Deadline = None) -> asyncio.Future:
+        """裁剪静音后在线程池中识别一段音频（避免阻塞主线程），返回识别结果的Future"""
+        # 裁掉首尾静音、压缩过长停顿，减少上传数据量
+        audio_data = self.audio_processor.trim_silence(client_id, audio_data)
+        
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor, self.asr_module.recognize_speech, audio_data, deadline)
+    
+    @staticmethod
+    def new_turn_deadline() -> Deadline:
+        """创建本轮对话的截止时间（未启用延迟预算时返回None，各阶段使用固定超时）"""
+        if not TURN_DEADLINE_CONFIG['ENABLED']:
+            return None
+        return Deadline(TURN_DEADLINE_CONFIG['BUDGET'], TURN_DEADLINE_CONFIG['MIN_REQUEST_TIMEOUT'])
+    
+    @staticmethod
+    async def await_within_deadline(future, deadline: Deadline):
+        """
+        等待线程池任务，最多等到本轮截止时间（至少等待请求超时下限，让预算将尽时的降级路径有机会返回）；
+        超时抛出 asyncio.TimeoutError，线程中的请求无法中断，结果被丢弃
+        """
+        if deadline is None:
+            return await future
+        return await asyncio.wait_for(future, timeout=max(deadline.remaining(), deadline.min_timeout))
+    
+    async def try_intent_fast_path(self, client_id: str, text: str) -> bool:
+        """本地快速意图：命中时直接回复（固定回复使用预合成语音）并返回True，未命中时返回False"""
+        try:
+            started = time.monotonic()
+            session = self.clients.get(client_id)
+            if session is None:
+                return False
+            
+            result = self.intent_fast_path.match(text, {'last_reply': session.last_reply})
+            if result is None:
+                return False
+            
+            if result.command:
+                # 停止播放时释放回声参考信号，并丢弃WebRTC下行轨道中尚未播放的音频
+                if result.command['action'] == 'stop':
+                    self.barge_in.stop_playback(session)
+                    if self.rtc_transport:
+                        self.rtc_transport.interrupt(client_id)
+                await self.send_message(session.websocket, {
+                    'type': 'intent_command', 
+                    **result.command, 
+                    'timestamp': time.time()
+                })
+            
+            audio_data = None
+            if result.reply:
+                session.last_reply = result.reply
+                await self.send_message(session.websocket, {
+                    'type': 'llm_response', 
+                    'text': result.reply, 
+                    'intent': result.intent, 
+                    'timestamp': time.time()
+                })
+                audio_data = self.intent_fast_path.prerendered.get(result.reply)
+                if audio_data:
+                    await self.deliver_tts_audio(client_id, result.reply, audio_data)
+            
+            self.intent_fast_path.record_hit(result.intent, time.monotonic() - started)
+            
+            if result.reply and audio_data is None:
+                # 动态回复（时间、日期、复述）没有预合成语音，文本已发出，语音随后合成
+                await self.generate_tts_audio(client_id, result.reply)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ 本地快速意图处理失败: {e}")
+            return False
+    
+    async def prerender_intent_replies(self):
+        """在后台预合成快速意图固定回复的语音"""
+        loop = asyncio.get_event_loop()
+        for reply in self.intent_fast_path.static_replies:
+            audio_data = await loop.run_in_executor(self.executor, self.tts_module.prerender_speech, reply)
+            if audio_data:
+                self.intent_fast_path.prerendered[reply] = audio_data
+        
+        logger.info(f"⚡ 快速意图固定回复预合成完成: {len(self.intent_fast_path.prerendered)}/"
+                    f"{len(self.intent_fast_path.static_replies)} 条")
+    
+    async def process_llm_conversation(self, client_id: str, recognized_text: str, deadline: Deadline = None):
+        """处理LLM对话（文本输入没有ASR阶段，从此刻开始计算本轮预算）"""
         try:
             logger.info(f"🤖 处理LLM对话: {recognized_text}")
             
+            if deadline is None:
+                deadline = self.new_turn_deadline()
+            
             # 在线程池中执行LLM请求
             loop = asyncio.get_event_loop()
-            llm_response = await loop.run_in_executor(
-                self.executor, 
-                self.llm_module.ask_question, 
-                recognized_text, 
-                client_id
-            )
+            try:
+                llm_response = await self.await_within_deadline(loop.run_in_executor(
+                    self.executor, 
+                    self.llm_module.ask_question, 
+                    recognized_text, 
+                    client_id, 
+                    deadline
+                ), deadline)
+            except asyncio.TimeoutError:
+                logger.warning("⏱️ LLM超出本轮预算")
+                llm_response = "抱歉，服务响应超时，请稍后重试。"
             
             if llm_response:
+                session = self.clients.get(client_id)
+                if session is not None:
+                    session.last_reply = llm_response
+                
                 # 发送LLM回复给客户端
-                await self.send_message(self.clients[client_id]['websocket'], {
+                await self.send_message(self.clients[client_id].websocket, {
                     'type': 'llm_response', 
                     'text': llm_response, 
                     'timestamp': time.time()
                 })
                 
+                # 对话历史增长后核算会话内存
+                self.check_session_memory(client_id)
+                
                 # 生成TTS音频
-                await self.generate_tts_audio(client_id, llm_response)
+                await self.generate_tts_audio(client_id, llm_response, deadline)
             else:
                 logger.warning("⚠️ LLM未返回有效回复")
                 
         except Exception as e:
             logger.error(f"❌ LLM处理失败: {e}")
     
-    async def generate_tts_audio(self, client_id: str, text: str):
-        """生成TTS音频"""
+    async def generate_tts_audio(self, client_id: str, text: str, deadline: Deadline = None):
+        """生成TTS音频（超出本轮预算时只返回文本）"""
         try:
             logger.info(f"🔊 开始生成TTS音频: {text}")
             
             # 在线程池中执行TTS合成
             loop = asyncio.get_event_loop()
-            audio_data = await loop.run_in_executor(
-                self.executor, 
-                self.tts_module.synthesize_speech, 
-                text
-            )
+            try:
+                audio_data = await self.await_within_deadline(loop.run_in_executor(
+                    self.executor, 
+                    self.tts_module.synthesize_speech, 
+                    text, 
+                    deadline
+                ), deadline)
+            except asyncio.TimeoutError:
+                logger.warning("⏱️ TTS超出本轮预算，只返回文本")
+                audio_data = None
+            
+            if deadline is not None:
+                logger.info(f"⏱️ 本轮耗时 {deadline.elapsed():.2f} 秒（预算 {deadline.budget:.1f} 秒）")
             
             if audio_data:
-                # 将音频数据编码为base64
+                await self.deliver_tts_audio(client_id, text, audio_data)
+            else:
+                logger.warning("⚠️ TTS模块未返回有效音频数据")
+                
+        except Exception as e:
+            logger.error(f"❌ TTS生成失败: {e}")
+    
+    async def deliver_tts_audio(self, client_id: str, text: str, audio_data: bytes):
+        """把TTS音频发给客户端（已建立WebRTC连接时通过下行音频轨道播放）"""
+        try:
+            if self.rtc_transport and self.rtc_transport.is_connected(client_id):
+                # 通过WebRTC下行音频轨道播放，WebSocket只发送文本和时长
+                duration = await self.rtc_transport.play_audio(client_id, audio_data)
+                await self.send_message(self.clients[client_id].websocket, {
+                    'type': 'tts_audio', 
+                    'transport': 'rtc', 
+                    'duration': duration, 
+                    'text': text, 
+                    'timestamp': time.time()
+                })
+                
+                logger.info(f"✅ TTS音频已通过WebRTC发送: {duration:.2f} 秒")
+            else:
+                # 客户端声明了播放采样率时先转换，再将音频数据编码为base64
                 import base64
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+                playback_audio = audio_data
+                session = self.clients.get(client_id)
+                if session is not None and session.playback_rate:
+                    try:
+                        playback_audio = convert_wav(audio_data, session.playback_rate)
+                    except (wave.Error, EOFError):
+                        logger.debug("📝 TTS音频不是16位wav，原样下发")
+                audio_base64 = base64.b64encode(playback_audio).decode('utf-8')
                 
                 # 发送TTS音频给客户端
-                await self.send_message(self.clients[client_id]['websocket'], {
+                await self.send_message(self.clients[client_id].websocket, {
                     'type': 'tts_audio', 
                     'audio': audio_base64, 
                     'text': text, 
@@ -358,51 +1112,174 @@ class WebRTCServer:
                 })
                 
                 logger.info(f"✅ TTS音频生成完成: {len(audio_data)} 字节")
-            else:
-                logger.warning("⚠️ TTS模块未返回有效音频数据")
+            
+            # 记录本轮TTS音频，播放期间据此区分回声和用户说话
+            session = self.clients.get(client_id)
+            if session is not None:
+                self.barge_in.start_playback(session, audio_data, time.time())
                 
         except Exception as e:
-            logger.error(f"❌ TTS生成失败: {e}")
+            logger.error(f"❌ TTS音频发送失败: {e}")
     
     async def handle_tts_interruption(self, client_id: str, message_data: dict):
-        """处理TTS打断请求"""
+        """处理TTS打断请求（客户端按音量判断，播放期间由回声检测确认后才生效）"""
         try:
             logger.info(f"🛑 收到客户端 {client_id} 的TTS打断请求")
             
-            # 清理音频缓冲区，准备处理新的语音输入
-            self.audio_processor.clear_buffer(client_id)
-            
-            # 取消正在进行的ASR任务
-            if client_id in self.audio_processor.asr_tasks and self.audio_processor.asr_tasks[client_id] is not None:
-                try:
-                    self.audio_processor.asr_tasks[client_id].cancel()
-                except Exception as e:
-                    logger.warning(f"⚠️ 取消ASR任务失败: {e}")
-            
-            # 发送打断确认消息给客户端
-            await self.send_message(self.clients[client_id]['websocket'], {
-                'type': 'interruption_confirmed', 
-                'message': 'TTS播放已停止，准备处理新的语音输入', 
-                'timestamp': time.time()
-            })
+            session = self.clients.get(client_id)
+            if session is not None and self.barge_in.hint(session, time.time()):
+                logger.info(f"👂 客户端 {client_id} 正在播放TTS，等待上行音频确认打断")
+                return
             
-            logger.info(f"✅ 客户端 {client_id} 的TTS打断处理完成")
+            self.interrupt_playback(client_id)
+            await self.confirm_interruption(client_id)
             
         except Exception as e:
             logger.error(f"❌ 处理TTS打断失败: {e}")
     
-    async def send_message(self, websocket, message_data: dict):
-        """发送消息给客户端"""
+    def interrupt_playback(self, client_id: str):
+        """停止本轮TTS播放：清空音频缓冲区、取消ASR任务、丢弃尚未播放的TTS音频"""
+        # 清理音频缓冲区，准备处理新的语音输入
+        self.audio_processor.clear_buffer(client_id)
+        
+        # 取消正在进行的ASR任务
+        session = self.clients.get(client_id)
+        if session is not None:
+            session.cancel_asr_task()
+            session.cancel_asr_segments()
+            self.barge_in.stop_playback(session)
+        
+        # 丢弃WebRTC下行轨道中尚未播放的TTS音频
+        if self.rtc_transport:
+            self.rtc_transport.interrupt(client_id)
+    
+    async def confirm_interruption(self, client_id: str):
+        """发送打断确认消息给客户端"""
+        session = self.clients.get(client_id)
+        if session is None:
+            return
+        await self.send_message(session.websocket, {
+            'type': 'interruption_confirmed', 
+            'message': 'TTS播放已停止，准备处理新的语音输入', 
+            'timestamp': time.time()
+        })
+        
+        logger.info(f"✅ 客户端 {client_id} 的TTS打断处理完成")
+    
+    async def send_message(self, websocket, message_data: dict) -> bool:
+        """发送消息给客户端并等待写出，返回是否送达（或已进入断线会话的待发送队列）"""
         try:
             message = json.dumps(message_data, ensure_ascii=False)
-            await websocket.send(message)
+            await self.deliver(websocket, message)
+            return True
+        except (websockets.exceptions.ConnectionClosed, SlowConsumerError) as e:
+            # 连接刚断开或被按慢消费者断开、会话尚未转入宽限期（进行中的回复先于断开处理发出）：立即转入，
+            # 消息进入待发送队列；同一连接上排在其后的消息随后进入同一个待发送队列
+            session = self.find_session_by_connection(websocket)
+            if session is not None and self.can_detach(session, websocket):
+                await self.detach_client(session)
+            elif session is None:
+                session = self.find_session_detached_from(websocket)
+            if session is not None and session.detached:
+                await session.websocket.send(message)
+                return True
+            logger.error(f"❌ 发送消息失败: {e}")
         except Exception as e:
             logger.error(f"❌ 发送消息失败: {e}")
+        return False
+    
+    async def deliver(self, websocket, message):
+        """
+        经连接的发送队列写出已序列化的消息并等待写出完成（断线会话的消息直接进入待发送队列）
+        
+        Raises:
+            ConnectionClosed: 连接已断开
+            SlowConsumerError: 连接被按慢消费者断开
+        """
+        if isinstance(websocket, DetachedConnection) or not SEND_QUEUE_CONFIG['ENABLED']:
+            await websocket.send(message)
+            return
+        if isinstance(websocket, MuxChannel):
+            message = websocket.encode(message)
+            websocket = websocket.connection
+        await self.get_send_queue(websocket).send(message)
+    
+    async def broadcast_message(self, message_data: dict) -> int:
+        """
+        广播消息给所有客户端：只序列化一次，放入各连接的发送队列后立即返回，
+        各连接的写任务并发写出，写得慢的连接不影响其他客户端；断线会话的消息进入其待发送队列
+        
+        Returns:
+            已入队的客户端数
+        """
+        message = json.dumps(message_data, ensure_ascii=False)
+        sessions = list(self.clients.values())
+        self.send_stats['broadcasts'] += 1
+        
+        if not SEND_QUEUE_CONFIG['ENABLED']:
+            results = await asyncio.gather(*(self.deliver(session.websocket, message) for session in sessions),
+                                           return_exceptions=True)
+            return sum(1 for result in results if result is None)
+        
+        queued = 0
+        for session in sessions:
+            connection = session.websocket
+            if session.detached:
+                await connection.send(message)
+                queued += 1
+            elif isinstance(connection, MuxChannel):
+                queued += self.get_send_queue(connection.connection).put(connection.encode(message))
+            else:
+                queued += self.get_send_queue(connection).put(message)
+        return queued
+    
+    def get_send_queue(self, connection) -> SendQueue:
+        """连接的发送队列，首次发送时创建写任务"""
+        queue = self.send_queues.get(connection)
+        if queue is None:
+            queue = SendQueue(
+                connection,
+                max_bytes=SEND_QUEUE_CONFIG['MAX_QUEUED_BYTES'],
+                high_water=SEND_QUEUE_CONFIG['HIGH_WATER_BYTES'],
+                send_timeout=SEND_QUEUE_CONFIG['SEND_TIMEOUT'],
+                on_error=self.handle_send_error
+            )
+            self.send_queues[connection] = queue
+        return queue
+    
+    def handle_send_error(self, queue: SendQueue, error: Exception):
+        """连接写出失败或被按慢消费者驱逐：移除发送队列，慢消费者的连接随即断开"""
+        if self.send_queues.get(queue.connection) is queue:
+            del self.send_queues[queue.connection]
+        
+        if not isinstance(error, SlowConsumerError):
+            self.send_stats['failed'] += 1
+            return
+        
+        self.send_stats['evicted'] += 1
+        logger.warning(f"🐢 连接接收太慢，断开连接（会话保留等待重连）: {error}")
+        close = getattr(queue.connection, 'close', None)
+        if close is not None:
+            # 1013: 稍后重试，客户端凭恢复令牌重连后补发断线期间的消息
+            asyncio.create_task(close(1013, 'slow consumer'))
+    
+    def close_send_queue(self, connection):
+        """连接已关闭：已入队的消息写完（或失败）后写任务退出"""
+        queue = self.send_queues.pop(connection, None)
+        if queue is not None:
+            queue.close()
+    
+    def find_session_detached_from(self, websocket) -> Optional[ClientSession]:
+        """查找已从该连接转入断线宽限期的会话"""
+        for session in self.clients.values():
+            if session.detached and session.websocket.origin is websocket:
+                return session
+        return None
     
     async def send_error_message(self, client_id: str, error_message: str):
         """发送错误消息给客户端"""
         try:
-            await self.send_message(self.clients[client_id]['websocket'], {
+            await self.send_message(self.clients[client_id].websocket, {
                 'type': 'error', 
                 'message': error_message, 
                 'timestamp': time.time()
@@ -410,12 +1287,64 @@ class WebRTCServer:
         except Exception as e:
             logger.error(f"❌ 发送错误消息失败: {e}")
     
+    def get_server_status(self) -> dict:
+        """获取服务器状态信息（多进程模式下由工作进程定期上报）"""
+        try:
+            return {
+                'pid': os.getpid(),
+                'host': self.host,
+                'port': self.port,
+                'uptime': time.time() - self.start_time if self.start_time else 0,
+                'total_clients': len(self.clients),
+                'modules': {
+                    'asr': self.asr_module.get_module_status(),
+                    'llm': self.llm_module.get_module_status(),
+                    'tts': self.tts_module.get_module_status(),
+                    'audio': self.audio_processor.get_module_status()
+                },
+                'reaper': self.reaper.get_reaper_status() if self.reaper else None,
+                'rtc': self.rtc_transport.get_transport_status() if self.rtc_transport else None,
+                'intent': self.intent_fast_path.get_stats(),
+                'mux': dict(self.mux_stats),
+                'memory': self.memory_budget.get_status(self.clients.values()),
+                'barge_in': self.barge_in.get_status(),
+                'send': {
+                    'queues': len(self.send_queues),
+                    'queued_bytes': sum(queue.bytes for queue in self.send_queues.values()),
+                    'congested': sum(1 for queue in self.send_queues.values() if queue.congested),
+                    'max_drain_ms': max((queue.max_drain_time for queue in self.send_queues.values()), default=0) * 1000,
+                    **self.send_stats
+                },
+                'dsp': self.dsp_pool.get_status() if self.dsp_pool else None,
+                'resume': {
+                    **self.resume_stats, 
+                    'detached_sessions': sum(1 for session in self.clients.values() if session.detached)
+                }
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ 获取服务器状态失败: {e}")
+            return {'pid': os.getpid(), 'total_clients': len(self.clients), 'error': str(e)}
+    
     async def cleanup_client(self, client_id: str):
         """清理客户端资源"""
         try:
-            # 清理音频处理资源
+            # 恢复令牌随会话失效
+            session = self.clients.get(client_id)
+            if session is not None and session.resume_token:
+                self.resume_tokens.pop(session.resume_token, None)
+            
+            # 清理音频处理资源（同时移除客户端会话）
             self.audio_processor.cleanup_client(client_id)
             
+            # 关闭WebRTC媒体连接
+            if self.rtc_transport:
+                await self.rtc_transport.close_peer(client_id)
+            
+            # 释放DSP工作进程中的会话状态
+            if self.dsp_pool:
+                self.dsp_pool.release_session(client_id)
+            
             # 清理对话历史
             self.llm_module.clear_conversation_history(client_id)
             
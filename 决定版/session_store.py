@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话存储模块
+按客户端提供的会话令牌保存对话历史等会话状态，使其在断线重连和多进程之间得以保留
+
+提供：
+- SessionStore: 存储后端接口
+- MemorySessionStore: 进程内存储（默认）
+- SQLiteSessionStore: 本地持久化存储，多个工作进程可共享同一数据库文件
+- CachedSessionStore: 读穿透缓存 + 后台批量写入，保证对话轮次上不出现阻塞的数据库调用
+
+版本: 2.0.0
+"""
+
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(ABC):
+    """会话存储后端接口（缺少 load、save_many、delete 的后端在创建时即报错）"""
+
+    @abstractmethod
+    def load(self, token: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """读取会话状态，不存在或已过期时返回None（refresh仅对带缓存的存储有意义）"""
+
+    @abstractmethod
+    def save_many(self, items: List[Tuple[str, Dict[str, Any]]]):
+        """批量写入会话状态"""
+
+    def save(self, token: str, state: Dict[str, Any]):
+        """写入单个会话状态"""
+        self.save_many([(token, state)])
+
+    @abstractmethod
+    def delete(self, token: str):
+        """删除会话状态"""
+
+    def purge_expired(self) -> int:
+        """清理过期会话，返回清理数量"""
+        return 0
+
+    def close(self):
+        """关闭存储"""
+        pass
+
+    def get_store_status(self) -> Dict[str, Any]:
+        """获取存储状态信息"""
+        return {'backend': type(self).__name__}
+
+
+class MemorySessionStore(SessionStore):
+    """进程内会话存储"""
+
+    def __init__(self, ttl: float = 86400):
+        self.ttl = ttl
+        self._sessions: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, token: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+
+            updated_at, state = entry
+            if time.time() - updated_at > self.ttl:
+                del self._sessions[token]
+                return None
+
+            return json.loads(json.dumps(state))
+
+    def save_many(self, items: List[Tuple[str, Dict[str, Any]]]):
+        now = time.time()
+        with self._lock:
+            for token, state in items:
+                # 存储副本，避免调用方后续修改影响已保存的状态
+                self._sessions[token] = (now, json.loads(json.dumps(state)))
+
+    def delete(self, token: str):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def purge_expired(self) -> int:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [token for token, (updated_at, _) in self._sessions.items() if updated_at < cutoff]
+            for token in expired:
+                del self._sessions[token]
+        return len(expired)
+
+    def get_store_status(self) -> Dict[str, Any]:
+        return {
+            'backend': 'memory',
+            'total_sessions': len(self._sessions),
+            'ttl': self.ttl
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """基于SQLite的本地持久化会话存储"""
+
+    def __init__(self, path: str = 'sessions.db', ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        # WAL模式允许多个工作进程并发读写同一数据库文件
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'token TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+        logger.info(f"💾 SQLite会话存储已打开: {path}")
+
+    def load(self, token: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data, updated_at FROM sessions WHERE token = ?', (token,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        data, updated_at = row
+        if time.time() - updated_at > self.ttl:
+            self.delete(token)
+            return None
+
+        return json.loads(data)
+
+    def save_many(self, items: List[Tuple[str, Dict[str, Any]]]):
+        if not items:
+            return
+
+        now = time.time()
+        rows = [(token, json.dumps(state, ensure_ascii=False), now) for token, state in items]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO sessions (token, data, updated_at) VALUES (?, ?, ?)', rows
+            )
+            self._conn.commit()
+
+    def delete(self, token: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM sessions WHERE token = ?', (token,))
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM sessions WHERE updated_at < ?', (time.time() - self.ttl,))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_store_status(self) -> Dict[str, Any]:
+        try:
+            with self._lock:
+                total = self._conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        except Exception as e:
+            logger.error(f"❌ 获取SQLite会话存储状态失败: {e}")
+            total = -1
+
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'total_sessions': total,
+            'ttl': self.ttl
+        }
+
+
+class CachedSessionStore(SessionStore):
+    """读穿透缓存 + 后台批量写入的会话存储包装器"""
+
+    def __init__(self, backend: SessionStore, cache_size: int = 1000,
+                 flush_interval: float = 1.0, flush_batch_size: int = 100):
+        """
+        Args:
+            backend: 实际的存储后端
+            cache_size (int): 缓存的最大会话数（LRU淘汰，未写入的会话不会被淘汰）
+            flush_interval (float): 后台批量写入间隔（秒）
+            flush_batch_size (int): 脏数据达到该数量时立即触发写入
+        """
+        self.backend = backend
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+
+        # 统计信息
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'flushes': 0, 'flush_errors': 0}
+
+        self._flusher = threading.Thread(target=self._flush_loop, name='session-store-flusher', daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def load(self, token: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        读取会话状态
+
+        Args:
+            token (str): 会话令牌
+            refresh (bool): 跳过缓存直接读取后端（会话可能已在其他工作进程中更新）
+        """
+        with self._lock:
+            if token in self._dirty:
+                # 本进程中尚未写入的数据总是最新的
+                self.stats['hits'] += 1
+                return json.loads(json.dumps(self._dirty[token]))
+
+            if not refresh and token in self._cache:
+                self._cache.move_to_end(token)
+                self.stats['hits'] += 1
+                return json.loads(json.dumps(self._cache[token]))
+
+            self.stats['misses'] += 1
+
+        state = self.backend.load(token)
+        if state is None:
+            return None
+        with self._lock:
+            self._remember(token, state)
+        # 返回副本，避免调用方修改缓存中的状态
+        return json.loads(json.dumps(state))
+
+    def save_many(self, items: List[Tuple[str, Dict[str, Any]]]):
+        """更新缓存并标记为待写入，不阻塞调用方"""
+        with self._lock:
+            for token, state in items:
+                self._dirty[token] = state
+                self._remember(token, state)
+                self.stats['writes'] += 1
+            pending = len(self._dirty)
+
+        if pending >= self.flush_batch_size:
+            self._flush_event.set()
+
+    def delete(self, token: str):
+        with self._lock:
+            self._cache.pop(token, None)
+            self._dirty.pop(token, None)
+        self.backend.delete(token)
+
+    def purge_expired(self) -> int:
+        return self.backend.purge_expired()
+
+    def _remember(self, token: str, state: Dict[str, Any]):
+        """写入LRU缓存（调用方需持有锁）"""
+        self._cache[token] = state
+        self._cache.move_to_end(token)
+
+        while len(self._cache) > self.cache_size:
+            oldest, _ = next(iter(self._cache.items()))
+            if oldest in self._dirty:
+                break
+            self._cache.popitem(last=False)
+
+    def flush(self) -> int:
+        """立即将所有待写入的会话批量写入后端，返回写入数量"""
+        with self._lock:
+            if not self._dirty:
+                return 0
+            batch = list(self._dirty.items())
+            self._dirty.clear()
+
+        try:
+            self.backend.save_many(batch)
+            self.stats['flushes'] += 1
+            logger.debug(f"💾 会话批量写入完成: {len(batch)} 个")
+            return len(batch)
+
+        except Exception as e:
+            logger.error(f"❌ 会话批量写入失败: {e}")
+            self.stats['flush_errors'] += 1
+            # 放回待写入队列，保留期间产生的更新版本
+            with self._lock:
+                for token, state in batch:
+                    self._dirty.setdefault(token, state)
+            return 0
+
+    def _flush_loop(self):
+        """后台批量写入线程"""
+        while not self._stop_event.is_set():
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+
+    def close(self):
+        """停止后台线程，写入剩余数据并关闭后端"""
+        if self._stop_event.is_set():
+            return
+
+        self._stop_event.set()
+        self._flush_event.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+        self.backend.close()
+
+    def get_store_status(self) -> Dict[str, Any]:
+        status = self.backend.get_store_status()
+        status.update({
+            'cached_sessions': len(self._cache),
+            'pending_writes': len(self._dirty),
+            'cache_stats': dict(self.stats)
+        })
+        return status
+
+
+def create_session_store(config: Dict[str, Any]) -> Optional[CachedSessionStore]:
+    """根据配置创建会话存储，BACKEND为None时不启用"""
+    backend_name = config.get('BACKEND')
+    if not backend_name:
+        return None
+
+    try:
+        if backend_name == 'sqlite':
+            backend = SQLiteSessionStore(config['SQLITE_PATH'], ttl=config['SESSION_TTL'])
+        elif backend_name == 'memory':
+            backend = MemorySessionStore(ttl=config['SESSION_TTL'])
+        else:
+            logger.error(f"❌ 未知的会话存储后端: {backend_name}")
+            return None
+
+        return CachedSessionStore(
+            backend,
+            cache_size=config['CACHE_SIZE'],
+            flush_interval=config['FLUSH_INTERVAL'],
+            flush_batch_size=config['FLUSH_BATCH_SIZE']
+        )
+
+    except Exception as e:
+        logger.error(f"❌ 创建会话存储失败: {e}")
+        return None
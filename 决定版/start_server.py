@@ -26,8 +26,9 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 # 导入配置和服务器
-from config import validate_config, get_config_summary, SERVER_HOST, SERVER_PORT
+from config import validate_config, get_config_summary, SERVER_HOST, SERVER_PORT, WORKER_CONFIG
 from server import WebRTCServer
+from worker_pool import run_workers
 
 # 配置日志
 logging.basicConfig(
@@ -283,6 +284,28 @@ async def main():
         logger.error(f"❌ 主程序异常: {e}")
         return 1
 
+def run_multi_worker(args) -> int:
+    """多进程模式：在同一端口上启动多个工作进程"""
+    try:
+        print(f"🏭 多进程模式: {args.workers} 个工作进程")
+        
+        if not validate_config():
+            logger.error("❌ 配置文件验证失败，无法启动服务器")
+            return 1
+        
+        success = run_workers(
+            WebRTCServer, args.host, args.port, args.workers,
+            metrics_interval=WORKER_CONFIG['METRICS_INTERVAL'],
+            restart_delay=WORKER_CONFIG['RESTART_DELAY'],
+            max_restarts=WORKER_CONFIG['MAX_RESTARTS'],
+            restart_window=WORKER_CONFIG['RESTART_WINDOW']
+        )
+        return 0 if success else 1
+        
+    except Exception as e:
+        logger.error(f"❌ 多进程模式运行异常: {e}")
+        return 1
+
 def parse_arguments():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='WebRTC语音助手服务器')
@@ -300,6 +323,13 @@ def parse_arguments():
         help=f'服务器监听端口 (默认: {SERVER_PORT})'
     )
     
+    parser.add_argument(
+        '--workers', 
+        type=int, 
+        default=WORKER_CONFIG['DEFAULT_WORKERS'],
+        help=f"工作进程数，大于1时通过SO_REUSEPORT共享端口 (默认: {WORKER_CONFIG['DEFAULT_WORKERS']})"
+    )
+    
     parser.add_argument(
         '--debug', 
         action='store_true',
@@ -333,6 +363,10 @@ if __name__ == "__main__":
                 print("❌ 配置验证失败")
                 sys.exit(1)
         
+        # 多进程模式
+        if args.workers > 1:
+            sys.exit(run_multi_worker(args))
+        
         # 启动服务器
         exit_code = asyncio.run(main())
         sys.exit(exit_code)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试ASR识别结果缓存
+验证相同音频命中缓存、不再请求后端，失败结果不缓存，以及容量和有效期限制
+"""
+
+import time
+import logging
+from asr_module import ASRModule
+from asr_fakes import FakeBaidu, FakeResponse, make_asr, recognize
+from config import ASR_CACHE_CONFIG
+from utils import calculate_audio_hash
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+PCM = b'\x01\x02' * 4000
+
+
+def _make_asr() -> ASRModule:
+    return make_asr(upload_mode='raw')
+
+
+def _run(asr: ASRModule, fake: FakeBaidu, audio: bytes = PCM):
+    return recognize(asr, fake, audio)
+
+
+def test_identical_audio_hits_cache():
+    """相同音频第二次直接返回缓存结果，不再请求后端；不同音频照常请求"""
+    asr = _make_asr()
+    fake = FakeBaidu({'raw': FakeResponse(200, {'err_no': 0, 'result': ['打开客厅的灯']})})
+
+    assert _run(asr, fake) == '打开客厅的灯'
+    assert _run(asr, fake) == '打开客厅的灯'
+    assert len(fake.calls) == 1
+
+    _run(asr, fake, PCM + b'\x03\x04')
+    assert len(fake.calls) == 2
+
+    stats = asr.get_module_status()['cache']
+    assert stats['hits'] == 1 and stats['misses'] == 2 and stats['size'] == 2
+
+    # 所有客户端共用缓存，键为128位指纹
+    assert len(calculate_audio_hash(PCM)) == 32 and calculate_audio_hash(PCM) != calculate_audio_hash(PCM[:-2])
+
+
+def test_failures_not_cached():
+    """识别失败时不缓存，同一段音频重发时仍会请求后端"""
+    asr = _make_asr()
+    fake = FakeBaidu({'raw': FakeResponse(200, {'err_no': 3301, 'err_msg': 'speech quality error.'})})
+
+    _run(asr, fake)
+    _run(asr, fake)
+    assert len(fake.calls) == 2
+    assert asr.get_cache_stats()['size'] == 0
+
+
+def test_size_and_ttl_bounds():
+    """超过容量时淘汰最久未用的条目，过期条目不再命中"""
+    asr = _make_asr()
+    for i in range(ASR_CACHE_CONFIG['MAX_ENTRIES'] + 5):
+        asr._cache_result(f'key_{i}', f'text_{i}')
+    assert len(asr.result_cache) == ASR_CACHE_CONFIG['MAX_ENTRIES']
+    assert asr._get_cached_result('key_0') is None
+
+    expires_at, text = asr.result_cache['key_10']
+    asr.result_cache['key_10'] = (time.monotonic() - 1, text)
+    assert asr._get_cached_result('key_10') is None
+    assert 'key_10' not in asr.result_cache and asr.get_cache_stats()['expired'] == 1
+
+
+if __name__ == "__main__":
+    test_identical_audio_hits_cache()
+    test_failures_not_cached()
+    test_size_and_ttl_bounds()
+    print("🎉 ASR识别结果缓存测试通过")
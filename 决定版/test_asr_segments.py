@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试长语音分段
+验证缓冲音频超过单段时长时在句中停顿处切分、重采样后的小帧不会切出过短的段，切分前后音频完整拼接
+"""
+
+import logging
+import numpy as np
+from audio_processor import AudioProcessor
+from resampler import Resampler
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+RATE = 16000
+CHUNK_BYTES = 2048
+
+
+def _speech_with_pause(pause_at: float, total: float, pause: float = 0.1) -> bytes:
+    """生成总长 total 秒、在 pause_at 秒处有一段停顿的16位PCM"""
+    t = np.arange(int(total * RATE)) / RATE
+    signal = 6000 * np.sin(2 * np.pi * 220 * t)
+    signal[(t >= pause_at) & (t < pause_at + pause)] = 0
+    return signal.astype('<i2').tobytes()
+
+
+def _feed(processor: AudioProcessor, audio, max_seconds: float, search_seconds: float):
+    """按浏览器端的块长逐块送入（audio 也可以是已分好的帧），每块之后尝试分段，返回切出的段"""
+    if isinstance(audio, bytes):
+        audio = [audio[offset:offset + CHUNK_BYTES] for offset in range(0, len(audio), CHUNK_BYTES)]
+    segments = []
+    for chunk in audio:
+        processor.add_audio_data('client_a', chunk)
+        segment = processor.pop_segment('client_a', max_seconds, search_seconds)
+        if segment:
+            segments.append(segment)
+    return segments
+
+
+def test_cut_at_pause_after_limit():
+    """超过单段时长后在段尾窗口内的停顿处切分，剩余音频留在缓冲区"""
+    processor = AudioProcessor(buffer_size=100)
+    audio = _speech_with_pause(pause_at=2.4, total=4.0)
+    segments = _feed(processor, audio, max_seconds=3.0, search_seconds=1.0)
+
+    assert len(segments) == 1
+    cut_seconds = len(segments[0]) / 2 / RATE
+    assert 2.4 <= cut_seconds <= 2.5
+    assert segments[0] + processor.get_audio_data('client_a') == audio
+    assert processor.get_module_status()['asr_segments'] == 1
+
+
+def test_small_resampled_frames_cut_by_duration():
+    """48kHz采集重采样后每帧约341个采样：按时长切分，不因块数多切出过短的段，旧音频也不会被deque丢弃"""
+    processor = AudioProcessor(buffer_size=50)
+    t = np.arange(int(7.0 * 48000)) / 48000
+    signal = 6000 * np.sin(2 * np.pi * 220 * t)
+    signal[(t >= 2.4) & (t < 2.5)] = 0
+    capture = signal.astype('<i2').tobytes()
+    resampler = Resampler(48000, RATE)
+    frames = [resampler.process(capture[offset:offset + 2048]) for offset in range(0, len(capture), 2048)]
+    assert 680 <= len(frames[10]) <= 684
+
+    segments = _feed(processor, frames, max_seconds=3.0, search_seconds=1.0)
+    assert len(segments) == 2
+    assert all(len(segment) / 2 / RATE >= 2.0 for segment in segments)
+    assert b''.join(segments) + processor.get_audio_data('client_a') == b''.join(frames)
+
+
+def test_short_utterance_not_segmented():
+    """未达到分段条件时不切分"""
+    processor = AudioProcessor(buffer_size=50)
+    audio = _speech_with_pause(pause_at=1.0, total=2.0)
+    assert _feed(processor, audio, max_seconds=3.0, search_seconds=1.0) == []
+
+
+if __name__ == "__main__":
+    test_cut_at_pause_after_limit()
+    test_small_resampled_frames_cut_by_duration()
+    test_short_utterance_not_segmented()
+    print("🎉 长语音分段测试通过")
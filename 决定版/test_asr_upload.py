@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试ASR上传方式
+验证原始音频请求体上传、上传方式的探测与记忆、识别错误和网络错误时不重复上传，以及m4a压缩
+"""
+
+import logging
+import requests
+import numpy as np
+from asr_module import ASRModule
+from asr_fakes import FakeBaidu, FakeResponse, make_asr, recognize
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+PCM = (6000 * np.sin(2 * np.pi * 220 * np.arange(32000) / 16000)).astype('<i2').tobytes()
+
+
+def _make_asr() -> ASRModule:
+    return make_asr(cache_enabled=False)
+
+
+def _run(asr: ASRModule, fake: FakeBaidu, audio: bytes = PCM):
+    return recognize(asr, fake, audio)
+
+
+OK = FakeResponse(200, {'err_no': 0, 'err_msg': 'success.', 'result': ['你好']})
+FORMAT_ERROR = FakeResponse(200, {'err_no': 3300, 'err_msg': 'speech param error'})
+
+
+def test_raw_body_upload():
+    """原始PCM直接作为请求体，Content-Type携带采样率，不经base64编码"""
+    asr = _make_asr()
+    fake = FakeBaidu({'raw': OK})
+    assert _run(asr, fake) == '你好'
+    assert fake.calls == [('raw', 'audio/pcm;rate=16000', PCM)]
+    assert asr.upload_mode == 'raw'
+
+
+def test_working_mode_probed_once_and_remembered():
+    """首次请求探测到可用方式后记住，之后每次请求只发送一次"""
+    asr = _make_asr()
+    fake = FakeBaidu({'raw': FORMAT_ERROR, 'json': OK, 'form': OK})
+    assert _run(asr, fake) == '你好'
+    assert [mode for mode, _, _ in fake.calls] == ['raw', 'json']
+
+    fake.calls.clear()
+    for _ in range(3):
+        assert _run(asr, fake) == '你好'
+    assert [mode for mode, _, _ in fake.calls] == ['json'] * 3
+
+    # 记住的方式被拒绝后清除，下次请求重新探测
+    fake.responses['json'] = FakeResponse(400, {})
+    _run(asr, fake)
+    assert asr.upload_mode is None
+    fake.calls.clear()
+    assert _run(asr, fake) == '你好'
+    assert [mode for mode, _, _ in fake.calls] == ['raw', 'json', 'form'] and asr.upload_mode == 'form'
+
+
+def test_no_resend_on_recognition_or_network_error():
+    """识别失败（请求格式正确）或网络错误时，不换方式重发同一份音频"""
+    asr = _make_asr()
+    fake = FakeBaidu({'raw': FakeResponse(200, {'err_no': 3301, 'err_msg': 'speech quality error.'})})
+    assert _run(asr, fake) is None
+    assert len(fake.calls) == 1 and asr.upload_mode == 'raw'
+
+    asr = _make_asr()
+    fake = FakeBaidu({'raw': requests.exceptions.Timeout(), 'json': OK})
+    _run(asr, fake)
+    assert len(fake.calls) == 1 and asr.upload_mode is None
+
+
+def test_m4a_compression():
+    """启用m4a压缩时上传AAC数据（需要av，未安装时回退为原始PCM）"""
+    asr = _make_asr()
+    asr.compression = 'm4a'
+    fake = FakeBaidu({'raw': OK, 'json': OK})
+    assert _run(asr, fake) == '你好'
+
+    mode, content_type, body = fake.calls[0]
+    if asr.compression is None:
+        print("⚠️ 未安装av，跳过m4a压缩检查")
+        assert content_type == 'audio/pcm;rate=16000'
+        return
+    assert content_type == 'audio/m4a;rate=16000'
+    assert len(body) < len(PCM) / 4
+    assert asr.get_module_status()['upload']['compressed_requests'] == 1
+
+    # base64方式同样携带格式参数
+    asr.upload_mode = 'json'
+    fake.calls.clear()
+    _run(asr, fake)
+    assert fake.calls[0][2]['format'] == 'm4a'
+
+
+if __name__ == "__main__":
+    test_raw_body_upload()
+    test_working_mode_probed_once_and_remembered()
+    test_no_resend_on_recognition_or_network_error()
+    test_m4a_compression()
+    print("🎉 ASR上传方式测试通过")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试上行音频帧时钟
+验证帧头格式、序号缺口和迟到帧的检测、按采集时间判断静音（网络抖动不产生假静音，
+积压后集中到达的帧不产生假语音），以及服务器按协商的帧头接收音频
+"""
+
+import json
+import asyncio
+import logging
+
+# 先配置日志，避免导入server时写入server.log
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+from server import WebRTCServer
+from client_session import ClientSession
+from audio_clock import AudioClock, pack_audio_frame, unpack_audio_frame
+
+FRAME_MS = 100
+
+
+def test_frame_format_gaps_and_late_frames():
+    """帧头往返一致；序号跳变计为丢帧，迟到和重复的帧丢弃，序号归零视为重新计数"""
+    frame = pack_audio_frame(7, 1234, b'\x01\x02')
+    assert unpack_audio_frame(frame) == (7, 1234, b'\x01\x02')
+    try:
+        unpack_audio_frame(b'\x00' * 8)
+        assert False
+    except ValueError:
+        pass
+
+    clock = AudioClock(max_reorder=5)
+    for seq in (0, 1, 2, 5, 6):
+        assert clock.observe(seq, seq * FRAME_MS, FRAME_MS, 10 + seq * 0.1)
+    assert clock.lost_frames == 2
+    assert not clock.observe(3, 3 * FRAME_MS, FRAME_MS, 10.8)
+    assert not clock.observe(6, 6 * FRAME_MS, FRAME_MS, 10.8)
+    assert clock.late_frames == 2 and clock.frames == 5
+
+    assert clock.observe(0, 0, FRAME_MS, 20.0)
+    assert clock.restarts == 1 and clock.next_seq == 1
+
+
+def test_jitter_does_not_fake_a_pause():
+    """到达间隔忽长忽短时，下一帧仍在网络中的间隙不算静音（按到达时间会误判）"""
+    clock = AudioClock(jitter_margin=2.0, max_margin_ms=300)
+    arrival = 0.0
+    for seq in range(20):
+        transit = 0.05 if seq % 2 == 0 else 0.2
+        arrival = seq * FRAME_MS / 1000 + transit
+        clock.observe(seq, seq * FRAME_MS, FRAME_MS, arrival)
+    assert clock.jitter_ms > 100
+
+    # 最后一帧到达后 0.25 秒：到达间隔已超过 0.2 秒的静音阈值，按音频时钟仍未静音
+    assert clock.silence_seconds(arrival + 0.25) < 0.2
+    # 真正停止说话后仍能判定静音
+    assert clock.silence_seconds(arrival + 1.0) >= 0.2
+
+
+def test_burst_after_stall_is_not_fake_speech():
+    """网络卡顿后一批帧集中到达：按采集时间这段音频早已结束，静音判断不被推迟"""
+    clock = AudioClock(jitter_margin=0.0)
+    for seq in range(5):
+        clock.observe(seq, seq * FRAME_MS, FRAME_MS, 10 + seq * 0.1 + 0.05)
+    for seq in range(5, 10):
+        clock.observe(seq, seq * FRAME_MS, FRAME_MS, 11.5)
+
+    # 最后一帧到达后 0.1 秒，音频已结束 0.55 秒（按到达时间只有 0.1 秒）
+    assert abs(clock.silence_seconds(11.6) - 0.55) < 1e-6
+
+
+def test_server_reads_negotiated_frame_header():
+    """客户端在编码协商时声明帧头后，服务器取出序号和时间戳、丢弃迟到帧并上报抖动"""
+    class _FakeWebSocket:
+        def __init__(self):
+            self.sent = []
+
+        async def send(self, message):
+            self.sent.append(json.loads(message))
+
+    async def run():
+        server = WebRTCServer()
+        websocket = _FakeWebSocket()
+        session = ClientSession('client', websocket)
+        server.clients['client'] = session
+
+        await server.handle_codec_select('client', {'codec': 'pcm16', 'frame_header': True})
+        assert websocket.sent[-1]['frame_header'] is True and session.frame_header
+
+        pcm = b'\x00\x01' * 1600
+        for seq in (0, 1, 3, 2):
+            await server.handle_binary_audio_data('client', pack_audio_frame(seq, seq * FRAME_MS, pcm))
+        assert len(session.audio_buffer) == 3 and session.audio_buffer[0] == pcm
+        assert session.stats.total_wire_bytes == 3 * (len(pcm) + 8)
+
+        clock = server.audio_processor.get_module_status()['clock']
+        assert clock['lost_frames'] == 1 and clock['late_frames'] == 1
+        assert 'client' in clock['jitter_ms']
+        session.cancel_asr_task()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_frame_format_gaps_and_late_frames()
+    test_jitter_does_not_fake_a_pause()
+    test_burst_after_stall_is_not_fake_speech()
+    test_server_reads_negotiated_frame_header()
+    print("🎉 上行音频帧时钟测试通过")
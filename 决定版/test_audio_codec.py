@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试上行音频编解码
+验证各编码的压缩比、解码还原质量以及纯Python实现与audioop的一致性
+"""
+
+import logging
+import numpy as np
+import audio_codec
+from audio_codec import (decode_audio, encode_pcmu, encode_pcma, encode_ima_adpcm,
+                         negotiate_codec, PCM16, PCMU, PCMA, IMA_ADPCM)
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+
+def _make_speech_frame(seed: int = 0) -> bytes:
+    """生成一帧（1024样本）类似语音的16位PCM"""
+    t = np.arange(1024) / 16000
+    rng = np.random.default_rng(seed)
+    signal = 6000 * np.sin(2 * np.pi * 220 * t) + 2000 * np.sin(2 * np.pi * 1250 * t) + rng.normal(0, 300, t.size)
+    return signal.astype('<i2').tobytes()
+
+
+def _snr_db(reference: bytes, decoded: bytes) -> float:
+    ref = np.frombuffer(reference, dtype='<i2').astype(np.float64)
+    err = ref - np.frombuffer(decoded, dtype='<i2').astype(np.float64)
+    return 10 * np.log10(np.sum(ref ** 2) / max(np.sum(err ** 2), 1e-9))
+
+
+def test_round_trip_size_and_quality():
+    """G.711 压缩到1/2、IMA-ADPCM 约1/4，解码后仍接近原始PCM"""
+    frame = _make_speech_frame()
+
+    for codec, encoded, min_snr in [
+        (PCMU, encode_pcmu(frame), 30),
+        (PCMA, encode_pcma(frame), 30),
+        (IMA_ADPCM, encode_ima_adpcm(frame)[0], 20),
+    ]:
+        decoded = decode_audio(codec, encoded)
+        assert len(decoded) == len(frame)
+        assert _snr_db(frame, decoded) > min_snr, codec
+
+    assert len(encode_pcmu(frame)) == len(frame) // 2
+    assert len(encode_ima_adpcm(frame)[0]) == len(frame) // 4 + audio_codec.ADPCM_HEADER.size
+    assert decode_audio(PCM16, frame) is frame
+
+
+def test_adpcm_frames_decode_independently():
+    """编码器状态跨帧延续，但每帧帧头携带状态，纯Python解码与audioop结果一致"""
+    first, state = encode_ima_adpcm(_make_speech_frame(1))
+    second, _ = encode_ima_adpcm(_make_speech_frame(2), state)
+
+    expected = audio_codec.decode_ima_adpcm(second)
+    saved = audio_codec.audioop
+    audio_codec.audioop = None
+    try:
+        assert audio_codec.decode_ima_adpcm(second) == expected
+    finally:
+        audio_codec.audioop = saved
+
+
+def test_negotiate_codec():
+    """不支持的编码回退到默认编码"""
+    supported = [IMA_ADPCM, PCMU, PCM16]
+    assert negotiate_codec(PCMU, supported) == PCMU
+    assert negotiate_codec(PCMA, supported) == PCM16
+    assert negotiate_codec('opus', supported) == PCM16
+    assert negotiate_codec(None, supported) == PCM16
+
+
+if __name__ == "__main__":
+    test_round_trip_size_and_quality()
+    test_adpcm_frames_decode_independently()
+    test_negotiate_codec()
+    print("🎉 音频编解码测试通过")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试熔断器
+验证连续失败达到阈值后打开并直接走降级方案、半开探测的恢复与退避，ASR模块在熔断期间不再发请求，
+以及ASR熔断时服务器立即通知客户端识别失败、不调用LLM
+"""
+
+import json
+import time
+import asyncio
+import logging
+import requests
+
+import numpy as np
+
+# 先配置日志，避免导入server时写入server.log
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+import asr_module
+from asr_module import ASRModule
+from server import WebRTCServer
+from client_session import ClientSession
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def test_opens_after_consecutive_failures():
+    """连续失败达到阈值后打开，成功会重新计数"""
+    breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request() and not breaker.allow_request()
+    status = breaker.get_status()
+    assert status['opened'] == 1 and status['short_circuited'] == 2 and status['retry_in'] > 9
+
+
+def test_half_open_probe_and_backoff():
+    """恢复等待时间过后只放行一个探测请求；探测失败时等待时间加倍，探测成功时关闭"""
+    breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=0.05, backoff_multiplier=2)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    assert breaker.allow_request() and breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.current_recovery_timeout == 0.1
+
+    time.sleep(0.11)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.current_recovery_timeout == 0.05
+
+
+def test_asr_short_circuits_during_outage():
+    """ASR后端故障时连续失败后熔断，之后的请求不再发出、立即返回None（不返回模拟的识别结果）"""
+    asr = ASRModule()
+    asr.access_token = 'test_token'
+    asr.token_expire_time = time.time() + 3600
+    asr.compression = None
+    calls = []
+
+    def failing_post(*args, **kwargs):
+        calls.append(1)
+        raise requests.exceptions.ConnectionError('backend down')
+
+    audio = b'\x01\x00' * 8000
+    original = asr_module.requests.post
+    asr_module.requests.post = failing_post
+    try:
+        for _ in range(asr.breaker.failure_threshold):
+            asr.recognize_speech(audio)
+        assert asr.breaker.state == OPEN
+
+        started = time.monotonic()
+        assert asr.recognize_speech(audio) is None
+        assert time.monotonic() - started < 0.05
+    finally:
+        asr_module.requests.post = original
+
+    assert len(calls) == asr.breaker.failure_threshold
+    assert asr.get_module_status()['breaker']['short_circuited'] == 1
+
+
+def test_open_asr_breaker_skips_llm():
+    """ASR熔断时本轮立即以 asr_error 结束，不调用LLM"""
+    class _FakeWebSocket:
+        def __init__(self):
+            self.sent = []
+
+        async def send(self, message):
+            self.sent.append(json.loads(message))
+
+    async def run():
+        server = WebRTCServer()
+        websocket = _FakeWebSocket()
+        session = ClientSession('client', websocket)
+        server.clients['client'] = session
+        noise = (np.random.default_rng(0).standard_normal(16000) * 3000).astype('<i2').tobytes()
+        session.ensure_audio_buffer(50).append(noise)
+
+        llm_calls = []
+
+        async def process_llm_conversation(client_id, text, deadline=None):
+            llm_calls.append(text)
+
+        server.process_llm_conversation = process_llm_conversation
+        for _ in range(server.asr_module.breaker.failure_threshold):
+            server.asr_module.breaker.record_failure()
+
+        started = time.monotonic()
+        await server.process_audio_for_asr('client')
+        assert time.monotonic() - started < 0.5
+        assert not llm_calls
+        assert [message['type'] for message in websocket.sent] == ['asr_error']
+        assert websocket.sent[0]['retry_in'] > 0
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_opens_after_consecutive_failures()
+    test_half_open_probe_and_backoff()
+    test_asr_short_circuits_during_outage()
+    test_open_asr_breaker_skips_llm()
+    print("🎉 熔断器测试通过")
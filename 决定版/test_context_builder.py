@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试对话上下文构建
+验证提示词大小受token预算约束，旧对话在后台折叠为摘要
+"""
+
+import logging
+from config import CONTEXT_CONFIG
+from context_builder import ContextBuilder, estimate_tokens, estimate_message_tokens
+from llm_module import LLMModule
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+
+def _make_history(rounds):
+    history = []
+    for i in range(rounds):
+        history.append({"role": "user", "content": f"第{i}个问题：" + "今天的天气和路况怎么样" * 3})
+        history.append({"role": "assistant", "content": f"第{i}个回答：" + "晴天，道路通畅" * 3})
+    return history
+
+
+def test_prompt_stays_within_budget():
+    """无论历史多长，构建出的提示词都不超过预算，且保留最新的完整对话轮次"""
+    builder = ContextBuilder(max_prompt_tokens=300)
+    history = _make_history(50)
+
+    messages, used = builder.build("你是语音助手。", "明天呢？", history, summary="用户关心天气")
+    assert used <= 300
+    assert used == sum(estimate_message_tokens(m) for m in messages)
+    assert messages[-1]['content'] == "明天呢？"
+    assert messages[-2] == history[-1]
+    assert messages[2]['role'] == 'user'
+
+
+def test_old_turns_fold_into_summary():
+    """历史超过阈值后，旧对话在后台折叠为摘要，只保留最近几条原文"""
+    llm = LLMModule()
+    llm._request_summary = lambda previous_summary, folded: None  # 离线测试，使用抽取式摘要
+
+    history = _make_history(10)
+    for i in range(0, len(history), 2):
+        llm._save_conversation_history('client_a', history[i]['content'], history[i + 1]['content'])
+    llm._summary_executor.shutdown(wait=True)
+
+    keep = llm.context_builder.summary_keep_messages
+    assert len(llm.conversation_history['client_a']) <= llm.context_builder.summary_trigger_messages
+    assert len(llm.conversation_history['client_a']) >= keep
+    summary = llm.conversation_summaries['client_a']
+    assert summary.startswith("用户问过：")
+    assert estimate_tokens(summary) <= CONTEXT_CONFIG['SUMMARY_MAX_TOKENS']
+
+    messages = llm._build_conversation_messages('明天呢？', 'client_a')
+    assert messages[1]['content'].startswith("此前对话摘要：")
+
+
+if __name__ == "__main__":
+    test_prompt_stays_within_budget()
+    test_old_turns_fold_into_summary()
+    print("🎉 对话上下文测试通过")
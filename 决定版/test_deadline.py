@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试单轮对话延迟预算
+验证请求超时取阶段超时与剩余预算中较小者，以及预算将尽时LLM限制回复长度、使用缓存回复，TTS只返回文本
+"""
+
+import time
+import logging
+import llm_module
+from deadline import Deadline, request_timeout
+from llm_module import LLMModule
+from tts_module import TTSModule
+from config import TURN_DEADLINE_CONFIG
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+
+class _Response:
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'choices': [{'message': {'content': '今天晴'}}]}
+
+
+def test_timeout_bounded_by_remaining_budget():
+    """请求超时不超过剩余预算，预算耗尽时使用超时下限"""
+    deadline = Deadline(3.0, min_timeout=0.5)
+    assert 2.9 < deadline.timeout(15) <= 3.0
+    assert deadline.timeout(1.0) == 1.0
+    assert request_timeout(None, 15) == 15
+
+    expired = Deadline(0.0, min_timeout=0.5)
+    assert expired.expired() and expired.timeout(15) == 0.5
+
+
+def test_llm_fast_paths():
+    """预算紧张时限制回复长度；预算将尽时复用该客户端上次的相同回复，不再请求"""
+    llm = LLMModule()
+    requests_sent = []
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        requests_sent.append((json['max_tokens'], timeout))
+        return _Response()
+
+    original = llm_module.requests.post
+    llm_module.requests.post = fake_post
+    try:
+        tight = Deadline(TURN_DEADLINE_CONFIG['LLM_SHORT_BELOW'] - 1)
+        assert llm.ask_question('今天天气怎么样', 'client_a', tight) == '今天晴'
+        max_tokens, timeout = requests_sent[0]
+        assert max_tokens == TURN_DEADLINE_CONFIG['LLM_SHORT_MAX_TOKENS']
+        assert timeout <= TURN_DEADLINE_CONFIG['LLM_SHORT_BELOW'] - 1
+
+        nearly_spent = Deadline(TURN_DEADLINE_CONFIG['LLM_CACHED_BELOW'] / 2)
+        assert llm.ask_question('今天天气怎么样', 'client_a', nearly_spent) == '今天晴'
+        assert llm.ask_question('今天天气怎么样', 'client_b', nearly_spent) != '今天晴'
+    finally:
+        llm_module.requests.post = original
+
+    assert len(requests_sent) == 1
+    stats = llm.get_module_status()['deadline']
+    assert stats == {'short_answers': 1, 'cached_answers': 1, 'budget_exhausted': 1}
+
+
+def test_tts_text_only_when_budget_spent():
+    """预算将尽时跳过语音合成"""
+    tts = TTSModule()
+    started = time.monotonic()
+    assert tts.synthesize_speech('你好', Deadline(0.0)) is None
+    assert time.monotonic() - started < 0.05
+    assert tts.get_module_status()['text_only'] == 1
+
+
+if __name__ == "__main__":
+    test_timeout_bounded_by_remaining_budget()
+    test_llm_fast_paths()
+    test_tts_text_only_when_budget_spent()
+    print("🎉 延迟预算测试通过")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试DSP进程池
+验证共享内存环形缓冲区的回绕和写满判断、工作进程的处理结果与本进程处理一致且会话固定在一个工作进程上，
+工作进程退出后会话改由其他进程接管，以及服务器把上行音频的解码和重采样交给进程池、失败后改在本进程处理
+"""
+
+import json
+import time
+import asyncio
+import logging
+
+import numpy as np
+
+# 先配置日志，避免导入server时写入server.log
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+from server import WebRTCServer
+from client_session import ClientSession
+from audio_codec import encode_pcmu
+from resampler import Resampler
+from dsp_pool import DSPPool, SharedRing, process_uplink
+
+
+def _tone(frequency: float, rate: int, seconds: float = 0.5, channels: int = 1) -> bytes:
+    t = np.arange(int(rate * seconds)) / rate
+    samples = (np.sin(2 * np.pi * frequency * t) * 12000).astype('<i2')
+    return np.repeat(samples, channels).tobytes()
+
+
+def _frames(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_shared_ring_wraps_and_reports_full():
+    """写入跨越缓冲区末尾时分段拷贝，读出内容不变；未释放的空间不会被覆盖"""
+    ring = SharedRing(100)
+    attached = SharedRing(100, ring.name)
+    try:
+        first = ring.write(b'a' * 70)
+        assert first == 0 and ring.write(b'b' * 40) is None
+        assert attached.read(first, 70) == b'a' * 70
+        attached.release(first + 70)
+
+        second = ring.write(bytes(range(60)))
+        assert second == 70 and ring.used == 60
+        assert attached.read(second, 60) == bytes(range(60))
+        attached.release(second + 60)
+        assert ring.used == 0 and ring.write(b'c' * 100) == 130
+    finally:
+        attached.close()
+        ring.close()
+
+
+def test_pool_matches_inline_processing():
+    """两个会话分到不同工作进程且保持不变，结果与本进程处理相同；工作进程退出后会话改由另一进程处理"""
+    async def run():
+        pool = DSPPool(workers=2, ring_bytes=8192)
+        pool.start()
+        try:
+            stereo = _frames(_tone(440, 48000, channels=2), 4096)
+            ulaw = _frames(encode_pcmu(_tone(300, 44100)), 2048)
+            reference_a = Resampler(48000, 16000, 2)
+            reference_b = Resampler(44100, 16000, 1)
+
+            for frame_a, frame_b in zip(stereo, ulaw):
+                pcm_a = await pool.process_uplink('a', frame_a, 'pcm16', 48000, 2)
+                pcm_b = await pool.process_uplink('b', frame_b, 'pcmu', 44100, 1)
+                assert pcm_a == process_uplink(frame_a, 'pcm16', reference_a)
+                assert pcm_b == process_uplink(frame_b, 'pcmu', reference_b)
+
+            worker_a, worker_b = pool.assignments['a'], pool.assignments['b']
+            assert worker_a is not worker_b
+
+            # 超过环形缓冲区容量的帧经管道传递
+            pcm = await pool.process_uplink('a', _tone(440, 48000, seconds=0.1, channels=2), 'pcm16', 48000, 2)
+            status = pool.get_status()
+            assert len(pcm) in (3198, 3200, 3202) and status['ring_full'] == 1 and status['failed'] == 0
+
+            # 工作进程退出：会话改由仍存活的进程处理
+            worker_a.process.terminate()
+            for _ in range(100):
+                if not worker_a.alive:
+                    break
+                await asyncio.sleep(0.02)
+            pcm = await pool.process_uplink('a', stereo[0], 'pcm16', 48000, 2)
+            assert pool.assignments['a'] is worker_b and len(pcm) > 0
+
+            pool.release_session('a')
+            assert 'a' not in pool.assignments and worker_b.sessions == 1
+        finally:
+            pool.close()
+
+    asyncio.run(run())
+
+
+def test_server_offloads_uplink_to_pool():
+    """服务器启用进程池后，48kHz立体声上行帧在工作进程中转换，缓冲区内容与本进程处理一致"""
+    class _FakeWebSocket:
+        async def send(self, message):
+            json.loads(message)
+
+    async def run():
+        server = WebRTCServer()
+        server.dsp_pool = DSPPool(workers=1)
+        server.dsp_pool.start()
+        try:
+            session = ClientSession('client', _FakeWebSocket())
+            server.clients['client'] = session
+            await server.handle_codec_select('client', {'codec': 'pcm16', 'sample_rate': 48000, 'channels': 2})
+
+            frames = _frames(_tone(1000, 48000, channels=2), 4096)
+            started = time.time()
+            for frame in frames:
+                await server.handle_binary_audio_data('client', frame)
+            reference = Resampler(48000, 16000, 2)
+            assert b''.join(session.audio_buffer) == b''.join(reference.process(frame) for frame in frames)
+            assert time.time() - started < 10
+
+            status = server.get_server_status()['dsp']
+            assert status['tasks'] == len(frames) and status['workers'][0]['sessions'] == 1
+            session.cancel_asr_task()
+
+            # 唯一的工作进程退出：会话改在本进程处理，重采样器换成新实例
+            worker = server.dsp_pool.workers[0]
+            worker.process.terminate()
+            for _ in range(100):
+                if not worker.alive:
+                    break
+                await asyncio.sleep(0.02)
+            session.audio_buffer.clear()
+            for frame in frames[:2]:
+                await server.handle_binary_audio_data('client', frame)
+            fresh = Resampler(48000, 16000, 2)
+            assert b''.join(session.audio_buffer) == b''.join(fresh.process(frame) for frame in frames[:2])
+            assert session.dsp_local and not server.dsp_pool.assignments
+            session.cancel_asr_task()
+
+            await server.cleanup_client('client')
+            assert not server.dsp_pool.assignments
+        finally:
+            server.dsp_pool.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_shared_ring_wraps_and_reports_full()
+    test_pool_matches_inline_processing()
+    test_server_offloads_uplink_to_pool()
+    print("🎉 DSP进程池测试通过")
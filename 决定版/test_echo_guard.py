@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试回声感知的打断检测
+验证与TTS参考信号的互相关计算、回声被丢弃并否决打断、用户说话确认打断，
+以及服务器只在用户真的说话时才停止本轮播放
+"""
+
+import io
+import json
+import wave
+import asyncio
+import logging
+
+import numpy as np
+
+# 先配置日志，避免导入server时写入server.log
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+from server import WebRTCServer
+from client_session import ClientSession
+from echo_guard import BargeInDetector, decode_reference, echo_correlation
+
+RATE = 16000
+FRAME = 1600   # 100ms
+
+
+def _signal(seed: int, seconds: float = 2.0) -> np.ndarray:
+    """类语音的测试信号：按音节节奏调幅的噪声（int16）"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(RATE * seconds)) / RATE
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    return (rng.standard_normal(t.size) * envelope * 6000).astype(np.int16)
+
+
+def _wav(pcm: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(RATE)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def _echo(reference: np.ndarray, start: int, length: int, seed: int = 9) -> np.ndarray:
+    """扬声器回声：衰减后的参考信号加上底噪"""
+    noise = np.random.default_rng(seed).standard_normal(length) * 100
+    return (reference[start:start + length] * 0.3 + noise).astype(np.int16)
+
+
+def test_echo_correlation():
+    """延迟、衰减后的参考信号相关度接近1，无关的语音相关度很低"""
+    reference = _signal(1)
+    assert np.array_equal(decode_reference(_wav(reference), RATE), reference)
+
+    ref = reference.astype(np.float32) / 32768
+    echo = _echo(reference, 5000, 3200).astype(np.float32) / 32768
+    speech = _signal(2)[:3200].astype(np.float32) / 32768
+    assert echo_correlation(echo, ref) > 0.9
+    assert echo_correlation(speech, ref) < 0.2
+    assert echo_correlation(np.zeros(3200, dtype=np.float32), ref) == 0.0
+
+
+def test_detector_rejects_echo_and_confirms_speech():
+    """回声窗口被丢弃并否决客户端的打断；用户说话时确认，暂存的音频按顺序取出"""
+    detector = BargeInDetector(sample_rate=RATE, window_ms=200, max_delay_ms=800, echo_threshold=0.5)
+    reference = _signal(1)
+    session = ClientSession('client')
+    detector.start_playback(session, _wav(reference), now=100.0)
+
+    assert detector.hint(session, 101.0)
+    echo = _echo(reference, 8000, 2 * FRAME)
+    assert detector.check(session, echo[:FRAME].tobytes(), 101.0) == 'pending'
+    assert detector.check(session, echo[FRAME:].tobytes(), 101.0) == 'echo'
+    assert detector.reject_hint(session) and not detector.reject_hint(session)
+
+    speech = _signal(2)[:2 * FRAME]
+    assert detector.check(session, speech[:FRAME].tobytes(), 101.2, 800) == 'pending'
+    assert detector.check(session, speech[FRAME:].tobytes(), 101.2, 800) == 'speech'
+    held = detector.take_held(session)
+    assert b''.join(chunk for chunk, _ in held) == speech.tobytes() and held[0][1] == 800
+
+    # 播放结束（含余量）后不再检测
+    assert detector.check(session, speech.tobytes(), 103.0) is None and session.tts_reference is None
+    status = detector.get_status()
+    assert status['barge_ins'] == 1 and status['false_barge_ins'] == 1 and status['confirmed'] == 1
+
+
+def test_server_interrupts_only_on_user_speech():
+    """播放期间回声不会打断本轮回复也不会送识别；用户开口后才确认打断并处理其语音"""
+    class _FakeWebSocket:
+        def __init__(self):
+            self.sent = []
+
+        async def send(self, message):
+            self.sent.append(json.loads(message))
+
+        def types(self):
+            return [message['type'] for message in self.sent]
+
+    async def run():
+        server = WebRTCServer()
+        websocket = _FakeWebSocket()
+        session = ClientSession('client', websocket)
+        server.clients['client'] = session
+
+        reference = _signal(1)
+        await server.deliver_tts_audio('client', '你好', _wav(reference))
+        session.tts_reference.started_at -= 1.0
+
+        # 客户端按音量声明打断，随后上行的是回声
+        await server.handle_tts_interruption('client', {})
+        echo = _echo(reference, 8000, 2 * FRAME)
+        for start in (0, FRAME):
+            await server.handle_binary_audio_data('client', echo[start:start + FRAME].tobytes())
+        await asyncio.sleep(0)
+        assert 'interruption_rejected' in websocket.types() and 'interruption_confirmed' not in websocket.types()
+        assert not session.audio_buffer and session.tts_reference is not None
+
+        # 用户真的开口
+        await server.handle_tts_interruption('client', {})
+        speech = _signal(2)[:2 * FRAME]
+        for start in (0, FRAME):
+            await server.handle_binary_audio_data('client', speech[start:start + FRAME].tobytes())
+        await asyncio.sleep(0)
+        assert websocket.types()[-1] == 'interruption_confirmed' and session.tts_reference is None
+        assert b''.join(session.audio_buffer) == speech.tobytes()
+        assert server.get_server_status()['barge_in']['false_barge_in_rate'] == 0.5
+        session.cancel_asr_task()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_echo_correlation()
+    test_detector_rejects_echo_and_confirms_speech()
+    test_server_interrupts_only_on_user_speech()
+    print("🎉 回声感知打断检测测试通过")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试对冲请求
+验证主请求超过对冲延迟后发出对冲请求并取先返回的有效结果、按分位数计算对冲延迟，
+以及LLM对冲请求发往备用模型且对话历史只保存一次
+"""
+
+import time
+import logging
+import threading
+import llm_module
+from hedging import Hedger
+from llm_module import LLMModule
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+
+def _slow(seconds: float, result):
+    def call():
+        time.sleep(seconds)
+        return result
+    return call
+
+
+def test_fast_primary_not_hedged():
+    """主请求在对冲延迟内返回时不发对冲请求"""
+    hedger = Hedger('test', initial_delay=0.2)
+    hedge_calls = []
+    assert hedger.call(_slow(0.01, 'primary'), hedge=lambda: hedge_calls.append(1)) == 'primary'
+    stats = hedger.get_stats()
+    assert hedge_calls == [] and stats['hedged'] == 0 and stats['hedge_rate'] == 0.0
+
+
+def test_slow_primary_hedged():
+    """主请求超过对冲延迟时发出对冲请求，先返回的对冲结果获胜；对冲先失败时继续等待主请求"""
+    hedger = Hedger('test', initial_delay=0.05, min_delay=0.01)
+    started = time.monotonic()
+    assert hedger.call(_slow(0.5, 'primary'), hedge=_slow(0.01, 'hedge')) == 'hedge'
+    assert time.monotonic() - started < 0.3
+
+    assert hedger.call(_slow(0.2, 'primary'), hedge=_slow(0.01, None)) == 'primary'
+
+    stats = hedger.get_stats()
+    assert stats['requests'] == 2 and stats['hedged'] == 2 and stats['hedge_wins'] == 1
+    assert stats['hedge_rate'] == 1.0 and stats['win_rate'] == 0.5
+
+
+def test_delay_follows_percentile():
+    """样本足够后对冲延迟取主请求耗时的分位数，并限制在上下限之间"""
+    hedger = Hedger('test', percentile=90, initial_delay=1.0, min_delay=0.05, max_delay=0.5, min_samples=10)
+    assert hedger.hedge_delay() == 0.5  # 样本不足时使用初始延迟（受上限限制）
+
+    hedger.latencies.extend([0.1] * 9 + [0.3])
+    assert hedger.hedge_delay() == 0.1
+    hedger.latencies.extend([0.3] * 10)
+    assert hedger.hedge_delay() == 0.3
+    hedger.latencies.extend([2.0] * 20)
+    assert hedger.hedge_delay() == 0.5
+
+
+def test_llm_hedge_uses_secondary_model():
+    """LLM对冲请求发往备用模型，对话历史只保存一次"""
+    llm = LLMModule()
+    llm.hedge_model = 'secondary'
+    llm.hedger = Hedger('llm', initial_delay=0.05, min_delay=0.01)
+    models = []
+    lock = threading.Lock()
+
+    class _Response:
+        def __init__(self, content):
+            self.content = content
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {'choices': [{'message': {'content': self.content}}]}
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        with lock:
+            models.append(json['model'])
+        if json['model'] == 'secondary':
+            return _Response('备用模型的回复')
+        time.sleep(0.5)
+        return _Response('主模型的回复')
+
+    original = llm_module.requests.post
+    llm_module.requests.post = fake_post
+    try:
+        assert llm.ask_question('你好', 'client_a') == '备用模型的回复'
+    finally:
+        llm_module.requests.post = original
+
+    assert models == [llm.model, 'secondary']
+    assert len(llm.conversation_history['client_a']) == 2
+    assert llm.get_module_status()['hedging']['hedge_wins'] == 1
+
+
+if __name__ == "__main__":
+    test_fast_primary_not_hedged()
+    test_slow_primary_hedged()
+    test_delay_follows_percentile()
+    test_llm_hedge_uses_secondary_model()
+    print("🎉 对冲请求测试通过")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试空闲会话回收
+验证空闲和已断开客户端的音频缓冲、统计与对话历史会被释放，并报告回收字节数，
+以及探测失败的半开连接上可恢复的会话转入断线宽限期而不是被清理
+"""
+
+import time
+import asyncio
+import logging
+
+from websockets.protocol import State
+
+# 先配置日志，避免导入server时写入server.log
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+from server import WebRTCServer
+from idle_reaper import IdleReaper
+from config import REAPER_CONFIG
+from audio_processor import AudioProcessor
+from llm_module import LLMModule
+from session_store import CachedSessionStore, MemorySessionStore
+
+
+def test_audio_reap_idle():
+    """空闲客户端释放缓冲区和统计，已断开客户端的遗留资源全部释放"""
+    processor = AudioProcessor(buffer_size=50)
+    for _ in range(10):
+        processor.add_audio_data('idle_client', bytes(2048))
+        processor.add_audio_data('gone_client', bytes(2048))
+    time.sleep(0.05)
+
+    reclaimed = processor.reap_idle({'idle_client'}, buffer_ttl=0.01, stats_ttl=0.01)
+    assert reclaimed > 2 * 10 * 2048
+    assert processor.audio_buffers == {} and processor.processing_stats == {}
+    assert 'gone_client' not in processor.last_audio_time
+
+    # 回收后再次收到音频时重新分配
+    assert processor.add_audio_data('idle_client', bytes(2048))
+    assert processor.get_audio_buffer_size('idle_client') == 1
+
+
+def test_history_spilled_to_store_and_restored():
+    """空闲对话历史写入会话存储后移出内存，下次提问前按需恢复"""
+    store = CachedSessionStore(MemorySessionStore(), flush_interval=60)
+    llm = LLMModule(session_store=store)
+    llm.bind_session('client_a', 'session_token_1')
+    llm._save_conversation_history('client_a', '今天天气怎么样？', '今天晴。')
+    time.sleep(0.05)
+
+    assert llm.reap_idle_history({'client_a'}, ttl=0.01) > 0
+    assert 'client_a' not in llm.conversation_history
+    assert 'client_a' in llm.spilled_clients
+
+    llm._restore_spilled_history('client_a')
+    assert [m['content'] for m in llm.conversation_history['client_a']] == ['今天天气怎么样？', '今天晴。']
+    store.close()
+
+
+def test_half_open_probe_detaches_resumable_session():
+    """探测失败的半开连接按意外断开处理：会话转入宽限期，音频、对话历史和恢复令牌保留，可以重连恢复"""
+    class _HalfOpenWebSocket:
+        """收不到Pong、关闭握手也无法完成的连接"""
+
+        def __init__(self):
+            self.state = State.OPEN
+            self.close_code = None
+
+        async def ping(self):
+            return asyncio.get_running_loop().create_future()
+
+        async def close(self):
+            self.state = State.CLOSED
+            self.close_code = 1006
+
+    async def run():
+        server = WebRTCServer()
+        websocket = _HalfOpenWebSocket()
+        session, resumed = server.open_session(websocket, None)
+        token = session.resume_token
+        session.ensure_audio_buffer(50).append(bytes(3200))
+        server.llm_module._save_conversation_history(session.client_id, '你好', '你好，有什么可以帮你？')
+        session.last_activity = time.time() - REAPER_CONFIG['CONNECTION_IDLE_TIMEOUT'] - 1
+
+        reaper = IdleReaper(server, dict(REAPER_CONFIG, PROBE_TIMEOUT=0.05))
+        assert await reaper._reap_connections() == 1
+
+        assert session.detached and session.websocket.origin is websocket
+        assert server.clients[session.client_id] is session and len(session.audio_buffer) == 1
+        assert server.llm_module.conversation_history[session.client_id]
+        assert server.find_resumable_session(token) is session
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_audio_reap_idle()
+    test_history_spilled_to_store_and_restored()
+    test_half_open_probe_detaches_resumable_session()
+    print("🎉 空闲会话回收测试通过")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试本地快速意图
+验证常见指令的整句匹配和槽位提取、未命中时交给LLM，以及命中率和耗时统计
+"""
+
+import time
+import logging
+from intent_fast_path import IntentFastPath, IntentResult, GREETING_REPLY
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+
+def test_builtin_intents_and_slots():
+    """时间、日期、问候、调音量、停止播放在本地命中，音量档位支持中文数字"""
+    fast_path = IntentFastPath()
+
+    assert fast_path.match('你好！').reply == GREETING_REPLY
+    assert fast_path.match('现在几点了？').reply.startswith('现在是')
+    assert fast_path.match('今天星期几').reply.startswith('今天是')
+    assert fast_path.match('声音大一点').command == {'action': 'volume', 'delta': 1}
+    assert fast_path.match('小点声').command == {'action': 'volume', 'delta': -1}
+    assert fast_path.match('把音量调到五').command == {'action': 'volume', 'level': 5}
+    assert fast_path.match('音量调到8').command == {'action': 'volume', 'level': 8}
+
+    stop = fast_path.match('别说了')
+    assert stop.intent == 'stop' and stop.reply is None and stop.command == {'action': 'stop'}
+    assert GREETING_REPLY in fast_path.static_replies
+
+
+def test_fall_through_to_llm():
+    """包含真实问题的句子、没有上一句回复时的"再说一遍"交给LLM"""
+    fast_path = IntentFastPath()
+
+    assert fast_path.match('你好，帮我查一下明天的天气') is None
+    assert fast_path.match('几点钟出发去机场比较好') is None
+    assert fast_path.match('再说一遍') is None
+    assert fast_path.match('再说一遍', {'last_reply': '明天晴'}).reply == '明天晴'
+
+    disabled = IntentFastPath(enabled=False)
+    assert disabled.match('你好') is None
+
+
+def test_custom_intent_and_stats():
+    """注册自定义意图；命中率和命中耗时单独统计，本地匹配远低于100毫秒"""
+    fast_path = IntentFastPath()
+    fast_path.register('thanks', [r'(谢谢|多谢)(你)?'], lambda match, context: IntentResult('不客气'),
+                       static_replies=('不客气',))
+
+    started = time.monotonic()
+    result = fast_path.match('谢谢你')
+    fast_path.record_hit(result.intent, time.monotonic() - started)
+    assert result.intent == 'thanks' and result.reply == '不客气'
+    assert fast_path.match('讲个笑话') is None
+
+    stats = fast_path.get_stats()
+    assert stats['turns'] == 2 and stats['hits'] == 1 and stats['hit_rate'] == 0.5
+    assert stats['by_intent']['thanks'] == 1
+    assert stats['max_latency_ms'] < 100
+
+
+if __name__ == "__main__":
+    test_builtin_intents_and_slots()
+    test_fall_through_to_llm()
+    test_custom_intent_and_stats()
+    print("🎉 本地快速意图测试通过")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试会话内存核算和上限
+验证各部分内存按字节核算、超过软上限时丢弃最早的对话历史和待发送消息、
+超过硬上限时清空音频缓冲区，以及接近全局预算时拒绝新会话；连接发送队列的积压计入待发送消息
+"""
+
+import asyncio
+import logging
+from collections import deque
+
+import numpy as np
+
+from client_session import ClientSession, DetachedConnection
+from llm_module import LLMModule
+from memory_budget import MemoryBudget
+from multiplex import MuxChannel
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+KB = 1024
+
+
+def _session(client_id: str = 'client', audio_chunks: int = 0) -> ClientSession:
+    session = ClientSession(client_id)
+    if audio_chunks:
+        session.audio_buffer = deque([b'\x00' * (10 * KB)] * audio_chunks, maxlen=100)
+    return session
+
+
+def _budget(llm: LLMModule, **kwargs) -> MemoryBudget:
+    options = dict(soft_limit=100 * KB, hard_limit=200 * KB, global_limit=1000 * KB, admit_ratio=0.9)
+    options.update(kwargs)
+    return MemoryBudget(llm, **options)
+
+
+def test_accounting_by_category():
+    """音频缓冲、对话历史、断线期间暂存的消息分别核算"""
+    llm = LLMModule()
+    session = _session(audio_chunks=3)
+    llm.conversation_history['client'] = [{'role': 'user', 'content': 'x' * 5000}]
+    session.websocket = DetachedConnection(max_messages=10, max_bytes=1000 * KB)
+    asyncio.run(session.websocket.send('y' * 2000))
+
+    usage = _budget(llm).account(session)
+    assert usage['audio'] == 30 * KB
+    assert 5000 <= usage['history'] < 5200
+    assert 2000 <= usage['outbound'] < 2200
+    assert usage['total'] == sum(value for key, value in usage.items() if key != 'total')
+
+
+def test_soft_limit_sheds_history_then_outbound():
+    """超过软上限时先丢弃最早的对话历史（保留最近一轮），再丢弃最早的待发送消息"""
+    llm = LLMModule()
+    budget = _budget(llm)
+    session = _session()
+    history = [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'{i}' * (30 * KB)} for i in range(6)]
+    llm.conversation_history['client'] = history
+
+    assert budget.enforce(session) == 'soft'
+    assert [message['content'][0] for message in llm.conversation_history['client']] == ['3', '4', '5']
+    assert budget.account(session)['total'] <= 100 * KB
+
+    # 对话历史只剩最近一轮时丢弃待发送消息
+    llm.conversation_history['client'] = history[-2:]
+    session.websocket = DetachedConnection(max_messages=10, max_bytes=1000 * KB)
+    for _ in range(4):
+        asyncio.run(session.websocket.send('z' * (20 * KB)))
+    assert budget.enforce(session) == 'soft'
+    assert len(llm.conversation_history['client']) == 2 and len(session.websocket.outbox) == 1
+    assert budget.get_status([session])['soft_sheds'] == 2
+
+
+def test_hard_limit_and_global_admission():
+    """超过硬上限时清空音频缓冲区；全部会话接近全局预算时拒绝新会话"""
+    llm = LLMModule()
+    budget = _budget(llm)
+    session = _session(audio_chunks=25)
+
+    session.tts_reference = np.zeros(10 * KB, dtype=np.int16)
+    assert budget.enforce(session) == 'hard'
+    assert len(session.audio_buffer) == 0 and budget.stats['hard_sheds'] == 1
+    assert budget.stats['shed_bytes'] == 250 * KB and session.tts_reference is not None
+
+    sessions = [_session(f'client_{i}', audio_chunks=10) for i in range(9)]
+    assert budget.admit(sessions[:8])
+    assert not budget.admit(sessions)
+    status = budget.get_status(sessions)
+    assert status['rejected_sessions'] == 1 and status['bytes']['audio'] == 9 * 100 * KB
+
+
+def test_send_queue_backlog_counts_once_per_connection():
+    """发送队列中的积压计入会话的待发送消息；多路复用会话共用网关连接的队列，合计时只计一次"""
+    class _Queue:
+        bytes = 150 * KB
+
+    llm = LLMModule()
+    gateway, websocket = object(), object()
+    send_queues = {gateway: _Queue(), websocket: _Queue()}
+    budget = _budget(llm, send_queues=send_queues)
+
+    direct = ClientSession('direct', websocket)
+    channels = [ClientSession(f'mux_{i}', MuxChannel(gateway, f'session-{i}', 10)) for i in range(2)]
+    assert budget.account(direct)['outbound'] == 150 * KB
+    assert all(budget.account(session)['outbound'] == 150 * KB for session in channels)
+
+    status = budget.get_status([direct] + channels)
+    assert status['bytes']['outbound'] == 300 * KB
+    assert budget.total_bytes([direct] + channels) == 300 * KB
+    assert budget.enforce(direct) == 'soft'
+
+    # 积压占满预算时拒绝新会话
+    send_queues[gateway].bytes = 900 * KB
+    assert not budget.admit(channels)
+
+
+if __name__ == "__main__":
+    test_accounting_by_category()
+    test_soft_limit_sheds_history_then_outbound()
+    test_hard_limit_and_global_admission()
+    test_send_queue_backlog_counts_once_per_connection()
+    print("🎉 会话内存核算测试通过")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试LLM模型路由
+验证首token时间和吞吐量的拟合、按预期延迟选择模型、上下文窗口约束，以及绕开连续失败的模型
+"""
+
+import logging
+from model_router import ModelRouter
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+FAST_START = 'fast-start'
+FAST_STREAM = 'fast-stream'
+CONTEXT = {FAST_START: 8000, FAST_STREAM: 1000000}
+
+
+def _router(**kwargs) -> ModelRouter:
+    options = dict(min_samples=3, explore_rate=0.0, failure_threshold=2, recovery_timeout=60)
+    options.update(kwargs)
+    return ModelRouter([FAST_START, FAST_STREAM], FAST_START, CONTEXT, **options)
+
+
+def _feed(router: ModelRouter, model: str, ttft: float, tokens_per_second: float):
+    for tokens in (20, 50, 80, 100):
+        router.record_success(model, tokens, ttft + tokens / tokens_per_second)
+
+
+def test_fit_and_route_by_expected_latency():
+    """拟合首token时间和吞吐量；短回复选首token快的模型，长回复选吞吐量高的模型"""
+    router = _router()
+    _feed(router, FAST_START, ttft=0.2, tokens_per_second=20)
+    _feed(router, FAST_STREAM, ttft=1.0, tokens_per_second=200)
+
+    stats = router.get_status()['models'][FAST_START]
+    assert abs(stats['ttft'] - 0.2) < 1e-6 and abs(stats['tokens_per_second'] - 20) < 1e-6
+
+    assert router.choose(prompt_tokens=100, max_tokens=10) == FAST_START
+    assert router.choose(prompt_tokens=100, max_tokens=100) == FAST_STREAM
+    assert router.get_status()['decisions']['routed'] == {FAST_START: 1, FAST_STREAM: 1}
+
+
+def test_context_constraint():
+    """提示词加生成长度超过上下文窗口的模型不参与路由"""
+    router = _router()
+    _feed(router, FAST_START, ttft=0.1, tokens_per_second=100)
+    _feed(router, FAST_STREAM, ttft=2.0, tokens_per_second=100)
+
+    assert router.choose(prompt_tokens=100, max_tokens=100) == FAST_START
+    assert router.choose(prompt_tokens=9000, max_tokens=100) == FAST_STREAM
+    assert router.get_status()['decisions']['skipped_context'] == 1
+
+
+def test_steer_away_from_degraded_model():
+    """连续失败的模型暂停路由，首选模型样本不足时先使用首选模型"""
+    router = _router()
+    assert router.choose(prompt_tokens=100, max_tokens=100) == FAST_START
+
+    _feed(router, FAST_START, ttft=0.1, tokens_per_second=100)
+    _feed(router, FAST_STREAM, ttft=2.0, tokens_per_second=100)
+    router.record_failure(FAST_START)
+    router.record_failure(FAST_START)
+
+    assert router.choose(prompt_tokens=100, max_tokens=100) == FAST_STREAM
+    status = router.get_status()
+    assert status['models'][FAST_START]['state'] == 'open'
+    assert status['decisions']['skipped_degraded'] == 1
+
+
+if __name__ == "__main__":
+    test_fit_and_route_by_expected_latency()
+    test_context_constraint()
+    test_steer_away_from_degraded_model()
+    print("🎉 模型路由测试通过")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试会话多路复用
+验证帧格式、一条连接上多个逻辑会话的消息路由和单独关闭，以及按会话的流量控制
+"""
+
+import json
+import asyncio
+import logging
+
+# 先配置日志，避免导入server时写入server.log
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+from server import WebRTCServer
+from config import MUX_CONFIG
+from multiplex import MuxChannel, pack_binary_frame, unpack_binary_frame
+
+
+class _Request:
+    def __init__(self, path: str):
+        self.path = path
+
+
+class _FakeGateway:
+    """模拟网关的多路复用连接：incoming 中的帧依次交给服务器，None 表示连接关闭"""
+
+    def __init__(self):
+        self.request = _Request(MUX_CONFIG['PATH'])
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent = []
+        self.close_code = None
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    def push(self, frame):
+        self.incoming.put_nowait(frame if isinstance(frame, bytes) else json.dumps(frame))
+
+    def messages_for(self, session_id: str, message_type: str):
+        return [message for message in self.sent if message.get('session') == session_id and message['type'] == message_type]
+
+
+def test_frame_format():
+    """二进制帧带会话ID前缀；发出的JSON消息插入会话ID字段后仍是合法JSON"""
+    frame = pack_binary_frame('用户-1', b'\x01\x02')
+    assert unpack_binary_frame(frame) == ('用户-1', b'\x01\x02')
+    for bad in (b'', b'\x00abc', b'\x09ab'):
+        try:
+            unpack_binary_frame(bad)
+            assert False, bad
+        except ValueError:
+            pass
+
+    async def run():
+        gateway = _FakeGateway()
+        channel = MuxChannel(gateway, 'u1', max_pending=4)
+        await channel.send(json.dumps({'type': 'pong', 'text': '你好'}, ensure_ascii=False))
+        await channel.send('{}')
+        assert gateway.sent == [{'session': 'u1', 'type': 'pong', 'text': '你好'}, {'session': 'u1'}]
+
+    asyncio.run(run())
+
+
+def test_sessions_routed_over_one_connection():
+    """一条连接上的多个会话各自建立、收发消息，单独关闭的会话被清理，其余不受影响"""
+    async def run():
+        server = WebRTCServer()
+        gateway = _FakeGateway()
+        task = asyncio.create_task(server.handle_client(gateway))
+
+        gateway.push({'type': 'session_open', 'session': 'alice'})
+        gateway.push({'type': 'session_open', 'session': 'bob'})
+        gateway.push({'type': 'ping', 'session': 'bob'})
+        gateway.push(pack_binary_frame('alice', b'\x00\x01' * 800))
+        await asyncio.sleep(0.05)
+
+        alice = gateway.messages_for('alice', 'connection_established')[0]['client_id']
+        bob = gateway.messages_for('bob', 'connection_established')[0]['client_id']
+        assert alice != bob and len(server.clients) == 2
+        assert gateway.messages_for('bob', 'pong') and not gateway.messages_for('alice', 'pong')
+        assert server.clients[alice].stats.total_audio_bytes == 1600
+
+        gateway.push({'type': 'session_close', 'session': 'alice'})
+        await asyncio.sleep(0.05)
+        assert alice not in server.clients and bob in server.clients
+        assert server.get_server_status()['mux']['sessions'] == 1
+
+        gateway.close_code = 1000
+        gateway.incoming.put_nowait(None)
+        await task
+        assert not server.clients and server.mux_stats['connections'] == 0
+
+    asyncio.run(run())
+
+
+def test_per_session_flow_control():
+    """会话处理跟不上时只暂停该会话：丢弃新帧并通知暂停，队列排空后通知恢复"""
+    async def run():
+        server = WebRTCServer()
+        release = asyncio.Event()
+        handled = []
+
+        async def slow_process_message(client_id, message):
+            await release.wait()
+            handled.append(client_id)
+
+        server.process_message = slow_process_message
+        gateway = _FakeGateway()
+        task = asyncio.create_task(server.handle_client(gateway))
+        gateway.push({'type': 'session_open', 'session': 'slow'})
+        await asyncio.sleep(0.01)
+
+        for _ in range(MUX_CONFIG['MAX_PENDING_FRAMES'] + 5):
+            gateway.push({'type': 'ping', 'session': 'slow'})
+        await asyncio.sleep(0.05)
+
+        paused = gateway.messages_for('slow', 'flow_control')
+        assert len(paused) == 1 and paused[0]['paused'] is True
+        assert server.mux_stats['dropped_frames'] >= 4
+
+        release.set()
+        await asyncio.sleep(0.05)
+        assert gateway.messages_for('slow', 'flow_control')[-1]['paused'] is False
+
+        gateway.close_code = 1000
+        gateway.incoming.put_nowait(None)
+        await task
+
+    original = MUX_CONFIG['MAX_PENDING_FRAMES']
+    MUX_CONFIG['MAX_PENDING_FRAMES'] = 8
+    try:
+        asyncio.run(run())
+    finally:
+        MUX_CONFIG['MAX_PENDING_FRAMES'] = original
+
+
+if __name__ == "__main__":
+    test_frame_format()
+    test_sessions_routed_over_one_connection()
+    test_per_session_flow_control()
+    print("🎉 会话多路复用测试通过")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试重采样和声道下混
+验证逐帧处理与整段处理一致、通带保持而高于新奈奎斯特频率的成分被滤除、立体声下混，
+以及服务器按客户端声明的采集格式把上行音频转换为16kHz单声道、按播放采样率转换TTS音频
+"""
+
+import io
+import json
+import base64
+import wave
+import asyncio
+import logging
+
+import numpy as np
+
+# 先配置日志，避免导入server时写入server.log
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+from server import WebRTCServer
+from client_session import ClientSession
+from resampler import Resampler, convert_wav, downmix, read_wav, resample_pcm
+
+
+def _tone(frequency: float, rate: int, seconds: float = 1.0, channels: int = 1) -> bytes:
+    t = np.arange(int(rate * seconds)) / rate
+    samples = (np.sin(2 * np.pi * frequency * t) * 16000).astype('<i2')
+    return np.repeat(samples, channels).tobytes()
+
+
+def _peak(pcm: bytes) -> int:
+    """去掉首尾滤波器暖机部分后的峰值"""
+    samples = np.frombuffer(pcm, dtype='<i2')
+    return int(np.abs(samples[400:-400]).max())
+
+
+def test_frame_by_frame_matches_whole_signal():
+    """44.1/48kHz 逐帧重采样与整段一次处理只有舍入误差，输出长度按比例"""
+    for rate in (44100, 48000, 22050):
+        pcm = _tone(1000, rate)
+        whole = np.frombuffer(resample_pcm(pcm, rate, 16000), dtype='<i2')
+        resampler = Resampler(rate, 16000)
+        frames = b''.join(resampler.process(pcm[i:i + 2048]) for i in range(0, len(pcm), 2048))
+        framed = np.frombuffer(frames, dtype='<i2')
+
+        assert abs(framed.size - 16000) <= 1 and framed.size == whole.size
+        assert np.abs(framed.astype(np.int32) - whole).max() <= 8
+
+
+def test_passband_and_anti_aliasing():
+    """1kHz 保持原幅度；10kHz 高于16kHz的奈奎斯特频率，被滤除而不是混叠成6kHz"""
+    assert abs(_peak(resample_pcm(_tone(1000, 48000), 48000, 16000)) - 16000) < 200
+    assert _peak(resample_pcm(_tone(10000, 48000), 48000, 16000)) < 50
+    assert _peak(resample_pcm(_tone(10000, 44100), 44100, 16000)) < 50
+
+    # 上采样（TTS 16kHz → 48kHz 播放）
+    assert abs(_peak(resample_pcm(_tone(1000, 16000), 16000, 48000)) - 16000) < 200
+
+    # 立体声下混取两声道平均
+    stereo = np.array([1000, 3000, -2000, 2000], dtype='<i2').tobytes()
+    assert np.allclose(downmix(stereo, 2) * 32768, [2000, 0])
+
+
+def test_server_normalizes_uplink_and_tts():
+    """客户端声明48kHz立体声采集和48kHz播放：上行帧转换为16kHz单声道，TTS按48kHz下发"""
+    class _FakeWebSocket:
+        def __init__(self):
+            self.sent = []
+
+        async def send(self, message):
+            self.sent.append(json.loads(message))
+
+    async def run():
+        server = WebRTCServer()
+        websocket = _FakeWebSocket()
+        session = ClientSession('client', websocket)
+        server.clients['client'] = session
+
+        await server.handle_codec_select('client', {'codec': 'pcm16', 'sample_rate': 48000, 'channels': 2,
+                                                    'playback_rate': 48000})
+        selected = websocket.sent[-1]
+        assert (selected['sample_rate'], selected['channels'], selected['playback_rate']) == (48000, 2, 48000)
+
+        pcm = _tone(1000, 48000, seconds=0.5, channels=2)
+        for i in range(0, len(pcm), 4096):
+            await server.handle_binary_audio_data('client', pcm[i:i + 4096])
+        buffered = b''.join(session.audio_buffer)
+        assert abs(len(buffered) // 2 - 8000) <= 1
+        assert abs(_peak(buffered) - 16000) < 200
+        session.cancel_asr_task()
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(16000)
+            wav_file.writeframes(_tone(440, 16000))
+        await server.deliver_tts_audio('client', '你好', buffer.getvalue())
+        delivered = base64.b64decode(websocket.sent[-1]['audio'])
+        _, rate, channels = read_wav(delivered)
+        assert (rate, channels) == (48000, 1)
+        assert convert_wav(delivered, 48000) is delivered
+
+        # 不支持的格式回退到16kHz单声道，不做转换
+        await server.handle_codec_select('client', {'codec': 'pcm16', 'sample_rate': 12345, 'channels': 6})
+        assert session.resampler is None and websocket.sent[-1]['sample_rate'] == 16000
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_frame_by_frame_matches_whole_signal()
+    test_passband_and_anti_aliasing()
+    test_server_normalizes_uplink_and_tts()
+    print("🎉 重采样和声道下混测试通过")
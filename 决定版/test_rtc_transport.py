@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试WebRTC媒体传输
+在本机用aiortc对等端回环：上行Opus音频解码为16kHz PCM进入处理流程，静音不转发；
+下行TTS音频经Opus轨道送达对端，并可被打断。未安装aiortc时跳过
+"""
+
+import io
+import wave
+import asyncio
+import logging
+import numpy as np
+from rtc_transport import RTC_AVAILABLE, RTCTransport, TTSAudioTrack
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+def _tone(seconds: float, sample_rate: int, amplitude: int = 8000) -> bytes:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * 300 * t)).astype('<i2').tobytes()
+
+
+def _wav(pcm: bytes, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+
+async def _wait_for(condition, timeout: float = 10.0):
+    deadline = asyncio.get_event_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_event_loop().time() < deadline, "等待超时"
+        await asyncio.sleep(0.05)
+
+
+async def _loopback():
+    from aiortc import RTCPeerConnection, RTCSessionDescription
+
+    received = []
+    transport = RTCTransport(lambda client_id, pcm: received.append((client_id, pcm)))
+
+    # 模拟浏览器：麦克风轨道先发送1秒有声音频，之后为静音
+    client_pc = RTCPeerConnection()
+    microphone = TTSAudioTrack(48000, 20)
+    microphone.push_pcm(_tone(1.0, 48000))
+    client_pc.addTrack(microphone)
+
+    downlink_peaks = []
+
+    async def collect(track):
+        while True:
+            frame = await track.recv()
+            downlink_peaks.append(int(np.abs(frame.to_ndarray()).max()))
+
+    tasks = []
+    client_pc.on('track', lambda track: tasks.append(asyncio.ensure_future(collect(track))))
+
+    try:
+        await client_pc.setLocalDescription(await client_pc.createOffer())
+        answer = await transport.handle_offer('client_a', client_pc.localDescription.sdp)
+        await client_pc.setRemoteDescription(RTCSessionDescription(sdp=answer['sdp'], type=answer['type']))
+        await _wait_for(lambda: transport.is_connected('client_a'))
+
+        # 上行：有声音频按1024样本（16kHz）切块送入处理流程，静音不转发
+        await _wait_for(lambda: microphone.queued_seconds == 0 and len(received) >= 10)
+        await asyncio.sleep(0.5)
+        assert {client_id for client_id, _ in received} == {'client_a'}
+        assert all(len(pcm) == 2048 for _, pcm in received)
+        assert 10 <= len(received) <= 18
+        status = transport.get_transport_status()
+        assert status['connected_peers'] == 1 and status['received_bytes'] > status['voiced_chunks'] * 2048
+
+        # 下行：TTS音频经Opus轨道送达对端
+        silent_frames = len(downlink_peaks)
+        duration = await transport.play_audio('client_a', _wav(_tone(0.5, 16000), 16000))
+        assert abs(duration - 0.5) < 0.01
+        await _wait_for(lambda: any(peak > 2000 for peak in downlink_peaks[silent_frames:]))
+
+        # 打断：丢弃尚未播放的部分
+        await transport.play_audio('client_a', _wav(_tone(2.0, 16000), 16000))
+        assert transport.interrupt('client_a') > 0
+        assert transport.peers['client_a'].tts_track.queued_seconds == 0
+
+    finally:
+        for task in tasks:
+            task.cancel()
+        await transport.close_all()
+        await client_pc.close()
+
+    assert transport.get_transport_status()['active_peers'] == 0
+
+
+def test_rtc_loopback():
+    """本机回环：上行音频进入处理流程，下行TTS音频送达对端"""
+    if not RTC_AVAILABLE:
+        print("⚠️ 未安装aiortc，跳过WebRTC回环测试")
+        return
+    asyncio.run(asyncio.wait_for(_loopback(), timeout=30))
+
+
+def test_tts_track_pacing_and_silence():
+    """下行轨道无数据时输出静音帧，帧时间戳连续递增"""
+    if not RTC_AVAILABLE:
+        print("⚠️ 未安装aiortc，跳过WebRTC轨道测试")
+        return
+
+    async def run():
+        track = TTSAudioTrack(48000, 20)
+        track.push_pcm(_tone(0.03, 48000))
+        frames = [await track.recv() for _ in range(3)]
+        assert [frame.pts for frame in frames] == [0, 960, 1920]
+        assert all(frame.samples == 960 for frame in frames)
+        assert np.abs(frames[0].to_ndarray()).max() > 0
+        assert np.abs(frames[2].to_ndarray()).max() == 0
+        track.stop()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_tts_track_pacing_and_silence()
+    test_rtc_loopback()
+    print("🎉 WebRTC媒体传输测试通过")
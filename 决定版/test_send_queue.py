@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试连接发送队列
+验证按顺序写出、积压的拥塞标记和慢消费者驱逐，广播只序列化一次且不等待慢连接，
+以及慢消费者被断开后会话转入断线宽限期、回复进入待发送队列
+"""
+
+import json
+import time
+import asyncio
+import logging
+
+# 先配置日志，避免导入server时写入server.log
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+from server import WebRTCServer
+from client_session import ClientSession
+from send_queue import SendQueue, SlowConsumerError
+
+
+class _GatedConnection:
+    """gate 打开时立即写出，关闭时写出一直阻塞（模拟接收缓慢的客户端）"""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.close_code = None
+
+    async def send(self, message):
+        await self.gate.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000, reason: str = ''):
+        self.close_code = code
+
+
+def test_queue_orders_detects_backlog_and_evicts():
+    """空闲时直接写出；积压超过高水位标记拥塞，排空后解除；超过上限或写出超时按慢消费者驱逐"""
+    async def run():
+        errors = []
+        connection = _GatedConnection()
+        queue = SendQueue(connection, max_bytes=3000, high_water=1000, send_timeout=5,
+                          on_error=lambda queue, error: errors.append(error))
+
+        await queue.send('a')
+        assert connection.sent == ['a']
+
+        connection.gate.clear()
+        for message in ('b' * 600, 'c' * 600):
+            assert queue.put(message)
+        assert queue.congested and queue.bytes == 1200
+        connection.gate.set()
+        await queue.send('d')
+        assert connection.sent == ['a', 'b' * 600, 'c' * 600, 'd'] and not queue.congested and queue.bytes == 0
+
+        connection.gate.clear()
+        assert queue.put('e' * 1000)
+        waiter = asyncio.ensure_future(queue.send('f' * 1000))
+        await asyncio.sleep(0)
+        assert not queue.put('g' * 1500)
+        try:
+            await waiter
+            assert False, "积压超限后应按慢消费者驱逐"
+        except SlowConsumerError:
+            pass
+        assert isinstance(errors[0], SlowConsumerError) and not queue.put('h')
+
+        # 单条消息超过发送超时仍未写出
+        stalled = SendQueue(_GatedConnection(), send_timeout=0.05, on_error=lambda queue, error: errors.append(error))
+        stalled.connection.gate.clear()
+        stalled.put('x')
+        started = time.time()
+        try:
+            await stalled.send('y')
+            assert False, "写出超时后应按慢消费者驱逐"
+        except SlowConsumerError:
+            pass
+        assert time.time() - started < 1 and len(errors) == 2
+
+    asyncio.run(run())
+
+
+def test_broadcast_serializes_once_and_skips_slow_client():
+    """广播立即返回，快客户端收到同一个序列化结果；卡住的客户端超时后被断开，不影响其他客户端"""
+    async def run():
+        server = WebRTCServer()
+        connections = [_GatedConnection() for _ in range(200)]
+        for index, connection in enumerate(connections):
+            server.clients[f'client-{index}'] = ClientSession(f'client-{index}', connection)
+
+        slow = connections[0]
+        slow.gate.clear()
+        server.get_send_queue(slow).send_timeout = 0.05
+
+        started = time.perf_counter()
+        assert await server.broadcast_message({'type': 'notice', 'text': '服务即将维护'}) == 200
+        assert time.perf_counter() - started < 0.5
+        await asyncio.sleep(0)
+
+        first = connections[1].sent[0]
+        assert json.loads(first)['text'] == '服务即将维护'
+        assert all(connection.sent[0] is first for connection in connections[1:]) and not slow.sent
+
+        await asyncio.sleep(0.2)
+        assert slow.close_code == 1013 and slow not in server.send_queues
+        status = server.get_server_status()['send']
+        assert status['evicted'] == 1 and status['broadcasts'] == 1 and status['queued_bytes'] == 0
+
+    asyncio.run(run())
+
+
+def test_slow_consumer_session_detaches_and_keeps_reply():
+    """等待写出的回复因慢消费者驱逐失败时，会话转入断线宽限期，回复进入待发送队列等待重连补发"""
+    async def run():
+        server = WebRTCServer()
+        connection = _GatedConnection()
+        session = ClientSession('client', connection)
+        server.clients['client'] = session
+
+        connection.gate.clear()
+        server.get_send_queue(connection).send_timeout = 0.05
+        await server.broadcast_message({'type': 'notice', 'text': '通知'})
+
+        assert await server.send_message(connection, {'type': 'llm_response', 'text': '回复'})
+        assert session.detached and session.websocket.origin is connection
+        assert [json.loads(message)['text'] for message in session.websocket.outbox] == ['回复']
+        await asyncio.sleep(0)
+        assert connection.close_code == 1013
+
+        # 同一连接上随后失败的消息进入同一个待发送队列
+        assert server.find_session_detached_from(connection) is session
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_queue_orders_detects_backlog_and_evicts()
+    test_broadcast_serializes_once_and_skips_slow_client()
+    test_slow_consumer_session_detaches_and_keeps_reply()
+    print("🎉 连接发送队列测试通过")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试断线恢复
+验证连接意外断开后会话保留、断线期间的消息暂存并在重连后按顺序补发，
+正常关闭时立即清理，以及宽限期到期后清理和待发送队列的容量限制
+"""
+
+import json
+import asyncio
+import logging
+
+# 先配置日志，避免导入server时写入server.log
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+from server import WebRTCServer
+from config import RESUME_CONFIG
+
+
+class _Request:
+    def __init__(self, path: str):
+        self.path = path
+
+
+class _FakeWebSocket:
+    """模拟WebSocket连接：incoming 中的消息依次交给服务器，None 表示连接关闭"""
+
+    def __init__(self, path: str = '/'):
+        self.request = _Request(path)
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent = []
+        self.close_code = None
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    def close_with(self, code: int):
+        self.close_code = code
+        self.incoming.put_nowait(None)
+
+
+async def _connect(server: WebRTCServer, path: str = '/'):
+    websocket = _FakeWebSocket(path)
+    task = asyncio.create_task(server.handle_client(websocket))
+    await asyncio.sleep(0.01)
+    return websocket, task
+
+
+def test_resume_replays_undelivered_messages():
+    """意外断开后会话保留，断线期间的回复在重连后按顺序补发，恢复令牌每次连接轮换"""
+    async def run():
+        server = WebRTCServer()
+        first, task = await _connect(server)
+        established = first.sent[0]
+        client_id, token = established['client_id'], established['resume_token']
+        server.clients[client_id].last_reply = '上一句回复'
+
+        first.close_with(1006)
+        await task
+        session = server.clients[client_id]
+        assert session.detached and session.last_reply == '上一句回复'
+
+        for i in range(3):
+            await server.send_message(session.websocket, {'type': 'llm_response', 'text': f'回复{i}'})
+
+        second, task = await _connect(server, f'/?resume={token}')
+        established = second.sent[0]
+        assert established['resumed'] and established['client_id'] == client_id
+        assert established['resume_token'] != token
+        assert [message['text'] for message in second.sent[1:]] == ['回复0', '回复1', '回复2']
+        assert not session.detached and session.websocket is second
+
+        # 旧令牌已失效
+        third, third_task = await _connect(server, f'/?resume={token}')
+        assert not third.sent[0]['resumed'] and third.sent[0]['client_id'] != client_id
+
+        second.close_with(1000)
+        third.close_with(1000)
+        await asyncio.gather(task, third_task)
+        stats = server.get_server_status()['resume']
+        assert stats['resumed'] == 1 and stats['replayed_messages'] == 3
+
+    asyncio.run(run())
+
+
+def test_normal_close_cleans_up_immediately():
+    """客户端正常关闭（1000）时立即清理会话，恢复令牌随之失效"""
+    async def run():
+        server = WebRTCServer()
+        websocket, task = await _connect(server)
+        client_id = websocket.sent[0]['client_id']
+
+        websocket.close_with(1000)
+        await task
+        assert client_id not in server.clients and not server.resume_tokens
+
+    asyncio.run(run())
+
+
+def test_grace_period_expiry_and_queue_bound():
+    """宽限期内未重连时清理会话；待发送队列满时丢弃最早的消息"""
+    async def run():
+        server = WebRTCServer()
+        websocket, task = await _connect(server)
+        client_id = websocket.sent[0]['client_id']
+        websocket.close_with(1006)
+        await task
+
+        connection = server.clients[client_id].websocket
+        for i in range(RESUME_CONFIG['MAX_QUEUED_MESSAGES'] + 2):
+            await server.send_message(connection, {'type': 'llm_response', 'text': f'回复{i}'})
+        assert len(connection.outbox) == RESUME_CONFIG['MAX_QUEUED_MESSAGES'] and connection.dropped == 2
+        assert json.loads(connection.outbox[0])['text'] == '回复2'
+
+        await server.expire_detached_session(server.clients[client_id], connection)
+        assert client_id not in server.clients and not server.resume_tokens
+        assert server.resume_stats['expired'] == 1
+
+    original = RESUME_CONFIG['GRACE_PERIOD']
+    RESUME_CONFIG['GRACE_PERIOD'] = 0
+    try:
+        asyncio.run(run())
+    finally:
+        RESUME_CONFIG['GRACE_PERIOD'] = original
+
+
+if __name__ == "__main__":
+    test_resume_replays_undelivered_messages()
+    test_normal_close_cleans_up_immediately()
+    test_grace_period_expiry_and_queue_bound()
+    print("🎉 断线恢复测试通过")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试会话存储
+验证对话历史可以跨断线重连、跨工作进程恢复，以及缺少接口方法的存储后端在创建时报错
+"""
+
+import os
+import tempfile
+import logging
+from session_store import SessionStore, MemorySessionStore, SQLiteSessionStore, CachedSessionStore
+from llm_module import LLMModule
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+
+def test_cached_store_write_behind():
+    """写入只更新缓存，flush后才落到后端"""
+    backend = MemorySessionStore()
+    store = CachedSessionStore(backend, flush_interval=60)
+
+    store.save('token_0001', {'history': [{'role': 'user', 'content': '你好'}]})
+    assert backend.load('token_0001') is None
+    assert store.load('token_0001')['history'][0]['content'] == '你好'
+
+    # 读取返回副本，调用方修改不影响缓存
+    store.load('token_0001')['history'].clear()
+    assert store.load('token_0001')['history'][0]['content'] == '你好'
+
+    assert store.flush() == 1
+    assert backend.load('token_0001')['history'][0]['content'] == '你好'
+    store.close()
+
+
+def test_history_survives_reconnect_across_workers():
+    """同一会话令牌在另一个LLM模块实例（模拟另一工作进程）中恢复历史"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'sessions.db')
+
+        # 工作进程A：对话后断开
+        store_a = CachedSessionStore(SQLiteSessionStore(db_path), flush_interval=60)
+        llm_a = LLMModule(session_store=store_a)
+        assert llm_a.bind_session('client_a', 'session_token_1') == 0
+        llm_a._save_conversation_history('client_a', '今天天气怎么样？', '今天晴。')
+        llm_a.clear_conversation_history('client_a')
+        store_a.close()
+
+        # 工作进程B：同一会话令牌重连
+        store_b = CachedSessionStore(SQLiteSessionStore(db_path), flush_interval=60)
+        llm_b = LLMModule(session_store=store_b)
+        assert llm_b.bind_session('client_b', 'session_token_1') == 2
+
+        messages = llm_b._build_conversation_messages('明天呢？', 'client_b')
+        assert [m['content'] for m in messages[1:]] == ['今天天气怎么样？', '今天晴。', '明天呢？']
+        store_b.close()
+
+
+def test_incomplete_backend_fails_on_construction():
+    """缺少 load、save_many、delete 任一方法的后端无法创建，不会等到调用时才失败"""
+    class _NoDelete(SessionStore):
+        def load(self, token, refresh=False):
+            return None
+
+        def save_many(self, items):
+            pass
+
+    try:
+        _NoDelete()
+        assert False, "缺少 delete 的后端不应创建成功"
+    except TypeError as e:
+        assert 'delete' in str(e)
+
+
+if __name__ == "__main__":
+    test_cached_store_write_behind()
+    test_history_survives_reconnect_across_workers()
+    test_incomplete_backend_fails_on_construction()
+    print("🎉 会话存储测试通过")
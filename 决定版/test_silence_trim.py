@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试ASR前静音裁剪
+验证首尾静音按余量裁剪、过长停顿被压缩、短停顿保持不变，以及节省字节数的统计
+"""
+
+import logging
+import numpy as np
+from audio_processor import AudioProcessor
+from silence_trim import trim_silence
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+RATE = 16000
+
+
+def _segment(seconds: float, voiced: bool) -> np.ndarray:
+    """生成一段有声（正弦）或静音（弱噪声）的16位PCM"""
+    n = int(seconds * RATE)
+    if voiced:
+        return (6000 * np.sin(2 * np.pi * 220 * np.arange(n) / RATE)).astype('<i2')
+    return np.random.default_rng(n).normal(0, 30, n).astype('<i2')
+
+
+def _pcm(*segments) -> bytes:
+    return np.concatenate([_segment(seconds, voiced) for seconds, voiced in segments]).tobytes()
+
+
+def _seconds(pcm: bytes) -> float:
+    return len(pcm) / 2 / RATE
+
+
+def test_edges_trimmed_to_margin():
+    """首尾静音只保留余量"""
+    pcm = _pcm((1.0, False), (0.5, True), (1.5, False))
+    trimmed, saved = trim_silence(pcm, RATE, edge_margin_ms=200, max_pause_ms=400)
+    assert abs(_seconds(trimmed) - 0.9) < 0.03
+    assert saved == len(pcm) - len(trimmed)
+
+
+def test_long_pause_collapsed_short_pause_kept():
+    """超过上限的句中停顿压缩到上限，较短的停顿保持不变"""
+    pcm = _pcm((0.3, True), (2.0, False), (0.3, True), (0.3, False), (0.3, True))
+    trimmed, _ = trim_silence(pcm, RATE, edge_margin_ms=0, max_pause_ms=400)
+    assert abs(_seconds(trimmed) - (0.3 + 0.4 + 0.3 + 0.3 + 0.3)) < 0.03
+
+
+def test_silent_or_fully_voiced_unchanged():
+    """全部静音时原样返回（交由ASR判断），全部有声时不做裁剪"""
+    silent = _pcm((1.0, False))
+    assert trim_silence(silent, RATE) == (silent, 0)
+
+    voiced = _pcm((1.0, True))
+    assert trim_silence(voiced, RATE) == (voiced, 0)
+
+
+def test_processor_trim_stats():
+    """音频处理模块统计裁剪节省的字节数"""
+    processor = AudioProcessor(buffer_size=50)
+    pcm = _pcm((1.0, False), (0.5, True), (1.0, False))
+    processor.add_audio_data('client_a', pcm)
+
+    trimmed = processor.trim_silence('client_a', processor.get_audio_data('client_a'))
+    assert len(trimmed) < len(pcm)
+    assert processor.processing_stats['client_a']['trimmed_bytes'] == len(pcm) - len(trimmed)
+    trim = processor.get_module_status()['trim']
+    assert trim['trimmed_requests'] == 1 and trim['saved_bytes'] == len(pcm) - len(trimmed)
+
+
+if __name__ == "__main__":
+    test_edges_trimmed_to_margin()
+    test_long_pause_collapsed_short_pause_kept()
+    test_silent_or_fully_voiced_unchanged()
+    test_processor_trim_stats()
+    print("🎉 静音裁剪测试通过")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多进程工作模式的监督器
+验证工作进程退出后按指数退避重启、统计窗口内重启次数达到上限后停止重启，
+窗口过后重新计数，以及指标汇总中列出熔断中的后端
+"""
+
+import logging
+from collections import deque
+
+import worker_pool
+from worker_pool import WorkerSupervisor
+
+# 配置日志
+logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] %(message)s')
+
+
+class _FakeProcess:
+    """已退出的工作进程替身"""
+
+    def __init__(self, alive: bool = False):
+        self.pid = 4242
+        self.exitcode = 1
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        pass
+
+
+class _Clock:
+    """替换 worker_pool 中的 time 模块，手动推进时间"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def _supervisor(clock: _Clock, **kwargs) -> WorkerSupervisor:
+    options = dict(restart_delay=1.0, max_restarts=3, restart_window=60)
+    options.update(kwargs)
+    supervisor = WorkerSupervisor(lambda *args, **kw: None, '127.0.0.1', 0, 1, **options)
+    supervisor.spawned = []
+
+    def spawn(worker_id):
+        supervisor.spawned.append(clock.now)
+        supervisor.processes[worker_id] = _FakeProcess()
+
+    supervisor._spawn_worker = spawn
+    supervisor.restart_history[0] = deque()
+    supervisor.processes[0] = _FakeProcess()
+    return supervisor
+
+
+def _run(supervisor: WorkerSupervisor, clock: _Clock, until: float, step: float = 0.25) -> list:
+    """按 step 推进时间并检查工作进程，返回每次安排重启时的退避等待时间"""
+    delays = []
+    while clock.now < until:
+        scheduled = dict(supervisor.pending_restarts)
+        supervisor._check_workers()
+        delays.extend(restart_at - clock.now for worker_id, restart_at in supervisor.pending_restarts.items()
+                      if scheduled.get(worker_id) != restart_at)
+        clock.now += step
+    return delays
+
+
+def test_restart_backoff_and_limit():
+    """每次重启的等待时间按 restart_delay * 2^n 增长，窗口内重启 max_restarts 次后不再重启"""
+    clock = _Clock()
+    original = worker_pool.time
+    worker_pool.time = clock
+    try:
+        supervisor = _supervisor(clock)
+        assert _run(supervisor, clock, until=1030) == [1.0, 2.0, 4.0]
+        assert supervisor.spawned == [1001.0, 1003.25, 1007.5] and supervisor.total_restarts == 3
+        assert 0 not in supervisor.processes and not supervisor.pending_restarts
+    finally:
+        worker_pool.time = original
+
+
+def test_restart_window_resets_backoff():
+    """距上次重启超过统计窗口后，重启次数重新计数，退避等待回到 restart_delay"""
+    clock = _Clock()
+    original = worker_pool.time
+    worker_pool.time = clock
+    try:
+        supervisor = _supervisor(clock, restart_window=5)
+        supervisor.processes[0].alive = True
+        supervisor.restart_history[0].extend([990.0, 992.0])
+
+        clock.now = 1000.0
+        supervisor.processes[0].alive = False
+        assert _run(supervisor, clock, until=1001.1) == [1.0]
+        assert supervisor.spawned == [1001.0] and list(supervisor.restart_history[0]) == [1001.0]
+    finally:
+        worker_pool.time = original
+
+
+def test_aggregated_metrics_list_open_breakers():
+    """汇总指标中列出各工作进程熔断中的后端"""
+    supervisor = WorkerSupervisor(lambda *args, **kw: None, '127.0.0.1', 0, 2)
+    supervisor.processes = {0: _FakeProcess(alive=True), 1: _FakeProcess(alive=True)}
+    supervisor.worker_metrics = {
+        0: {'pid': 1, 'timestamp': 0, 'status': {'total_clients': 3, 'modules': {
+            'asr': {'breaker': {'state': 'open'}}, 'llm': {'breaker': {'state': 'closed'}}}}},
+        1: {'pid': 2, 'timestamp': 0, 'status': {'total_clients': 2, 'modules': {
+            'tts': {'breaker': {'state': 'half_open'}}}}}
+    }
+
+    metrics = supervisor.get_aggregated_metrics()
+    assert metrics['workers_alive'] == 2 and metrics['total_clients'] == 5
+    assert metrics['open_breakers'] == ['#0/asr', '#1/tts']
+    assert metrics['per_worker'][0]['breakers'] == {'asr': 'open', 'llm': 'closed'}
+
+
+if __name__ == "__main__":
+    test_restart_backoff_and_limit()
+    test_restart_window_resets_backoff()
+    test_aggregated_metrics_list_open_breakers()
+    print("🎉 多进程监督器测试通过")
@@ -15,6 +15,11 @@ import wave
 import io
 from typing import Optional
 
+from circuit_breaker import CircuitBreaker
+from config import HEDGING_CONFIG, ERROR_THRESHOLDS, RETRY_CONFIG, API_TIMEOUTS, TURN_DEADLINE_CONFIG
+from deadline import Deadline, request_timeout
+from hedging import Hedger
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -41,6 +46,15 @@ class TTSModule:
             'aue': '6'       # 音频格式：3为mp3格式(默认)； 4为pcm-16k；5为pcm-8k；6为wav
         }
         
+        # 对冲请求：主请求出现长尾延迟时重复发送同一合成请求
+        self.hedger = Hedger.from_config('tts', HEDGING_CONFIG['TTS'], HEDGING_CONFIG)
+        
+        # 熔断器：百度TTS故障期间跳过语音合成，只返回文本
+        self.breaker = CircuitBreaker.from_config('TTS', ERROR_THRESHOLDS, RETRY_CONFIG)
+        
+        # 本轮预算将尽、只返回文本的次数
+        self.text_only_count = 0
+        
     def get_access_token(self) -> Optional[str]:
         """获取百度TTS访问令牌"""
         try:
@@ -94,8 +108,8 @@ class TTSModule:
             logger.error(f"❌ 获取TTS访问令牌时发生未知错误: {e}")
             return None
     
-    def synthesize_speech(self, text: str) -> Optional[bytes]:
-        """执行TTS语音合成"""
+    def synthesize_speech(self, text: str, deadline: Optional[Deadline] = None) -> Optional[bytes]:
+        """执行TTS语音合成（deadline 为本轮对话的截止时间，预算将尽时不再合成、只返回文本）"""
         try:
             logger.info(f"🔊 开始TTS语音合成: {text[:50]}...")
             
@@ -103,19 +117,55 @@ class TTSModule:
             if not self._validate_input_text(text):
                 return self.generate_beep_sound()
             
+            # 本轮预算将尽：跳过语音合成，客户端只显示文本回复
+            if deadline and deadline.remaining() < TURN_DEADLINE_CONFIG['TTS_TEXT_ONLY_BELOW']:
+                self.text_only_count += 1
+                logger.warning(f"⏱️ 本轮剩余预算 {deadline.remaining():.1f} 秒，跳过语音合成")
+                return None
+            
+            # 熔断打开时不再请求（也不生成提示音），客户端只显示文本回复
+            if not self.breaker.allow_request():
+                logger.warning("⚡ TTS服务熔断中，跳过语音合成")
+                return None
+            
             # 获取访问令牌
             access_token = self.get_access_token()
             if not access_token:
                 logger.error("❌ 无法获取TTS访问令牌")
+                self.breaker.record_failure()
                 return self.generate_beep_sound()
             
             # 执行TTS合成
-            return self._execute_tts_request(text, access_token)
+            return self._execute_tts_request(text, access_token, deadline)
             
         except Exception as e:
             logger.error(f"❌ TTS语音合成过程中发生未知错误: {e}")
+            self.breaker.record_failure()
             return self.generate_beep_sound()
     
+    def prerender_speech(self, text: str) -> Optional[bytes]:
+        """预合成固定回复的语音（失败时返回None而不是提示音，避免把提示音缓存下来）"""
+        try:
+            if not self._validate_input_text(text) or not self.breaker.allow_request():
+                return None
+            
+            access_token = self.get_access_token()
+            if not access_token:
+                self.breaker.record_failure()
+                return None
+            
+            audio_data = self._send_tts_request(text, access_token)
+            if audio_data:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            return audio_data
+        
+        except Exception as e:
+            logger.warning(f"⚠️ 预合成语音失败: {e}")
+            self.breaker.record_failure()
+            return None
+    
     def _validate_input_text(self, text: str) -> bool:
         """验证输入文本有效性"""
         if not text or not text.strip():
@@ -130,33 +180,47 @@ class TTSModule:
         logger.debug(f"✅ 输入文本验证通过: {len(text)} 字符")
         return True
     
-    def _execute_tts_request(self, text: str, access_token: str) -> Optional[bytes]:
-        """执行TTS API请求"""
+    def _execute_tts_request(self, text: str, access_token: str, deadline: Optional[Deadline] = None) -> Optional[bytes]:
+        """执行TTS API请求（主请求出现长尾延迟时发出对冲请求，取先返回的有效音频）"""
         try:
-            # 构建TTS API URL
-            tts_url = f"https://tsn.baidu.com/text2audio?tok={access_token}"
-            
-            # 构建请求参数
-            tts_params = self._build_tts_params(text, access_token)
-            
             logger.info(f"📤 发送TTS合成请求: {len(text)} 字符")
             
-            # 发送TTS请求
-            tts_response = requests.get(tts_url, params=tts_params, timeout=10)
+            audio_data = self.hedger.call(lambda: self._send_tts_request(text, access_token, deadline))
+            if audio_data:
+                self.breaker.record_success()
+                return audio_data
             
-            # 处理响应
-            return self._process_tts_response(tts_response)
+            self.breaker.record_failure()
+            return self.generate_beep_sound()
             
         except requests.exceptions.Timeout:
             logger.error("❌ TTS API请求超时")
+            self.breaker.record_failure()
             return self.generate_beep_sound()
         except requests.exceptions.RequestException as e:
             logger.error(f"❌ TTS API请求异常: {e}")
+            self.breaker.record_failure()
             return self.generate_beep_sound()
         except Exception as e:
             logger.error(f"❌ 执行TTS请求时发生未知错误: {e}")
+            self.breaker.record_failure()
             return self.generate_beep_sound()
     
+    def _send_tts_request(self, text: str, access_token: str, deadline: Optional[Deadline] = None) -> Optional[bytes]:
+        """发送一次TTS请求，返回音频数据（失败时返回None；请求超时不超过本轮剩余预算）"""
+        # 构建TTS API URL
+        tts_url = f"https://tsn.baidu.com/text2audio?tok={access_token}"
+        
+        # 构建请求参数
+        tts_params = self._build_tts_params(text, access_token)
+        
+        # 发送TTS请求
+        timeout = request_timeout(deadline, API_TIMEOUTS['TTS_REQUEST'])
+        tts_response = requests.get(tts_url, params=tts_params, timeout=timeout)
+        
+        # 处理响应
+        return self._process_tts_response(tts_response)
+    
     def _build_tts_params(self, text: str, access_token: str) -> dict:
         """构建TTS请求参数"""
         params = {
@@ -173,7 +237,7 @@ class TTSModule:
         return params
     
     def _process_tts_response(self, response: requests.Response) -> Optional[bytes]:
-        """处理TTS API响应"""
+        """处理TTS API响应，返回音频数据（失败时返回None）"""
         try:
             if response.status_code == 200:
                 # 检查响应内容类型
@@ -191,14 +255,14 @@ class TTSModule:
                         logger.error(f"❌ TTS API返回错误: {error_text}")
                     else:
                         logger.warning(f"⚠️ TTS响应格式异常: {content_type}")
-                    return self.generate_beep_sound()
+                    return None
             else:
                 logger.error(f"❌ TTS API请求失败: HTTP {response.status_code}")
-                return self.generate_beep_sound()
+                return None
                 
         except Exception as e:
             logger.error(f"❌ 处理TTS响应失败: {e}")
-            return self.generate_beep_sound()
+            return None
     
     def _is_audio_response(self, content: bytes, content_type: str) -> bool:
         """检查响应是否为音频数据"""
@@ -311,7 +375,10 @@ class TTSModule:
             'has_token': self.access_token is not None,
             'token_expires_in': max(0, self.token_expire_time - time.time()) if self.token_expire_time else 0,
             'api_key_configured': bool(self.API_KEY and self.SECRET_KEY),
-            'default_params': self.default_params.copy()
+            'default_params': self.default_params.copy(),
+            'hedging': self.hedger.get_stats(),
+            'breaker': self.breaker.get_status(),
+            'text_only': self.text_only_count
         }
     
     def reset_token(self):
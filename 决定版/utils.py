@@ -10,11 +10,18 @@
 import logging
 import json
 import time
-import hashlib
 import base64
+import hashlib
 from typing import Any, Dict, Optional, Union
 from datetime import datetime, timedelta
 
+# 可选依赖：xxhash（更快的128位非加密哈希），未安装时使用标准库的BLAKE2b
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -23,7 +30,7 @@ logger = logging.getLogger(__name__)
 # =============================================================================
 
 def create_message(message_type: str, data: Dict[str, Any] = None) -> str:
-            """创建标准格式的WebSocket消息"""
+    """创建标准格式的WebSocket消息"""
     try:
         message = {
             'type': message_type,
@@ -47,7 +54,7 @@ def create_message(message_type: str, data: Dict[str, Any] = None) -> str:
         }, ensure_ascii=False)
 
 def parse_message(message: str) -> Optional[Dict[str, Any]]:
-            """解析WebSocket消息"""
+    """解析WebSocket消息"""
     try:
         parsed = json.loads(message)
         
@@ -66,7 +73,7 @@ def parse_message(message: str) -> Optional[Dict[str, Any]]:
         return None
 
 def validate_message(message: Dict[str, Any]) -> bool:
-            """验证消息格式的有效性"""
+    """验证消息格式的有效性"""
     try:
         # 检查必需字段
         required_fields = ['type', 'timestamp']
@@ -98,11 +105,11 @@ def validate_message(message: Dict[str, Any]) -> bool:
         return False
 
 def generate_message_id() -> str:
-            """生成唯一的消息ID"""
+    """生成唯一的消息ID"""
     try:
         # 使用时间戳和随机数生成ID
         timestamp = str(int(time.time() * 1000))
-        random_part = str(hash(str(time.time()))[-6:])
+        random_part = str(hash(str(time.time())))[-6:]
         return f"msg_{timestamp}_{random_part}"
         
     except Exception as e:
@@ -114,7 +121,7 @@ def generate_message_id() -> str:
 # =============================================================================
 
 def format_timestamp(timestamp: float) -> str:
-            """格式化时间戳为可读格式"""
+    """格式化时间戳为可读格式"""
     try:
         return time.strftime('%H:%M:%S', time.localtime(timestamp))
         
@@ -123,7 +130,7 @@ def format_timestamp(timestamp: float) -> str:
         return "00:00:00"
 
 def format_datetime(timestamp: float, format_str: str = '%Y-%m-%d %H:%M:%S') -> str:
-            """格式化时间戳为指定格式的日期时间字符串"""
+    """格式化时间戳为指定格式的日期时间字符串"""
     try:
         return time.strftime(format_str, time.localtime(timestamp))
         
@@ -132,7 +139,7 @@ def format_datetime(timestamp: float, format_str: str = '%Y-%m-%d %H:%M:%S') ->
         return "1970-01-01 00:00:00"
 
 def get_time_difference(timestamp1: float, timestamp2: float) -> str:
-            """计算两个时间戳之间的时间差"""
+    """计算两个时间戳之间的时间差"""
     try:
         diff_seconds = abs(timestamp2 - timestamp1)
         
@@ -153,7 +160,7 @@ def get_time_difference(timestamp1: float, timestamp2: float) -> str:
         return "未知"
 
 def is_timestamp_recent(timestamp: float, max_age_seconds: int = 300) -> bool:
-            """检查时间戳是否在最近的时间内"""
+    """检查时间戳是否在最近的时间内"""
     try:
         current_time = time.time()
         age = current_time - timestamp
@@ -169,7 +176,7 @@ def is_timestamp_recent(timestamp: float, max_age_seconds: int = 300) -> bool:
 
 def log_performance(operation: str, start_time: float, success: bool = True, 
                    additional_info: Dict[str, Any] = None):
-            """记录性能日志"""
+    """记录性能日志"""
     try:
         duration = time.time() - start_time
         status = "✅" if success else "❌"
@@ -190,7 +197,7 @@ def log_performance(operation: str, start_time: float, success: bool = True,
         logger.error(f"❌ 记录性能日志失败: {e}")
 
 def measure_performance(func):
-            """性能测量装饰器"""
+    """性能测量装饰器"""
     def wrapper(*args, **kwargs):
         start_time = time.time()
         try:
@@ -203,7 +210,7 @@ def measure_performance(func):
     return wrapper
 
 def get_performance_stats() -> Dict[str, Any]:
-            """获取系统性能统计信息"""
+    """获取系统性能统计信息"""
     try:
         import psutil
         
@@ -250,7 +257,7 @@ def get_performance_stats() -> Dict[str, Any]:
 # =============================================================================
 
 def validate_audio_data(audio_data: bytes, min_size: int = 1000) -> bool:
-            """验证音频数据有效性"""
+    """验证音频数据有效性"""
     try:
         if not audio_data:
             logger.warning("⚠️ 音频数据为空")
@@ -272,7 +279,7 @@ def validate_audio_data(audio_data: bytes, min_size: int = 1000) -> bool:
         return False
 
 def encode_audio_to_base64(audio_data: bytes) -> str:
-            """将音频数据编码为base64字符串"""
+    """将音频数据编码为base64字符串"""
     try:
         return base64.b64encode(audio_data).decode('utf-8')
         
@@ -281,7 +288,7 @@ def encode_audio_to_base64(audio_data: bytes) -> str:
         return ""
 
 def decode_audio_from_base64(base64_string: str) -> Optional[bytes]:
-            """将base64字符串解码为音频数据"""
+    """将base64字符串解码为音频数据"""
     try:
         return base64.b64decode(base64_string)
         
@@ -290,9 +297,16 @@ def decode_audio_from_base64(base64_string: str) -> Optional[bytes]:
         return None
 
 def calculate_audio_hash(audio_data: bytes) -> str:
-            """计算音频数据的哈希值"""
+    """
+    计算音频数据的指纹（用作缓存键，不用于安全校验）
+    
+    ASR结果缓存由所有客户端共用，键冲突会把别人的识别结果返回给当前用户，因此使用128位指纹：
+    安装了xxhash时用xxh3_128，否则用BLAKE2b（16字节摘要），都比MD5快，适合每段语音都要计算的热路径
+    """
     try:
-        return hashlib.md5(audio_data).hexdigest()
+        if XXHASH_AVAILABLE:
+            return xxhash.xxh3_128_hexdigest(audio_data)
+        return hashlib.blake2b(audio_data, digest_size=16).hexdigest()
         
     except Exception as e:
         logger.error(f"❌ 计算音频哈希失败: {e}")
@@ -303,7 +317,7 @@ def calculate_audio_hash(audio_data: bytes) -> str:
 # =============================================================================
 
 def get_memory_usage() -> Dict[str, Any]:
-            """获取内存使用情况"""
+    """获取内存使用情况"""
     try:
         import psutil
         
@@ -324,8 +338,32 @@ def get_memory_usage() -> Dict[str, Any]:
         logger.error(f"❌ 获取内存使用信息失败: {e}")
         return {'error': str(e)}
 
+def estimate_object_size(obj: Any) -> int:
+    """递归估算对象及其包含的容器、字符串、字节串占用的内存（字节）"""
+    import sys
+    from collections import deque
+
+    seen = set()
+    pending = [obj]
+    total = 0
+
+    while pending:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            pending.extend(current)
+
+    return total
+
 def cleanup_resources():
-            """清理系统资源"""
+    """清理系统资源"""
     try:
         import gc
         
@@ -343,7 +381,7 @@ def cleanup_resources():
         logger.error(f"❌ 资源清理失败: {e}")
 
 def check_disk_space(path: str = "/", min_free_gb: float = 1.0) -> bool:
-            """检查磁盘空间是否充足"""
+    """检查磁盘空间是否充足"""
     try:
         import psutil
         
@@ -418,7 +456,7 @@ ERROR_CODES = {
 # =============================================================================
 
 def test_utils():
-            """测试工具函数的基本功能"""
+    """测试工具函数的基本功能"""
     try:
         print("🧪 开始测试工具函数...")
         
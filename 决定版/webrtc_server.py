@@ -17,7 +17,8 @@ from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 
 # 导入配置
-from config import BASE_URL, DEFAULT_MODEL
+from config import BASE_URL, DEFAULT_MODEL, SEND_QUEUE_CONFIG
+from send_queue import SendQueue, SlowConsumerError
 
 # 配置日志
 logging.basicConfig(
@@ -38,6 +39,7 @@ class WebRTCServer:
         self.audio_buffers = {}  # 存储每个客户端的音频缓冲区
         self.last_audio_time = {}  # 最后音频时间
         self.asr_tasks = {}      # ASR任务
+        self.send_queues = {}    # 每个连接的发送队列（广播时不等待慢连接）
         
     async def start(self):
         """启动WebRTC服务器"""
@@ -65,6 +67,14 @@ class WebRTCServer:
         }
         
         self.clients[client_id] = client_info
+        if SEND_QUEUE_CONFIG['ENABLED']:
+            self.send_queues[websocket] = SendQueue(
+                websocket,
+                max_bytes=SEND_QUEUE_CONFIG['MAX_QUEUED_BYTES'],
+                high_water=SEND_QUEUE_CONFIG['HIGH_WATER_BYTES'],
+                send_timeout=SEND_QUEUE_CONFIG['SEND_TIMEOUT'],
+                on_error=self.handle_send_error
+            )
         self.audio_buffers[client_id] = deque(maxlen=50)  # 减少音频缓冲区大小，降低延迟
         self.last_audio_time[client_id] = time.time()  # 初始化最后音频时间
         # 不初始化asr_tasks，让它自然创建
@@ -327,11 +337,7 @@ class WebRTCServer:
         """ASR失败时的备用方案"""
         logger.warning("⚠️ 使用备用ASR方案")
         
-        # 模拟处理延迟
-        import time
-        time.sleep(1)
-        
-        # 返回模拟结果
+        # 直接返回模拟结果（不再模拟处理延迟，ASR故障时本轮应尽快结束）
         mock_result = "我听到了您的声音，这是一个测试回复"
         logger.info(f"✅ 备用ASR完成: {mock_result}")
         return mock_result
@@ -598,11 +604,28 @@ class WebRTCServer:
             logger.error(f"❌ 处理TTS打断失败: {e}")
     
     async def send_message(self, websocket, message):
-        """发送消息给客户端"""
+        """发送消息给客户端（经该连接的发送队列），返回是否写出"""
         try:
-            await websocket.send(json.dumps(message, ensure_ascii=False))
+            text = json.dumps(message, ensure_ascii=False)
+            queue = self.send_queues.get(websocket)
+            if queue is not None:
+                await queue.send(text)
+            else:
+                await websocket.send(text)
+            return True
+        except SlowConsumerError as e:
+            logger.warning(f"🐢 客户端接收太慢，消息未送达: {e}")
+        except websockets.exceptions.ConnectionClosed as e:
+            logger.info(f"🔌 连接已断开，消息未送达: {e}")
         except Exception as e:
             logger.error(f"❌ 发送消息失败: {e}")
+        return False
+    
+    def handle_send_error(self, queue, error):
+        """连接被按慢消费者驱逐时断开连接，由连接处理流程清理客户端资源"""
+        if isinstance(error, SlowConsumerError):
+            logger.warning(f"🐢 客户端接收太慢，断开连接: {error}")
+            asyncio.create_task(queue.connection.close(1013, 'slow consumer'))
     
     async def send_error(self, client_id, error_message):
         """发送错误消息给客户端"""
@@ -619,6 +642,9 @@ class WebRTCServer:
         """清理客户端资源"""
         try:
             if client_id in self.clients:
+                queue = self.send_queues.pop(self.clients[client_id]['websocket'], None)
+                if queue is not None:
+                    queue.close()
                 del self.clients[client_id]
             
             if client_id in self.audio_buffers:
@@ -640,16 +666,29 @@ class WebRTCServer:
             logger.error(f"❌ 清理客户端资源失败: {e}")
     
     async def broadcast_message(self, message):
-        """广播消息给所有客户端"""
+        """广播消息给所有客户端：只序列化一次，放入各连接的发送队列后立即返回，慢连接不阻塞其他客户端；
+        未启用发送队列时各连接并发写出，等待全部完成"""
+        text = json.dumps(message, ensure_ascii=False)
         disconnected_clients = []
+        direct_sends = []
         
-        for client_id, client_info in self.clients.items():
-            try:
-                await self.send_message(client_info['websocket'], message)
-            except Exception as e:
-                logger.error(f"❌ 广播消息给客户端 {client_id} 失败: {e}")
+        for client_id, client_info in list(self.clients.items()):
+            websocket = client_info['websocket']
+            queue = self.send_queues.get(websocket)
+            if queue is None:
+                # 未启用发送队列：各连接并发写出同一个序列化结果
+                direct_sends.append((client_id, websocket.send(text)))
+            elif not queue.put(text):
+                logger.error(f"❌ 广播消息给客户端 {client_id} 失败: {queue.error}")
                 disconnected_clients.append(client_id)
         
+        if direct_sends:
+            results = await asyncio.gather(*(send for _, send in direct_sends), return_exceptions=True)
+            for (client_id, _), result in zip(direct_sends, results):
+                if isinstance(result, Exception):
+                    logger.error(f"❌ 广播消息给客户端 {client_id} 失败: {result}")
+                    disconnected_clients.append(client_id)
+        
         # 清理断开的客户端
         for client_id in disconnected_clients:
             await self.cleanup_client(client_id)
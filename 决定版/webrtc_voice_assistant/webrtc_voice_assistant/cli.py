@@ -9,6 +9,7 @@ import argparse
 import sys
 import logging
 from .server import WebRTCServer
+from .worker_pool import run_workers
 from . import get_info, create_server
 
 def setup_logging(verbose=False):
@@ -32,13 +33,14 @@ def print_banner():
 def print_help():
     """打印帮助信息"""
     print("\n📖 使用说明:")
-    print("  启动服务器: webrtc-voice-assistant start [--host HOST] [--port PORT]")
+    print("  启动服务器: webrtc-voice-assistant start [--host HOST] [--port PORT] [--workers N]")
     print("  查看信息:  webrtc-voice-assistant info")
     print("  查看帮助:  webrtc-voice-assistant --help")
     
     print("\n🔧 参数说明:")
     print("  --host HOST    服务器主机地址 (默认: localhost)")
     print("  --port PORT    服务器端口 (默认: 8765)")
+    print("  --workers N    工作进程数，大于1时通过SO_REUSEPORT共享端口 (默认: 1)")
     print("  --verbose     启用详细日志")
     print("  --version     显示版本信息")
 
@@ -65,6 +67,17 @@ async def start_server(host, port, verbose):
             traceback.print_exc()
         sys.exit(1)
 
+def start_workers(host, port, workers):
+    """以多进程模式启动WebRTC服务器"""
+    print_banner()
+    print(f"\n🏭 多进程模式: {workers} 个工作进程")
+    print(f"📍 地址: {host}:{port}")
+    print("\n按 Ctrl+C 停止服务器")
+    print("-" * 60)
+    
+    if not run_workers(WebRTCServer, host, port, workers):
+        sys.exit(1)
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(
@@ -74,6 +87,7 @@ def main():
 示例:
   webrtc-voice-assistant start              # 启动服务器
   webrtc-voice-assistant start --port 8888  # 指定端口
+  webrtc-voice-assistant start --workers 4  # 4个工作进程共享端口
   webrtc-voice-assistant info               # 查看包信息
         """
     )
@@ -84,6 +98,7 @@ def main():
     start_parser = subparsers.add_parser('start', help='启动WebRTC服务器')
     start_parser.add_argument('--host', default='localhost', help='服务器主机地址 (默认: localhost)')
     start_parser.add_argument('--port', type=int, default=8765, help='服务器端口 (默认: 8765)')
+    start_parser.add_argument('--workers', type=int, default=1, help='工作进程数，大于1时通过SO_REUSEPORT共享端口 (默认: 1)')
     start_parser.add_argument('--verbose', action='store_true', help='启用详细日志')
     
     # info 命令
@@ -101,7 +116,10 @@ def main():
     
     if args.command == 'start':
         setup_logging(args.verbose)
-        asyncio.run(start_server(args.host, args.port, args.verbose))
+        if args.workers > 1:
+            start_workers(args.host, args.port, args.workers)
+        else:
+            asyncio.run(start_server(args.host, args.port, args.verbose))
     
     elif args.command == 'info':
         info = get_info()
@@ -4,6 +4,7 @@
 WebRTC语音助手服务端 - 模块化架构
 """
 
+import os
 import asyncio
 import websockets
 import logging
@@ -22,9 +23,10 @@ logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(
 logger = logging.getLogger(__name__)
 
 class WebRTCServer:
-    def __init__(self, host='localhost', port=8765):
+    def __init__(self, host='localhost', port=8765, reuse_port=False):
         self.host = host
         self.port = port
+        self.reuse_port = reuse_port  # 多进程模式下多个工作进程共享同一端口
         
         # 初始化功能模块
         self.asr_module = ASRModule()
@@ -39,7 +41,8 @@ class WebRTCServer:
     async def start(self):
         logger.info(f"🚀 启动WebRTC服务器 {self.host}:{self.port}")
         try:
-            async with websockets.serve(self.handle_client, self.host, self.port):
+            serve_kwargs = {'reuse_port': True} if self.reuse_port else {}
+            async with websockets.serve(self.handle_client, self.host, self.port, **serve_kwargs):
                 logger.info(f"✅ WebRTC服务器已启动，监听端口 {self.port}")
                 await asyncio.Future()
         except Exception as e:
@@ -196,6 +199,14 @@ class WebRTCServer:
         except Exception as e:
             logger.error(f"❌ 发送消息失败: {e}")
     
+    def get_server_status(self) -> dict:
+        return {
+            'pid': os.getpid(),
+            'host': self.host,
+            'port': self.port,
+            'total_clients': len(self.clients)
+        }
+    
     async def cleanup_client(self, client_id: str):
         try:
             self.audio_processor.cleanup_client(client_id)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程工作模式
+在同一端口上通过 SO_REUSEPORT 启动多个互不共享状态的服务器进程，
+由主进程负责监督、异常重启和指标汇总，使单机可以利用全部CPU核心
+
+版本: 2.0.0
+"""
+
+import os
+import time
+import queue
+import signal
+import socket
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+from typing import Any, Callable, Dict
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def is_reuse_port_supported() -> bool:
+    """检查当前平台是否支持 SO_REUSEPORT"""
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        return False
+
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _worker_main(worker_id: int, server_factory: Callable, host: str, port: int,
+                 metrics_queue, metrics_interval: float):
+    """工作进程入口"""
+    # Ctrl+C 由主进程统一处理，工作进程只响应主进程发送的 SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    try:
+        asyncio.run(_run_worker(worker_id, server_factory, host, port, metrics_queue, metrics_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_worker(worker_id: int, server_factory: Callable, host: str, port: int,
+                      metrics_queue, metrics_interval: float):
+    """在工作进程中运行服务器，并定期上报指标"""
+    server = server_factory(host, port, reuse_port=True)
+    logger.info(f"👷 工作进程 #{worker_id} 启动 (PID: {os.getpid()})")
+
+    async def report_metrics():
+        while True:
+            try:
+                metrics_queue.put_nowait({
+                    'worker_id': worker_id,
+                    'pid': os.getpid(),
+                    'timestamp': time.time(),
+                    'status': server.get_server_status()
+                })
+            except Exception as e:
+                logger.warning(f"⚠️ 工作进程 #{worker_id} 上报指标失败: {e}")
+            await asyncio.sleep(metrics_interval)
+
+    reporter = asyncio.create_task(report_metrics())
+    try:
+        await server.start()
+    finally:
+        reporter.cancel()
+
+
+class WorkerSupervisor:
+    """工作进程监督器"""
+
+    def __init__(self, server_factory: Callable, host: str, port: int, workers: int,
+                 metrics_interval: float = 60, restart_delay: float = 1.0,
+                 max_restarts: int = 5, restart_window: float = 60):
+        """
+        初始化工作进程监督器
+
+        Args:
+            server_factory: 服务器工厂，调用方式为 server_factory(host, port, reuse_port=True)，
+                            返回的对象需提供 start() 协程和 get_server_status() 方法
+            host (str): 监听地址
+            port (int): 监听端口（所有工作进程共享）
+            workers (int): 工作进程数
+            metrics_interval (float): 工作进程上报及主进程汇总指标的间隔（秒）
+            restart_delay (float): 工作进程退出后重启前的等待时间（秒）
+            max_restarts (int): 单个工作进程在 restart_window 内允许的最大重启次数
+            restart_window (float): 重启次数统计窗口（秒）
+        """
+        self.server_factory = server_factory
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.metrics_interval = metrics_interval
+        self.restart_delay = restart_delay
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+
+        # 工作进程管理
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.restart_history: Dict[int, deque] = {}
+        self.pending_restarts: Dict[int, float] = {}
+        self.total_restarts = 0
+
+        # 指标汇总：worker_id -> 最近一次上报
+        self.worker_metrics: Dict[int, Dict[str, Any]] = {}
+        self.metrics_queue = multiprocessing.Queue()
+
+        self.is_running = False
+        self.start_time = None
+
+    def _spawn_worker(self, worker_id: int):
+        """启动（或重启）一个工作进程"""
+        process = multiprocessing.Process(
+            target=_worker_main,
+            args=(worker_id, self.server_factory, self.host, self.port,
+                  self.metrics_queue, self.metrics_interval),
+            name=f"webrtc-worker-{worker_id}",
+            daemon=False
+        )
+        process.start()
+        self.processes[worker_id] = process
+        logger.info(f"🚀 已启动工作进程 #{worker_id} (PID: {process.pid})")
+
+    def start(self):
+        """启动所有工作进程"""
+        logger.info(f"🏭 以多进程模式启动: {self.workers} 个工作进程 @ {self.host}:{self.port}")
+        self.is_running = True
+        self.start_time = time.time()
+
+        for worker_id in range(self.workers):
+            self.restart_history[worker_id] = deque()
+            self._spawn_worker(worker_id)
+
+    def _check_workers(self):
+        """检查工作进程存活状态，按退避策略重启退出的进程"""
+        now = time.time()
+
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive() or worker_id in self.pending_restarts:
+                continue
+
+            logger.warning(f"⚠️ 工作进程 #{worker_id} (PID: {process.pid}) 已退出，退出码: {process.exitcode}")
+            process.join(timeout=0)
+            self.worker_metrics.pop(worker_id, None)
+
+            # 统计窗口内的重启次数，防止崩溃循环
+            history = self.restart_history[worker_id]
+            while history and now - history[0] > self.restart_window:
+                history.popleft()
+
+            if len(history) >= self.max_restarts:
+                logger.error(f"❌ 工作进程 #{worker_id} 在 {self.restart_window} 秒内重启 {len(history)} 次，停止重启")
+                del self.processes[worker_id]
+                continue
+
+            self.pending_restarts[worker_id] = now + self.restart_delay * (2 ** len(history))
+
+        # 执行到期的重启
+        for worker_id, restart_at in list(self.pending_restarts.items()):
+            if now >= restart_at:
+                del self.pending_restarts[worker_id]
+                self.restart_history[worker_id].append(now)
+                self.total_restarts += 1
+                logger.info(f"🔄 正在重启工作进程 #{worker_id}")
+                self._spawn_worker(worker_id)
+
+    def _drain_metrics(self):
+        """读取工作进程上报的所有指标"""
+        while True:
+            try:
+                report = self.metrics_queue.get_nowait()
+            except queue.Empty:
+                break
+            except Exception as e:
+                logger.warning(f"⚠️ 读取工作进程指标失败: {e}")
+                break
+
+            self.worker_metrics[report['worker_id']] = report
+
+    def get_aggregated_metrics(self) -> Dict[str, Any]:
+        """汇总所有工作进程的指标"""
+        self._drain_metrics()
+
+        alive = [wid for wid, p in self.processes.items() if p.is_alive()]
+        total_clients = 0
+        per_worker = {}
+        open_breakers = []
+
+        for worker_id, report in self.worker_metrics.items():
+            status = report.get('status', {})
+            total_clients += status.get('total_clients', 0)
+            breakers = {
+                name: module['breaker']['state']
+                for name, module in status.get('modules', {}).items()
+                if isinstance(module, dict) and module.get('breaker')
+            }
+            open_breakers.extend(f"#{worker_id}/{name}" for name, state in breakers.items() if state != 'closed')
+            per_worker[worker_id] = {
+                'pid': report.get('pid'),
+                'total_clients': status.get('total_clients', 0),
+                'breakers': breakers,
+                'report_age': time.time() - report.get('timestamp', 0)
+            }
+
+        return {
+            'workers_configured': self.workers,
+            'workers_alive': len(alive),
+            'total_restarts': self.total_restarts,
+            'total_clients': total_clients,
+            'uptime': time.time() - self.start_time if self.start_time else 0,
+            'open_breakers': open_breakers,
+            'per_worker': per_worker
+        }
+
+    def run(self):
+        """运行监督循环，直到收到停止信号或所有工作进程均无法重启"""
+        def handle_signal(signum, frame):
+            logger.info(f"🛑 收到信号: {signal.Signals(signum).name}")
+            self.is_running = False
+
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGTERM, handle_signal)
+
+        self.start()
+        last_report = time.time()
+
+        try:
+            while self.is_running:
+                time.sleep(0.5)
+                self._check_workers()
+                self._drain_metrics()
+
+                if not self.processes:
+                    logger.error("❌ 所有工作进程均已停止")
+                    return False
+
+                if time.time() - last_report >= self.metrics_interval:
+                    last_report = time.time()
+                    metrics = self.get_aggregated_metrics()
+                    logger.info(
+                        f"📊 工作进程: {metrics['workers_alive']}/{metrics['workers_configured']} 存活, "
+                        f"客户端总数: {metrics['total_clients']}, 累计重启: {metrics['total_restarts']}"
+                    )
+                    if metrics['open_breakers']:
+                        logger.warning(f"⚡ 熔断中的后端: {', '.join(metrics['open_breakers'])}")
+            return True
+
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 10.0):
+        """停止所有工作进程"""
+        self.is_running = False
+        logger.info("🛑 正在停止所有工作进程...")
+
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.time() + timeout
+        for worker_id, process in self.processes.items():
+            process.join(timeout=max(0, deadline - time.time()))
+            if process.is_alive():
+                logger.warning(f"⚠️ 工作进程 #{worker_id} 未能及时退出，强制结束")
+                process.kill()
+                process.join()
+
+        self.processes.clear()
+        self.pending_restarts.clear()
+        logger.info("✅ 所有工作进程已停止")
+
+
+def run_workers(server_factory: Callable, host: str, port: int, workers: int, **kwargs) -> bool:
+    """以多进程模式运行服务器，平台不支持 SO_REUSEPORT 时返回 False"""
+    if not is_reuse_port_supported():
+        logger.error("❌ 当前平台不支持 SO_REUSEPORT，无法启用多进程模式")
+        return False
+
+    supervisor = WorkerSupervisor(server_factory, host, port, workers, **kwargs)
+    return supervisor.run()